@@ -0,0 +1,232 @@
+# benchmarks/bench_admin_api.py
+"""
+اختبار حمل للوحة الإدارة (fastapi_admin) بعدد مشرفين متزامنين واقعي.
+
+كل "مشرف" حلقة تطلب مزيجاً من المسارات (طوابير معلقة، بحث عمليات، مستخدمون، تدقيق)
+وتعيد إرسال ETag السابق كما يفعل المتصفح، ثم يُطبع لكل مسار: عدد الطلبات، نسبة 304، و p50/p99.
+
+الوضعان:
+  داخلي (افتراضي) — يشغّل التطبيق عبر uvicorn في خيط، ودوال store تُستبدل ببيانات في الذاكرة
+                    مع تأخير --db-latency-ms يحاكي زمن الاستعلام (المنفذ thread pool كما في الإنتاج).
+  --url           — يقيس نسخة قائمة فعلاً على قاعدة بيانات حقيقية (يتطلب --token).
+
+التشغيل:
+    python -m benchmarks.bench_admin_api --admins 8 --duration 20 --db-latency-ms 3
+    python -m benchmarks.bench_admin_api --url http://127.0.0.1:8080 --token <token> --admins 8
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+import aiohttp
+
+_BENCH_TOKEN = "bench-token"
+os.environ.setdefault("ADMIN_WEB_TOKENS", f"bench:{_BENCH_TOKEN}")
+
+import config  # noqa: E402
+import store  # noqa: E402
+
+config.ADMIN_WEB_TOKENS.setdefault(_BENCH_TOKEN, "bench")
+
+PATHS = [
+    # (الاسم، المسار، الوزن)
+    ("pending", "/api/pending/syriatel_dep", 5),
+    ("pending_wd", "/api/pending/coinex_wd", 3),
+    ("search_status", "/api/transactions/syriatel_transactions?status=approved", 2),
+    ("search_user", "/api/transactions/shamcash_withdrawals?user_id={user}", 2),
+    ("users", "/api/users?q=user1", 1),
+    ("user_detail", "/api/users/{user}", 1),
+    ("audit", "/api/audit", 2),
+]
+
+
+# ---------- in-memory store ----------
+class FakeData:
+    def __init__(self, users: int, rows_per_table: int, latency: float):
+        rnd = random.Random(7)
+        self.latency = latency
+        start = datetime(2024, 1, 1)
+        self.users = [{"id": i, "telegram_id": str(100000 + i), "username": f"user{i}",
+                       "balance": rnd.randint(0, 10 ** 6), "blocked_at": None} for i in range(1, users + 1)]
+        self.tables = {}
+        for table in store.TRANSACTION_TABLES:
+            rows = []
+            for i in range(1, rows_per_table + 1):
+                uid = rnd.randint(1, users)
+                rows.append({
+                    "id": i, "user_id": uid, "amount": rnd.randint(25, 500) * 1000,
+                    "nsp_amount": rnd.randint(25, 500) * 1000, "usdt_amount": 10.5,
+                    "status": "pending" if rnd.random() < 0.05 else rnd.choice(["approved", "rejected"]),
+                    "txid": f"TX{table[:3]}{i}", "created_at": start + timedelta(minutes=i),
+                    "telegram_id": str(100000 + uid), "username": f"user{uid}",
+                })
+            self.tables[table] = rows
+        # فهارس بسيطة حتى لا يقيس الاختبار مسحاً خطياً في Python بدل التطبيق
+        self.pending = {t: [r for r in rows if r["status"] == "pending"] for t, rows in self.tables.items()}
+        self.by_user = {}
+        for t, rows in self.tables.items():
+            for r in rows:
+                self.by_user.setdefault((t, r["user_id"]), []).append(r)
+        self.audit = [{"id": i, "source": "syriatel_transactions", "tx_id": i, "action": "approved",
+                       "actor": "admin_1", "reason": None, "created_at": start + timedelta(minutes=i)}
+                      for i in range(1, rows_per_table + 1)]
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_pending_page(self, table_name, after_id=0, limit=50, actor=None):
+        self._wait()
+        return [r for r in self.pending[table_name] if r["id"] > after_id][:limit]
+
+    def search_transactions(self, table_name, status=None, user_id=None, txid=None, before_id=None, limit=50):
+        self._wait()
+        out = []
+        rows = self.by_user.get((table_name, user_id), []) if user_id is not None else self.tables[table_name]
+        for r in reversed(rows):
+            if (status and r["status"] != status) or (user_id is not None and r["user_id"] != user_id) \
+                    or (txid and r["txid"] != txid) or (before_id and r["id"] >= before_id):
+                continue
+            out.append(r)
+            if len(out) == limit:
+                break
+        return out
+
+    def lookup_users(self, q=None, after_id=0, limit=50):
+        self._wait()
+        q = (q or "").lstrip("@")
+        return [u for u in self.users if u["id"] > after_id and u["username"].startswith(q)][:limit]
+
+    def get_user_by_id(self, user_id):
+        self._wait()
+        return self.users[user_id - 1] if 0 < user_id <= len(self.users) else None
+
+    def get_audit_page(self, source=None, tx_id=None, actor=None, action=None, text=None,
+                       time_from=None, time_to=None, before_id=None, limit=50):
+        self._wait()
+        out = [a for a in reversed(self.audit) if (not before_id or a["id"] < before_id)
+               and (not actor or a["actor"] == actor) and (not action or a["action"] == action)]
+        return out[:limit]
+
+    def install(self):
+        for name in ("get_pending_page", "search_transactions", "lookup_users", "get_user_by_id", "get_audit_page"):
+            setattr(store, name, getattr(self, name))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ServerThread:
+    def __init__(self, port: int):
+        import uvicorn
+        from fastapi_admin.app import app
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+# ---------- load ----------
+def _pct(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+async def run_load(base_url: str, token: str, admins: int, duration: float, users: int, think_ms: float):
+    weighted = [p for p in PATHS for _ in range(p[2])]
+    results = {name: {"lat": [], "304": 0, "errors": 0} for name, _, _ in PATHS}
+    deadline = time.monotonic() + duration
+
+    async def admin_loop(session: aiohttp.ClientSession, seed: int):
+        rnd = random.Random(seed)
+        etags = {}
+        while time.monotonic() < deadline:
+            name, path, _ = rnd.choice(weighted)
+            url = base_url + path.format(user=rnd.randint(1, users))
+            headers = {"Authorization": f"Bearer {token}"}
+            if url in etags:
+                headers["If-None-Match"] = etags[url]
+            t0 = time.perf_counter()
+            try:
+                async with session.get(url, headers=headers) as resp:
+                    await resp.read()
+                    elapsed = time.perf_counter() - t0
+                    if resp.status == 304:
+                        results[name]["304"] += 1
+                    elif resp.status == 200:
+                        etags[url] = resp.headers.get("ETag", "")
+                    else:
+                        results[name]["errors"] += 1
+            except aiohttp.ClientError:
+                elapsed = time.perf_counter() - t0
+                results[name]["errors"] += 1
+            results[name]["lat"].append(elapsed)
+            if think_ms:
+                await asyncio.sleep(rnd.uniform(0, think_ms) / 1000.0)
+
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(admin_loop(session, i) for i in range(admins)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Admin web app load test (p50/p99 per endpoint)")
+    parser.add_argument("--url", help="benchmark a running instance instead of the in-process one")
+    parser.add_argument("--token", default=_BENCH_TOKEN)
+    parser.add_argument("--admins", type=int, default=8, help="concurrent admin sessions")
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--think-ms", type=float, default=0.0, help="random pause between requests (0 = closed loop)")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--rows", type=int, default=20000, help="rows per transaction table (in-process mode)")
+    parser.add_argument("--db-latency-ms", type=float, default=2.0, help="simulated query time (in-process mode)")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        FakeData(args.users, args.rows, args.db_latency_ms / 1000.0).install()
+        port = _free_port()
+        server = ServerThread(port).start()
+        base_url = f"http://127.0.0.1:{port}"
+    try:
+        print(f"target={base_url} admins={args.admins} duration={args.duration}s think={args.think_ms}ms "
+              f"db_latency={'n/a' if args.url else f'{args.db_latency_ms}ms'}")
+        results = asyncio.run(run_load(base_url, args.token, args.admins, args.duration, args.users, args.think_ms))
+    finally:
+        if server:
+            server.stop()
+
+    print(f"{'endpoint':<14} {'req':>7} {'req/s':>8} {'304 %':>6} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    all_lat = []
+    for name, res in results.items():
+        lat = sorted(res["lat"])
+        all_lat += lat
+        if not lat:
+            continue
+        print(f"{name:<14} {len(lat):>7} {len(lat) / args.duration:>8.1f} {res['304'] * 100 / len(lat):>6.1f} "
+              f"{_pct(lat, 50) * 1000:>8.2f} {_pct(lat, 99) * 1000:>8.2f} {res['errors']:>7}")
+    all_lat.sort()
+    print(f"{'ALL':<14} {len(all_lat):>7} {len(all_lat) / args.duration:>8.1f} {'':>6} "
+          f"{_pct(all_lat, 50) * 1000:>8.2f} {_pct(all_lat, 99) * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
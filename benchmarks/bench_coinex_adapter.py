@@ -0,0 +1,132 @@
+# benchmarks/bench_coinex_adapter.py
+"""
+قياس أداء services/coinex_adapter مقابل الخادم الوهمي المحلي.
+
+يقيس لكل هدف: الإنتاجية (طلب/ث) و p50/p99 للزمن، ونسبة الاستجابات الخاطئة.
+الأهداف:
+  sync      — CoinExClient مباشرة، طلب تلو الآخر
+  executor  — async wrappers (run_in_executor) مع عدد مهام متزامنة = --concurrency
+
+التشغيل:
+    python -m benchmarks.bench_coinex_adapter --requests 500 --concurrency 16 --latency-ms 20
+لإضافة هدف جديد (مثلاً عميل async أصلي) أضف دالة إلى TARGETS.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+# حدود العميل المحلية ترفع افتراضياً حتى نقيس المحوّل نفسه لا الـ token bucket
+os.environ.setdefault("COINEX_READ_RATE", "100000")
+os.environ.setdefault("COINEX_WITHDRAW_RATE", "100000")
+os.environ.setdefault("COINEX_BREAKER_THRESHOLD", "1000000")
+
+from benchmarks.coinex_mock_server import MockConfig, MockServerThread  # noqa: E402
+import config  # noqa: E402
+from services import coinex_adapter  # noqa: E402
+
+
+def _call(client, endpoint: str):
+    if endpoint == "address":
+        return client.get_deposit_address("USDT", "TRC20")
+    if endpoint == "history":
+        return client.get_deposit_history("USDT", "TRC20", limit=50)
+    return client.withdraw("USDT", "TMockAddress000000000000000000000", 1.5, "TRC20", remark="bench")
+
+
+async def _acall(endpoint: str):
+    if endpoint == "address":
+        return await coinex_adapter.get_deposit_address("USDT", "TRC20")
+    if endpoint == "history":
+        return await coinex_adapter.get_deposit_history("USDT", "TRC20", limit=50)
+    return await coinex_adapter.withdraw_coinex("USDT", "TMockAddress000000000000000000000", 1.5, "TRC20", remark="bench")
+
+
+def bench_sync(client, endpoint: str, n: int, concurrency: int):
+    latencies, errors = [], 0
+    for _ in range(n):
+        t0 = time.perf_counter()
+        res = _call(client, endpoint)
+        latencies.append(time.perf_counter() - t0)
+        errors += int(not isinstance(res, dict) or res.get("code") != 0)
+    return latencies, errors
+
+
+def bench_executor(client, endpoint: str, n: int, concurrency: int):
+    async def run():
+        sem = asyncio.Semaphore(concurrency)
+        latencies, errors = [], 0
+
+        async def one():
+            nonlocal errors
+            async with sem:
+                t0 = time.perf_counter()
+                res = await _acall(endpoint)
+                latencies.append(time.perf_counter() - t0)
+                errors += int(not isinstance(res, dict) or res.get("code") != 0)
+
+        await asyncio.gather(*(one() for _ in range(n)))
+        return latencies, errors
+
+    return asyncio.run(run())
+
+
+TARGETS = {
+    "sync": bench_sync,
+    "executor": bench_executor,
+}
+
+
+def _pct(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CoinEx adapter benchmark against the local mock server")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--endpoint", choices=["address", "history", "withdraw"], default="address")
+    parser.add_argument("--targets", default=",".join(TARGETS), help="comma-separated subset of: " + ",".join(TARGETS))
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    args = parser.parse_args()
+
+    mock = MockServerThread(MockConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, rate_429=args.rate_429, retry_after=0,
+    )).start()
+    try:
+        config.COINEX_BASE_URL = mock.base_url
+        if coinex_adapter.base_url() != mock.base_url.rstrip("/"):
+            # القياس يرسل طلبات سحب موقعة: لا تخرج أبداً إلى CoinEx الحقيقي
+            raise SystemExit(f"refusing to run: adapter targets {coinex_adapter.base_url()}, not the mock {mock.base_url}")
+        client = coinex_adapter.CoinExClient(mock.app["mock_config"].access_id, mock.app["mock_config"].secret_key)
+        coinex_adapter._coinex_client = client  # تستخدمه الـ async wrappers
+
+        print(f"endpoint={args.endpoint} requests={args.requests} concurrency={args.concurrency} "
+              f"latency={args.latency_ms}ms error_rate={args.error_rate} rate_429={args.rate_429}")
+        print(f"{'target':<10} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>8}")
+        for name in [t.strip() for t in args.targets.split(",") if t.strip()]:
+            fn = TARGETS[name]
+            t0 = time.perf_counter()
+            latencies, errors = fn(client, args.endpoint, args.requests, args.concurrency)
+            elapsed = time.perf_counter() - t0
+            lat = sorted(latencies)
+            print(f"{name:<10} {len(lat) / elapsed:>10.1f} {_pct(lat, 50) * 1000:>10.2f} "
+                  f"{_pct(lat, 99) * 1000:>10.2f} {errors:>8}")
+        counters = mock.state.counters
+        print(f"server: requests={counters['requests']} bad_sign={counters['bad_sign']} "
+              f"5xx={counters['injected_5xx']} 429={counters['injected_429']}")
+        if counters["bad_sign"]:
+            print("⚠️ signature mismatches detected — the client and sign_payload disagree")
+    finally:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
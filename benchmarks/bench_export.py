@@ -0,0 +1,86 @@
+# benchmarks/bench_export.py
+"""
+قياس services/export على مليون صف: الإنتاجية، حجم الناتج، وذروة الذاكرة.
+
+كل تركيبة (format × gzip) تعمل في عملية مستقلة حتى تكون ذروة RSS (ru_maxrss) خاصة بها؛
+ثبات الذاكرة يظهر بمقارنة --rows 100000 مع --rows 1000000.
+الصفوف مولّدة في الذاكرة بشكل الصفوف التي يرجعها cursor العمليات؛ مع --db تُقرأ من قاعدة
+البيانات المهيأة في .env عبر cursor غير مخزَّن (يجب أن تحتوي الفترة على عدد كافٍ من الصفوف).
+
+التشغيل:
+    python -m benchmarks.bench_export --rows 1000000
+    python -m benchmarks.bench_export --db --date-from 2024-01-01 --date-to 2024-12-31
+"""
+import argparse
+import multiprocessing
+import resource
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from services import export
+
+TARGETS = [("csv", False), ("csv", True), ("jsonl", False), ("jsonl", True)]
+
+
+def synthetic_chunks(rows: int, chunk_rows: int):
+    start = datetime(2024, 1, 1)
+    methods = export.store.HISTORY_METHODS
+    produced = 0
+    while produced < rows:
+        n = min(chunk_rows, rows - produced)
+        yield [
+            (methods[i % 6], i, 1000 + i % 50000, "approved", Decimal(25000 + i % 975000), "NSP",
+             f"TX{i:012d}", start + timedelta(seconds=i))
+            for i in range(produced, produced + n)
+        ]
+        produced += n
+
+
+def _run(args, fmt, gz, out):
+    spec = export.ExportSpec(kind="transactions", date_from=args.date_from, date_to=args.date_to, fmt=fmt, gzip=gz)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    chunks = (export.iter_row_chunks(spec, args.chunk) if args.db
+              else synthetic_chunks(args.rows, args.chunk))
+    counted = []
+
+    def counting(it):
+        for rows in it:
+            counted.append(len(rows))
+            yield rows
+
+    t0 = time.perf_counter()
+    size = 0
+    for data in export.encode(spec, counting(chunks)):
+        size += len(data)
+    elapsed = time.perf_counter() - t0
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    out.put((sum(counted), elapsed, size, rss_before, rss_after))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming export benchmark")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk", type=int, default=export.CHUNK_ROWS)
+    parser.add_argument("--db", action="store_true", help="read from the configured database instead of synthetic rows")
+    parser.add_argument("--date-from", type=date.fromisoformat, default=date(2000, 1, 1))
+    parser.add_argument("--date-to", type=date.fromisoformat, default=date(2100, 1, 1))
+    args = parser.parse_args()
+
+    print(f"source={'db' if args.db else 'synthetic'} rows={'all in range' if args.db else args.rows} chunk={args.chunk}")
+    print(f"{'target':<12} {'rows':>9} {'rows/s':>10} {'MB out':>8} {'peak RSS MB':>12} {'RSS growth MB':>14}")
+    ctx = multiprocessing.get_context("spawn")
+    for fmt, gz in TARGETS:
+        q = ctx.Queue()
+        p = ctx.Process(target=_run, args=(args, fmt, gz, q))
+        p.start()
+        rows, elapsed, size, before, after = q.get()
+        p.join()
+        name = fmt + ("+gzip" if gz else "")
+        # ru_maxrss بالكيلوبايت على Linux
+        print(f"{name:<12} {rows:>9} {rows / elapsed:>10.0f} {size / 1e6:>8.1f} {after / 1024:>12.1f} "
+              f"{(after - before) / 1024:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# benchmarks/bench_payouts.py
+"""
+قياس services/payout_workers مع متصفح حقيقي ضد البوابة المحلية (payout_portal_standin).
+
+تُنشأ --payouts مهمة في قائمة داخل الذاكرة (بدل جداول payout_queue والسحوبات) وتمر عبر PayoutLane
+و ContextPool و StandInPortal كما في البوت، بتوازٍ --concurrency. يُطبع: مدفوعات/ثانية، عدد مرات
+تسجيل الدخول (يجب ألا يتجاوز عدد السياقات إلا عند انتهاء الجلسة)، إعادة المحاولات، والاسترداد
+من السجل بعد --drop-rate؛ وأي تحويل مكرر على البوابة يعني دفعاً مزدوجاً.
+
+يتطلب مرة واحدة: python -m playwright install chromium
+
+التشغيل:
+    python -m benchmarks.bench_payouts --payouts 200 --concurrency 4
+    python -m benchmarks.bench_payouts --payouts 100 --concurrency 2 --drop-rate 0.1 --latency-ms 150
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from decimal import Decimal
+
+from benchmarks.payout_portal_standin import DEFAULT_PASSWORD, DEFAULT_USERNAME, PortalConfig, PortalServerThread
+from services import payout_workers
+from services.payout_portal import StandInPortal
+
+
+class MemoryQueue:
+    """claim/finish/retry بنفس دلالات دوال store على payout_queue."""
+
+    def __init__(self, payouts: int):
+        now = time.monotonic()
+        self.jobs = {
+            i: {"job_id": i, "provider": "syriatel", "withdrawal_id": i, "client_id": f"bench-{i}", "attempts": 0,
+                "user_id": 1, "amount": Decimal(50000 + i), "destination": f"0933{i:06d}",
+                "withdrawal_status": "approved_awaiting_txid", "status": "queued", "available_at": now}
+            for i in range(1, payouts + 1)
+        }
+        self.completed = {}
+
+    def claim(self, provider, claim_token, limit, lock_seconds):
+        now = time.monotonic()
+        out = []
+        for job in self.jobs.values():
+            if len(out) >= limit:
+                break
+            if job["status"] == "queued" and job["available_at"] <= now:
+                job["status"] = "processing"
+                job["attempts"] += 1
+                out.append(dict(job))
+        return out
+
+    def finish(self, job_id, status, last_error=None, external_txid=None):
+        self.jobs[job_id]["status"] = status
+
+    def retry(self, job_id, delay_seconds, last_error=None):
+        self.jobs[job_id].update(status="queued", available_at=time.monotonic() + delay_seconds)
+
+    def open(self) -> int:
+        return sum(1 for j in self.jobs.values() if j["status"] in ("queued", "processing"))
+
+
+def _install_fakes(queue: MemoryQueue, retry_seconds: float):
+    targets = {"start_payout": payout_workers.transitions.PAYOUT_IN_PROGRESS,
+               "release_payout": "approved_awaiting_txid", "complete": "approved"}
+
+    async def apply(table, tx_id, name, actor, reason=None, txid=None, note=None):
+        queue.jobs[tx_id]["withdrawal_status"] = targets[name]
+        if name == "complete":
+            queue.completed[tx_id] = txid
+        return {"id": tx_id}
+
+    async def notify_admin(message, *args, **kwargs):
+        print("  admin:", message.splitlines()[0])
+
+    payout_workers.store.claim_payout_jobs = queue.claim
+    payout_workers.store.finish_payout_job = queue.finish
+    payout_workers.store.retry_payout_job = queue.retry
+    payout_workers.transitions.apply = apply
+    payout_workers.notify_admin = notify_admin
+    payout_workers.backoff_delay = lambda *a, **k: retry_seconds
+
+
+async def _run(args, base_url: str) -> dict:
+    from playwright.async_api import async_playwright
+
+    queue = MemoryQueue(args.payouts)
+    _install_fakes(queue, args.retry_seconds)
+    script = StandInPortal(base_url, DEFAULT_USERNAME, DEFAULT_PASSWORD)
+    async with async_playwright() as pw:
+        browser = await pw.chromium.launch(headless=True)
+        with tempfile.TemporaryDirectory() as state_dir:
+            pool = payout_workers.ContextPool("syriatel", args.concurrency, state_dir, args.timeout * 1000)
+            await pool.open(browser)
+            lane = payout_workers.PayoutLane("syriatel", script, pool, poll_seconds=0.2,
+                                             max_attempts=args.max_attempts, lock_seconds=300)
+            t0 = time.perf_counter()
+            task = asyncio.create_task(lane.dispatch_loop())
+            while queue.open():
+                await asyncio.sleep(0.1)
+            elapsed = time.perf_counter() - t0
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await lane.drain()
+            await pool.close()
+        await browser.close()
+    return {"elapsed": elapsed, "lane": lane.stats(), "completed": len(queue.completed),
+            "unique_txids": len(set(queue.completed.values()))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pooled browser payout benchmark")
+    parser.add_argument("--payouts", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--reject-rate", type=float, default=0.0)
+    parser.add_argument("--session-ttl", type=float, default=3600.0)
+    parser.add_argument("--timeout", type=float, default=5.0, help="per-action browser timeout (seconds)")
+    parser.add_argument("--max-attempts", type=int, default=4)
+    parser.add_argument("--retry-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    server = PortalServerThread(PortalConfig(latency_ms=args.latency_ms, drop_rate=args.drop_rate,
+                                             reject_rate=args.reject_rate, session_ttl=args.session_ttl)).start()
+    try:
+        r = asyncio.run(_run(args, server.base_url))
+    finally:
+        server.stop()
+    st, c = r["lane"], server.state.counters
+    print(f"payouts={args.payouts} concurrency={args.concurrency} latency={args.latency_ms:g}ms "
+          f"drop={args.drop_rate:g} reject={args.reject_rate:g}")
+    print(f"completed {r['completed']} in {r['elapsed']:.1f}s — {r['completed'] / r['elapsed']:.1f} payouts/s, "
+          f"avg job {st['avg_seconds']}s")
+    print(f"logins {st['logins']} (portal {c['logins']}) — retried {st['retried']} — recovered from history "
+          f"{st['recovered']} — failed {st['failed']}")
+    print(f"portal transfers {c['transfers']} (dropped {c['dropped']}, declined {c['rejected']}) — "
+          f"duplicate payments {c['duplicates']} — unique TxIDs {r['unique_txids']}")
+
+
+if __name__ == "__main__":
+    main()
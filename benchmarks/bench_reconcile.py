@@ -0,0 +1,114 @@
+# benchmarks/bench_reconcile.py
+"""
+قياس services/reconciliation على كشف مولّد: سرعة القراءة والفهرسة، ذروة الذاكرة، وزمن المطابقة.
+
+يُكتب كشف من --lines سطراً (CSV أو SMS) في ملف مؤقت ويُقرأ عبر index_file كما يقرؤه المجلد الوارد؛
+الطلبات المعلقة (--pending) مولّدة في الذاكرة بدل store.get_pending_deposits: نسبة منها تطابق الكشف
+تماماً، ونسبة بمبلغ مختلف أو TxID فيه خطأ حرف، والباقي بلا مقابل. الموافقة الجماعية لا تلمس القاعدة
+(bulk_actions.execute مستبدلة بدالة تعيد الصفوف) فالزمن المقاس هو الفهرسة والمرور الواحد فقط.
+
+التشغيل:
+    python -m benchmarks.bench_reconcile --lines 100000
+    python -m benchmarks.bench_reconcile --lines 100000 --format sms --pending 20000
+"""
+import argparse
+import asyncio
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from decimal import Decimal
+
+from services import reconciliation
+
+
+def _txid(i: int) -> str:
+    return f"{600000000000 + i * 7919:012d}"
+
+
+def write_statement(path: str, lines: int, fmt: str):
+    with open(path, "w", encoding="utf-8") as f:
+        if fmt == "csv":
+            f.write("Date,Transaction ID,Amount,Currency,Sender\n")
+            for i in range(lines):
+                f.write(f"2024-05-{1 + i % 28:02d} 10:{i % 60:02d},{_txid(i)},{10000 + i % 990000},NSP,0933{i % 1000000:06d}\n")
+        else:
+            for i in range(lines):
+                f.write(f"تم استلام مبلغ {10000 + i % 990000:,} ل.س من الرقم 0933{i % 1000000:06d}. "
+                        f"رقم العملية: {_txid(i)}. الرصيد الحالي 1,250,000 ل.س\n")
+
+
+def synthetic_pending(count: int, lines: int) -> list:
+    rows = []
+    for n in range(count):
+        i = (n * 37) % lines
+        amount, txid = Decimal(10000 + i % 990000), _txid(i)
+        if n % 10 == 7:
+            amount += 500                              # مبلغ مختلف
+        elif n % 10 == 8:
+            txid = txid[:-1] + ("0" if txid[-1] != "0" else "1")  # خطأ بحرف
+        elif n % 10 == 9:
+            txid = f"X{n:011d}"                        # لا مقابل
+        rows.append({"id": n + 1, "user_id": 1000 + n, "amount": amount, "currency": "NSP", "txid": txid})
+    return rows
+
+
+def _install_fakes(pending: list):
+    def get_pending_deposits(table_name, after_id, limit):
+        start = next((k for k, r in enumerate(pending) if r["id"] > after_id), len(pending)) if after_id else 0
+        return pending[start:start + limit]
+
+    async def execute(kind, ids, approve, actor, actor_name, respect_claims=True):
+        return [{"id": i} for i in ids]
+
+    reconciliation.store.get_pending_deposits = get_pending_deposits
+    reconciliation.store.add_audit_logs = lambda entries: None
+    reconciliation.store.get_used_deposit_txids = lambda table_name, txids: {}
+    reconciliation.store.get_audit_reasons = lambda source, action, tx_ids: set()
+    reconciliation.bulk_actions.execute = execute
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Statement reconciliation benchmark")
+    parser.add_argument("--lines", type=int, default=100_000)
+    parser.add_argument("--pending", type=int, default=5_000)
+    parser.add_argument("--format", choices=reconciliation.FORMATS, default="csv")
+    parser.add_argument("--provider", choices=sorted(reconciliation.PROVIDERS), default="syriatel")
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=f".{args.format}")
+    os.close(fd)
+    try:
+        write_statement(path, args.lines, args.format)
+        size = os.path.getsize(path)
+        pending = synthetic_pending(args.pending, args.lines)
+        _install_fakes(pending)
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        t0 = time.perf_counter()
+        index = reconciliation.index_file(path, args.format)
+        ingest = time.perf_counter() - t0
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # تمرير ثانٍ تحت tracemalloc للذاكرة فقط (يبطئ القراءة كثيراً فلا يُحسب في الزمن)
+        tracemalloc.start()
+        reconciliation.index_file(path, args.format)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        report = asyncio.run(reconciliation.reconcile(args.provider, index))
+    finally:
+        os.remove(path)
+
+    print(f"format={args.format} lines={args.lines} file={size / 1e6:.1f} MB pending={args.pending}")
+    print(f"ingest   {index.lines:>9} lines  {ingest:7.3f}s  {index.lines / ingest:>10.0f} lines/s  "
+          f"indexed={len(index.by_txid)} skipped={index.skipped}")
+    # ru_maxrss بالكيلوبايت على Linux؛ ذروة tracemalloc هي الفهرس نفسه (الملف لا يُحمَّل كاملاً)
+    print(f"memory   index peak {peak / 1e6:.1f} MB  RSS growth {(rss_after - rss_before) / 1024:.1f} MB")
+    print(f"match    {report.pending:>9} pending {report.match_seconds:7.3f}s  "
+          f"{report.pending / max(report.match_seconds, 1e-9):>10.0f} rows/s")
+    print(f"result   matched={len(report.matched)} flagged={len(report.flagged)} unmatched={report.unmatched}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# benchmarks/coinex_mock_server.py
+"""
+خادم CoinEx وهمي محلي (aiohttp) لاختبار services/coinex_adapter دون المنصة الحقيقية.
+
+يتحقق من X-COINEX-SIGN بنفس طريقة sign_payload حرفياً، ويدعم حقن الأعطال:
+زمن استجابة، نسبة أخطاء 5xx، نسبة 429 مع Retry-After.
+
+التشغيل:
+    python -m benchmarks.coinex_mock_server --port 8765 --latency-ms 50 --error-rate 0.05 --rate-429 0.02
+ثم: COINEX_BASE_URL=http://127.0.0.1:8765 مع COINEX_ACCESS_ID/COINEX_SECRET_KEY المطابقة.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+from services.coinex_adapter import sign_payload
+
+DEFAULT_ACCESS_ID = "mock-access-id"
+DEFAULT_SECRET = "mock-secret-key"
+
+
+@dataclass
+class MockConfig:
+    access_id: str = DEFAULT_ACCESS_ID
+    secret_key: str = DEFAULT_SECRET
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    rate_429: float = 0.0
+    retry_after: int = 1
+    # السحب ينتقل إلى finished بعد هذه المدة، إلا نسبة fail_withdraw_rate تنتقل إلى failed
+    settle_seconds: float = 5.0
+    fail_withdraw_rate: float = 0.0
+    timestamp_window_ms: int = 60_000
+
+
+@dataclass
+class MockState:
+    withdrawals: list = field(default_factory=list)
+    deposits: list = field(default_factory=list)
+    counters: dict = field(default_factory=lambda: {"requests": 0, "bad_sign": 0, "injected_5xx": 0, "injected_429": 0})
+    _ids: itertools.count = field(default_factory=lambda: itertools.count(1_000_000))
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+
+def _ok(data, **extra):
+    return web.json_response({"code": 0, "data": data, "message": "OK", **extra})
+
+
+def _paginate(items, request):
+    limit = int(request.query.get("limit", 10))
+    page = int(request.query.get("page", 1))
+    chunk = items[(page - 1) * limit: page * limit]
+    return _ok(chunk, pagination={"total": len(items), "has_next": page * limit < len(items)})
+
+
+def build_app(cfg: MockConfig = None, state: MockState = None) -> web.Application:
+    cfg = cfg or MockConfig()
+    state = state or MockState()
+
+    @web.middleware
+    async def faults_and_auth(request: web.Request, handler):
+        state.counters["requests"] += 1
+        if cfg.latency_ms or cfg.jitter_ms:
+            await asyncio.sleep((cfg.latency_ms + random.uniform(0, cfg.jitter_ms)) / 1000.0)
+        r = random.random()
+        if r < cfg.rate_429:
+            state.counters["injected_429"] += 1
+            return web.json_response({"code": 429, "message": "Too Many Requests"}, status=429,
+                                     headers={"Retry-After": str(cfg.retry_after)})
+        if r < cfg.rate_429 + cfg.error_rate:
+            state.counters["injected_5xx"] += 1
+            return web.json_response({"code": 500, "message": "Injected failure"}, status=503)
+
+        body = await request.text()
+        ts = request.headers.get("X-COINEX-TIMESTAMP", "")
+        # نستخدم المسار والاستعلام الخام (غير المفكوك) لأنهما ما وقّعه العميل
+        expected = sign_payload(cfg.secret_key, request.method, request.rel_url.raw_path,
+                                request.rel_url.raw_query_string, body, ts)
+        if (
+            request.headers.get("X-COINEX-KEY") != cfg.access_id
+            or request.headers.get("X-COINEX-SIGN") != expected
+            or not ts.isdigit()
+            or abs(int(ts) - int(time.time() * 1000)) > cfg.timestamp_window_ms
+        ):
+            state.counters["bad_sign"] += 1
+            return web.json_response({"code": 25, "data": {}, "message": "Signature Incorrect"})
+        return await handler(request)
+
+    async def deposit_address(request):
+        ccy = request.query.get("ccy", "USDT")
+        chain = request.query.get("chain", "TRC20")
+        return _ok({"address": f"mock-{ccy}-{chain}-address", "memo": "", "chain": chain})
+
+    async def deposit_history(request):
+        return _paginate(state.deposits, request)
+
+    def _withdraw_view(w):
+        status = w["status"]
+        if status == "processing" and time.time() - w["created_ts"] >= cfg.settle_seconds:
+            w["status"] = status = "failed" if w["doomed"] else "finished"
+        return {k: v for k, v in w.items() if k not in ("created_ts", "doomed")}
+
+    async def withdraw(request):
+        try:
+            payload = json.loads(await request.text() or "{}")
+        except ValueError:
+            return web.json_response({"code": 3008, "message": "invalid json"})
+        for key in ("ccy", "to_address", "amount"):
+            if not payload.get(key):
+                return web.json_response({"code": 3008, "message": f"missing {key}"})
+        w = {
+            "withdraw_id": state.next_id(),
+            "created_at": int(time.time() * 1000),
+            "ccy": payload["ccy"],
+            "chain": payload.get("chain"),
+            "to_address": payload["to_address"],
+            "withdraw_amount": payload["amount"],
+            "remark": payload.get("remark", ""),
+            "status": "processing",
+            "tx_id": "",
+            "created_ts": time.time(),
+            "doomed": random.random() < cfg.fail_withdraw_rate,
+        }
+        state.withdrawals.insert(0, w)
+        return _ok(_withdraw_view(w))
+
+    async def withdraw_history(request):
+        items = [_withdraw_view(w) for w in state.withdrawals]
+        if request.query.get("withdraw_id"):
+            items = [w for w in items if str(w["withdraw_id"]) == request.query["withdraw_id"]]
+        if request.query.get("status"):
+            items = [w for w in items if w["status"] == request.query["status"]]
+        return _paginate(items, request)
+
+    app = web.Application(middlewares=[faults_and_auth])
+    app["mock_config"] = cfg
+    app["mock_state"] = state
+    app.router.add_get("/v2/assets/deposit-address", deposit_address)
+    app.router.add_get("/v2/assets/deposit-history", deposit_history)
+    app.router.add_post("/v2/assets/withdraw", withdraw)
+    app.router.add_get("/v2/assets/withdraw", withdraw_history)
+    return app
+
+
+class MockServerThread:
+    """تشغيل الخادم في خيط خلفي بحلقة asyncio مستقلة (للاستخدام من سكربتات القياس)."""
+
+    def __init__(self, cfg: MockConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.app = build_app(cfg)
+        self.host = host
+        self.port = port
+        self._loop = asyncio.new_event_loop()
+        self._runner = None
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def state(self) -> MockState:
+        return self.app["mock_state"]
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(self.app, access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, self.host, self.port)
+        self._loop.run_until_complete(site.start())
+        if not self.port:
+            self.port = site._server.sockets[0].getsockname()[1]
+        self._started.set()
+        self._loop.run_forever()
+
+    def start(self):
+        self._thread.start()
+        self._started.wait(10)
+        return self
+
+    def stop(self):
+        if self._runner:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local CoinEx v2 mock server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--access-id", default=DEFAULT_ACCESS_ID)
+    parser.add_argument("--secret", default=DEFAULT_SECRET)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--settle-seconds", type=float, default=5.0)
+    parser.add_argument("--fail-withdraw-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    cfg = MockConfig(
+        access_id=args.access_id, secret_key=args.secret,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, rate_429=args.rate_429, retry_after=args.retry_after,
+        settle_seconds=args.settle_seconds, fail_withdraw_rate=args.fail_withdraw_rate,
+    )
+    web.run_app(build_app(cfg), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
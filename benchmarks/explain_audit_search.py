@@ -0,0 +1,113 @@
+# benchmarks/explain_audit_search.py
+"""
+يتحقق بـ EXPLAIN من أن كل شكل استعلام يدعمه بحث سجل التدقيق (store.build_audit_search)
+يستخدم الفهرس المخصص له دون filesort، وأن تحويل المدى الزمني إلى حدود id يقرأ من idx_audit_created_at.
+
+يعمل على قاعدة البيانات المهيأة في .env بعد تطبيق المهاجرات. خطط المحسّن تعتمد على حجم الجدول؛
+على قاعدة فارغة أو صغيرة استخدم --seed لإدراج صفوف اصطناعية (قاعدة تجريبية فقط).
+
+التشغيل:
+    python -m benchmarks.explain_audit_search
+    python -m benchmarks.explain_audit_search --seed 200000
+"""
+import argparse
+import random
+import sys
+from datetime import datetime, timedelta
+
+import store
+
+SEED_SOURCES = ["syriatel_transactions", "shamcash_transactions", "syriatel_withdrawals", "shamcash_withdrawals",
+                "coinex_withdrawals", "whitelist_address", "system"]
+SEED_ACTIONS = ["pending", "approved", "rejected", "failed", "added", "removed", "update_rate"]
+SEED_REASONS = ["User submitted deposit", "رصيد غير كاف", "Transfer not found in statement",
+                "approved via bulk action", "withdrawal expired and refunded", None]
+
+
+def seed(n: int, batch: int = 5000):
+    start = datetime.now() - timedelta(days=90)
+    step = timedelta(days=90) / max(n, 1)
+    conn = store.getDatabaseConnection()
+    cur = conn.cursor()
+    try:
+        for offset in range(0, n, batch):
+            rows = [(random.choice(SEED_SOURCES), random.randint(1, n // 20 + 1), random.choice(SEED_ACTIONS),
+                     f"admin_{random.randint(1, 5)}" if random.random() < 0.5 else f"user_{random.randint(1, 5000)}",
+                     random.choice(SEED_REASONS), start + step * i)
+                    for i in range(offset, min(offset + batch, n))]
+            cur.executemany("INSERT INTO audit_log (source, tx_id, action, actor, reason, created_at) "
+                            "VALUES (%s,%s,%s,%s,%s,%s)", rows)
+            conn.commit()
+        cur.execute("ANALYZE TABLE audit_log")
+        cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _sample():
+    """قيم حقيقية من أحدث صف حتى تكون الانتقائية واقعية."""
+    row = store._execute_query("SELECT source, tx_id, actor, action FROM audit_log ORDER BY id DESC LIMIT 1",
+                               fetchone=True)
+    return row or {"source": "syriatel_transactions", "tx_id": 1, "actor": "admin_1", "action": "approved"}
+
+
+def shapes(sample: dict):
+    """(name, filters, expected keys, filesort allowed) لكل شكل مدعوم، مع وبدون حدود id ومؤشر صفحة."""
+    values = {"source": sample["source"], "tx_id": sample["tx_id"], "actor": sample["actor"],
+              "action": sample["action"]}
+    for shape, index in store.AUDIT_SEARCH_INDEXES.items():
+        filters = {k: values[k] for k in shape}
+        name = "+".join(shape) or "(none)"
+        yield name, filters, {index}, False
+        yield name + " +before", dict(filters, before_id=10 ** 12), {index}, False
+        yield name + " +time", dict(filters, min_id=1, max_id=10 ** 12), {index}, False
+    # FULLTEXT: الصفوف المطابقة تُرتَّب بـ id بعد البحث (عددها محدود بطبيعة البحث)
+    yield "text", {"text": "deposit"}, {"ft_audit_reason"}, True
+    yield "text +time", {"text": "deposit", "min_id": 1, "max_id": 10 ** 12}, {"ft_audit_reason", "PRIMARY"}, True
+    yield "actor+text", {"actor": values["actor"], "text": "deposit"}, {"ft_audit_reason", "idx_audit_actor"}, True
+
+
+def explain(sql: str, params) -> list:
+    return store._execute_query("EXPLAIN " + sql, params, fetch=True) or []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN every audit search query shape")
+    parser.add_argument("--seed", type=int, default=0, help="insert N synthetic audit_log rows first (scratch DB only)")
+    args = parser.parse_args()
+    if args.seed:
+        seed(args.seed)
+
+    failures = 0
+    print(f"{'shape':<28} {'key':<26} {'type':<9} {'rows':>8}  result")
+
+    plan = explain(store.AUDIT_ID_BOUNDS_SQL, (datetime.now() - timedelta(days=7), datetime.now()))
+    for r in plan:
+        if r.get("select_type") != "SUBQUERY":
+            continue
+        ok = r.get("key") == "idx_audit_created_at" and "filesort" not in (r.get("Extra") or "")
+        failures += not ok
+        print(f"{'time → id bounds':<28} {str(r.get('key')):<26} {str(r.get('type')):<9} {str(r.get('rows')):>8}  "
+              f"{'ok' if ok else 'FAIL ' + str(r.get('Extra'))}")
+
+    for name, filters, expected, filesort_ok in shapes(_sample()):
+        sql, params = store.build_audit_search(limit=51, **filters)
+        rows = [r for r in explain(sql, params) if r.get("table") == "audit_log"]
+        if not rows:
+            failures += 1
+            print(f"{name:<28} {'-':<26} {'-':<9} {'-':>8}  FAIL no plan")
+            continue
+        r = rows[0]
+        extra = r.get("Extra") or ""
+        ok = r.get("key") in expected and (filesort_ok or "filesort" not in extra)
+        failures += not ok
+        print(f"{name:<28} {str(r.get('key')):<26} {str(r.get('type')):<9} {str(r.get('rows')):>8}  "
+              f"{'ok' if ok else 'FAIL expected ' + '/'.join(sorted(expected)) + ' — ' + extra}")
+
+    print("\nall query shapes use their index" if not failures else f"\n{failures} shape(s) failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
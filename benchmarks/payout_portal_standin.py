@@ -0,0 +1,207 @@
+# benchmarks/payout_portal_standin.py
+"""
+بوابة مزوّد وهمية محلية (aiohttp، صفحات HTML) لاختبار services/payout_workers و StandInPortal
+دون بوابة Syriatel / ShamCash الحقيقية.
+
+نموذج دخول بجلسة cookie تنتهي بعد --session-ttl، نموذج تحويل يعرض TxID في صفحة النتيجة،
+وصفحة سجل تُبحث بملاحظة التحويل. حقن الأعطال: زمن استجابة، نسبة رفض صريح، ونسبة "انقطاع بعد
+التنفيذ" (التحويل يُسجل ثم يرجع 502) لاختبار البحث في السجل بدل الدفع مرتين.
+state.duplicates يعد الملاحظات التي دُفعت أكثر من مرة (يجب أن يبقى 0).
+
+التشغيل:
+    python -m benchmarks.payout_portal_standin --port 8766 --latency-ms 200 --drop-rate 0.05
+ثم: PAYOUT_SYRIATEL_SCRIPT=services.payout_portal:StandInPortal PAYOUT_SYRIATEL_URL=http://127.0.0.1:8766
+مع PAYOUT_SYRIATEL_USERNAME / PAYOUT_SYRIATEL_PASSWORD المطابقة.
+"""
+import argparse
+import asyncio
+import html
+import itertools
+import random
+import secrets
+import threading
+import time
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+DEFAULT_USERNAME = "agent"
+DEFAULT_PASSWORD = "standin-password"
+
+
+@dataclass
+class PortalConfig:
+    username: str = DEFAULT_USERNAME
+    password: str = DEFAULT_PASSWORD
+    latency_ms: float = 0.0
+    session_ttl: float = 3600.0
+    reject_rate: float = 0.0
+    drop_rate: float = 0.0
+
+
+@dataclass
+class PortalState:
+    sessions: dict = field(default_factory=dict)
+    transfers: list = field(default_factory=list)
+    by_note: dict = field(default_factory=dict)
+    counters: dict = field(default_factory=lambda: {"logins": 0, "transfers": 0, "rejected": 0, "dropped": 0,
+                                                    "duplicates": 0, "lookups": 0})
+    _ids: itertools.count = field(default_factory=lambda: itertools.count(800_000_001))
+
+
+def _page(title: str, body: str) -> web.Response:
+    return web.Response(text=f"<!doctype html><html><head><meta charset='utf-8'><title>{title}</title></head>"
+                             f"<body><h1>{title}</h1>{body}</body></html>", content_type="text/html")
+
+
+_LOGIN_FORM = ("<form id='login' method='post' action='/login'>"
+               "<input name='username'><input name='password' type='password'>"
+               "<button type='submit'>Sign in</button></form>")
+_TRANSFER_FORM = ("<form id='transfer' method='post' action='/transfer'>"
+                  "<input name='destination'><input name='amount'><input name='note'>"
+                  "<button type='submit'>Send</button></form>")
+
+
+def build_app(cfg: PortalConfig = None, state: PortalState = None) -> web.Application:
+    cfg = cfg or PortalConfig()
+    state = state or PortalState()
+    app = web.Application()
+    app["portal_state"] = state
+
+    def authed(request) -> bool:
+        expires = state.sessions.get(request.cookies.get("session"))
+        return bool(expires and expires > time.time())
+
+    async def latency():
+        if cfg.latency_ms:
+            await asyncio.sleep(cfg.latency_ms / 1000)
+
+    async def login_page(request):
+        return _page("Sign in", _LOGIN_FORM)
+
+    async def login(request):
+        await latency()
+        form = await request.post()
+        if form.get("username") != cfg.username or form.get("password") != cfg.password:
+            return _page("Sign in", "<p id='error'>Invalid credentials</p>" + _LOGIN_FORM)
+        token = secrets.token_hex(16)
+        state.sessions[token] = time.time() + cfg.session_ttl
+        state.counters["logins"] += 1
+        resp = web.HTTPSeeOther("/transfer")
+        resp.set_cookie("session", token, httponly=True)
+        raise resp
+
+    async def transfer_page(request):
+        if not authed(request):
+            raise web.HTTPSeeOther("/login")
+        return _page("Transfer", _TRANSFER_FORM)
+
+    async def transfer(request):
+        if not authed(request):
+            raise web.HTTPSeeOther("/login")
+        await latency()
+        form = await request.post()
+        try:
+            amount = float(form.get("amount", ""))
+        except ValueError:
+            amount = 0
+        if amount <= 0 or not form.get("destination") or random.random() < cfg.reject_rate:
+            state.counters["rejected"] += 1
+            return _page("Transfer", "<p id='error'>Transfer declined</p>" + _TRANSFER_FORM)
+        note = form.get("note", "")
+        txid = str(next(state._ids))
+        if note and note in state.by_note:
+            state.counters["duplicates"] += 1
+        state.by_note[note] = txid
+        state.transfers.append({"txid": txid, "destination": form["destination"], "amount": amount,
+                                "note": note, "at": time.time()})
+        state.counters["transfers"] += 1
+        if random.random() < cfg.drop_rate:
+            state.counters["dropped"] += 1
+            return web.Response(status=502, text="Bad gateway")
+        return _page("Transfer complete",
+                     f"<p>Sent {amount:g} to {html.escape(form['destination'])}</p>"
+                     f"<p>Transaction ID: <span id='txid'>{txid}</span></p>" + _TRANSFER_FORM)
+
+    async def history(request):
+        if not authed(request):
+            raise web.HTTPSeeOther("/login")
+        state.counters["lookups"] += 1
+        note = request.query.get("note")
+        items = [t for t in state.transfers if note is None or t["note"] == note][-100:]
+        rows = "".join(
+            f"<tr data-note=\"{html.escape(t['note'], quote=True)}\"><td class='txid'>{t['txid']}</td>"
+            f"<td>{html.escape(t['destination'])}</td><td>{t['amount']:g}</td></tr>"
+            for t in items
+        )
+        return _page("History", f"<table id='history'>{rows}</table>")
+
+    app.router.add_get("/login", login_page)
+    app.router.add_post("/login", login)
+    app.router.add_get("/transfer", transfer_page)
+    app.router.add_post("/transfer", transfer)
+    app.router.add_get("/history", history)
+    return app
+
+
+class PortalServerThread:
+    """تشغيل البوابة في خيط خلفي بحلقة asyncio مستقلة (للاستخدام من سكربتات القياس)."""
+
+    def __init__(self, cfg: PortalConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.app = build_app(cfg)
+        self.host = host
+        self.port = port
+        self._loop = asyncio.new_event_loop()
+        self._runner = None
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def state(self) -> PortalState:
+        return self.app["portal_state"]
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(self.app, access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, self.host, self.port)
+        self._loop.run_until_complete(site.start())
+        if not self.port:
+            self.port = site._server.sockets[0].getsockname()[1]
+        self._started.set()
+        self._loop.run_forever()
+
+    def start(self):
+        self._thread.start()
+        self._started.wait(10)
+        return self
+
+    def stop(self):
+        if self._runner:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local payout portal stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--username", default=DEFAULT_USERNAME)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--session-ttl", type=float, default=3600.0)
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="fraction of transfers declined outright")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of transfers executed then answered 502")
+    args = parser.parse_args()
+    cfg = PortalConfig(username=args.username, password=args.password, latency_ms=args.latency_ms,
+                       session_ttl=args.session_ttl, reject_rate=args.reject_rate, drop_rate=args.drop_rate)
+    web.run_app(build_app(cfg), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -73,4 +73,138 @@ SYRIATEL_MAX_WITHDRAW: int = _int_env("SYRIATEL_MAX_WITHDRAW", 500000)
 SYRIATEL_FEE_PERCENT: int = _int_env("SYRIATEL_FEE_PERCENT", 10)
 
 COINEX_MIN_WITHDRAW_NSP: int = _int_env("COINEX_MIN_WITHDRAW_NSP", 10000)
-COINEX_FEE_PERCENT: float = _float_env("COINEX_FEE_PERCENT", 0.0)
\ No newline at end of file
+COINEX_FEE_PERCENT: float = _float_env("COINEX_FEE_PERCENT", 0.0)
+
+
+# CoinEx client protection (rate limit / retries / circuit breaker)
+# يمكن توجيه COINEX_BASE_URL إلى خادم محلي للاختبار
+COINEX_BASE_URL: str = os.getenv("COINEX_BASE_URL", "https://api.coinex.com")
+COINEX_TIMEOUT: float = _float_env("COINEX_TIMEOUT", 15.0)
+COINEX_READ_RATE: float = _float_env("COINEX_READ_RATE", 10.0)
+COINEX_WITHDRAW_RATE: float = _float_env("COINEX_WITHDRAW_RATE", 2.0)
+COINEX_RATE_WAIT: float = _float_env("COINEX_RATE_WAIT", 5.0)
+COINEX_MAX_RETRIES: int = _int_env("COINEX_MAX_RETRIES", 3)
+COINEX_BACKOFF_BASE: float = _float_env("COINEX_BACKOFF_BASE", 0.5)
+COINEX_BACKOFF_CAP: float = _float_env("COINEX_BACKOFF_CAP", 8.0)
+COINEX_BREAKER_THRESHOLD: int = _int_env("COINEX_BREAKER_THRESHOLD", 5)
+COINEX_BREAKER_RESET: float = _float_env("COINEX_BREAKER_RESET", 30.0)
+
+# CoinEx withdrawal execution queue
+COINEX_WITHDRAW_CONCURRENCY: int = _int_env("COINEX_WITHDRAW_CONCURRENCY", 3)
+COINEX_QUEUE_POLL_SECONDS: float = _float_env("COINEX_QUEUE_POLL_SECONDS", 5.0)
+COINEX_QUEUE_MAX_ATTEMPTS: int = _int_env("COINEX_QUEUE_MAX_ATTEMPTS", 5)
+COINEX_QUEUE_LOCK_SECONDS: int = _int_env("COINEX_QUEUE_LOCK_SECONDS", 120)
+# سجل السحوبات يُقرأ حتى ما قبل إضافة المهمة للقائمة (بهامش فرق الساعة) وبحد أقصى من الصفحات
+COINEX_HISTORY_MAX_PAGES: int = _int_env("COINEX_HISTORY_MAX_PAGES", 20)
+COINEX_HISTORY_SKEW_SECONDS: int = _int_env("COINEX_HISTORY_SKEW_SECONDS", 300)
+
+# CoinEx withdrawal reconciliation (adaptive polling)
+COINEX_RECONCILE_FAST_SECONDS: float = _float_env("COINEX_RECONCILE_FAST_SECONDS", 20.0)
+COINEX_RECONCILE_IDLE_SECONDS: float = _float_env("COINEX_RECONCILE_IDLE_SECONDS", 300.0)
+COINEX_RECONCILE_PAGE_SIZE: int = _int_env("COINEX_RECONCILE_PAGE_SIZE", 100)
+COINEX_RECONCILE_MAX_PAGES: int = _int_env("COINEX_RECONCILE_MAX_PAGES", 50)
+
+# Notification outbox dispatcher
+OUTBOX_BATCH_SIZE: int = _int_env("OUTBOX_BATCH_SIZE", 50)
+OUTBOX_POLL_SECONDS: float = _float_env("OUTBOX_POLL_SECONDS", 5.0)
+OUTBOX_MAX_ATTEMPTS: int = _int_env("OUTBOX_MAX_ATTEMPTS", 8)
+
+# Broadcast engine
+BROADCAST_RATE: float = _float_env("BROADCAST_RATE", 15.0)
+BROADCAST_CHUNK_SIZE: int = _int_env("BROADCAST_CHUNK_SIZE", 500)
+BROADCAST_PROGRESS_SECONDS: float = _float_env("BROADCAST_PROGRESS_SECONDS", 5.0)
+
+# Admin web app (fastapi_admin): "name:token,name:token" — الاسم يظهر كـ actor في سجل التدقيق
+def _parse_web_tokens(raw: str) -> dict:
+    tokens = {}
+    for part in (raw or "").split(","):
+        name, sep, token = part.strip().partition(":")
+        if sep and name.strip() and token.strip():
+            tokens[token.strip()] = name.strip()
+    return tokens
+
+
+ADMIN_WEB_TOKENS: dict = _parse_web_tokens(os.getenv("ADMIN_WEB_TOKENS", ""))
+ADMIN_WEB_PAGE_SIZE: int = _int_env("ADMIN_WEB_PAGE_SIZE", 50)
+# تشغيل اللوحة داخل عملية البوت (0 = معطّل) — مطلوب لبث الأحداث الحية من handlers البوت
+ADMIN_WEB_HOST: str = os.getenv("ADMIN_WEB_HOST", "127.0.0.1")
+ADMIN_WEB_PORT: int = _int_env("ADMIN_WEB_PORT", 0)
+
+# Live pending-queue events (services/events): events kept for reconnecting SSE clients
+EVENTS_REPLAY_SIZE: int = _int_env("EVENTS_REPLAY_SIZE", 500)
+
+# Admin work claims: claim lifetime, assignment sweep interval (0 = no auto-assignment),
+# and optional explicit assignee actors ("admin_<id>,web_<name>"; default = admin_<id> for ADMIN_IDS)
+CLAIM_TTL_SECONDS: int = _int_env("CLAIM_TTL_SECONDS", 600)
+CLAIM_SWEEP_SECONDS: float = _float_env("CLAIM_SWEEP_SECONDS", 60.0)
+CLAIM_ASSIGNEES: list = [a.strip() for a in os.getenv("CLAIM_ASSIGNEES", "").split(",") if a.strip()]
+
+# Stale withdrawal sweeper (services/stale_sweeper): hours a withdrawal may stay pending /
+# approved_awaiting_txid before it is expired and refunded (0 = never), per method;
+# sweep interval and rows expired per transaction
+STALE_WITHDRAW_HOURS_SYRIATEL: float = _float_env("STALE_WITHDRAW_HOURS_SYRIATEL", 72.0)
+STALE_WITHDRAW_HOURS_SHAMCASH: float = _float_env("STALE_WITHDRAW_HOURS_SHAMCASH", 72.0)
+STALE_WITHDRAW_HOURS_COINEX: float = _float_env("STALE_WITHDRAW_HOURS_COINEX", 48.0)
+STALE_SWEEP_SECONDS: float = _float_env("STALE_SWEEP_SECONDS", 600.0)
+STALE_SWEEP_BATCH: int = _int_env("STALE_SWEEP_BATCH", 200)
+
+# Statement reconciliation (services/reconciliation): inbox directory watched for provider
+# statements ("" = off; files named syriatel*/shamcash*, .csv or SMS text), poll interval, and the
+# largest deposit approved automatically on an exact match (0 = no limit)
+RECONCILE_INBOX_DIR: str = os.getenv("RECONCILE_INBOX_DIR", "")
+RECONCILE_POLL_SECONDS: float = _float_env("RECONCILE_POLL_SECONDS", 60.0)
+RECONCILE_AUTO_APPROVE_MAX: float = _float_env("RECONCILE_AUTO_APPROVE_MAX", 0.0)
+
+# Per-user velocity limits (services/velocity): flow openings per minute per method, requests per
+# hour / 24h, and NSP withdrawn per 24h per method (0 = no limit). Counters live in process in
+# VELOCITY_BUCKET_SECONDS buckets; set VELOCITY_REDIS_URL to share them between bot processes
+VELOCITY_ATTEMPTS_PER_MINUTE: int = _int_env("VELOCITY_ATTEMPTS_PER_MINUTE", 6)
+VELOCITY_DEPOSIT_PER_HOUR: int = _int_env("VELOCITY_DEPOSIT_PER_HOUR", 5)
+VELOCITY_DEPOSIT_PER_DAY: int = _int_env("VELOCITY_DEPOSIT_PER_DAY", 20)
+VELOCITY_COINEX_DEPOSIT_PER_HOUR: int = _int_env("VELOCITY_COINEX_DEPOSIT_PER_HOUR", VELOCITY_DEPOSIT_PER_HOUR)
+VELOCITY_COINEX_DEPOSIT_PER_DAY: int = _int_env("VELOCITY_COINEX_DEPOSIT_PER_DAY", VELOCITY_DEPOSIT_PER_DAY)
+VELOCITY_WITHDRAW_PER_HOUR: int = _int_env("VELOCITY_WITHDRAW_PER_HOUR", 3)
+VELOCITY_WITHDRAW_PER_DAY: int = _int_env("VELOCITY_WITHDRAW_PER_DAY", 10)
+VELOCITY_DAILY_NSP_SYRIATEL: float = _float_env("VELOCITY_DAILY_NSP_SYRIATEL", 0.0)
+VELOCITY_DAILY_NSP_SHAMCASH: float = _float_env("VELOCITY_DAILY_NSP_SHAMCASH", 0.0)
+VELOCITY_DAILY_NSP_COINEX: float = _float_env("VELOCITY_DAILY_NSP_COINEX", 0.0)
+VELOCITY_BUCKET_SECONDS: int = _int_env("VELOCITY_BUCKET_SECONDS", 300)
+VELOCITY_MAX_USERS: int = _int_env("VELOCITY_MAX_USERS", 50000)
+VELOCITY_REDIS_URL: str = os.getenv("VELOCITY_REDIS_URL", "")
+
+# Callback debounce (handlers/debounce): identical (user, callback_data) taps are dropped while the
+# first is still being handled (at most CALLBACK_INFLIGHT_SECONDS) and for CALLBACK_DEBOUNCE_SECONDS
+# after it finished (0 = off)
+CALLBACK_DEBOUNCE_SECONDS: float = _float_env("CALLBACK_DEBOUNCE_SECONDS", 1.5)
+CALLBACK_INFLIGHT_SECONDS: float = _float_env("CALLBACK_INFLIGHT_SECONDS", 30.0)
+CALLBACK_DEBOUNCE_MAX_KEYS: int = _int_env("CALLBACK_DEBOUNCE_MAX_KEYS", 10000)
+
+# USD → NSP rate (services/rates): the current rate is kept in memory and re-read every
+# RATE_CACHE_SECONDS; a flow's quote stays valid for RATE_QUOTE_TTL_SECONDS
+RATE_CACHE_SECONDS: float = _float_env("RATE_CACHE_SECONDS", 60.0)
+RATE_QUOTE_TTL_SECONDS: float = _float_env("RATE_QUOTE_TTL_SECONDS", 600.0)
+
+# Syriatel / ShamCash portal payouts (services/payout_workers): "module:Class" provider script
+# ("" = manual TxID as before), portal URL and login, and browser contexts (= concurrent payouts)
+PAYOUT_SYRIATEL_SCRIPT: str = os.getenv("PAYOUT_SYRIATEL_SCRIPT", "")
+PAYOUT_SYRIATEL_URL: str = os.getenv("PAYOUT_SYRIATEL_URL", "")
+PAYOUT_SYRIATEL_USERNAME: str = os.getenv("PAYOUT_SYRIATEL_USERNAME", "")
+PAYOUT_SYRIATEL_PASSWORD: str = os.getenv("PAYOUT_SYRIATEL_PASSWORD", "")
+PAYOUT_SYRIATEL_CONCURRENCY: int = _int_env("PAYOUT_SYRIATEL_CONCURRENCY", 2)
+PAYOUT_SHAMCASH_SCRIPT: str = os.getenv("PAYOUT_SHAMCASH_SCRIPT", "")
+PAYOUT_SHAMCASH_URL: str = os.getenv("PAYOUT_SHAMCASH_URL", "")
+PAYOUT_SHAMCASH_USERNAME: str = os.getenv("PAYOUT_SHAMCASH_USERNAME", "")
+PAYOUT_SHAMCASH_PASSWORD: str = os.getenv("PAYOUT_SHAMCASH_PASSWORD", "")
+PAYOUT_SHAMCASH_CONCURRENCY: int = _int_env("PAYOUT_SHAMCASH_CONCURRENCY", 2)
+# الجلسات المحفوظة (storage_state) — تحتوي ملفات تعريف الارتباط فاحمها كما تحمي كلمات المرور
+PAYOUT_STATE_DIR: str = os.getenv("PAYOUT_STATE_DIR", "payout_sessions")
+PAYOUT_HEADLESS: bool = os.getenv("PAYOUT_HEADLESS", "1") != "0"
+PAYOUT_TIMEOUT_SECONDS: float = _float_env("PAYOUT_TIMEOUT_SECONDS", 30.0)
+PAYOUT_POLL_SECONDS: float = _float_env("PAYOUT_POLL_SECONDS", 10.0)
+PAYOUT_MAX_ATTEMPTS: int = _int_env("PAYOUT_MAX_ATTEMPTS", 4)
+PAYOUT_LOCK_SECONDS: int = _int_env("PAYOUT_LOCK_SECONDS", 300)
+# فقط السحوبات الموافق عليها خلال هذه المدة تُنفذ آلياً (ما قبلها قد يكون دُفع يدوياً)
+PAYOUT_ENQUEUE_WINDOW_HOURS: float = _float_env("PAYOUT_ENQUEUE_WINDOW_HOURS", 24.0)
+
+# Statistics rollups: hour (server local time) of the nightly compaction
+STATS_COMPACT_HOUR: int = _int_env("STATS_COMPACT_HOUR", 3)
@@ -0,0 +1,21 @@
+-- Persistent execution queue for admin-approved CoinEx withdrawals.
+-- One row per coinex_withdrawals row; client_id is sent to CoinEx as the
+-- withdrawal remark so a retried submission can be detected in history.
+CREATE TABLE IF NOT EXISTS coinex_withdraw_queue (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    withdrawal_id BIGINT NOT NULL,
+    client_id VARCHAR(64) NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'queued',
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT NULL,
+    claim_token VARCHAR(36) NULL,
+    locked_until DATETIME NULL,
+    available_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    enqueued_by VARCHAR(64) NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at DATETIME NULL,
+    UNIQUE KEY uq_cwq_withdrawal (withdrawal_id),
+    UNIQUE KEY uq_cwq_client_id (client_id),
+    KEY idx_cwq_status_available (status, available_at),
+    KEY idx_cwq_claim_token (claim_token)
+);
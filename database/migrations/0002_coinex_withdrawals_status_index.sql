@@ -0,0 +1,2 @@
+-- The reconciler scans open (status = 'processing') CoinEx withdrawals.
+CREATE INDEX idx_cw_status_id ON coinex_withdrawals (status, id);
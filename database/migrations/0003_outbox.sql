@@ -0,0 +1,18 @@
+-- Durable notification outbox. Rows are written in the same DB transaction
+-- as the status change they announce and drained by services/outbox_dispatcher.
+CREATE TABLE IF NOT EXISTS outbox (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    chat_id BIGINT NOT NULL,
+    text TEXT NOT NULL,
+    parse_mode VARCHAR(16) NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT NULL,
+    claim_token VARCHAR(36) NULL,
+    locked_until DATETIME NULL,
+    next_attempt_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    sent_at DATETIME NULL,
+    KEY idx_outbox_status_next (status, next_attempt_at),
+    KEY idx_outbox_claim_token (claim_token)
+);
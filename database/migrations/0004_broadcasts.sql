@@ -0,0 +1,23 @@
+-- Users that blocked the bot or were deactivated are skipped by broadcasts.
+ALTER TABLE users ADD COLUMN blocked_at DATETIME NULL;
+
+-- Resumable broadcast jobs. last_user_id is the keyset checkpoint:
+-- recipients are read in users.id order and a restarted job continues after it.
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    text TEXT NOT NULL,
+    parse_mode VARCHAR(16) NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'running',
+    created_by BIGINT NULL,
+    status_chat_id BIGINT NULL,
+    status_message_id BIGINT NULL,
+    total INT NOT NULL DEFAULT 0,
+    last_user_id BIGINT NOT NULL DEFAULT 0,
+    sent INT NOT NULL DEFAULT 0,
+    failed INT NOT NULL DEFAULT 0,
+    blocked INT NOT NULL DEFAULT 0,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME NULL,
+    finished_at DATETIME NULL,
+    KEY idx_broadcasts_status (status)
+);
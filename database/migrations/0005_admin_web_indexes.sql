@@ -0,0 +1,31 @@
+-- Indexes behind the keyset-paginated admin web app (fastapi_admin).
+-- Pending queues: WHERE status = 'pending' AND id > ? ORDER BY id
+-- (coinex_withdrawals already has idx_cw_status_id from 0002).
+CREATE INDEX idx_st_status_id ON syriatel_transactions (status, id);
+CREATE INDEX idx_sht_status_id ON shamcash_transactions (status, id);
+CREATE INDEX idx_ct_status_id ON coinex_transactions (status, id);
+CREATE INDEX idx_sw_status_id ON syriatel_withdrawals (status, id);
+CREATE INDEX idx_shw_status_id ON shamcash_withdrawals (status, id);
+
+-- Transaction search by user: WHERE user_id = ? AND id < ? ORDER BY id DESC
+CREATE INDEX idx_st_user_id ON syriatel_transactions (user_id, id);
+CREATE INDEX idx_sht_user_id ON shamcash_transactions (user_id, id);
+CREATE INDEX idx_ct_user_id ON coinex_transactions (user_id, id);
+CREATE INDEX idx_cw_user_id ON coinex_withdrawals (user_id, id);
+CREATE INDEX idx_sw_user_id ON syriatel_withdrawals (user_id, id);
+CREATE INDEX idx_shw_user_id ON shamcash_withdrawals (user_id, id);
+
+-- Transaction search by external transfer id
+CREATE INDEX idx_st_txid ON syriatel_transactions (txid);
+CREATE INDEX idx_sht_txid ON shamcash_transactions (txid);
+CREATE INDEX idx_ct_txid ON coinex_transactions (txid);
+CREATE INDEX idx_cw_coinex_txid ON coinex_withdrawals (coinex_txid);
+CREATE INDEX idx_sw_txid ON syriatel_withdrawals (txid);
+CREATE INDEX idx_shw_txid ON shamcash_withdrawals (txid);
+
+-- User lookup by username prefix
+CREATE INDEX idx_users_username ON users (username);
+
+-- Audit log: per-transaction history and per-actor history, newest first
+CREATE INDEX idx_audit_source_tx ON audit_log (source, tx_id, id);
+CREATE INDEX idx_audit_actor ON audit_log (actor, id);
@@ -0,0 +1,223 @@
+-- Per-day statistics rollups read by the stats screens (services/stats_rollup.py).
+-- One row per (user, day, method, status, currency); user_id = 0 holds the all-users total.
+-- day is the transaction's creation date and method is the source table, so a status
+-- change moves one transaction between two buckets of the same day.
+--
+-- Rows are maintained by the triggers below, so every writer (handlers, bulk actions,
+-- reconciler, admin web app) keeps them current without code changes. Each trigger body
+-- is a single statement (no BEGIN ... END) so the ';' splitter in apply_migrations works.
+-- min_amount/max_amount can only grow incrementally: a bucket that loses a row is marked
+-- dirty and recomputed exactly by the nightly compaction job.
+--
+-- With binary logging enabled MySQL may require log_bin_trust_function_creators=1
+-- (or SUPER) for the migration user to create triggers.
+CREATE TABLE IF NOT EXISTS stats_rollup (
+    user_id BIGINT NOT NULL,
+    day DATE NOT NULL,
+    method VARCHAR(32) NOT NULL,
+    status VARCHAR(32) NOT NULL,
+    currency VARCHAR(8) NOT NULL DEFAULT 'NSP',
+    cnt INT NOT NULL DEFAULT 0,
+    total DECIMAL(20,2) NOT NULL DEFAULT 0,
+    min_amount DECIMAL(20,2) NULL,
+    max_amount DECIMAL(20,2) NULL,
+    dirty TINYINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day, method, status, currency),
+    KEY idx_rollup_day_method (day, method),
+    KEY idx_rollup_dirty (dirty)
+);
+
+-- Compaction recomputes one (day, method) at a time from the source table.
+CREATE INDEX idx_st_created_at ON syriatel_transactions (created_at);
+CREATE INDEX idx_sht_created_at ON shamcash_transactions (created_at);
+CREATE INDEX idx_ct_created_at ON coinex_transactions (created_at);
+CREATE INDEX idx_cw_created_at ON coinex_withdrawals (created_at);
+CREATE INDEX idx_sw_created_at ON syriatel_withdrawals (created_at);
+CREATE INDEX idx_shw_created_at ON shamcash_withdrawals (created_at);
+
+-- Backfill existing rows, then keep each table's buckets current with an insert and an update trigger.
+-- syriatel_transactions
+INSERT INTO stats_rollup (user_id, day, method, status, currency, cnt, total, min_amount, max_amount, dirty)
+SELECT user_id, DATE(created_at), 'syriatel_transactions', status, 'NSP', COUNT(*), SUM(amount), MIN(amount), MAX(amount), 0
+FROM syriatel_transactions GROUP BY user_id, DATE(created_at), status
+UNION ALL
+SELECT 0, DATE(created_at), 'syriatel_transactions', status, 'NSP', COUNT(*), SUM(amount), MIN(amount), MAX(amount), 0
+FROM syriatel_transactions GROUP BY DATE(created_at), status;
+CREATE TRIGGER trg_st_rollup_ins AFTER INSERT ON syriatel_transactions FOR EACH ROW
+INSERT INTO stats_rollup (user_id, day, method, status, currency, cnt, total, min_amount, max_amount, dirty)
+SELECT k.u, DATE(NEW.created_at), 'syriatel_transactions', NEW.status, 'NSP', 1, NEW.amount, NEW.amount, NEW.amount, 0
+FROM (SELECT 0 AS u UNION ALL SELECT NEW.user_id) k
+ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt), total = total + VALUES(total),
+    min_amount = IF(VALUES(cnt) > 0, LEAST(COALESCE(min_amount, VALUES(min_amount)), VALUES(min_amount)), min_amount),
+    max_amount = IF(VALUES(cnt) > 0, GREATEST(COALESCE(max_amount, VALUES(max_amount)), VALUES(max_amount)), max_amount),
+    dirty = GREATEST(dirty, VALUES(dirty));
+CREATE TRIGGER trg_st_rollup_upd AFTER UPDATE ON syriatel_transactions FOR EACH ROW
+INSERT INTO stats_rollup (user_id, day, method, status, currency, cnt, total, min_amount, max_amount, dirty)
+SELECT d.u, DATE(d.created_at), 'syriatel_transactions', d.st, d.cur, d.delta, d.delta * d.amt, d.amt, d.amt, d.delta < 0
+FROM (
+    SELECT 0 AS u, -1 AS delta, OLD.status AS st, 'NSP' AS cur, OLD.amount AS amt, OLD.created_at AS created_at
+    UNION ALL SELECT OLD.user_id, -1, OLD.status, 'NSP', OLD.amount, OLD.created_at
+    UNION ALL SELECT 0, 1, NEW.status, 'NSP', NEW.amount, NEW.created_at
+    UNION ALL SELECT NEW.user_id, 1, NEW.status, 'NSP', NEW.amount, NEW.created_at
+) d
+WHERE NOT (OLD.status <=> NEW.status AND OLD.amount <=> NEW.amount AND OLD.user_id <=> NEW.user_id
+           AND OLD.created_at <=> NEW.created_at)
+ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt), total = total + VALUES(total),
+    min_amount = IF(VALUES(cnt) > 0, LEAST(COALESCE(min_amount, VALUES(min_amount)), VALUES(min_amount)), min_amount),
+    max_amount = IF(VALUES(cnt) > 0, GREATEST(COALESCE(max_amount, VALUES(max_amount)), VALUES(max_amount)), max_amount),
+    dirty = GREATEST(dirty, VALUES(dirty));
+
+-- shamcash_transactions
+INSERT INTO stats_rollup (user_id, day, method, status, currency, cnt, total, min_amount, max_amount, dirty)
+SELECT user_id, DATE(created_at), 'shamcash_transactions', status, COALESCE(currency, 'NSP'), COUNT(*), SUM(amount), MIN(amount), MAX(amount), 0
+FROM shamcash_transactions GROUP BY user_id, DATE(created_at), status, COALESCE(currency, 'NSP')
+UNION ALL
+SELECT 0, DATE(created_at), 'shamcash_transactions', status, COALESCE(currency, 'NSP'), COUNT(*), SUM(amount), MIN(amount), MAX(amount), 0
+FROM shamcash_transactions GROUP BY DATE(created_at), status, COALESCE(currency, 'NSP');
+CREATE TRIGGER trg_sht_rollup_ins AFTER INSERT ON shamcash_transactions FOR EACH ROW
+INSERT INTO stats_rollup (user_id, day, method, status, currency, cnt, total, min_amount, max_amount, dirty)
+SELECT k.u, DATE(NEW.created_at), 'shamcash_transactions', NEW.status, COALESCE(NEW.currency, 'NSP'), 1, NEW.amount, NEW.amount, NEW.amount, 0
+FROM (SELECT 0 AS u UNION ALL SELECT NEW.user_id) k
+ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt), total = total + VALUES(total),
+    min_amount = IF(VALUES(cnt) > 0, LEAST(COALESCE(min_amount, VALUES(min_amount)), VALUES(min_amount)), min_amount),
+    max_amount = IF(VALUES(cnt) > 0, GREATEST(COALESCE(max_amount, VALUES(max_amount)), VALUES(max_amount)), max_amount),
+    dirty = GREATEST(dirty, VALUES(dirty));
+CREATE TRIGGER trg_sht_rollup_upd AFTER UPDATE ON shamcash_transactions FOR EACH ROW
+INSERT INTO stats_rollup (user_id, day, method, status, currency, cnt, total, min_amount, max_amount, dirty)
+SELECT d.u, DATE(d.created_at), 'shamcash_transactions', d.st, d.cur, d.delta, d.delta * d.amt, d.amt, d.amt, d.delta < 0
+FROM (
+    SELECT 0 AS u, -1 AS delta, OLD.status AS st, COALESCE(OLD.currency, 'NSP') AS cur, OLD.amount AS amt, OLD.created_at AS created_at
+    UNION ALL SELECT OLD.user_id, -1, OLD.status, COALESCE(OLD.currency, 'NSP'), OLD.amount, OLD.created_at
+    UNION ALL SELECT 0, 1, NEW.status, COALESCE(NEW.currency, 'NSP'), NEW.amount, NEW.created_at
+    UNION ALL SELECT NEW.user_id, 1, NEW.status, COALESCE(NEW.currency, 'NSP'), NEW.amount, NEW.created_at
+) d
+WHERE NOT (OLD.status <=> NEW.status AND OLD.amount <=> NEW.amount AND OLD.user_id <=> NEW.user_id
+           AND OLD.created_at <=> NEW.created_at AND OLD.currency <=> NEW.currency)
+ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt), total = total + VALUES(total),
+    min_amount = IF(VALUES(cnt) > 0, LEAST(COALESCE(min_amount, VALUES(min_amount)), VALUES(min_amount)), min_amount),
+    max_amount = IF(VALUES(cnt) > 0, GREATEST(COALESCE(max_amount, VALUES(max_amount)), VALUES(max_amount)), max_amount),
+    dirty = GREATEST(dirty, VALUES(dirty));
+
+-- coinex_transactions
+INSERT INTO stats_rollup (user_id, day, method, status, currency, cnt, total, min_amount, max_amount, dirty)
+SELECT user_id, DATE(created_at), 'coinex_transactions', status, 'NSP', COUNT(*), SUM(nsp_value), MIN(nsp_value), MAX(nsp_value), 0
+FROM coinex_transactions GROUP BY user_id, DATE(created_at), status
+UNION ALL
+SELECT 0, DATE(created_at), 'coinex_transactions', status, 'NSP', COUNT(*), SUM(nsp_value), MIN(nsp_value), MAX(nsp_value), 0
+FROM coinex_transactions GROUP BY DATE(created_at), status;
+CREATE TRIGGER trg_ct_rollup_ins AFTER INSERT ON coinex_transactions FOR EACH ROW
+INSERT INTO stats_rollup (user_id, day, method, status, currency, cnt, total, min_amount, max_amount, dirty)
+SELECT k.u, DATE(NEW.created_at), 'coinex_transactions', NEW.status, 'NSP', 1, NEW.nsp_value, NEW.nsp_value, NEW.nsp_value, 0
+FROM (SELECT 0 AS u UNION ALL SELECT NEW.user_id) k
+ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt), total = total + VALUES(total),
+    min_amount = IF(VALUES(cnt) > 0, LEAST(COALESCE(min_amount, VALUES(min_amount)), VALUES(min_amount)), min_amount),
+    max_amount = IF(VALUES(cnt) > 0, GREATEST(COALESCE(max_amount, VALUES(max_amount)), VALUES(max_amount)), max_amount),
+    dirty = GREATEST(dirty, VALUES(dirty));
+CREATE TRIGGER trg_ct_rollup_upd AFTER UPDATE ON coinex_transactions FOR EACH ROW
+INSERT INTO stats_rollup (user_id, day, method, status, currency, cnt, total, min_amount, max_amount, dirty)
+SELECT d.u, DATE(d.created_at), 'coinex_transactions', d.st, d.cur, d.delta, d.delta * d.amt, d.amt, d.amt, d.delta < 0
+FROM (
+    SELECT 0 AS u, -1 AS delta, OLD.status AS st, 'NSP' AS cur, OLD.nsp_value AS amt, OLD.created_at AS created_at
+    UNION ALL SELECT OLD.user_id, -1, OLD.status, 'NSP', OLD.nsp_value, OLD.created_at
+    UNION ALL SELECT 0, 1, NEW.status, 'NSP', NEW.nsp_value, NEW.created_at
+    UNION ALL SELECT NEW.user_id, 1, NEW.status, 'NSP', NEW.nsp_value, NEW.created_at
+) d
+WHERE NOT (OLD.status <=> NEW.status AND OLD.nsp_value <=> NEW.nsp_value AND OLD.user_id <=> NEW.user_id
+           AND OLD.created_at <=> NEW.created_at)
+ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt), total = total + VALUES(total),
+    min_amount = IF(VALUES(cnt) > 0, LEAST(COALESCE(min_amount, VALUES(min_amount)), VALUES(min_amount)), min_amount),
+    max_amount = IF(VALUES(cnt) > 0, GREATEST(COALESCE(max_amount, VALUES(max_amount)), VALUES(max_amount)), max_amount),
+    dirty = GREATEST(dirty, VALUES(dirty));
+
+-- coinex_withdrawals
+INSERT INTO stats_rollup (user_id, day, method, status, currency, cnt, total, min_amount, max_amount, dirty)
+SELECT user_id, DATE(created_at), 'coinex_withdrawals', status, 'NSP', COUNT(*), SUM(nsp_amount), MIN(nsp_amount), MAX(nsp_amount), 0
+FROM coinex_withdrawals GROUP BY user_id, DATE(created_at), status
+UNION ALL
+SELECT 0, DATE(created_at), 'coinex_withdrawals', status, 'NSP', COUNT(*), SUM(nsp_amount), MIN(nsp_amount), MAX(nsp_amount), 0
+FROM coinex_withdrawals GROUP BY DATE(created_at), status;
+CREATE TRIGGER trg_cw_rollup_ins AFTER INSERT ON coinex_withdrawals FOR EACH ROW
+INSERT INTO stats_rollup (user_id, day, method, status, currency, cnt, total, min_amount, max_amount, dirty)
+SELECT k.u, DATE(NEW.created_at), 'coinex_withdrawals', NEW.status, 'NSP', 1, NEW.nsp_amount, NEW.nsp_amount, NEW.nsp_amount, 0
+FROM (SELECT 0 AS u UNION ALL SELECT NEW.user_id) k
+ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt), total = total + VALUES(total),
+    min_amount = IF(VALUES(cnt) > 0, LEAST(COALESCE(min_amount, VALUES(min_amount)), VALUES(min_amount)), min_amount),
+    max_amount = IF(VALUES(cnt) > 0, GREATEST(COALESCE(max_amount, VALUES(max_amount)), VALUES(max_amount)), max_amount),
+    dirty = GREATEST(dirty, VALUES(dirty));
+CREATE TRIGGER trg_cw_rollup_upd AFTER UPDATE ON coinex_withdrawals FOR EACH ROW
+INSERT INTO stats_rollup (user_id, day, method, status, currency, cnt, total, min_amount, max_amount, dirty)
+SELECT d.u, DATE(d.created_at), 'coinex_withdrawals', d.st, d.cur, d.delta, d.delta * d.amt, d.amt, d.amt, d.delta < 0
+FROM (
+    SELECT 0 AS u, -1 AS delta, OLD.status AS st, 'NSP' AS cur, OLD.nsp_amount AS amt, OLD.created_at AS created_at
+    UNION ALL SELECT OLD.user_id, -1, OLD.status, 'NSP', OLD.nsp_amount, OLD.created_at
+    UNION ALL SELECT 0, 1, NEW.status, 'NSP', NEW.nsp_amount, NEW.created_at
+    UNION ALL SELECT NEW.user_id, 1, NEW.status, 'NSP', NEW.nsp_amount, NEW.created_at
+) d
+WHERE NOT (OLD.status <=> NEW.status AND OLD.nsp_amount <=> NEW.nsp_amount AND OLD.user_id <=> NEW.user_id
+           AND OLD.created_at <=> NEW.created_at)
+ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt), total = total + VALUES(total),
+    min_amount = IF(VALUES(cnt) > 0, LEAST(COALESCE(min_amount, VALUES(min_amount)), VALUES(min_amount)), min_amount),
+    max_amount = IF(VALUES(cnt) > 0, GREATEST(COALESCE(max_amount, VALUES(max_amount)), VALUES(max_amount)), max_amount),
+    dirty = GREATEST(dirty, VALUES(dirty));
+
+-- syriatel_withdrawals
+INSERT INTO stats_rollup (user_id, day, method, status, currency, cnt, total, min_amount, max_amount, dirty)
+SELECT user_id, DATE(created_at), 'syriatel_withdrawals', status, 'NSP', COUNT(*), SUM(amount), MIN(amount), MAX(amount), 0
+FROM syriatel_withdrawals GROUP BY user_id, DATE(created_at), status
+UNION ALL
+SELECT 0, DATE(created_at), 'syriatel_withdrawals', status, 'NSP', COUNT(*), SUM(amount), MIN(amount), MAX(amount), 0
+FROM syriatel_withdrawals GROUP BY DATE(created_at), status;
+CREATE TRIGGER trg_sw_rollup_ins AFTER INSERT ON syriatel_withdrawals FOR EACH ROW
+INSERT INTO stats_rollup (user_id, day, method, status, currency, cnt, total, min_amount, max_amount, dirty)
+SELECT k.u, DATE(NEW.created_at), 'syriatel_withdrawals', NEW.status, 'NSP', 1, NEW.amount, NEW.amount, NEW.amount, 0
+FROM (SELECT 0 AS u UNION ALL SELECT NEW.user_id) k
+ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt), total = total + VALUES(total),
+    min_amount = IF(VALUES(cnt) > 0, LEAST(COALESCE(min_amount, VALUES(min_amount)), VALUES(min_amount)), min_amount),
+    max_amount = IF(VALUES(cnt) > 0, GREATEST(COALESCE(max_amount, VALUES(max_amount)), VALUES(max_amount)), max_amount),
+    dirty = GREATEST(dirty, VALUES(dirty));
+CREATE TRIGGER trg_sw_rollup_upd AFTER UPDATE ON syriatel_withdrawals FOR EACH ROW
+INSERT INTO stats_rollup (user_id, day, method, status, currency, cnt, total, min_amount, max_amount, dirty)
+SELECT d.u, DATE(d.created_at), 'syriatel_withdrawals', d.st, d.cur, d.delta, d.delta * d.amt, d.amt, d.amt, d.delta < 0
+FROM (
+    SELECT 0 AS u, -1 AS delta, OLD.status AS st, 'NSP' AS cur, OLD.amount AS amt, OLD.created_at AS created_at
+    UNION ALL SELECT OLD.user_id, -1, OLD.status, 'NSP', OLD.amount, OLD.created_at
+    UNION ALL SELECT 0, 1, NEW.status, 'NSP', NEW.amount, NEW.created_at
+    UNION ALL SELECT NEW.user_id, 1, NEW.status, 'NSP', NEW.amount, NEW.created_at
+) d
+WHERE NOT (OLD.status <=> NEW.status AND OLD.amount <=> NEW.amount AND OLD.user_id <=> NEW.user_id
+           AND OLD.created_at <=> NEW.created_at)
+ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt), total = total + VALUES(total),
+    min_amount = IF(VALUES(cnt) > 0, LEAST(COALESCE(min_amount, VALUES(min_amount)), VALUES(min_amount)), min_amount),
+    max_amount = IF(VALUES(cnt) > 0, GREATEST(COALESCE(max_amount, VALUES(max_amount)), VALUES(max_amount)), max_amount),
+    dirty = GREATEST(dirty, VALUES(dirty));
+
+-- shamcash_withdrawals
+INSERT INTO stats_rollup (user_id, day, method, status, currency, cnt, total, min_amount, max_amount, dirty)
+SELECT user_id, DATE(created_at), 'shamcash_withdrawals', status, 'NSP', COUNT(*), SUM(requested_amount), MIN(requested_amount), MAX(requested_amount), 0
+FROM shamcash_withdrawals GROUP BY user_id, DATE(created_at), status
+UNION ALL
+SELECT 0, DATE(created_at), 'shamcash_withdrawals', status, 'NSP', COUNT(*), SUM(requested_amount), MIN(requested_amount), MAX(requested_amount), 0
+FROM shamcash_withdrawals GROUP BY DATE(created_at), status;
+CREATE TRIGGER trg_shw_rollup_ins AFTER INSERT ON shamcash_withdrawals FOR EACH ROW
+INSERT INTO stats_rollup (user_id, day, method, status, currency, cnt, total, min_amount, max_amount, dirty)
+SELECT k.u, DATE(NEW.created_at), 'shamcash_withdrawals', NEW.status, 'NSP', 1, NEW.requested_amount, NEW.requested_amount, NEW.requested_amount, 0
+FROM (SELECT 0 AS u UNION ALL SELECT NEW.user_id) k
+ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt), total = total + VALUES(total),
+    min_amount = IF(VALUES(cnt) > 0, LEAST(COALESCE(min_amount, VALUES(min_amount)), VALUES(min_amount)), min_amount),
+    max_amount = IF(VALUES(cnt) > 0, GREATEST(COALESCE(max_amount, VALUES(max_amount)), VALUES(max_amount)), max_amount),
+    dirty = GREATEST(dirty, VALUES(dirty));
+CREATE TRIGGER trg_shw_rollup_upd AFTER UPDATE ON shamcash_withdrawals FOR EACH ROW
+INSERT INTO stats_rollup (user_id, day, method, status, currency, cnt, total, min_amount, max_amount, dirty)
+SELECT d.u, DATE(d.created_at), 'shamcash_withdrawals', d.st, d.cur, d.delta, d.delta * d.amt, d.amt, d.amt, d.delta < 0
+FROM (
+    SELECT 0 AS u, -1 AS delta, OLD.status AS st, 'NSP' AS cur, OLD.requested_amount AS amt, OLD.created_at AS created_at
+    UNION ALL SELECT OLD.user_id, -1, OLD.status, 'NSP', OLD.requested_amount, OLD.created_at
+    UNION ALL SELECT 0, 1, NEW.status, 'NSP', NEW.requested_amount, NEW.created_at
+    UNION ALL SELECT NEW.user_id, 1, NEW.status, 'NSP', NEW.requested_amount, NEW.created_at
+) d
+WHERE NOT (OLD.status <=> NEW.status AND OLD.requested_amount <=> NEW.requested_amount AND OLD.user_id <=> NEW.user_id
+           AND OLD.created_at <=> NEW.created_at)
+ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt), total = total + VALUES(total),
+    min_amount = IF(VALUES(cnt) > 0, LEAST(COALESCE(min_amount, VALUES(min_amount)), VALUES(min_amount)), min_amount),
+    max_amount = IF(VALUES(cnt) > 0, GREATEST(COALESCE(max_amount, VALUES(max_amount)), VALUES(max_amount)), max_amount),
+    dirty = GREATEST(dirty, VALUES(dirty));
@@ -0,0 +1,9 @@
+-- "My transactions" pages (store.get_user_history_page) read each table as
+-- WHERE user_id = ? AND (created_at, id) beyond the cursor ORDER BY created_at, id LIMIT n,
+-- which is a single range scan on these indexes.
+CREATE INDEX idx_st_user_created ON syriatel_transactions (user_id, created_at, id);
+CREATE INDEX idx_sht_user_created ON shamcash_transactions (user_id, created_at, id);
+CREATE INDEX idx_ct_user_created ON coinex_transactions (user_id, created_at, id);
+CREATE INDEX idx_sw_user_created ON syriatel_withdrawals (user_id, created_at, id);
+CREATE INDEX idx_shw_user_created ON shamcash_withdrawals (user_id, created_at, id);
+CREATE INDEX idx_cw_user_created ON coinex_withdrawals (user_id, created_at, id);
@@ -0,0 +1,3 @@
+-- Date-range exports of the audit log (services/export.py) stream
+-- WHERE created_at BETWEEN ... ORDER BY created_at, id straight off this index.
+CREATE INDEX idx_audit_created_at ON audit_log (created_at);
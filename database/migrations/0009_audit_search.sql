@@ -0,0 +1,12 @@
+-- Admin audit log search (store.build_audit_search). Every filter pattern is an
+-- equality prefix followed by id, so WHERE <filters> AND id BETWEEN ? AND ? ORDER BY id DESC
+-- is a backward range scan with no filesort. Time ranges are translated to id bounds
+-- through idx_audit_created_at (0008) before the search runs.
+-- Already present: (source, tx_id, id) and (actor, id) from 0005.
+CREATE INDEX idx_audit_source_id ON audit_log (source, id);
+CREATE INDEX idx_audit_source_action ON audit_log (source, action, id);
+CREATE INDEX idx_audit_action ON audit_log (action, id);
+CREATE INDEX idx_audit_actor_action ON audit_log (actor, action, id);
+
+-- Free-text search of the reason column: MATCH(reason) AGAINST (... IN BOOLEAN MODE)
+CREATE FULLTEXT INDEX ft_audit_reason ON audit_log (reason);
@@ -0,0 +1,11 @@
+-- Admin work claims on reviewable pending requests (services/claims.py).
+-- claimed_by is the audit actor ("admin_<telegram id>" / "web_<name>"); a claim is
+-- active while claimed_until > NOW() and expires on its own. Claims are taken with a
+-- compare-and-set UPDATE ... WHERE status = 'pending' AND (free OR own).
+ALTER TABLE syriatel_transactions ADD COLUMN claimed_by VARCHAR(64) NULL, ADD COLUMN claimed_until DATETIME NULL;
+ALTER TABLE shamcash_transactions ADD COLUMN claimed_by VARCHAR(64) NULL, ADD COLUMN claimed_until DATETIME NULL;
+ALTER TABLE syriatel_withdrawals ADD COLUMN claimed_by VARCHAR(64) NULL, ADD COLUMN claimed_until DATETIME NULL;
+ALTER TABLE shamcash_withdrawals ADD COLUMN claimed_by VARCHAR(64) NULL, ADD COLUMN claimed_until DATETIME NULL;
+ALTER TABLE coinex_withdrawals ADD COLUMN claimed_by VARCHAR(64) NULL, ADD COLUMN claimed_until DATETIME NULL;
+
+-- Sweeps and per-admin load counts read only pending rows: (status, id) from 0002/0005 covers them.
@@ -0,0 +1,6 @@
+-- Stale withdrawal sweeper (services/stale_sweeper.py): the oldest rows of one status,
+-- WHERE status = ? AND created_at < NOW() - INTERVAL ? ORDER BY created_at LIMIT ?,
+-- are a range scan on (status, created_at) with no filesort.
+CREATE INDEX idx_sw_status_created ON syriatel_withdrawals (status, created_at);
+CREATE INDEX idx_shw_status_created ON shamcash_withdrawals (status, created_at);
+CREATE INDEX idx_cw_status_created ON coinex_withdrawals (status, created_at);
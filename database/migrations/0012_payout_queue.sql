@@ -0,0 +1,24 @@
+-- Execution queue for Syriatel / ShamCash payouts run through the provider portal
+-- (services/payout_workers.py). Rows are fed from withdrawals in approved_awaiting_txid;
+-- (provider, withdrawal_id) is unique so the feeder can INSERT IGNORE repeatedly.
+-- client_id is typed into the portal's transfer note so a retried job can look the
+-- earlier transfer up instead of paying twice.
+CREATE TABLE IF NOT EXISTS payout_queue (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    provider VARCHAR(16) NOT NULL,
+    withdrawal_id BIGINT NOT NULL,
+    client_id VARCHAR(64) NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'queued',
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT NULL,
+    external_txid VARCHAR(128) NULL,
+    claim_token VARCHAR(36) NULL,
+    locked_until DATETIME NULL,
+    available_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at DATETIME NULL,
+    UNIQUE KEY uq_pq_withdrawal (provider, withdrawal_id),
+    UNIQUE KEY uq_pq_client_id (client_id),
+    KEY idx_pq_provider_status_available (provider, status, available_at),
+    KEY idx_pq_claim_token (claim_token)
+);
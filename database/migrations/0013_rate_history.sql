@@ -0,0 +1,20 @@
+-- USD → NSP rate history (services/rates.py). Every /set_rate appends a row; the latest row
+-- is the current rate (settings.usd_to_nsp_rate is still written for older readers).
+-- Flows take a quote (rate + rate_history id) once and settle with it: ShamCash USD deposits
+-- keep the quoted rate on the row so approval credits what the user was shown.
+CREATE TABLE IF NOT EXISTS rate_history (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    pair VARCHAR(16) NOT NULL DEFAULT 'USD_NSP',
+    rate INT NOT NULL,
+    set_by VARCHAR(64) NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    KEY idx_rate_history_pair_id (pair, id)
+);
+
+INSERT INTO rate_history (pair, rate, set_by)
+SELECT 'USD_NSP', CAST(CAST(value AS DECIMAL(18, 4)) AS SIGNED), 'migration'
+FROM settings WHERE key_name = 'usd_to_nsp_rate';
+
+ALTER TABLE shamcash_transactions ADD COLUMN rate_id BIGINT NULL, ADD COLUMN quote_rate INT NULL;
+ALTER TABLE coinex_withdrawals ADD COLUMN rate_id BIGINT NULL;
+ALTER TABLE coinex_transactions ADD COLUMN rate_id BIGINT NULL;
@@ -0,0 +1,8 @@
+-- audit_log.source is the transaction table name for every request type (as admin_transactions
+-- and CoinEx always wrote it). The per-method handlers used their own names for the same rows,
+-- which split one request's history across two sources; fold those into the table names.
+UPDATE audit_log SET source = 'syriatel_transactions' WHERE source = 'syriatel_deposit';
+UPDATE audit_log SET source = 'shamcash_transactions' WHERE source = 'shamcash_deposit';
+UPDATE audit_log SET source = 'coinex_transactions' WHERE source = 'coinex_deposit';
+UPDATE audit_log SET source = 'syriatel_withdrawals' WHERE source = 'syriatel_withdrawal';
+UPDATE audit_log SET source = 'shamcash_withdrawals' WHERE source = 'shamcash_withdrawal';
@@ -0,0 +1,10 @@
+-- Statement reconciliation (services/reconciliation.py) treats a TxID already used by an approved or
+-- rejected deposit as taken. It compares normalize_txid() values: all whitespace removed, upper-cased.
+-- txid_norm stores the same normalization, so the lookup is an index range on (txid_norm, status)
+-- instead of a scan that rewrites txid for every row.
+ALTER TABLE syriatel_transactions
+    ADD COLUMN txid_norm VARCHAR(255) AS (UPPER(REGEXP_REPLACE(txid, '[[:space:]]+', ''))) STORED;
+CREATE INDEX idx_st_txid_norm ON syriatel_transactions (txid_norm, status);
+ALTER TABLE shamcash_transactions
+    ADD COLUMN txid_norm VARCHAR(255) AS (UPPER(REGEXP_REPLACE(txid, '[[:space:]]+', ''))) STORED;
+CREATE INDEX idx_sht_txid_norm ON shamcash_transactions (txid_norm, status);
@@ -0,0 +1,53 @@
+# database/migrations/__init__.py
+"""
+مهاجرات SQL بسيطة: كل ملف NNNN_name.sql في هذا المجلد يُطبّق مرة واحدة بالترتيب،
+ويُسجّل اسمه في جدول schema_migrations.
+
+التشغيل:  python -m database.migrations
+"""
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _split_statements(sql: str):
+    # الملفات لا تحتوي procedures، لذا التقسيم على ";" كافٍ
+    lines = [ln for ln in sql.splitlines() if not ln.strip().startswith("--")]
+    for stmt in "\n".join(lines).split(";"):
+        if stmt.strip():
+            yield stmt.strip()
+
+
+def list_migrations():
+    return sorted(f for f in os.listdir(MIGRATIONS_DIR) if f.endswith(".sql"))
+
+
+def apply_migrations(conn) -> list:
+    """يطبّق المهاجرات غير المطبقة ويرجع أسماءها."""
+    cursor = conn.cursor()
+    applied_now = []
+    try:
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            " name VARCHAR(191) PRIMARY KEY,"
+            " applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        )
+        cursor.execute("SELECT name FROM schema_migrations")
+        done = {row[0] for row in cursor.fetchall()}
+        for name in list_migrations():
+            if name in done:
+                continue
+            with open(os.path.join(MIGRATIONS_DIR, name), encoding="utf-8") as f:
+                sql = f.read()
+            for stmt in _split_statements(sql):
+                cursor.execute(stmt)
+            cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+            conn.commit()
+            applied_now.append(name)
+            logger.info("Applied migration %s", name)
+    finally:
+        cursor.close()
+    return applied_now
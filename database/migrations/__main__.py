@@ -0,0 +1,15 @@
+# database/migrations/__main__.py
+import logging
+
+import store
+from database.migrations import apply_migrations
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+if __name__ == "__main__":
+    conn = store.getDatabaseConnection()
+    try:
+        applied = apply_migrations(conn)
+        print("✅ Applied:" if applied else "✅ Schema is up to date.", ", ".join(applied))
+    finally:
+        conn.close()
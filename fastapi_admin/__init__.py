@@ -0,0 +1,11 @@
+# fastapi_admin/__init__.py
+"""
+لوحة إدارة ويب (FastAPI + Jinja2) تعمل كعملية منفصلة عن البوت وتشاركه قاعدة البيانات:
+
+    uvicorn fastapi_admin.app:app --host 127.0.0.1 --port 8080
+
+الموافقة/الرفض تكتب إشعار المستخدم في outbox، والبوت يرسله في دورة المُرسِل التالية.
+
+أو داخل عملية البوت بضبط ADMIN_WEB_PORT (fastapi_admin/server.py)، وهو الوضع الذي تصل فيه
+أحداث الطلبات الجديدة من handlers البوت إلى البث الحي /api/events.
+"""
@@ -0,0 +1,24 @@
+# fastapi_admin/app.py
+from urllib.parse import quote
+
+from fastapi import FastAPI, Request
+from fastapi.responses import RedirectResponse
+
+from fastapi_admin.deps import LoginRequired
+from fastapi_admin.routes import auth, pending, transactions, users, audit, export, events, reconcile
+
+
+async def _login_redirect(request: Request, exc: LoginRequired):
+    target = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+    return RedirectResponse(f"/login?next={quote(target)}", status_code=303)
+
+
+def create_app() -> FastAPI:
+    app = FastAPI(title="Ichancy Bot Admin", docs_url="/api/docs", redoc_url=None, openapi_url="/api/openapi.json")
+    app.add_exception_handler(LoginRequired, _login_redirect)
+    for module in (auth, pending, transactions, users, audit, export, events, reconcile):
+        app.include_router(module.router)
+    return app
+
+
+app = create_app()
@@ -0,0 +1,132 @@
+# fastapi_admin/deps.py
+"""
+أدوات مشتركة لمسارات لوحة الإدارة: المصادقة، الترقيم keyset، و ETag للطلبات الشرطية.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+from typing import Optional
+from urllib.parse import parse_qs
+
+from fastapi import HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.templating import Jinja2Templates
+
+import config
+
+SESSION_COOKIE = "admin_token"
+MAX_PAGE_SIZE = 200
+
+templates = Jinja2Templates(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates"))
+
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+
+# ---------- auth ----------
+class LoginRequired(Exception):
+    """صفحات HTML تُحوَّل إلى /login بدل 401."""
+
+
+def admin_for_token(token: Optional[str]) -> Optional[str]:
+    if not token:
+        return None
+    for known, name in config.ADMIN_WEB_TOKENS.items():
+        if hmac.compare_digest(known.encode(), token.encode()):
+            return name
+    return None
+
+
+def _request_token(request: Request) -> Optional[str]:
+    auth = request.headers.get("authorization", "")
+    if auth.lower().startswith("bearer "):
+        return auth[7:].strip()
+    return request.cookies.get(SESSION_COOKIE)
+
+
+def api_admin(request: Request) -> str:
+    name = admin_for_token(_request_token(request))
+    if not name:
+        raise HTTPException(status_code=401, detail="unauthorized", headers={"WWW-Authenticate": "Bearer"})
+    return name
+
+
+def web_actor(admin: str) -> str:
+    """اسم المنفذ في سجل التدقيق والحجوزات؛ اسم رقمي (Telegram ID) يشارك هوية المشرف في البوت."""
+    return f"admin_{admin}" if admin.isdigit() else f"web_{admin}"
+
+
+def page_admin(request: Request) -> str:
+    name = admin_for_token(_request_token(request))
+    if not name:
+        raise LoginRequired()
+    return name
+
+
+async def read_form(request: Request) -> dict:
+    # نماذج HTML صغيرة (urlencoded) — نقرأها يدوياً بدل الاعتماد على python-multipart
+    body = (await request.body()).decode("utf-8", "replace")
+    return {k: v[0] for k, v in parse_qs(body).items()}
+
+
+def int_or_none(value: Optional[str]) -> Optional[int]:
+    # حقول نماذج HTML الفارغة تصل كـ "" لا كقيمة مفقودة
+    try:
+        return int(value) if value not in (None, "") else None
+    except ValueError:
+        return None
+
+
+# ---------- pagination ----------
+def page_size(limit: Optional[int]) -> int:
+    return max(1, min(MAX_PAGE_SIZE, limit or config.ADMIN_WEB_PAGE_SIZE))
+
+
+async def fetch_page(fn, *args, limit: int, **kwargs):
+    """
+    يطلب limit+1 صفاً ليعرف إن كانت هناك صفحة تالية دون COUNT.
+    يرجع (items, next_cursor) حيث next_cursor هو id آخر صف معروض أو None.
+    """
+    rows = await run_db(fn, *args, limit=limit + 1, **kwargs)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1]["id"]
+    return rows, None
+
+
+# ---------- conditional GET ----------
+def _etag(body: bytes) -> str:
+    return 'W/"%s"' % hashlib.sha1(body).hexdigest()[:32]
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (t.strip() for t in header.split(","))
+
+
+def conditional(request: Request, body: bytes, media_type: str) -> Response:
+    """
+    ETag من محتوى الرد: إن طابق If-None-Match يرجع 304 دون جسم.
+    الاستعلام يُنفذ في الحالتين، لكن لوحة تُحدّث كل بضع ثوان توفر الإرسال وإعادة الرسم.
+    """
+    etag = _etag(body)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def conditional_json(request: Request, payload) -> Response:
+    body = json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return conditional(request, body, "application/json")
+
+
+def conditional_page(request: Request, template: str, **context) -> Response:
+    body = templates.get_template(template).render(request=request, **context).encode("utf-8")
+    return conditional(request, body, "text/html; charset=utf-8")
@@ -0,0 +1,53 @@
+# fastapi_admin/routes/audit.py
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Request
+
+import store
+from fastapi_admin.deps import int_or_none, api_admin, page_admin, page_size, fetch_page, conditional_json, conditional_page
+
+router = APIRouter()
+
+
+def _date_or_none(value: Optional[str]) -> Optional[date]:
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+async def _load(source: Optional[str], tx_id: Optional[int], actor: Optional[str], action: Optional[str],
+                q: Optional[str], date_from: Optional[date], date_to: Optional[date],
+                before: Optional[int], limit: Optional[int]) -> dict:
+    # date_to شامل: المدى [date_from 00:00, date_to+1 00:00)
+    items, nxt = await fetch_page(
+        store.get_audit_page, source=source or None, tx_id=tx_id, actor=actor or None, action=action or None,
+        text=q or None,
+        time_from=datetime.combine(date_from, datetime.min.time()) if date_from else None,
+        time_to=datetime.combine(date_to + timedelta(days=1), datetime.min.time()) if date_to else None,
+        before_id=before, limit=page_size(limit),
+    )
+    return {"items": items, "next": nxt,
+            "filters": {"source": source, "tx_id": tx_id, "actor": actor, "action": action, "q": q,
+                        "date_from": date_from.isoformat() if date_from else None,
+                        "date_to": date_to.isoformat() if date_to else None}}
+
+
+@router.get("/api/audit")
+async def audit_api(request: Request, source: Optional[str] = None, tx_id: Optional[int] = None,
+                    actor: Optional[str] = None, action: Optional[str] = None, q: Optional[str] = None,
+                    date_from: Optional[date] = None, date_to: Optional[date] = None,
+                    before: Optional[int] = None, limit: Optional[int] = Query(None, ge=1),
+                    admin: str = Depends(api_admin)):
+    return conditional_json(request, await _load(source, tx_id, actor, action, q, date_from, date_to, before, limit))
+
+
+@router.get("/audit")
+async def audit_page(request: Request, source: Optional[str] = None, tx_id: Optional[str] = None,
+                     actor: Optional[str] = None, action: Optional[str] = None, q: Optional[str] = None,
+                     date_from: Optional[str] = None, date_to: Optional[str] = None,
+                     before: Optional[str] = None, admin: str = Depends(page_admin)):
+    data = await _load(source, int_or_none(tx_id), actor, action, q, _date_or_none(date_from),
+                       _date_or_none(date_to), int_or_none(before), None)
+    return conditional_page(request, "audit.html", admin=admin, **data)
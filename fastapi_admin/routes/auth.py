@@ -0,0 +1,43 @@
+# fastapi_admin/routes/auth.py
+from urllib.parse import quote
+
+from fastapi import APIRouter, Request
+from fastapi.responses import HTMLResponse, RedirectResponse
+
+from fastapi_admin.deps import SESSION_COOKIE, admin_for_token, read_form, templates
+
+router = APIRouter()
+
+_SESSION_SECONDS = 12 * 3600
+
+
+def _safe_next(target: str) -> str:
+    # التحويل بعد الدخول لمسارات داخلية فقط
+    return target if target.startswith("/") and not target.startswith("//") else "/"
+
+
+@router.get("/login")
+async def login_page(request: Request, next: str = "/", error: bool = False):
+    body = templates.get_template("login.html").render(request=request, next=_safe_next(next), error=error)
+    return HTMLResponse(body)
+
+
+@router.post("/login")
+async def login(request: Request):
+    form = await read_form(request)
+    target = _safe_next(form.get("next", "/"))
+    token = form.get("token", "").strip()
+    if not admin_for_token(token):
+        return RedirectResponse(f"/login?error=1&next={quote(target)}", status_code=303)
+    resp = RedirectResponse(target, status_code=303)
+    # SameSite=Strict يكفي لمنع إرسال النماذج من مواقع أخرى (CSRF) لأن كل الإجراءات POST
+    resp.set_cookie(SESSION_COOKIE, token, max_age=_SESSION_SECONDS, httponly=True, samesite="strict",
+                    secure=request.url.scheme == "https")
+    return resp
+
+
+@router.post("/logout")
+async def logout():
+    resp = RedirectResponse("/login", status_code=303)
+    resp.delete_cookie(SESSION_COOKIE)
+    return resp
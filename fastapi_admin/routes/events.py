@@ -0,0 +1,57 @@
+# fastapi_admin/routes/events.py
+"""
+بث أحداث طوابير الطلبات المعلقة (new / claimed / resolved) عبر Server-Sent Events.
+
+المتصفح يعيد الاتصال تلقائياً ويرسل Last-Event-ID، فيكمل من مخزن الإعادة في services.events
+دون قراءة قاعدة البيانات؛ حدث "reset" يعني أن الفجوة أكبر من المخزن وعلى الصفحة إعادة التحميل.
+"""
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Request
+from fastapi.responses import StreamingResponse
+
+from fastapi_admin.deps import api_admin
+from services.events import bus
+
+router = APIRouter()
+
+KEEPALIVE_SECONDS = 15
+RETRY_MS = 3000
+
+
+def _frame(event) -> str:
+    data = json.dumps(event.as_dict(), ensure_ascii=False, default=str)
+    return f"id: {bus.event_id(event)}\nevent: {event.type}\ndata: {data}\n\n"
+
+
+@router.get("/api/events")
+async def events_stream(request: Request, table: Optional[str] = None, last_event_id: Optional[str] = None,
+                        last_event_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+                        admin: str = Depends(api_admin)):
+    sub, backlog, reset = bus.subscribe(last_event_header or last_event_id)
+
+    async def gen():
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            if reset:
+                yield "event: reset\ndata: {}\n\n"
+            for event in backlog:
+                if not table or event.table == table:
+                    yield _frame(event)
+            while True:
+                try:
+                    event = await sub.get(KEEPALIVE_SECONDS)
+                except EOFError:
+                    return
+                if event is None:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                elif not table or event.table == table:
+                    yield _frame(event)
+        finally:
+            sub.close()
+
+    return StreamingResponse(gen(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
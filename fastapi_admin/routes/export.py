@@ -0,0 +1,27 @@
+# fastapi_admin/routes/export.py
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+
+from fastapi_admin.deps import api_admin
+from services import export
+
+router = APIRouter()
+
+
+@router.get("/api/export/{kind}")
+async def export_api(kind: str, date_from: date, date_to: date, method: Optional[str] = None,
+                     status: Optional[str] = None, format: str = "csv", gzip: bool = False,
+                     admin: str = Depends(api_admin)):
+    spec = export.ExportSpec(kind=kind, date_from=date_from, date_to=date_to, method=method or None,
+                             status=status or None, fmt=format, gzip=gzip)
+    error = export.validate(spec)
+    if error:
+        raise HTTPException(status_code=422, detail=error)
+    # مولّد متزامن: Starlette يشغّله في threadpool فلا تُحجب حلقة الأحداث بقراءة قاعدة البيانات
+    return StreamingResponse(
+        export.stream(spec), media_type=spec.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{spec.filename}"'},
+    )
@@ -0,0 +1,138 @@
+# fastapi_admin/routes/pending.py
+"""
+طوابير الطلبات المعلقة والموافقة/الرفض.
+الإجراءات تمر عبر services.bulk_actions.execute (نفس مسار /bulk_approve في البوت):
+انتقال مشروط بـ status='pending' مع الرصيد وسجل التدقيق وإشعار المستخدم في معاملة واحدة.
+كل مشرف يرى طلباته المحجوزة وغير المحجوزة فقط، والطلب المحجوز لغيره لا يُنفذ (services.claims).
+"""
+from typing import Optional
+from urllib.parse import quote
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import RedirectResponse
+from pydantic import BaseModel
+
+import store
+from fastapi_admin.deps import (
+    api_admin, page_admin, read_form, page_size, fetch_page, conditional_json, conditional_page, web_actor,
+)
+from services import bulk_actions, claims
+
+router = APIRouter()
+
+
+class RejectBody(BaseModel):
+    reason: str
+
+
+def _kind(kind: str) -> bulk_actions.BulkKind:
+    k = bulk_actions.BULK_KINDS.get(kind)
+    if not k:
+        raise HTTPException(status_code=404, detail="unknown kind")
+    return k
+
+
+async def _load(kind: str, after: int, limit: Optional[int], admin: str) -> dict:
+    k = _kind(kind)
+    items, nxt = await fetch_page(store.get_pending_page, k.table, after_id=after, limit=page_size(limit),
+                                  actor=web_actor(admin))
+    return {"kind": kind, "table": k.table, "label": k.label, "items": items, "next": nxt, "me": web_actor(admin)}
+
+
+async def _act(kind: str, tx_id: int, approve: bool, admin: str, reason: Optional[str] = None) -> list:
+    k = _kind(kind)
+    return await bulk_actions.execute(k, [tx_id], approve, actor=web_actor(admin), actor_name=admin, reason=reason)
+
+
+async def _claim(kind: str, tx_id: int, admin: str) -> Optional[dict]:
+    return await claims.acquire(_kind(kind).table, tx_id, web_actor(admin))
+
+
+def _back(kind: str, msg: str) -> RedirectResponse:
+    return RedirectResponse(f"/pending/{kind}?msg={quote(msg)}", status_code=303)
+
+
+# ---------- JSON API ----------
+@router.get("/api/pending/{kind}")
+async def pending_api(request: Request, kind: str, after: int = 0,
+                      limit: Optional[int] = Query(None, ge=1), admin: str = Depends(api_admin)):
+    return conditional_json(request, await _load(kind, after, limit, admin))
+
+
+@router.post("/api/pending/{kind}/{tx_id}/approve")
+async def approve_api(kind: str, tx_id: int, admin: str = Depends(api_admin)):
+    rows = await _act(kind, tx_id, True, admin)
+    if not rows:
+        raise HTTPException(status_code=409, detail="not pending or claimed by another admin")
+    return {"id": tx_id, "status": _kind(kind).approve_status}
+
+
+@router.post("/api/pending/{kind}/{tx_id}/reject")
+async def reject_api(kind: str, tx_id: int, body: RejectBody, admin: str = Depends(api_admin)):
+    reason = body.reason.strip()
+    if not reason:
+        raise HTTPException(status_code=422, detail="reason is required")
+    rows = await _act(kind, tx_id, False, admin, reason)
+    if not rows:
+        raise HTTPException(status_code=409, detail="not pending or claimed by another admin")
+    return {"id": tx_id, "status": "rejected"}
+
+
+@router.post("/api/pending/{kind}/{tx_id}/claim")
+async def claim_api(kind: str, tx_id: int, admin: str = Depends(api_admin)):
+    row = await _claim(kind, tx_id, admin)
+    if not row:
+        raise HTTPException(status_code=404, detail="not found")
+    if not row["claimed"]:
+        raise HTTPException(status_code=409, detail=f"claimed by {row['claimed_by']}" if row["status"] == "pending"
+                            else "not pending")
+    return {"id": tx_id, "claimed_by": row["claimed_by"], "claimed_until": row["claimed_until"]}
+
+
+@router.post("/api/pending/{kind}/{tx_id}/release")
+async def release_api(kind: str, tx_id: int, admin: str = Depends(api_admin)):
+    await claims.release(_kind(kind).table, tx_id, web_actor(admin))
+    return {"id": tx_id, "claimed_by": None}
+
+
+# ---------- HTML ----------
+@router.get("/")
+async def index_page(request: Request, admin: str = Depends(page_admin)):
+    return conditional_page(request, "index.html", admin=admin, kinds=bulk_actions.BULK_KINDS)
+
+
+@router.get("/pending/{kind}")
+async def pending_page(request: Request, kind: str, after: int = 0, msg: Optional[str] = None,
+                       admin: str = Depends(page_admin)):
+    data = await _load(kind, after, None, admin)
+    return conditional_page(request, "pending.html", admin=admin, kinds=bulk_actions.BULK_KINDS,
+                            after=after, msg=msg, **data)
+
+
+@router.post("/pending/{kind}/{tx_id}/approve")
+async def approve_page(kind: str, tx_id: int, admin: str = Depends(page_admin)):
+    rows = await _act(kind, tx_id, True, admin)
+    msg = f"✅ تمت الموافقة على #{tx_id}" if rows else f"⚠️ الطلب #{tx_id} لم يعد معلقاً أو محجوز لمشرف آخر"
+    return _back(kind, msg)
+
+
+@router.post("/pending/{kind}/{tx_id}/reject")
+async def reject_page(request: Request, kind: str, tx_id: int, admin: str = Depends(page_admin)):
+    reason = (await read_form(request)).get("reason", "").strip()
+    if not reason:
+        return _back(kind, f"❌ سبب الرفض مطلوب (#{tx_id})")
+    rows = await _act(kind, tx_id, False, admin, reason)
+    msg = f"🚫 تم رفض #{tx_id}" if rows else f"⚠️ الطلب #{tx_id} لم يعد معلقاً أو محجوز لمشرف آخر"
+    return _back(kind, msg)
+
+
+@router.post("/pending/{kind}/{tx_id}/claim")
+async def claim_page(kind: str, tx_id: int, admin: str = Depends(page_admin)):
+    row = await _claim(kind, tx_id, admin)
+    if row and row["claimed"]:
+        msg = f"🔒 تم حجز #{tx_id} لك حتى {row['claimed_until']:%H:%M}"
+    elif row and row["status"] == "pending":
+        msg = f"⚠️ #{tx_id} محجوز لـ {row['claimed_by']}"
+    else:
+        msg = f"⚠️ الطلب #{tx_id} لم يعد معلقاً"
+    return _back(kind, msg)
@@ -0,0 +1,48 @@
+# fastapi_admin/routes/reconcile.py
+"""
+رفع كشف Syriatel / ShamCash للمطابقة مع الإيداعات المعلقة (services.reconciliation).
+
+الملف يصل كجسم الطلب نفسه (fetch بـ body = File) لا كنموذج multipart، ويُنسخ على دفعات إلى
+ملف مؤقت (في الذاكرة حتى حد معين ثم على القرص)؛ القراءة والفهرسة سطراً سطراً في executor.
+"""
+import io
+import tempfile
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+
+from fastapi_admin.deps import api_admin, page_admin, conditional_page, run_db
+from services import reconciliation
+
+router = APIRouter()
+
+SPOOL_BYTES = 8 * 1024 * 1024
+
+
+def _index_spooled(spool, fmt: str) -> reconciliation.StatementIndex:
+    spool.seek(0)
+    text = io.TextIOWrapper(spool, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        return reconciliation.build_index(text, fmt)
+    finally:
+        text.detach()
+
+
+@router.post("/api/reconcile/{provider}")
+async def reconcile_api(provider: str, request: Request, format: str = "csv", admin: str = Depends(api_admin)):
+    if provider not in reconciliation.PROVIDERS or format not in reconciliation.FORMATS:
+        raise HTTPException(status_code=404, detail="unknown provider or format")
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        try:
+            index = await run_db(_index_spooled, spool, format)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    report = await reconciliation.reconcile(provider, index)
+    return report.as_dict()
+
+
+@router.get("/reconcile")
+async def reconcile_page(request: Request, admin: str = Depends(page_admin)):
+    return conditional_page(request, "reconcile.html", admin=admin, providers=reconciliation.PROVIDERS,
+                            formats=reconciliation.FORMATS)
@@ -0,0 +1,37 @@
+# fastapi_admin/routes/transactions.py
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+import store
+from fastapi_admin.deps import int_or_none, api_admin, page_admin, page_size, fetch_page, conditional_json, conditional_page
+
+router = APIRouter()
+
+
+async def _load(table: str, status: Optional[str], user_id: Optional[int], txid: Optional[str],
+                before: Optional[int], limit: Optional[int]) -> dict:
+    if table not in store.TRANSACTION_TABLES:
+        raise HTTPException(status_code=404, detail="unknown table")
+    items, nxt = await fetch_page(
+        store.search_transactions, table, status=status or None, user_id=user_id, txid=txid or None,
+        before_id=before, limit=page_size(limit),
+    )
+    return {"table": table, "items": items, "next": nxt,
+            "filters": {"status": status, "user_id": user_id, "txid": txid}}
+
+
+@router.get("/api/transactions/{table}")
+async def transactions_api(request: Request, table: str, status: Optional[str] = None,
+                           user_id: Optional[int] = None, txid: Optional[str] = None,
+                           before: Optional[int] = None, limit: Optional[int] = Query(None, ge=1),
+                           admin: str = Depends(api_admin)):
+    return conditional_json(request, await _load(table, status, user_id, txid, before, limit))
+
+
+@router.get("/transactions")
+async def transactions_page(request: Request, table: str = "syriatel_transactions", status: Optional[str] = None,
+                            user_id: Optional[str] = None, txid: Optional[str] = None,
+                            before: Optional[str] = None, admin: str = Depends(page_admin)):
+    data = await _load(table, status, int_or_none(user_id), txid, int_or_none(before), None)
+    return conditional_page(request, "transactions.html", admin=admin, tables=store.TRANSACTION_TABLES, **data)
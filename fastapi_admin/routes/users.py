@@ -0,0 +1,50 @@
+# fastapi_admin/routes/users.py
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+import store
+from fastapi_admin.deps import api_admin, page_admin, page_size, fetch_page, run_db, conditional_json, conditional_page
+
+router = APIRouter()
+
+_RECENT_PER_TABLE = 10
+
+
+async def _search(q: Optional[str], after: int, limit: Optional[int]) -> dict:
+    items, nxt = await fetch_page(store.lookup_users, q=q, after_id=after, limit=page_size(limit))
+    return {"q": q, "items": items, "next": nxt}
+
+
+async def _detail(user_id: int) -> dict:
+    user = await run_db(store.get_user_by_id, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="user not found")
+    # آخر العمليات من كل جدول بالتوازي؛ كل استعلام على idx (user_id, id)
+    recent = await asyncio.gather(*(
+        run_db(store.search_transactions, table, user_id=user_id, limit=_RECENT_PER_TABLE)
+        for table in store.TRANSACTION_TABLES
+    ))
+    return {"user": user, "recent": dict(zip(store.TRANSACTION_TABLES, recent))}
+
+
+@router.get("/api/users")
+async def users_api(request: Request, q: Optional[str] = None, after: int = 0,
+                    limit: Optional[int] = Query(None, ge=1), admin: str = Depends(api_admin)):
+    return conditional_json(request, await _search(q, after, limit))
+
+
+@router.get("/api/users/{user_id}")
+async def user_api(request: Request, user_id: int, admin: str = Depends(api_admin)):
+    return conditional_json(request, await _detail(user_id))
+
+
+@router.get("/users")
+async def users_page(request: Request, q: Optional[str] = None, after: int = 0, admin: str = Depends(page_admin)):
+    return conditional_page(request, "users.html", admin=admin, **await _search(q, after, None))
+
+
+@router.get("/users/{user_id}")
+async def user_page(request: Request, user_id: int, admin: str = Depends(page_admin)):
+    return conditional_page(request, "user_detail.html", admin=admin, **await _detail(user_id))
@@ -0,0 +1,63 @@
+# fastapi_admin/server.py
+"""
+تشغيل لوحة الإدارة داخل حلقة أحداث البوت (ADMIN_WEB_PORT > 0).
+
+بهذا تشترك اللوحة مع handlers البوت في services.events.bus، فتصل أحداث الطلبات الجديدة
+والمعالجة إلى /api/events لحظياً. التشغيل المنفصل عبر uvicorn ما زال ممكناً لكنه لا يرى
+إلا أحداث الإجراءات التي تمت من اللوحة نفسها.
+"""
+import asyncio
+import contextlib
+import logging
+from typing import Optional
+
+import uvicorn
+
+import config
+from services.events import bus
+
+logger = logging.getLogger(__name__)
+
+
+class _EmbeddedServer(uvicorn.Server):
+    @contextlib.contextmanager
+    def capture_signals(self):
+        # الإشارات (Ctrl+C / SIGTERM) يديرها Application الخاص بالبوت
+        yield
+
+
+class AdminWebServer:
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._server: Optional[_EmbeddedServer] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.port > 0
+
+    def start(self):
+        if not self.enabled or (self._task and not self._task.done()):
+            return
+        from fastapi_admin.app import app
+        self._server = _EmbeddedServer(uvicorn.Config(
+            app, host=self.host, port=self.port, log_level="warning", timeout_graceful_shutdown=5,
+        ))
+        self._task = asyncio.create_task(self._server.serve(), name="admin_web")
+        logger.info("Admin web app listening on http://%s:%s", self.host, self.port)
+
+    async def stop(self):
+        if not self._task:
+            return
+        # إنهاء اتصالات SSE أولاً وإلا ينتظرها الخادم حتى المهلة
+        bus.close()
+        self._server.should_exit = True
+        try:
+            await asyncio.wait_for(self._task, timeout=10)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self._task.cancel()
+        self._task = None
+
+
+admin_web = AdminWebServer(config.ADMIN_WEB_HOST, config.ADMIN_WEB_PORT)
@@ -3,6 +3,17 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
 import config
 import store
+from services.coinex_adapter import get_coinex_health
+from services.coinex_withdraw_queue import get_queue_stats
+from services.coinex_reconciler import reconciler
+from services.outbox_dispatcher import get_outbox_stats
+from services.stale_sweeper import stale_sweeper
+from services.payout_workers import payout_workers
+from services import transitions
+from services.velocity import limiter, METHODS
+from handlers.debounce import debouncer
+from services.rates import rates
+from utils.notifications import get_outbound_stats
 
 def is_admin(user_id: int) -> bool:
     return user_id in config.ADMIN_IDS
@@ -16,7 +27,7 @@ async def show_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             return await update.callback_query.answer("❌ ليس لديك صلاحية.", show_alert=True)
 
-    usd_rate = await store.async_get_usd_to_nsp_rate()
+    usd_rate = await rates.rate()
     sham_wallet = await store.async_get_shamcash_wallet()
     syriatel_nums = await store.async_get_syriatel_numbers()
 
@@ -55,8 +66,12 @@ async def set_usd_rate(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except ValueError:
         return await update.message.reply_text("⚠️ الرجاء إدخال رقم موجب صحيح.\nمثال: `/set_rate 5200`", parse_mode="Markdown")
 
-    store.update_usd_to_nsp_rate(new_rate)
-    await update.message.reply_text(f"✅ تم تحديث معدل التحويل إلى {new_rate} NSP لكل 1 USD")
+    old = await rates.rate()
+    rate_id = await rates.set_rate(new_rate, f"admin_{user.id}")
+    await update.message.reply_text(
+        f"✅ تم تحديث معدل التحويل إلى {new_rate} NSP لكل 1 USD (كان {old}، السجل #{rate_id})\n"
+        f"العروض المقفلة سابقاً تبقى بسعرها حتى انتهاء صلاحيتها."
+    )
 
 
 async def set_shamcash_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -88,6 +103,158 @@ async def set_syriatel_numbers(update: Update, context: ContextTypes.DEFAULT_TYP
     await update.message.reply_text(f"📱 تم تحديث أرقام سيريتل إلى:\n`{', '.join(numbers)}`", parse_mode="Markdown")
 
 
+async def coinex_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    if not is_admin(user.id):
+        return await update.message.reply_text("❌ ليس لديك صلاحية.")
+    icons = {"closed": "🟢", "half_open": "🟡", "open": "🔴"}
+    lines = ["🌐 *حالة اتصال CoinEx:*\n"]
+    for name, h in get_coinex_health().items():
+        lines.append(
+            f"{icons.get(h['state'], '⚪')} `{name}`: {h['state']}"
+            f" — إخفاقات متتالية: {h['consecutive_failures']}"
+            f" — مرفوضة: {h['total_rejected']}"
+            f" — توكنات: {h['tokens']}"
+        )
+        if h["state"] == "open":
+            lines.append(f"   ⏳ إعادة المحاولة بعد {h['retry_after']} ث")
+        if h["last_error"]:
+            last_error = str(h["last_error"])[:120].replace("`", "'")
+            lines.append(f"   ⚠️ آخر خطأ: `{last_error}`")
+    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
+
+
+async def coinex_queue_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    if not is_admin(user.id):
+        return await update.message.reply_text("❌ ليس لديك صلاحية.")
+    st = await get_queue_stats()
+    rc = reconciler.stats()
+    text = (
+        "📦 *قائمة تنفيذ سحوبات CoinEx:*\n\n"
+        f"{'🟢 تعمل' if st['running'] else '🔴 متوقفة'} — التوازي: {st['concurrency']}\n"
+        f"⏳ بالانتظار: {st['queued']}\n"
+        f"⚙️ قيد التنفيذ: {st['processing']} (في هذه العملية: {st['in_flight']})\n"
+        f"✅ منفذة: آخر 5 دقائق {st['completed_last_5m']} — آخر ساعة {st['completed_last_hour']}\n"
+        f"🔁 أعيدت جدولتها: {st['retried']} — ❌ فشلت: {st['failed']}\n\n"
+        f"🔍 المطابقة: مفتوحة {rc['open']} — مكتملة {rc['completed']} — مستردة {rc['refunded']}"
+        f" — طلبات API {rc['api_calls']}"
+    )
+    await update.message.reply_text(text, parse_mode="Markdown")
+
+
+async def notification_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    if not is_admin(user.id):
+        return await update.message.reply_text("❌ ليس لديك صلاحية.")
+    st = get_outbound_stats()
+    d = st["depth"]
+    dg = st["digest"]
+    ob = await get_outbox_stats()
+    od = ob["depth"]
+    text = (
+        "📨 *الرسائل الصادرة:*\n\n"
+        f"📥 بالانتظار — مستخدمون: {d['user']} | مشرفون: {d['admin']} | جماعية: {d['bulk']}\n"
+        f"⚙️ قيد الإرسال: {st['in_flight']}\n"
+        f"✅ أُرسلت: {st['sent']} — ❌ فشلت: {st['failed']}\n"
+        f"⏱️ زمن الإرسال p50: {st['latency_p50_ms']}ms — p99: {st['latency_p99_ms']}ms\n"
+        f"🚦 حدود Telegram (429): {st['retry_after_hits']}"
+        + (f" — متوقف لمدة {st['paused_for']} ث" if st["paused_for"] else "")
+        + "\n\n📦 *صندوق الإشعارات (outbox):*\n"
+        f"بالانتظار: {od.get('pending', 0)} — قيد الإرسال: {od.get('sending', 0)} — متروكة: {od.get('failed', 0)}\n"
+        f"✅ أُرسلت: {ob['sent']} — 🔁 أعيدت جدولتها: {ob['retried']}"
+        + "\n\n🗂 *ملخص إشعارات المشرفين:* "
+        + (f"بالانتظار {dg['buffered']} — ملخصات {dg['digests_sent']} تضم {dg['coalesced']} طلب — فورية {dg['immediate']}"
+           if dg["enabled"] else "معطّل")
+        + f"\n📌 رسائل طلبات متتبعة: {st['tracked_admin_messages']}"
+    )
+    await update.message.reply_text(text, parse_mode="Markdown")
+
+
+_METHOD_NAMES = {"syriatel_withdrawals": "Syriatel", "shamcash_withdrawals": "ShamCash", "coinex_withdrawals": "CoinEx"}
+
+
+async def stale_sweep_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    if not is_admin(user.id):
+        return await update.message.reply_text("❌ ليس لديك صلاحية.")
+    st = stale_sweeper.stats()
+    limits = " — ".join(f"{_METHOD_NAMES.get(t, t)}: {h:g} س" for t, h in st["thresholds"].items()) or "معطّل"
+    lines = [
+        "⌛ *إلغاء السحوبات المتروكة:*\n",
+        f"{'🟢 يعمل' if st['running'] else '🔴 متوقف'} — المهلة: {limits}",
+        f"🔁 دورات: {st['sweeps']} — آخرها: {st['last_run'].strftime('%Y-%m-%d %H:%M') if st['last_run'] else '—'}",
+        f"↩️ طلبات أُلغيت: {st['expired']} — رصيد مُعاد: {int(st['refunded']):,}",
+        f"⏱️ متوسط زمن الدفعة: {st['avg_batch_ms']}ms",
+    ]
+    for b in st["recent_batches"]:
+        lines.append(f"• {b['at'].strftime('%H:%M')} {_METHOD_NAMES.get(b['table'], b['table'])} `{b['status']}`: "
+                     f"{b['expired']}/{b['scanned']} في {b['ms']}ms")
+    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
+
+
+async def payout_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    if not is_admin(user.id):
+        return await update.message.reply_text("❌ ليس لديك صلاحية.")
+    st = await payout_workers.stats()
+    lines = ["🤖 *التنفيذ الآلي لسحوبات Syriatel / ShamCash:*\n",
+             f"{'🟢 يعمل' if st['running'] else '🔴 متوقف'} — أُضيف للقائمة: {st['enqueued']}"]
+    if not st["providers"]:
+        lines.append("لا يوجد سكربت بوابة مفعّل (PAYOUT_*_SCRIPT)؛ معرف التحويل يُدخل يدوياً.")
+    for provider, p in st["providers"].items():
+        lines.append(
+            f"\n*{provider}* — سياقات: {p['concurrency']} (مشغولة {p['in_flight']}) — تسجيلات دخول: {p['logins']}\n"
+            f"⏳ بالانتظار: {p.get('queued', 0)} — ⚙️ قيد التنفيذ: {p.get('processing', 0)}\n"
+            f"✅ منفذة: {p['completed']} (من السجل {p['recovered']}) — 🔁 {p['retried']} — ❌ {p['failed']}\n"
+            f"⏱️ متوسط العملية: {p['avg_seconds']} ث"
+        )
+    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
+
+
+_PAYOUT_REJECT_CALLBACKS = {"syriatel": "admin_reject_syriatel_wd", "shamcash": "admin_shamcash_reject"}
+
+
+async def payout_release(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # admin_payout_release:<provider>:<id> — بعد التأكد من الكشف أن التحويل الغامض لم يصل
+    q = update.callback_query
+    if not is_admin(q.from_user.id):
+        return await q.answer("❌ غير مصرح لك.", show_alert=True)
+    try:
+        _, provider, wid = q.data.split(":")
+        table, wid = store.PAYOUT_TABLES[provider][0], int(wid)
+    except (ValueError, KeyError):
+        return await q.answer("⚠️ بيانات غير صالحة.")
+    row = await transitions.apply(table, wid, "release_payout", f"admin_{q.from_user.id}",
+                                  note="Admin confirmed the portal transfer was not sent")
+    if not row:
+        return await q.answer("⚠️ السحب ليس قيد التحويل (ربما اكتمل أو أُعيد مسبقاً).", show_alert=True)
+    await q.answer()
+    await q.edit_message_reply_markup(reply_markup=None)
+    await q.message.reply_text(
+        f"🔓 أُعيد سحب {provider} #{wid} إلى انتظار معرف التحويل؛ يمكن رفضه (يُعاد الرصيد) أو تنفيذه يدوياً.",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(
+            "❌ رفض", callback_data=f"{_PAYOUT_REJECT_CALLBACKS[provider]}:{wid}")]]))
+
+
+async def velocity_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    if not is_admin(user.id):
+        return await update.message.reply_text("❌ ليس لديك صلاحية.")
+    st = limiter.stats()
+    lines = ["🚦 *حدود الطلبات لكل مستخدم:*\n",
+             f"المخزن: {st['backend']} — نوافذ محمّلة: {st['windows']} (تحميل من القاعدة {st['seeds']})",
+             f"⛔ محاولات مرفوضة: {st['blocked_attempts']} — طلبات مرفوضة بالحدود: {st['blocked_limits']}",
+             f"محاولات/دقيقة: {limiter.attempts_per_minute or '∞'}\n"]
+    for method, lim in limiter.limits.items():
+        amount = f" — {int(lim.daily_amount):,} NSP/يوم" if lim.daily_amount else ""
+        lines.append(f"• {METHODS[method].label}: {lim.per_hour or '∞'}/ساعة — {lim.per_day or '∞'}/يوم{amount}")
+    db = debouncer.stats()
+    lines.append(f"\n👆 نقرات مكررة مكبوحة: {db['suppressed_in_flight']} أثناء التنفيذ — {db['suppressed_window']} "
+                 f"خلال {debouncer.window_seconds:g}ث بعده (من {db['passed']} نقرة)")
+    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
+
+
 async def help_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     if not is_admin(user.id):
@@ -97,7 +264,20 @@ async def help_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "🔹 /show_settings — عرض الإعدادات الحالية\n"
         "🔹 /set_rate <number> — ضبط معدل USD → NSP\n"
         "🔹 /set_shamcash_wallet <wallet> — تعديل محفظة ShamCash\n"
-        "🔹 /set_syriatel_numbers <num1,num2> — تعديل أرقام Syriatel\n\n"
+        "🔹 /set_syriatel_numbers <num1,num2> — تعديل أرقام Syriatel\n"
+        "🔹 /coinex_status — حالة اتصال CoinEx (قاطع الدارة وحدود الطلبات)\n"
+        "🔹 /coinex_queue — حالة قائمة تنفيذ سحوبات CoinEx\n"
+        "🔹 /notif_stats — طابور الرسائل الصادرة وصندوق الإشعارات\n"
+        "🔹 /stale_sweeps — إلغاء السحوبات المتروكة وإعادة رصيدها\n"
+        "🔹 /payouts — التنفيذ الآلي لسحوبات Syriatel / ShamCash عبر البوابة\n"
+        "🔹 /velocity — حدود عدد ومبالغ الطلبات لكل مستخدم والنقرات المكررة\n"
+        "🔹 /broadcast <text> — بث رسالة لكل المستخدمين (أو بالرد على رسالة)\n"
+        "🔹 /broadcast_status — تقدم البث الحالي\n"
+        "🔹 /broadcast_cancel — إيقاف البث الحالي\n"
+        "🔹 /bulk_approve <kind> <ids|under X> — موافقة جماعية\n"
+        "🔹 /bulk_reject <kind> <ids|under X> <reason> — رفض جماعي\n"
+        "🔹 /export <transactions|audit> <from> <to> — تصدير CSV/JSONL\n"
+        "🔹 /audit source= tx= actor= action= from= to= نص — بحث سجل التدقيق\n\n"
         "أو استخدم الأزرار أدناه:"
     )
     keyboard = InlineKeyboardMarkup([
@@ -137,4 +317,11 @@ def register_handlers(dp):
     dp.add_handler(CommandHandler("set_rate", set_usd_rate))
     dp.add_handler(CommandHandler("set_shamcash_wallet", set_shamcash_wallet))
     dp.add_handler(CommandHandler("set_syriatel_numbers", set_syriatel_numbers))
+    dp.add_handler(CommandHandler("coinex_status", coinex_status))
+    dp.add_handler(CommandHandler("coinex_queue", coinex_queue_status))
+    dp.add_handler(CommandHandler("notif_stats", notification_stats))
+    dp.add_handler(CommandHandler("stale_sweeps", stale_sweep_status))
+    dp.add_handler(CommandHandler("payouts", payout_status))
+    dp.add_handler(CommandHandler("velocity", velocity_status))
+    dp.add_handler(CallbackQueryHandler(payout_release, pattern="^admin_payout_release:"))
     dp.add_handler(CallbackQueryHandler(handle_admin_buttons, pattern="^admin_"))
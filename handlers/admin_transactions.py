@@ -6,7 +6,8 @@ import config
 from datetime import datetime
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler, MessageHandler, ConversationHandler, filters
-from utils.notifications import notify_user, notify_admin
+from utils.notifications import notify_admin, admin_tx_key, resolve_admin_messages
+from services import bulk_actions, transitions
 
 logger = logging.getLogger(__name__)
 
@@ -17,27 +18,42 @@ async def run_db(fn, *args, **kwargs):
     return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
 
 
-async def fetch_pending_transactions():
+def _parse_admin_callback(data: str, prefix: str):
+    # أسماء الجداول تحتوي "_" لذا نفصل المعرف من اليمين: approve_admin_<table>_<id>
+    try:
+        table_name, tx_id = data[len(prefix):].rsplit("_", 1)
+        return table_name, int(tx_id)
+    except ValueError:
+        return None, None
+
+
+async def fetch_pending_transactions(actor: str):
+    """طلبات actor المحجوزة + غير المحجوزة (أو المنتهي حجزها) فقط."""
     conn = await run_db(store.getDatabaseConnection)
     cursor = conn.cursor(dictionary=True)
+    mine = "(claimed_by = %s OR claimed_by IS NULL OR claimed_until < NOW())"
+    holder = "IF(claimed_until > NOW(), claimed_by, NULL) AS claim_holder"
     try:
-        cursor.execute("""
-            SELECT 'syriatel_deposit' AS source_type, id, user_id, amount AS amount, status, txid, created_at
-            FROM syriatel_transactions WHERE status='pending'
-            UNION ALL
-            SELECT 'shamcash_deposit' AS source_type, id, user_id, amount AS amount, status, txid, created_at
-            FROM shamcash_transactions WHERE status='pending'
-            UNION ALL
-            SELECT 'coinex_withdraw' AS source_type, id, user_id, usdt_amount AS amount, status, chain, created_at
-            FROM coinex_withdrawals WHERE status='pending'
-            UNION ALL
-            SELECT 'shamcash_withdraw' AS source_type, id, user_id, net_amount AS amount, status, wallet_address AS details, created_at
-            FROM shamcash_withdrawals WHERE status='pending'
-            UNION ALL
-            SELECT 'syriatel_withdraw' AS source_type, id, user_id, net_amount AS amount, status, phone AS details, created_at
-            FROM syriatel_withdrawals WHERE status='pending'
-            ORDER BY created_at ASC
-        """)
+        # اسم المستخدم و telegram_id بـ JOIN واحد على الاتحاد بدل قراءة لكل طلب
+        cursor.execute(f"""
+            SELECT p.*, u.username, u.telegram_id FROM (
+                SELECT 'syriatel_deposit' AS source_type, id, user_id, amount AS amount, status, txid, created_at, {holder}
+                FROM syriatel_transactions WHERE status='pending' AND {mine}
+                UNION ALL
+                SELECT 'shamcash_deposit' AS source_type, id, user_id, amount AS amount, status, txid, created_at, {holder}
+                FROM shamcash_transactions WHERE status='pending' AND {mine}
+                UNION ALL
+                SELECT 'coinex_withdraw' AS source_type, id, user_id, usdt_amount AS amount, status, chain, created_at, {holder}
+                FROM coinex_withdrawals WHERE status='pending' AND {mine}
+                UNION ALL
+                SELECT 'shamcash_withdraw' AS source_type, id, user_id, net_amount AS amount, status, wallet_address AS details, created_at, {holder}
+                FROM shamcash_withdrawals WHERE status='pending' AND {mine}
+                UNION ALL
+                SELECT 'syriatel_withdraw' AS source_type, id, user_id, net_amount AS amount, status, phone AS details, created_at, {holder}
+                FROM syriatel_withdrawals WHERE status='pending' AND {mine}
+            ) p LEFT JOIN users u ON u.id = p.user_id
+            ORDER BY p.created_at ASC
+        """, (actor,) * 5)
         results = cursor.fetchall()
         return results
     except Exception as e:
@@ -65,13 +81,12 @@ async def show_pending_transactions_admin_callback(update: Update, context: Cont
     if q.from_user.id not in config.ADMIN_IDS:
         await q.edit_message_text("❌ غير مصرح لك.")
         return
-    txs = await fetch_pending_transactions()
+    txs = await fetch_pending_transactions(f"admin_{q.from_user.id}")
     if not txs:
         await q.edit_message_text("✅ لا توجد عمليات قيد الانتظار حالياً.")
         return
     for tx in txs:
-        user = await run_db(store.get_user_by_id, tx["user_id"])
-        username = user["username"] if user else f"ID: {tx['user_id']}"
+        username = tx["username"] or f"ID: {tx['user_id']}"
         table_name = ""
         if "syriatel_deposit" in tx['source_type']: table_name = "syriatel_transactions"
         elif "shamcash_deposit" in tx['source_type']: table_name = "shamcash_transactions"
@@ -100,8 +115,8 @@ async def show_pending_transactions_admin_callback(update: Update, context: Cont
             except Exception:
                 ts = str(created)
         msg = (
-            f"📌 <b>عملية جديدة ({tx['source_type']})</b>\n"
-            f"👤 المستخدم: <a href='tg://user?id={user['telegram_id'] if user else tx['user_id']}'>{username}</a>\n"
+            f"📌 <b>عملية جديدة ({tx['source_type']})</b>{' 🔒 محجوزة لك' if tx.get('claim_holder') else ''}\n"
+            f"👤 المستخدم: <a href='tg://user?id={tx['telegram_id'] or tx['user_id']}'>{username}</a>\n"
             f"💰 المبلغ: {tx['amount']}\n"
             f"{details_info}"
             f"🕒 الوقت: {ts}"
@@ -115,39 +130,33 @@ async def approve_transaction_admin(update: Update, context: ContextTypes.DEFAUL
     if q.from_user.id not in config.ADMIN_IDS:
         await q.edit_message_text("❌ غير مصرح لك.")
         return
-    parts = q.data.split("_")
-    if len(parts) < 4:
+    table_name, tx_id = _parse_admin_callback(q.data, "approve_admin_")
+    if not table_name:
         return await q.edit_message_text("⚠️ بيانات غير صحيحة.")
-    table_name = parts[2]
-    tx_id = int(parts[3])
-    tx = await run_db(store.get_transaction, table_name, tx_id)
-    if not tx or tx.get("status") != "pending":
+    if table_name not in transitions.MACHINES:
+        return await q.edit_message_text("⚠️ نوع العملية غير مدعوم للموافقة المباشرة من هنا.")
+    try:
+        tx = await transitions.apply(table_name, tx_id, "approve", f"admin_{q.from_user.id}")
+    except transitions.Claimed as e:
+        return await q.answer(str(e), show_alert=True)
+    if not tx:
         return await q.edit_message_text("❌ لم يتم العثور على العملية أو تمت مراجعتها.")
-    user_id = tx["user_id"]
-    amount = tx.get("amount") or tx.get("usdt_amount")
-    if table_name == "coinex_withdrawals":
-        await run_db(store.update_transaction_status, table_name, tx_id, "approved_by_admin", None, None, datetime.now(), None)
-        await notify_user(await run_db(store.get_user_telegram_by_id, user_id), f"✅ تمت الموافقة على طلب سحب CoinEx الخاص بك #{tx_id}. قيد التنفيذ...")
-        await run_db(store.add_audit_log, "coinex_withdrawals", tx_id, "approved_by_admin", f"admin_{q.from_user.id}")
-        await q.edit_message_text(f"✅ تمت الموافقة المبدئية على سحب CoinEx رقم {tx_id}.")
+    if tx["status"] == "approved_by_admin":
+        if not await resolve_admin_messages(admin_tx_key(table_name, tx_id),
+                                            f"⏳ وافق عليه {q.from_user.full_name} — في قائمة التنفيذ", origin=q.message):
+            await q.edit_message_text(f"⏳ تمت الموافقة على سحب CoinEx رقم {tx_id} وإضافته إلى قائمة التنفيذ الآلي.")
         return
-    if table_name in ("syriatel_transactions", "shamcash_transactions"):
-        if table_name == "shamcash_transactions" and tx.get("currency") == "USD":
-            rate = await run_db(store.get_usd_to_nsp_rate)
-            amount = int(tx["amount"] * rate)
-        await run_db(store.add_balance, user_id, amount)
-        await run_db(store.update_transaction_status, table_name, tx_id, "approved", None, None, datetime.now(), None)
-        await run_db(store.add_audit_log, table_name, tx_id, "approved", f"admin_{q.from_user.id}")
-        await notify_user(await run_db(store.get_user_telegram_by_id, user_id), f"✅ تمت الموافقة على عملية الإيداع. المبلغ المضاف: {amount}")
-        await q.edit_message_text(f"✅ تمت الموافقة على العملية رقم {tx_id} ({table_name})")
+    if tx["status"] == "approved":
+        if not await resolve_admin_messages(admin_tx_key(table_name, tx_id),
+                                            f"✅ وافق عليها {q.from_user.full_name}", origin=q.message):
+            await q.edit_message_text(f"✅ تمت الموافقة على العملية رقم {tx_id} ({table_name})")
         return
-    if table_name in ("shamcash_withdrawals", "syriatel_withdrawals"):
-        await run_db(store.update_transaction_status, table_name, tx_id, "approved_awaiting_txid", None, None, datetime.now(), None)
-        await run_db(store.add_audit_log, table_name, tx_id, "approved_awaiting_txid", f"admin_{q.from_user.id}")
-        await notify_user(await run_db(store.get_user_telegram_by_id, user_id), f"✅ تمت الموافقة على طلب السحب الخاص بك #{tx_id}. يرجى انتظار معرف التحويل.")
-        await q.edit_message_text(f"✅ تمت الموافقة المبدئية على العملية رقم {tx_id} ({table_name}).\nالرجاء إرسال معرف التحويل باستخدام الأمر /set_{table_name}_txid {tx_id} <TxID>")
-        return
-    await q.edit_message_text("⚠️ نوع العملية غير مدعوم للموافقة المباشرة من هنا.")
+    text = f"✅ تمت الموافقة المبدئية على العملية رقم {tx_id} ({table_name}).\nالرجاء إرسال معرف التحويل باستخدام الأمر /set_{table_name}_txid {tx_id} <TxID>"
+    if await resolve_admin_messages(admin_tx_key(table_name, tx_id),
+                                    f"⏳ وافق عليها {q.from_user.full_name} — بانتظار معرف التحويل", origin=q.message):
+        await q.message.reply_text(text)
+    else:
+        await q.edit_message_text(text)
 
 
 async def reject_transaction_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -155,11 +164,9 @@ async def reject_transaction_admin(update: Update, context: ContextTypes.DEFAULT
     await q.answer()
     if q.from_user.id not in config.ADMIN_IDS:
         return await q.edit_message_text("❌ غير مصرح لك.")
-    parts = q.data.split("_")
-    if len(parts) < 4:
+    table_name, tx_id = _parse_admin_callback(q.data, "reject_admin_")
+    if not table_name:
         return await q.edit_message_text("⚠️ بيانات غير صحيحة.")
-    table_name = parts[2]
-    tx_id = int(parts[3])
     context.user_data["reject_table_name"] = table_name
     context.user_data["reject_tx_id"] = tx_id
     await q.message.reply_text("❌ يرجى إدخال سبب الرفض:")
@@ -173,54 +180,119 @@ async def handle_reject_reason_admin(update: Update, context: ContextTypes.DEFAU
     if not table_name or not tx_id:
         await update.message.reply_text("⚠️ حدث خطأ في معالجة الرفض. يرجى المحاولة مرة أخرى.")
         return ConversationHandler.END
-    await run_db(store.update_transaction_status, table_name, tx_id, "rejected", reason, None, None, datetime.now())
-    await run_db(store.add_audit_log, table_name, tx_id, "rejected", f"admin_{update.effective_user.id}", reason)
-    tx = await run_db(store.get_transaction, table_name, tx_id)
-    if tx:
-        user_telegram = await run_db(store.get_user_telegram_by_id, tx["user_id"])
-        if user_telegram:
-            await notify_user(user_telegram, f"🚫 تم رفض عمليتك. السبب: {reason}")
+    # الرفض من آلة الحالات: يعيد رصيد السحوبات ويرسل إشعار الطريقة نفسها
+    tx = None
+    if table_name in transitions.MACHINES:
+        try:
+            tx = await transitions.apply(table_name, tx_id, "reject", f"admin_{update.effective_user.id}", reason=reason)
+        except transitions.Claimed as e:
+            await update.message.reply_text(str(e))
+            return ConversationHandler.END
+    if not tx:
+        await update.message.reply_text(f"⚠️ العملية رقم {tx_id} ({table_name}) غير موجودة أو تمت مراجعتها.")
+        return ConversationHandler.END
+    await resolve_admin_messages(admin_tx_key(table_name, tx_id),
+                                 f"🚫 رفضها {update.effective_user.full_name} — السبب: {reason}")
     await update.message.reply_text(f"تم رفض العملية رقم {tx_id} ({table_name}) 🚫")
     return ConversationHandler.END
 
 
-async def show_audit_log_admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+# ==============================
+#     BULK APPROVE / REJECT
+# ==============================
+def _parse_bulk_args(args):
+    """<kind> (<id,id,...> | under <X>) [reason...] -> (kind_key, ids, max_value, rest)"""
+    if len(args) < 2 or args[0] not in bulk_actions.BULK_KINDS:
+        return None
+    kind_key, ids, max_value = args[0], None, None
+    if args[1].lower() == "under":
+        if len(args) < 3:
+            return None
+        try:
+            max_value = float(args[2])
+        except ValueError:
+            return None
+        rest = args[3:]
+    else:
+        try:
+            ids = [int(x) for x in args[1].replace("،", ",").split(",") if x.strip()]
+        except ValueError:
+            return None
+        rest = args[2:]
+    return kind_key, ids, max_value, " ".join(rest).strip()
+
+
+async def _bulk_preview(update: Update, context: ContextTypes.DEFAULT_TYPE, approve: bool):
+    if update.effective_user.id not in config.ADMIN_IDS:
+        return await update.message.reply_text("❌ غير مصرح لك.")
+    cmd = "bulk_approve" if approve else "bulk_reject"
+    parsed = _parse_bulk_args(context.args or [])
+    if not parsed or (not approve and not parsed[3]):
+        kinds = ", ".join(bulk_actions.BULK_KINDS)
+        usage = (f"الاستخدام:\n/{cmd} <النوع> <id,id,...>{'' if approve else ' <السبب>'}\n"
+                 f"/{cmd} <النوع> under <المبلغ>{'' if approve else ' <السبب>'}\n"
+                 f"الأنواع: {kinds}")
+        return await update.message.reply_text(usage)
+    kind_key, ids, max_value, reason = parsed
+    kind = bulk_actions.BULK_KINDS[kind_key]
+    rows = await bulk_actions.preview(kind, ids=ids, max_value=max_value, approve=approve)
+    if not rows:
+        return await update.message.reply_text("📭 لا توجد طلبات معلقة مطابقة.")
+
+    context.user_data["bulk_plan"] = {
+        "kind": kind_key, "ids": [r["id"] for r in rows], "approve": approve, "reason": reason or None,
+    }
+    total = sum(float(r["value"] or 0) for r in rows)
+    shown = ", ".join(f"#{r['id']}" for r in rows[:30]) + (" …" if len(rows) > 30 else "")
+    action = "✅ موافقة" if approve else "🚫 رفض"
+    text = (
+        f"{action} جماعية — {kind.label}\n\n"
+        f"📦 عدد الطلبات: {len(rows)}\n"
+        f"💰 الإجمالي: {total:,.0f} NSP\n"
+        f"🆔 {shown}"
+        + (f"\n📝 السبب: {reason}" if not approve else "")
+    )
+    kb = InlineKeyboardMarkup([[
+        InlineKeyboardButton("✔️ تأكيد", callback_data="bulk_confirm"),
+        InlineKeyboardButton("✖️ إلغاء", callback_data="bulk_cancel"),
+    ]])
+    await update.message.reply_text(text, reply_markup=kb)
+
+
+async def bulk_approve_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _bulk_preview(update, context, approve=True)
+
+
+async def bulk_reject_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _bulk_preview(update, context, approve=False)
+
+
+async def bulk_confirm_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     await q.answer()
     if q.from_user.id not in config.ADMIN_IDS:
-        await q.edit_message_text("❌ غير مصرح لك.")
-        return
-    conn = await run_db(store.getDatabaseConnection)
-    cursor = conn.cursor(dictionary=True)
+        return await q.edit_message_text("❌ غير مصرح لك.")
+    plan = context.user_data.pop("bulk_plan", None)
+    if q.data == "bulk_cancel" or not plan:
+        return await q.edit_message_text("❎ تم إلغاء الإجراء الجماعي." if plan or q.data == "bulk_cancel"
+                                         else "⚠️ لا يوجد إجراء جماعي بانتظار التأكيد.")
+    kind = bulk_actions.BULK_KINDS[plan["kind"]]
     try:
-        cursor.execute("SELECT * FROM audit_log ORDER BY created_at DESC LIMIT 10")
-        logs = cursor.fetchall()
+        rows = await bulk_actions.execute(kind, plan["ids"], plan["approve"], f"admin_{q.from_user.id}",
+                                          q.from_user.full_name, reason=plan["reason"])
     except Exception as e:
-        logger.exception("Error fetching audit log: %s", e)
-        logs = []
-    finally:
-        cursor.close()
-        conn.close()
-    if not logs:
-        await q.edit_message_text("📭 لا يوجد سجل عمليات بعد.")
-        return
-    msg = "🧾 <b>آخر 10 عمليات في النظام:</b>\n\n"
-    for log in logs:
-        try:
-            ts = log['created_at'].strftime('%Y-%m-%d %H:%M:%S')
-        except Exception:
-            ts = str(log['created_at'])
-        msg += f"🕒 {ts} — {log.get('action','')} "
-        if log.get('reason'):
-            msg += f"(السبب: {log['reason']})"
-        msg += f" — بواسطة {log.get('actor','system')}\n"
-    await q.edit_message_text(msg, parse_mode=ParseMode.HTML)
+        logger.exception("Bulk %s failed for %s: %s", "approve" if plan["approve"] else "reject", kind.table, e)
+        return await q.edit_message_text("❌ فشل الإجراء الجماعي ولم يتم تغيير أي طلب.")
+    skipped = len(plan["ids"]) - len(rows)
+    await q.edit_message_text(
+        f"{'✅ تمت الموافقة على' if plan['approve'] else '🚫 تم رفض'} {len(rows)} طلب ({kind.label})."
+        + (f"\n⚠️ {skipped} طلب عولج مسبقاً وتم تخطيه." if skipped else "")
+    )
 
 
 def register_handlers(dp):
     dp.add_handler(CommandHandler("admin_panel", show_admin_panel, filters.User(config.ADMIN_IDS)))
     dp.add_handler(CallbackQueryHandler(show_pending_transactions_admin_callback, pattern="^show_pending_admin$", block=False))
-    dp.add_handler(CallbackQueryHandler(show_audit_log_admin_callback, pattern="^show_audit_log_admin$", block=False))
     admin_reject_conv = ConversationHandler(
         entry_points=[CallbackQueryHandler(reject_transaction_admin, pattern="^reject_admin_")],
         states={0: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_reject_reason_admin)]},
@@ -229,3 +301,6 @@ def register_handlers(dp):
     )
     dp.add_handler(admin_reject_conv)
     dp.add_handler(CallbackQueryHandler(approve_transaction_admin, pattern="^approve_admin_"))
+    dp.add_handler(CommandHandler("bulk_approve", bulk_approve_command))
+    dp.add_handler(CommandHandler("bulk_reject", bulk_reject_command))
+    dp.add_handler(CallbackQueryHandler(bulk_confirm_callback, pattern="^bulk_(confirm|cancel)$"))
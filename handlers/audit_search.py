@@ -0,0 +1,145 @@
+# handlers/audit_search.py
+"""
+بحث سجل التدقيق للأدمن: /audit بفلاتر (source, tx, actor, action, from, to) ونص حر يُبحث في reason
+عبر فهرس FULLTEXT. الترقيم keyset على id؛ الفلاتر تُحفظ في user_data والزر يحمل آخر id فقط
+(حد callback_data في Telegram هو 64 بايت).
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
+
+import config
+import store
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 10
+_MAX_REASON = 120
+
+USAGE = (
+    "الاستخدام:\n"
+    "/audit [source=...] [tx=...] [actor=...] [action=...] [from=YYYY-MM-DD] [to=YYYY-MM-DD] [نص للبحث في السبب]\n\n"
+    "tx يتطلب source. التاريخ to شامل.\n"
+    "أمثلة:\n"
+    "/audit source=syriatel_transactions tx=1532\n"
+    "/audit actor=admin_12345 action=rejected from=2024-05-01\n"
+    "/audit from=2024-05-01 to=2024-05-07 رصيد غير كاف"
+)
+
+_KEYS = {"source": "source", "tx": "tx_id", "tx_id": "tx_id", "actor": "actor", "action": "action",
+         "from": "time_from", "to": "time_to"}
+
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+
+def is_admin(user_id: int) -> bool:
+    return user_id in config.ADMIN_IDS
+
+
+def parse_args(args) -> dict:
+    """key=value للفلاتر، وكل ما تبقى نص حر؛ يرمي ValueError عند قيمة غير صالحة."""
+    filters, words = {}, []
+    for arg in args:
+        key, sep, value = arg.partition("=")
+        name = _KEYS.get(key.lower()) if sep else None
+        if not name:
+            words.append(arg)
+        elif name == "tx_id":
+            filters[name] = int(value)
+        elif name == "time_from":
+            filters[name] = datetime.strptime(value, "%Y-%m-%d")
+        elif name == "time_to":
+            filters[name] = datetime.strptime(value, "%Y-%m-%d") + timedelta(days=1)
+        elif value:
+            filters[name] = value
+    if "tx_id" in filters and "source" not in filters:
+        raise ValueError("tx requires source")
+    if words:
+        filters["text"] = " ".join(words)
+    return filters
+
+
+def _describe(filters: dict) -> str:
+    parts = [f"{k}={v}" for k, v in filters.items() if k not in ("time_from", "time_to", "text")]
+    if filters.get("time_from"):
+        parts.append(f"from={filters['time_from']:%Y-%m-%d}")
+    if filters.get("time_to"):
+        parts.append(f"to={filters['time_to'] - timedelta(days=1):%Y-%m-%d}")
+    if filters.get("text"):
+        parts.append(f"«{filters['text']}»")
+    return " ".join(parts) or "بدون فلاتر"
+
+
+def _format_row(log: dict) -> str:
+    try:
+        ts = log["created_at"].strftime("%Y-%m-%d %H:%M:%S")
+    except Exception:
+        ts = str(log["created_at"])
+    line = f"#{log['id']} 🕒 {ts}\n   {log['source']} #{log['tx_id']} — {log['action']} — بواسطة {log['actor']}"
+    reason = log.get("reason")
+    if reason:
+        line += f"\n   📝 {reason[:_MAX_REASON]}{'…' if len(reason) > _MAX_REASON else ''}"
+    return line
+
+
+async def _render(filters: dict, before_id=None):
+    # صف إضافي لمعرفة وجود صفحة أقدم دون COUNT
+    rows = await run_db(store.get_audit_page, before_id=before_id, limit=PAGE_SIZE + 1, **filters)
+    more = len(rows) > PAGE_SIZE
+    rows = rows[:PAGE_SIZE]
+    header = f"🧾 سجل التدقيق — {_describe(filters)}\n\n"
+    if not rows:
+        text = header + ("📭 لا نتائج." if before_id is None else "📭 لا توجد سجلات أقدم.")
+    else:
+        text = header + "\n\n".join(_format_row(r) for r in rows)
+    keyboard = []
+    if more:
+        keyboard.append([InlineKeyboardButton("الأقدم ➡️", callback_data=f"audit_more:{rows[-1]['id']}")])
+    return text, InlineKeyboardMarkup(keyboard) if keyboard else None
+
+
+async def audit_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        return await update.message.reply_text("❌ ليس لديك صلاحية.")
+    try:
+        filters = parse_args(context.args or [])
+    except ValueError:
+        return await update.message.reply_text(USAGE)
+    context.user_data["audit_search"] = filters
+    text, markup = await _render(filters)
+    await update.message.reply_text(text, reply_markup=markup)
+
+
+async def show_audit_log_admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """زر "سجل العمليات" في لوحة الأدمن: أحدث السجلات بلا فلاتر."""
+    q = update.callback_query
+    await q.answer()
+    if not is_admin(q.from_user.id):
+        return await q.edit_message_text("❌ غير مصرح لك.")
+    context.user_data["audit_search"] = {}
+    text, markup = await _render({})
+    await q.edit_message_text(text + "\n\n🔎 للبحث: /audit", reply_markup=markup)
+
+
+async def audit_more_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    q = update.callback_query
+    await q.answer()
+    if not is_admin(q.from_user.id):
+        return await q.edit_message_text("❌ غير مصرح لك.")
+    filters = context.user_data.get("audit_search")
+    if filters is None:
+        return await q.edit_message_text("⚠️ انتهت جلسة البحث. أعد إرسال /audit.")
+    text, markup = await _render(filters, before_id=int(q.data.split(":", 1)[1]))
+    await q.edit_message_text(text, reply_markup=markup)
+
+
+def register_handlers(dp):
+    dp.add_handler(CommandHandler("audit", audit_command))
+    dp.add_handler(CallbackQueryHandler(show_audit_log_admin_callback, pattern="^show_audit_log_admin$", block=False))
+    dp.add_handler(CallbackQueryHandler(audit_more_callback, pattern=r"^audit_more:\d+$", block=False))
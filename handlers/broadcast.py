@@ -0,0 +1,61 @@
+# handlers/broadcast.py
+import logging
+from telegram import Update
+from telegram.constants import ParseMode
+from telegram.ext import ContextTypes, CommandHandler
+import config
+from services.broadcast import broadcaster, format_progress
+
+logger = logging.getLogger(__name__)
+
+
+def is_admin(user_id: int) -> bool:
+    return user_id in config.ADMIN_IDS
+
+
+async def start_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/broadcast <النص> — أو الرد على رسالة بـ /broadcast لبثها كما هي (مع التنسيق)."""
+    if not is_admin(update.effective_user.id):
+        return await update.message.reply_text("❌ ليس لديك صلاحية.")
+    reply = update.message.reply_to_message
+    if reply and reply.text:
+        text, parse_mode = reply.text_html, ParseMode.HTML
+    else:
+        parts = update.message.text.split(None, 1)
+        if len(parts) < 2 or not parts[1].strip():
+            return await update.message.reply_text(
+                "الاستخدام:\n/broadcast <نص الرسالة>\nأو الرد على رسالة بالأمر /broadcast"
+            )
+        text, parse_mode = parts[1].strip(), None
+    if broadcaster.running:
+        return await update.message.reply_text("⚠️ يوجد بث قيد التنفيذ. استخدم /broadcast_status أو /broadcast_cancel.")
+
+    status_msg = await update.message.reply_text("📣 جارٍ تجهيز البث...")
+    broadcast_id = await broadcaster.start(text, parse_mode, update.effective_user.id,
+                                           status_msg.chat_id, status_msg.message_id)
+    if not broadcast_id:
+        await status_msg.edit_text("❌ تعذر إنشاء مهمة البث.")
+
+
+async def broadcast_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        return await update.message.reply_text("❌ ليس لديك صلاحية.")
+    st = broadcaster.stats()
+    if not st:
+        return await update.message.reply_text("📭 لا يوجد بث في هذا التشغيل.")
+    await update.message.reply_text(format_progress(st, st["status"]))
+
+
+async def cancel_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        return await update.message.reply_text("❌ ليس لديك صلاحية.")
+    if broadcaster.cancel():
+        await update.message.reply_text("⛔ سيتوقف البث بعد الدفعة الحالية.")
+    else:
+        await update.message.reply_text("📭 لا يوجد بث قيد التنفيذ.")
+
+
+def register_handlers(dp):
+    dp.add_handler(CommandHandler("broadcast", start_broadcast))
+    dp.add_handler(CommandHandler("broadcast_status", broadcast_status))
+    dp.add_handler(CommandHandler("broadcast_cancel", cancel_broadcast))
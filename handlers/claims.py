@@ -0,0 +1,64 @@
+# handlers/claims.py
+"""
+بوابة الحجز لأزرار موافقة/رفض المشرفين: تعمل في group -1 قبل handlers الطرق.
+
+الضغط على موافقة/رفض يحجز الطلب للمشرف (أو يمدد حجزه)؛ إن كان محجوزاً لمشرف آخر يظهر تنبيه
+ويتوقف التنفيذ (ApplicationHandlerStop) فلا يبدأ مشرفان مراجعة نفس الطلب.
+الطلب غير المعلق يمر كما هو ليعرض handler الطريقة رسالة "تمت مراجعته مسبقاً".
+"""
+import logging
+import re
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes, CallbackQueryHandler
+
+import config
+import store
+from services import claims
+from handlers import debounce
+
+logger = logging.getLogger(__name__)
+
+GATE_GROUP = -1
+
+# callback_data -> الجدول: نفس الأنماط المسجلة في handlers كل طريقة
+_DECISIONS = [
+    (re.compile(r"^(?:approve|reject)_admin_([a-z_]+)_(\d+)$"), None),
+    (re.compile(r"^admin_(?:approve|reject)_syriatel_dep:(\d+)$"), "syriatel_transactions"),
+    (re.compile(r"^admin_(?:approve|reject)_shamcash_dep:(\d+)$"), "shamcash_transactions"),
+    (re.compile(r"^admin_(?:approve|reject)_syriatel_wd:(\d+)$"), "syriatel_withdrawals"),
+    (re.compile(r"^admin_shamcash_(?:approve|reject):(\d+)$"), "shamcash_withdrawals"),
+    (re.compile(r"^admin_coinex_(?:approve|reject):(\d+)$"), "coinex_withdrawals"),
+]
+PATTERN = "|".join(f"(?:{rx.pattern})" for rx, _ in _DECISIONS)
+
+
+def parse_decision(data: str):
+    """(table, tx_id) لزر موافقة/رفض، أو (None, None)."""
+    for rx, table in _DECISIONS:
+        m = rx.match(data or "")
+        if m:
+            if table is None:
+                return m.group(1), int(m.group(2))
+            return table, int(m.group(1))
+    return None, None
+
+
+async def claim_gate(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    q = update.callback_query
+    if q.from_user.id not in config.ADMIN_IDS:
+        return
+    table, tx_id = parse_decision(q.data)
+    if table not in store.CLAIM_TABLES:
+        return
+    actor = f"admin_{q.from_user.id}"
+    row = await claims.acquire(table, tx_id, actor)
+    if not row or row["claimed"] or row["status"] != "pending":
+        return
+    await q.answer(claims.held_text(row["claimed_by"], row.get("claimed_until")), show_alert=True)
+    debounce.finish(update)
+    raise ApplicationHandlerStop
+
+
+def register_handlers(dp):
+    dp.add_handler(CallbackQueryHandler(claim_gate, pattern=PATTERN), group=GATE_GROUP)
@@ -10,7 +10,9 @@ from telegram.ext import (
 import store
 import config
 from services.coinex_adapter import get_deposit_address, get_deposit_history
-from utils.notifications import notify_admin
+from services.rates import rates
+from services.velocity import limiter
+from utils.notifications import notify_admin_event
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +24,10 @@ async def start_deposit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Step 1: Ask user for chain"""
     q = update.callback_query
     await q.answer()
+    blocked = await limiter.check_entry(q.from_user.id, "coinex_dep")
+    if blocked:
+        await q.edit_message_text(blocked)
+        return ConversationHandler.END
     kb = InlineKeyboardMarkup([
         [InlineKeyboardButton("🟢 BEP20", callback_data="coinex_chain_BEP20")],
         [InlineKeyboardButton("🔵 TRC20", callback_data="coinex_chain_TRC20")],
@@ -132,26 +138,33 @@ async def confirm_transfer(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
 
     # تحويل USDT → NSP
-    rate = store.get_usd_to_nsp_rate()
-    if not rate or rate <= 0:
+    quote = await rates.quote()
+    if quote is None:
         await q.edit_message_text("⚠️ سعر التحويل غير متوفر حالياً.")
         return ConversationHandler.END
-    nsp_value = int(amount * rate)
+    nsp_value = quote.to_nsp(amount)
+
+    # الإيداع غير المسجل يبقى في سجل CoinEx ويُلتقط عند التأكيد لاحقاً
+    blocked = await limiter.acquire(q.from_user.id, "coinex_dep")
+    if blocked:
+        await q.edit_message_text(blocked)
+        context.user_data.clear()
+        return ConversationHandler.END
 
     # حفظ المعاملة في DB
     tx_db_id = store._execute_query(
         """
-        INSERT INTO coinex_transactions (user_id, chain, usdt_amount, nsp_value, txid, status, created_at)
-        VALUES (%s,%s,%s,%s,%s,%s,%s)
+        INSERT INTO coinex_transactions (user_id, chain, usdt_amount, nsp_value, txid, status, rate_id, created_at)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
         """,
-        (user["id"], chain, amount, nsp_value, txid, "approved", datetime.now()),
+        (user["id"], chain, amount, nsp_value, txid, "approved", quote.rate_id, datetime.now()),
         fetchone=False
     )
 
     if tx_db_id:
         store.add_balance(user["id"], nsp_value)
         store.add_audit_log(
-            "coinex_deposit",
+            "coinex_transactions",
             tx_db_id,
             "approved",
             actor=f"user_{user_telegram_id}",
@@ -173,8 +186,12 @@ async def confirm_transfer(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"💰 {amount} USDT ({nsp_value} NSP)\n"
             f"🔗 {chain}\n🆔 TxID: {txid}"
         )
-        await notify_admin(admin_msg)
+        await notify_admin_event(
+            "إيداع CoinEx تلقائي", admin_msg, f"#{tx_db_id} إيداع CoinEx {amount} USDT ({nsp_value} NSP)",
+            amount=nsp_value,
+        )
     else:
+        await limiter.release(q.from_user.id, "coinex_dep")
         await q.edit_message_text("❌ حدث خطأ أثناء تسجيل الإيداع في قاعدة البيانات.")
 
     context.user_data.clear()
@@ -1,4 +1,5 @@
 # handlers/coinex_withdraw.py
+import asyncio
 import logging
 from datetime import datetime
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
@@ -11,20 +12,31 @@ from telegram.ext import (
     CommandHandler,
 )
 import store, config
-from services.coinex_adapter import withdraw_coinex
-from utils.notifications import notify_user, notify_admin
+from services import transitions
+from services.velocity import limiter
+from services.rates import rates, QUOTE_KEY
+from utils.notifications import notify_admin_event, admin_tx_key, resolve_admin_messages
+from services.events import publish_new
 
 logger = logging.getLogger(__name__)
 
 # Conversation states
 AMOUNT, CHAIN, ADDRESS, CONFIRM, REJECT_REASON = range(5)
 
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
 def _fmt_nsp(n):
     return f"{int(n):,} NSP"
 
 async def start_withdraw(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     await q.answer()
+    blocked = await limiter.check_entry(q.from_user.id, "coinex_wd")
+    if blocked:
+        await q.edit_message_text(blocked)
+        return ConversationHandler.END
     await q.edit_message_text(
         f"💸 سحب عبر CoinEx\n"
         f"الحد الأدنى للسحب: {_fmt_nsp(config.COINEX_MIN_WITHDRAW_NSP)}\n"
@@ -45,6 +57,11 @@ async def ask_chain(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"⚠️ الحد الأدنى للسحب هو {_fmt_nsp(config.COINEX_MIN_WITHDRAW_NSP)}.")
         return AMOUNT
 
+    blocked = await limiter.check(update.effective_user.id, "coinex_wd", amount)
+    if blocked:
+        await update.message.reply_text(blocked)
+        return ConversationHandler.END
+
     user_telegram_id = str(update.effective_user.id)
     user = store.get_user_by_telegram_id(user_telegram_id)
     if not user:
@@ -77,6 +94,24 @@ async def ask_address(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return ADDRESS
 
+def _summary(amount_nsp, chain, address, quote) -> str:
+    return (
+        f"📋 **ملخص طلب السحب:**\n\n"
+        f"💰 المبلغ (NSP): {_fmt_nsp(amount_nsp)}\n"
+        f"💵 ما يعادله (USDT): {quote.to_usd(amount_nsp)}\n"
+        f"💱 السعر: 1 USDT = {_fmt_nsp(quote.rate)} NSP (صالح {quote.minutes_left} دقيقة)\n"
+        f"🔗 الشبكة: {chain}\n"
+        f"🏦 العنوان: `{address}`\n\n"
+        f"هل ترغب في إرسال الطلب للإدارة؟"
+    )
+
+
+_CONFIRM_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("✅ تأكيد", callback_data="withdraw_send")],
+    [InlineKeyboardButton("❌ إلغاء", callback_data="withdraw_cancel")]
+])
+
+
 async def confirm_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """User enters withdrawal address and confirms"""
     address = update.message.text.strip()
@@ -103,28 +138,16 @@ async def confirm_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return ConversationHandler.END
 
-    # إذا كان العنوان موثوقاً، تابع العملية
-    rate = store.get_usd_to_nsp_rate()
-    if not rate or rate <= 0:
+    # إذا كان العنوان موثوقاً، تابع العملية بسعر مقفل حتى التأكيد
+    quote = await rates.quote()
+    if quote is None:
         await update.message.reply_text("⚠️ سعر التحويل غير متوفر حالياً. يرجى المحاولة لاحقاً.")
         context.user_data.clear()
         return ConversationHandler.END
+    context.user_data[QUOTE_KEY] = quote
 
-    usdt_amount = float("{:.6f}".format(amount_nsp / rate))
-
-    summary = (
-        f"📋 **ملخص طلب السحب:**\n\n"
-        f"💰 المبلغ (NSP): {_fmt_nsp(amount_nsp)}\n"
-        f"💵 ما يعادله (USDT): {usdt_amount}\n"
-        f"🔗 الشبكة: {chain}\n"
-        f"🏦 العنوان: `{address}`\n\n"
-        f"هل ترغب في إرسال الطلب للإدارة؟"
-    )
-    kb = InlineKeyboardMarkup([
-        [InlineKeyboardButton("✅ تأكيد", callback_data="withdraw_send")],
-        [InlineKeyboardButton("❌ إلغاء", callback_data="withdraw_cancel")]
-    ])
-    await update.message.reply_text(summary, reply_markup=kb, parse_mode="Markdown")
+    await update.message.reply_text(_summary(amount_nsp, chain, address, quote), reply_markup=_CONFIRM_KB,
+                                    parse_mode="Markdown")
     return CONFIRM
 
 async def submit_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -148,16 +171,33 @@ async def submit_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chain = context.user_data["chain"]
     address = context.user_data["address"]
 
+    # التسوية بسعر الملخص؛ إن انتهت صلاحيته وتغير السعر يُعرض الملخص الجديد للتأكيد مرة أخرى
+    quote, changed = await rates.revalidate(context.user_data.get(QUOTE_KEY))
+    if quote is None:
+        await q.edit_message_text("⚠️ سعر التحويل غير متوفر حالياً. يرجى المحاولة لاحقاً.")
+        context.user_data.clear()
+        return ConversationHandler.END
+    context.user_data[QUOTE_KEY] = quote
+    if changed:
+        await q.edit_message_text("⚠️ تغير سعر التحويل منذ عرض الملخص.\n\n" + _summary(amount_nsp, chain, address, quote),
+                                  reply_markup=_CONFIRM_KB, parse_mode="Markdown")
+        return CONFIRM
+
+    blocked = await limiter.acquire(q.from_user.id, "coinex_wd", amount_nsp)
+    if blocked:
+        await q.edit_message_text(blocked)
+        context.user_data.clear()
+        return ConversationHandler.END
+
     # تجميد الرصيد مؤقتًا
     store.deduct_balance(user["id"], amount_nsp)
 
-    rate = store.get_usd_to_nsp_rate()
-    usdt_amount = float("{:.6f}".format(amount_nsp / rate))
+    usdt_amount = quote.to_usd(amount_nsp)
 
     wid = store._execute_query("""
-        INSERT INTO coinex_withdrawals (user_id, nsp_amount, usdt_amount, chain, address, status, created_at)
-        VALUES (%s,%s,%s,%s,%s,%s,%s)
-    """, (user["id"], amount_nsp, usdt_amount, chain, address, "pending", datetime.now()), fetchone=False)
+        INSERT INTO coinex_withdrawals (user_id, nsp_amount, usdt_amount, chain, address, status, rate_id, created_at)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+    """, (user["id"], amount_nsp, usdt_amount, chain, address, "pending", quote.rate_id, datetime.now()), fetchone=False)
 
     if wid:
         store.add_audit_log("coinex_withdrawals", wid, "pending", actor=f"user_{user_telegram_id}", reason="User submitted withdrawal request")
@@ -177,8 +217,15 @@ async def submit_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
             [InlineKeyboardButton("✅ موافقة وتنفيذ آلي", callback_data=f"admin_coinex_approve:{wid}")],
             [InlineKeyboardButton("❌ رفض", callback_data=f"admin_coinex_reject:{wid}")]
         ])
-        await notify_admin(msg, reply_markup=kb, parse_mode="Markdown")
+        publish_new("coinex_withdrawals", wid, user_id=user["id"], username=q.from_user.username,
+                    amount=f"{_fmt_nsp(amount_nsp)} NSP ({usdt_amount} USDT)", details=f"{chain} {address}")
+        await notify_admin_event(
+            "سحب CoinEx", msg, f"#{wid} سحب CoinEx {_fmt_nsp(amount_nsp)} → {usdt_amount} USDT ({chain})",
+            amount=amount_nsp, reply_markup=kb, parse_mode="Markdown",
+            tx_key=admin_tx_key("coinex_withdrawals", wid),
+        )
     else:
+        await limiter.release(q.from_user.id, "coinex_wd", amount_nsp)
         await q.edit_message_text("❌ حدث خطأ في تسجيل طلب السحب بقاعدة البيانات.")
         context.user_data.clear()
 
@@ -187,87 +234,25 @@ async def submit_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ==================== ADMIN FLOW ====================
 
 async def admin_approve_coinex_withdraw(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Admin approves and triggers automatic CoinEx withdrawal"""
+    """Admin approves; the withdrawal is queued for automatic execution via CoinEx"""
     q = update.callback_query
-    await q.answer("جاري معالجة السحب عبر CoinEx...")
+    await q.answer()
 
     if int(q.from_user.id) not in config.ADMIN_IDS:
         return await q.answer("❌ غير مصرح.")
 
     wid = int(q.data.split(":")[1])
-    tx = store.get_transaction("coinex_withdrawals", wid)
-    if not tx or tx["status"] != "pending":
-        return await q.answer("⚠️ العملية غير موجودة أو تمت معالجتها.")
-
+    # pending -> approved_by_admin وإضافة السحب لقائمة التنفيذ في معاملة واحدة
     try:
-        res = await withdraw_coinex(
-            coin="USDT",
-            to_address=tx["address"],
-            amount=float(tx["usdt_amount"]),
-            chain=tx["chain"]
-        )
+        tx = await transitions.apply("coinex_withdrawals", wid, "approve", f"admin_{q.from_user.id}")
+    except transitions.Claimed as e:
+        return await q.answer(str(e), show_alert=True)
+    if not tx:
+        return await q.answer("⚠️ العملية غير موجودة أو تمت معالجتها.")
 
-        if isinstance(res, dict) and res.get("code") == 0 and res.get("data"):
-            coinex_txid = (
-                res["data"].get("id")
-                or res["data"].get("withdraw_id")
-                or res["data"].get("order_id")
-            )
-            if coinex_txid:
-                store.update_transaction_status(
-                    "coinex_withdrawals",
-                    wid,
-                    "approved",
-                    txid_external=str(coinex_txid),
-                    approved_at=datetime.now()
-                )
-                store.add_audit_log(
-                    "coinex_withdrawals",
-                    wid,
-                    "approved",
-                    actor=f"admin_{q.from_user.id}",
-                    reason=f"Executed via API, CoinEx TxID: {coinex_txid}"
-                )
-
-                user_telegram_id = store.get_user_telegram_by_id(tx["user_id"])
-                if user_telegram_id:
-                    await notify_user(
-                        user_telegram_id,
-                        f"✅ تمت معالجة سحبك #{wid}.\n🆔 معرف تحويل CoinEx: `{coinex_txid}`",
-                        parse_mode="Markdown"
-                    )
-
-                await q.edit_message_text(
-                    f"✅ تم تنفيذ السحب آليًا.\nمعرف تحويل CoinEx: `{coinex_txid}`",
-                    parse_mode="Markdown"
-                )
-            else:
-                store.update_transaction_status(
-                    "coinex_withdrawals",
-                    wid,
-                    "error",
-                    reason=f"CoinEx API success, but no TxID: {res}",
-                    approved_at=datetime.now()
-                )
-                await q.edit_message_text(
-                    f"❌ تم السحب بنجاح ولكن لم يتم استرجاع معرف العملية.\nالاستجابة: {res}"
-                )
-        else:
-            error_msg = (res.get("message") or res.get("error_desc") or str(res)) if isinstance(res, dict) else str(res)
-            store.update_transaction_status(
-                "coinex_withdrawals",
-                wid,
-                "failed",
-                reason=f"CoinEx API error: {error_msg}"
-            )
-            await q.edit_message_text(f"❌ فشل تنفيذ السحب عبر CoinEx API.\nالخطأ: {error_msg}")
-
-    except Exception as e:
-        logger.error(f"Error executing CoinEx withdrawal via API for TX {wid}: {e}")
-        store.update_transaction_status(
-            "coinex_withdrawals", wid, "error", reason=f"Internal error: {e}"
-        )
-        await q.edit_message_text(f"❌ حدث خطأ داخلي أثناء محاولة تنفيذ السحب لـ #{wid}.")
+    if not await resolve_admin_messages(admin_tx_key("coinex_withdrawals", wid),
+                                        f"⏳ وافق عليه {q.from_user.full_name} — في قائمة التنفيذ", origin=q.message):
+        await q.edit_message_text(f"⏳ تمت الموافقة على السحب #{wid} وإضافته إلى قائمة التنفيذ الآلي عبر CoinEx.")
 
 async def admin_reject_coinex_withdraw(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
@@ -286,30 +271,20 @@ async def receive_reject_reason_coinex(update: Update, context: ContextTypes.DEF
         await update.message.reply_text("⚠️ لا يوجد طلب معلق.")
         return ConversationHandler.END
 
-    store.update_transaction_status(
-        "coinex_withdrawals",
-        wid,
-        "rejected",
-        reason=reason,
-        rejected_at=datetime.now()
-    )
-    store.add_audit_log(
-        "coinex_withdrawals",
-        wid,
-        "rejected",
-        actor=f"admin_{update.effective_user.id}",
-        reason=reason
-    )
-
-    tx = store.get_transaction("coinex_withdrawals", wid)
-    if tx:
-        user_telegram_id = store.get_user_telegram_by_id(tx["user_id"])
-        if user_telegram_id:
-            await notify_user(user_telegram_id, f"🚫 تم رفض عملية السحب #{wid}.\n📝 السبب: {reason}")
-        # return balance
-        store.add_balance(tx["user_id"], tx.get("nsp_amount") or tx.get("nsp"))
-        await notify_user(user_telegram_id, f"✅ تم إعادة رصيد {tx.get('nsp_amount'):,} NSP إلى حسابك.")
+    # الرفض وإعادة الرصيد والإشعار في معاملة واحدة، ومرة واحدة فقط
+    try:
+        tx = await transitions.apply("coinex_withdrawals", wid, "reject", f"admin_{update.effective_user.id}", reason=reason)
+    except transitions.Claimed as e:
+        await update.message.reply_text(str(e))
+        context.user_data.clear()
+        return ConversationHandler.END
+    if not tx:
+        await update.message.reply_text(f"⚠️ الطلب #{wid} غير موجود أو تمت معالجته.")
+        context.user_data.clear()
+        return ConversationHandler.END
 
+    await resolve_admin_messages(admin_tx_key("coinex_withdrawals", wid),
+                                 f"🚫 رفضه {update.effective_user.full_name} — السبب: {reason}")
     await update.message.reply_text(f"✅ تم رفض الطلب #{wid}.")
     context.user_data.clear()
     return ConversationHandler.END
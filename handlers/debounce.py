@@ -0,0 +1,119 @@
+# handlers/debounce.py
+"""
+كبح النقرات المكررة على الأزرار: يعمل في group -2 قبل بوابة الحجز وكل handlers الطرق.
+
+نقرة بنفس (المستخدم، callback_data) أثناء تنفيذ النقرة الأولى، أو خلال CALLBACK_DEBOUNCE_SECONDS
+بعد انتهائها، يُجاب عليها فوراً بـ answer() فارغ ويتوقف التنفيذ (ApplicationHandlerStop)، فلا
+تتكرر قراءات القاعدة ولا طلبات CoinEx ولا الخصم.
+انتهاء النقرة الأولى يسجله handler في آخر group؛ إن أوقف handler قبله التنفيذ (بوابة الحجز) يستدعي
+finish() بنفسه، وإلا تُعتبر منتهية بعد CALLBACK_INFLIGHT_SECONDS.
+handlers المسجلة بـ block=False محمية عند الإرسال فقط: تُجدول ثم يصل التنفيذ إلى آخر group فوراً،
+فتُسجل النقرة منتهية قبل أن ينتهي عملها، ونقرة مكررة بعد CALLBACK_DEBOUNCE_SECONDS تمر ولو كان
+الأول ما زال يعمل.
+"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes, CallbackQueryHandler
+
+import config
+
+logger = logging.getLogger(__name__)
+
+GATE_GROUP = -2
+DONE_GROUP = 1000
+
+
+class CallbackDebouncer:
+    def __init__(self, window_seconds: float, inflight_seconds: float, max_keys: int):
+        self.window_seconds = window_seconds
+        self.inflight_seconds = inflight_seconds
+        self.max_keys = max(1, max_keys)
+        # (telegram_id, callback_data) -> [update_id, بدأت, انتهت أو None]
+        self._keys: "OrderedDict[tuple, list]" = OrderedDict()
+        self.passed = 0
+        self.suppressed = {"in_flight": 0, "window": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0
+
+    def enter(self, key: tuple, update_id: int) -> Optional[str]:
+        """None إن كانت النقرة جديدة (وتُسجل قيد التنفيذ)، أو سبب الكبح: in_flight / window."""
+        now = time.monotonic()
+        entry = self._keys.get(key)
+        if entry is not None:
+            _, started, done = entry
+            if done is None and now - started < self.inflight_seconds:
+                self.suppressed["in_flight"] += 1
+                return "in_flight"
+            if done is not None and now - done < self.window_seconds:
+                self.suppressed["window"] += 1
+                return "window"
+            del self._keys[key]
+        self._keys[key] = [update_id, now, None]
+        if len(self._keys) > self.max_keys:
+            self._keys.popitem(last=False)
+        self.passed += 1
+        return None
+
+    def leave(self, key: tuple, update_id: int):
+        entry = self._keys.get(key)
+        # نقرة أحدث أخذت المفتاح بعد انتهاء مهلة الأولى: لا نلمسها
+        if entry is not None and entry[0] == update_id and entry[2] is None:
+            entry[2] = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "passed": self.passed,
+            "suppressed_in_flight": self.suppressed["in_flight"],
+            "suppressed_window": self.suppressed["window"],
+            "tracked": len(self._keys),
+        }
+
+
+debouncer = CallbackDebouncer(config.CALLBACK_DEBOUNCE_SECONDS, config.CALLBACK_INFLIGHT_SECONDS,
+                              config.CALLBACK_DEBOUNCE_MAX_KEYS)
+
+
+def _key(update: Update):
+    q = update.callback_query
+    if q is None or not q.data or not q.from_user:
+        return None
+    return q.from_user.id, q.data
+
+
+def finish(update: Update):
+    """تسجيل انتهاء النقرة لمن يوقف التنفيذ قبل DONE_GROUP."""
+    key = _key(update)
+    if key is not None:
+        debouncer.leave(key, update.update_id)
+
+
+async def debounce_gate(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not debouncer.enabled:
+        return
+    key = _key(update)
+    if key is None:
+        return
+    if debouncer.enter(key, update.update_id) is None:
+        return
+    try:
+        await update.callback_query.answer()
+    except Exception:
+        # النقرة قديمة أو أُجيب عليها؛ المهم ألا تُنفذ مرة ثانية
+        logger.debug("answer() failed for suppressed callback %s", key[1])
+    raise ApplicationHandlerStop
+
+
+async def debounce_done(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if debouncer.enabled:
+        finish(update)
+
+
+def register_handlers(dp):
+    dp.add_handler(CallbackQueryHandler(debounce_gate), group=GATE_GROUP)
+    dp.add_handler(CallbackQueryHandler(debounce_done), group=DONE_GROUP)
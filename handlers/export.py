@@ -0,0 +1,94 @@
+# handlers/export.py
+import asyncio
+import logging
+import os
+import tempfile
+from datetime import date, datetime
+
+from telegram import Update
+from telegram.ext import ContextTypes, CommandHandler
+
+import config
+from services import export
+
+logger = logging.getLogger(__name__)
+
+# حد Telegram لرفع الملفات من البوت
+_MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+
+USAGE = (
+    "الاستخدام:\n"
+    "/export <transactions|audit> <من YYYY-MM-DD> <إلى YYYY-MM-DD> [method=...] [status=...] [format=csv|jsonl] [gzip]\n\n"
+    "method: اسم جدول العمليات (مثل syriatel_transactions) أو source في سجل التدقيق\n"
+    "status: حالة العملية أو action في سجل التدقيق\n"
+    "مثال: /export transactions 2024-05-01 2024-05-31 status=approved gzip"
+)
+
+
+def is_admin(user_id: int) -> bool:
+    return user_id in config.ADMIN_IDS
+
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def parse_args(args) -> export.ExportSpec:
+    if len(args) < 3:
+        raise ValueError("missing arguments")
+    spec = export.ExportSpec(kind=args[0].lower(), date_from=_parse_date(args[1]), date_to=_parse_date(args[2]))
+    for arg in args[3:]:
+        key, sep, value = arg.partition("=")
+        key = key.lower()
+        if not sep and key == "gzip":
+            spec.gzip = True
+        elif key == "method":
+            spec.method = value or None
+        elif key == "status":
+            spec.status = value or None
+        elif key == "format":
+            spec.fmt = value.lower()
+        else:
+            raise ValueError(f"unknown option {arg}")
+    return spec
+
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        return await update.message.reply_text("❌ ليس لديك صلاحية.")
+    try:
+        spec = parse_args(context.args)
+    except ValueError:
+        return await update.message.reply_text(USAGE)
+    error = export.validate(spec)
+    if error:
+        return await update.message.reply_text(f"⚠️ {error}\n\n{USAGE}")
+
+    status_msg = await update.message.reply_text("⏳ جارٍ تجهيز الملف...")
+    # الكتابة إلى ملف مؤقت على القرص داخل executor: الذاكرة ثابتة مهما كان عدد الصفوف
+    fd, path = tempfile.mkstemp(suffix="_" + spec.filename)
+    try:
+        loop = asyncio.get_running_loop()
+        with os.fdopen(fd, "wb") as f:
+            size = await loop.run_in_executor(None, export.write_file, spec, f)
+        if size > _MAX_UPLOAD_BYTES:
+            return await status_msg.edit_text(
+                f"⚠️ حجم الملف {size / 1024 / 1024:.1f}MB يتجاوز حد Telegram (50MB).\n"
+                "أضف gzip أو قلّص الفترة، أو استخدم /api/export في لوحة الويب."
+            )
+        with open(path, "rb") as f:
+            await update.message.reply_document(f, filename=spec.filename,
+                                                caption=f"📤 {spec.filename} ({size / 1024:.0f}KB)")
+        await status_msg.delete()
+    except Exception as e:
+        logger.exception("Export failed: %s", e)
+        await status_msg.edit_text("❌ فشل التصدير. راجع السجلات.")
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def register_handlers(dp):
+    dp.add_handler(CommandHandler("export", export_command))
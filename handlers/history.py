@@ -0,0 +1,117 @@
+# handlers/history.py
+"""
+"عملياتي": كل إيداعات وسحوبات المستخدم عبر كل الطرق، بالأحدث أولاً.
+الترقيم keyset: الأزرار تحمل مؤشراً مشفّراً لأول/آخر صف في الصفحة، فكل صفحة استعلام واحد.
+"""
+import asyncio
+import base64
+import logging
+import struct
+from datetime import datetime, timedelta
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.ext import ContextTypes, CallbackQueryHandler
+
+import store
+from services.stats_rollup import METHOD_LABELS
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 10
+_CURSOR = struct.Struct(">QIBI")   # ثواني منذ 0001-01-01، ميكروثانية، رقم الجدول، id
+_EPOCH = datetime(1, 1, 1)
+
+STATUS_LABELS = {
+    "pending": "⏳ قيد المراجعة",
+    "approved": "✅ مقبولة",
+    "completed": "✅ مكتملة",
+    "approved_awaiting_txid": "⏳ بانتظار التحويل",
+    "payout_in_progress": "⏳ قيد التحويل",
+    "approved_by_admin": "⏳ قيد التنفيذ",
+    "processing": "⏳ قيد التنفيذ",
+    "rejected": "🚫 مرفوضة",
+    "failed": "❌ فشلت",
+    "expired": "⌛ أُلغيت لانتهاء المهلة",
+}
+
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+
+def encode_cursor(row: dict) -> str:
+    delta = row["created_at"] - _EPOCH
+    raw = _CURSOR.pack(delta.days * 86400 + delta.seconds, delta.microseconds, row["method_idx"], row["id"])
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        seconds, micros, method_idx, tx_id = _CURSOR.unpack(raw)
+    except (ValueError, struct.error):
+        return None
+    if method_idx >= len(store.HISTORY_METHODS):
+        return None
+    return _EPOCH + timedelta(seconds=seconds, microseconds=micros), method_idx, tx_id
+
+
+def _format_row(r: dict) -> str:
+    try:
+        ts = r["created_at"].strftime("%Y-%m-%d %H:%M")
+    except Exception:
+        ts = str(r["created_at"])
+    amount = r["amount"] or 0
+    amount = f"{amount:,.2f}" if r["currency"] == "USD" else f"{int(amount):,}"
+    return (f"{METHOD_LABELS.get(r['method'], r['method'])} #{r['id']} — {amount} {r['currency']}\n"
+            f"   {STATUS_LABELS.get(r['status'], r['status'])} · 🕒 {ts}")
+
+
+async def show_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """my_tx (الصفحة الأولى) | my_tx:o:<cursor> (أقدم) | my_tx:n:<cursor> (أحدث)"""
+    q = update.callback_query
+    await q.answer()
+    user = await run_db(store.get_user_by_telegram_id, str(q.from_user.id))
+    back = [InlineKeyboardButton("🔙 رجوع", callback_data="back_to_main")]
+    if not user:
+        return await q.edit_message_text("⚠️ حسابك غير مسجل. استخدم /start أولاً.",
+                                         reply_markup=InlineKeyboardMarkup([back]))
+
+    cursor, older = None, True
+    parts = q.data.split(":", 2)
+    if len(parts) == 3:
+        cursor, older = decode_cursor(parts[2]), parts[1] == "o"
+        if cursor is None:
+            return await q.edit_message_text("⚠️ رابط الصفحة غير صالح.", reply_markup=InlineKeyboardMarkup([back]))
+
+    # صف إضافي لمعرفة وجود صفحة تالية في نفس الاتجاه دون COUNT
+    rows = await run_db(store.get_user_history_page, user["id"], cursor, older, PAGE_SIZE + 1)
+    more = len(rows) > PAGE_SIZE
+    if more:
+        rows = rows[:PAGE_SIZE] if older else rows[1:]
+
+    if not rows and cursor is None:
+        return await q.edit_message_text("🧾 لا توجد عمليات بعد.", reply_markup=InlineKeyboardMarkup([back]))
+    if not rows:
+        # الطرف المطلوب اختفى (مثلاً حُذفت صفوف) — نعود لأحدث صفحة
+        rows = await run_db(store.get_user_history_page, user["id"], None, True, PAGE_SIZE + 1)
+        cursor, older, more = None, True, len(rows) > PAGE_SIZE
+        rows = rows[:PAGE_SIZE]
+
+    has_newer = cursor is not None and (older or more)
+    has_older = more if older else True
+    nav = []
+    if has_newer:
+        nav.append(InlineKeyboardButton("⬅️ الأحدث", callback_data=f"my_tx:n:{encode_cursor(rows[0])}"))
+    if has_older:
+        nav.append(InlineKeyboardButton("الأقدم ➡️", callback_data=f"my_tx:o:{encode_cursor(rows[-1])}"))
+    keyboard = [nav] if nav else []
+    keyboard.append(back)
+
+    text = "🧾 عملياتي (الأحدث أولاً)\n\n" + "\n\n".join(_format_row(r) for r in rows)
+    await q.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+
+def register_handlers(dp):
+    dp.add_handler(CallbackQueryHandler(show_history, pattern=r"^my_tx(:[on]:[A-Za-z0-9_-]+)?$"))
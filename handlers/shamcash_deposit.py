@@ -14,7 +14,11 @@ from telegram.ext import (
 )
 import store
 import config
-from utils.notifications import notify_user, notify_admin
+from services import transitions
+from utils.notifications import notify_admin_event, admin_tx_key, resolve_admin_messages
+from services.events import publish_new
+from services.velocity import limiter
+from services.rates import rates, QUOTE_KEY
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +32,10 @@ async def run_db(fn, *args, **kwargs):
 async def start_deposit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     await q.answer()
+    blocked = await limiter.check_entry(q.from_user.id, "shamcash_dep")
+    if blocked:
+        await q.edit_message_text(blocked)
+        return ConversationHandler.END
     text = "💵 اختر نوع العملة التي قمت بالتحويل بها:"
     kb = InlineKeyboardMarkup([
         [InlineKeyboardButton("🇺🇸 USD", callback_data="shamcash_usd"),
@@ -51,10 +59,16 @@ async def ask_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await q.edit_message_text("⚠️ لم يتم ضبط عنوان محفظة ShamCash بعد. يرجى المحاولة لاحقًا.")
         return ConversationHandler.END
 
-    text = (
-        f"📍 عنوان محفظة الإيداع:\n<code>{shamcash_wallet}</code>\n\n"
-        f"💰 الرجاء إدخال المبلغ الذي قمت بتحويله ({currency}):"
-    )
+    text = f"📍 عنوان محفظة الإيداع:\n<code>{shamcash_wallet}</code>\n\n"
+    if currency == "USD":
+        # السعر المعتمد للإيداع يُقفل هنا ويُحفظ مع الطلب فتُحسب قيمته عند الموافقة به
+        quote = await rates.quote()
+        if quote is None:
+            await q.edit_message_text("⚠️ سعر التحويل غير متوفر حالياً. يرجى المحاولة لاحقاً.")
+            return ConversationHandler.END
+        context.user_data[QUOTE_KEY] = quote
+        text += f"💱 السعر المعتمد: 1 USD = {quote.rate:,} NSP\n\n"
+    text += f"💰 الرجاء إدخال المبلغ الذي قمت بتحويله ({currency}):"
     await q.edit_message_text(text, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 إلغاء", callback_data="cancel_action")]]), parse_mode=ParseMode.HTML)
     return AMOUNT
 
@@ -94,13 +108,33 @@ async def finalize(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data.clear()
         return ConversationHandler.END
 
+    blocked = await limiter.acquire(update.effective_user.id, "shamcash_dep")
+    if blocked:
+        await update.message.reply_text(blocked)
+        context.user_data.clear()
+        return ConversationHandler.END
+
+    quote = None
+    if currency == "USD":
+        # عرض منتهٍ بسعر تغير يُستبدل بالسعر الحالي، ويظهر للمستخدم في رسالة التأكيد
+        quote, _ = await rates.revalidate(data.get(QUOTE_KEY))
+        if quote is None:
+            await limiter.release(update.effective_user.id, "shamcash_dep")
+            await update.message.reply_text("⚠️ سعر التحويل غير متوفر حالياً. يرجى المحاولة لاحقاً.")
+            context.user_data.clear()
+            return ConversationHandler.END
+
     tx_id = await run_db(store._execute_query, """
-        INSERT INTO shamcash_transactions (user_id, currency, amount, txid, status, created_at)
-        VALUES (%s,%s,%s,%s,%s,%s)
-    """, (user["id"], currency, amount, txid, "pending", datetime.now()))
+        INSERT INTO shamcash_transactions (user_id, currency, amount, txid, status, rate_id, quote_rate, created_at)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+    """, (user["id"], currency, amount, txid, "pending", quote and quote.rate_id, quote and quote.rate, datetime.now()))
     if tx_id:
-        await run_db(store.add_audit_log, "shamcash_deposit", tx_id, "pending", f"user_{user_telegram_id}", f"User submitted deposit in {currency}")
-        await update.message.reply_text("✅ تم تسجيل طلب الإيداع بانتظار مراجعة الإدارة.")
+        await run_db(store.add_audit_log, "shamcash_transactions", tx_id, "pending", f"user_{user_telegram_id}", f"User submitted deposit in {currency}")
+        amount_nsp = quote.to_nsp(amount) if quote else amount
+        await update.message.reply_text(
+            "✅ تم تسجيل طلب الإيداع بانتظار مراجعة الإدارة."
+            + (f"\n💱 بسعر 1 USD = {quote.rate:,} NSP يُضاف {amount_nsp:,} NSP عند الموافقة." if quote else "")
+        )
         context.user_data.clear()
         shamcash_wallet = await run_db(store.get_shamcash_wallet) or "غير محدد"
         msg = (
@@ -115,8 +149,15 @@ async def finalize(update: Update, context: ContextTypes.DEFAULT_TYPE):
             [InlineKeyboardButton("✅ موافقة", callback_data=f"admin_approve_shamcash_dep:{tx_id}")],
             [InlineKeyboardButton("❌ رفض", callback_data=f"admin_reject_shamcash_dep:{tx_id}")]
         ])
-        await notify_admin(msg, reply_markup=kb, parse_mode=ParseMode.HTML)
+        publish_new("shamcash_transactions", tx_id, user_id=user["id"], username=update.effective_user.username,
+                    amount=f"{amount} {currency}", details=txid)
+        await notify_admin_event(
+            "إيداع ShamCash", msg, f"#{tx_id} إيداع ShamCash {amount} {currency} — TxID {txid}",
+            amount=amount_nsp, reply_markup=kb, parse_mode=ParseMode.HTML,
+            tx_key=admin_tx_key("shamcash_transactions", tx_id),
+        )
     else:
+        await limiter.release(update.effective_user.id, "shamcash_dep")
         await update.message.reply_text("❌ حدث خطأ في تسجيل الإيداع بقاعدة البيانات.")
         context.user_data.clear()
     return ConversationHandler.END
@@ -128,20 +169,15 @@ async def admin_approve_dep(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if int(q.from_user.id) not in config.ADMIN_IDS:
         return await q.answer("❌ غير مصرح.")
     tx_id = int(q.data.split(":")[1])
-    tx = await run_db(store.get_transaction, "shamcash_transactions", tx_id)
-    if not tx or tx["status"] != "pending":
+    try:
+        tx = await transitions.apply("shamcash_transactions", tx_id, "approve", f"admin_{q.from_user.id}")
+    except transitions.Claimed as e:
+        return await q.answer(str(e), show_alert=True)
+    if not tx:
         return await q.answer("⚠️ العملية غير موجودة أو تمت مراجعتها سابقًا.")
-    value = tx["amount"]
-    if tx["currency"] == "USD":
-        rate = await run_db(store.get_usd_to_nsp_rate)
-        value = int(value * rate)
-    await run_db(store.add_balance, tx["user_id"], value)
-    await run_db(store.update_transaction_status, "shamcash_transactions", tx_id, "approved", None, None, datetime.now(), None)
-    await run_db(store.add_audit_log, "shamcash_deposit", tx_id, "approved", f"admin_{q.from_user.id}", "Admin approved deposit")
-    user_telegram = await run_db(store.get_user_telegram_by_id, tx["user_id"])
-    if user_telegram:
-        await notify_user(user_telegram, f"✅ تمت الموافقة على إيداعك #{tx_id} بمبلغ <b>{value} NSP</b>.", parse_mode=ParseMode.HTML)
-    await q.edit_message_text(f"✅ تمت الموافقة على العملية #{tx_id}.")
+    if not await resolve_admin_messages(admin_tx_key("shamcash_transactions", tx_id),
+                                        f"✅ وافق عليها {q.from_user.full_name}", origin=q.message):
+        await q.edit_message_text(f"✅ تمت الموافقة على العملية #{tx_id}.")
 
 
 async def admin_reject_dep(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -161,13 +197,19 @@ async def receive_reject_reason(update: Update, context: ContextTypes.DEFAULT_TY
     if not tx_id:
         await update.message.reply_text("⚠️ حدث خطأ في معالجة الرفض. يرجى المحاولة مرة أخرى.")
         return ConversationHandler.END
-    await run_db(store.update_transaction_status, "shamcash_transactions", tx_id, "rejected", reason, None, None, datetime.now())
-    await run_db(store.add_audit_log, "shamcash_deposit", tx_id, "rejected", f"admin_{update.effective_user.id}", reason)
-    tx = await run_db(store.get_transaction, "shamcash_transactions", tx_id)
-    if tx:
-        user_telegram = await run_db(store.get_user_telegram_by_id, tx["user_id"])
-        if user_telegram:
-            await notify_user(user_telegram, f"🚫 تم رفض عملية الإيداع #{tx_id}.\n📝 السبب: {reason}")
+    try:
+        tx = await transitions.apply("shamcash_transactions", tx_id, "reject", f"admin_{update.effective_user.id}",
+                                     reason=reason)
+    except transitions.Claimed as e:
+        await update.message.reply_text(str(e))
+        context.user_data.clear()
+        return ConversationHandler.END
+    if not tx:
+        await update.message.reply_text(f"⚠️ العملية #{tx_id} غير موجودة أو تمت مراجعتها سابقًا.")
+        context.user_data.clear()
+        return ConversationHandler.END
+    await resolve_admin_messages(admin_tx_key("shamcash_transactions", tx_id),
+                                 f"🚫 رفضها {update.effective_user.full_name} — السبب: {reason}")
     await update.message.reply_text(f"✅ تم تسجيل سبب الرفض للعملية #{tx_id}.")
     context.user_data.clear()
     return ConversationHandler.END
@@ -14,7 +14,11 @@ from telegram.ext import (
 )
 import store
 import config
-from utils.notifications import notify_user, notify_admin
+from services import transitions
+from services.payout_workers import payout_workers
+from services.velocity import limiter
+from utils.notifications import notify_admin_event, admin_tx_key, resolve_admin_messages
+from services.events import publish_new
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +36,10 @@ def _fmt(n):
 async def entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     await q.answer()
+    blocked = await limiter.check_entry(q.from_user.id, "shamcash_wd")
+    if blocked:
+        await q.edit_message_text(blocked)
+        return ConversationHandler.END
     text = (
         f"💸 <b>سحب عبر ShamCash</b>\n\n"
         f"🔹 الحد الأدنى: <b>{_fmt(config.SHAMCASH_MIN_WITHDRAW_NSP)}</b>\n"
@@ -55,6 +63,11 @@ async def get_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"⚠️ الحد الأدنى للسحب هو {_fmt(config.SHAMCASH_MIN_WITHDRAW_NSP)}.")
         return AMOUNT
 
+    blocked = await limiter.check(update.effective_user.id, "shamcash_wd", amount)
+    if blocked:
+        await update.message.reply_text(blocked)
+        return ConversationHandler.END
+
     user_telegram_id = str(update.effective_user.id)
     user = await run_db(store.get_user_by_telegram_id, user_telegram_id)
     if not user:
@@ -116,6 +129,12 @@ async def confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     commission = int(amount * config.SHAMCASH_COMMISSION)
     net = amount - commission
 
+    blocked = await limiter.acquire(q.from_user.id, "shamcash_wd", amount)
+    if blocked:
+        await q.edit_message_text(blocked)
+        context.user_data.clear()
+        return ConversationHandler.END
+
     # deduct balance
     await run_db(store.deduct_balance, user["id"], amount)
 
@@ -125,7 +144,7 @@ async def confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
         VALUES (%s,%s,%s,%s,%s,%s,%s)
     """, (user["id"], wallet, amount, commission, net, "pending", datetime.now()))
     if tx_id:
-        await run_db(store.add_audit_log, "shamcash_withdrawal", tx_id, "pending", f"user_{user_telegram_id}", "User requested withdrawal")
+        await run_db(store.add_audit_log, "shamcash_withdrawals", tx_id, "pending", f"user_{user_telegram_id}", "User requested withdrawal")
         await q.edit_message_text("✅ تم إرسال طلب السحب، بانتظار موافقة الإدارة.")
         context.user_data.clear()
         msg = (
@@ -140,8 +159,15 @@ async def confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
             [InlineKeyboardButton("✅ موافقة", callback_data=f"admin_shamcash_approve:{tx_id}")],
             [InlineKeyboardButton("❌ رفض", callback_data=f"admin_shamcash_reject:{tx_id}")]
         ])
-        await notify_admin(msg, reply_markup=kb, parse_mode=ParseMode.HTML)
+        publish_new("shamcash_withdrawals", tx_id, user_id=user["id"], username=q.from_user.username,
+                    amount=f"{_fmt(amount)} NSP (الصافي {_fmt(net)})", details=wallet)
+        await notify_admin_event(
+            "سحب ShamCash", msg, f"#{tx_id} سحب ShamCash {_fmt(amount)} → {wallet}",
+            amount=amount, reply_markup=kb, parse_mode=ParseMode.HTML,
+            tx_key=admin_tx_key("shamcash_withdrawals", tx_id),
+        )
     else:
+        await limiter.release(q.from_user.id, "shamcash_wd", amount)
         await q.edit_message_text("❌ حدث خطأ في تسجيل طلب السحب بقاعدة البيانات.")
         context.user_data.clear()
     return ConversationHandler.END
@@ -153,15 +179,24 @@ async def admin_approve_shamcash_withdraw(update: Update, context: ContextTypes.
     if int(q.from_user.id) not in config.ADMIN_IDS:
         return await q.answer("❌ غير مصرح.")
     tx_id = int(q.data.split(":")[1])
-    tx = await run_db(store.get_transaction, "shamcash_withdrawals", tx_id)
-    if not tx or tx["status"] != "pending":
+    try:
+        tx = await transitions.apply("shamcash_withdrawals", tx_id, "approve", f"admin_{q.from_user.id}")
+    except transitions.Claimed as e:
+        return await q.answer(str(e), show_alert=True)
+    if not tx:
         return await q.answer("⚠️ العملية غير موجودة أو تمت مراجعتها.")
-    await run_db(store.update_transaction_status, "shamcash_withdrawals", tx_id, "approved_awaiting_txid", None, None, datetime.now(), None)
-    await run_db(store.add_audit_log, "shamcash_withdrawal", tx_id, "approved_awaiting_txid", f"admin_{q.from_user.id}", "Admin approved awaiting txid")
-    user_telegram = await run_db(store.get_user_telegram_by_id, tx["user_id"])
-    if user_telegram:
-        await notify_user(user_telegram, f"✅ تمت الموافقة المبدئية على طلب سحبك #{tx_id}. يرجى انتظار معرف التحويل.")
-    await q.edit_message_text(f"✅ تمت الموافقة المبدئية على العملية #{tx_id}.\n📤 أرسل الآن رقم المعاملة عبر الأمر:\n<code>/set_shamcash_txid {tx_id} &lt;txid&gt;</code>", parse_mode=ParseMode.HTML)
+    if payout_workers.enabled("shamcash"):
+        text = f"✅ تمت الموافقة على العملية #{tx_id}.\n🤖 سيُنفذ التحويل آلياً عبر بوابة ShamCash."
+        if await resolve_admin_messages(admin_tx_key("shamcash_withdrawals", tx_id),
+                                        f"🤖 وافق عليها {q.from_user.full_name} — قيد التنفيذ الآلي", origin=q.message):
+            return await q.message.reply_text(text)
+        return await q.edit_message_text(text)
+    text = f"✅ تمت الموافقة المبدئية على العملية #{tx_id}.\n📤 أرسل الآن رقم المعاملة عبر الأمر:\n<code>/set_shamcash_txid {tx_id} &lt;txid&gt;</code>"
+    if await resolve_admin_messages(admin_tx_key("shamcash_withdrawals", tx_id),
+                                    f"⏳ وافق عليها {q.from_user.full_name} — بانتظار معرف التحويل", origin=q.message):
+        await q.message.reply_text(text, parse_mode=ParseMode.HTML)
+    else:
+        await q.edit_message_text(text, parse_mode=ParseMode.HTML)
 
 
 async def admin_reject_shamcash_withdraw(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -180,14 +215,17 @@ async def receive_reject_reason_shamcash(update: Update, context: ContextTypes.D
     if not tx_id:
         await update.message.reply_text("⚠️ حدث خطأ في معالجة الرفض. يرجى المحاولة مرة أخرى.")
         return ConversationHandler.END
-    await run_db(store.update_transaction_status, "shamcash_withdrawals", tx_id, "rejected", reason, None, None, datetime.now())
-    await run_db(store.add_audit_log, "shamcash_withdrawal", tx_id, "rejected", f"admin_{update.effective_user.id}", reason)
-    tx = await run_db(store.get_transaction, "shamcash_withdrawals", tx_id)
-    if tx:
-        await run_db(store.add_balance, tx["user_id"], tx["requested_amount"])
-        user_telegram = await run_db(store.get_user_telegram_by_id, tx["user_id"])
-        if user_telegram:
-            await notify_user(user_telegram, f"🚫 تم رفض طلب السحب #{tx_id}.\n📝 السبب: {reason}\n✅ تم إعادة رصيد {_fmt(tx['requested_amount'])} إلى حسابك.")
+    try:
+        tx = await transitions.apply("shamcash_withdrawals", tx_id, "reject", f"admin_{update.effective_user.id}",
+                                     reason=reason)
+    except transitions.Claimed as e:
+        await update.message.reply_text(str(e))
+        return ConversationHandler.END
+    if not tx:
+        await update.message.reply_text(f"⚠️ العملية #{tx_id} غير موجودة أو تمت معالجتها مسبقًا.")
+        return ConversationHandler.END
+    await resolve_admin_messages(admin_tx_key("shamcash_withdrawals", tx_id),
+                                 f"🚫 رفضها {update.effective_user.full_name} — السبب: {reason}")
     await update.message.reply_text(f"تم تسجيل سبب الرفض للعملية #{tx_id}. ✅")
     return ConversationHandler.END
 
@@ -201,16 +239,14 @@ async def set_shamcash_txid(update: Update, context: ContextTypes.DEFAULT_TYPE):
         tx_id, external_txid = int(context.args[0]), context.args[1]
     except Exception:
         return await update.message.reply_text("❌ معرف العملية أو معرف التحويل غير صالح.")
-    tx = await run_db(store.get_transaction, "shamcash_withdrawals", tx_id)
+    try:
+        tx = await transitions.apply("shamcash_withdrawals", tx_id, "complete", f"admin_{update.effective_user.id}",
+                                     txid=external_txid)
+    except transitions.Claimed as e:
+        return await update.message.reply_text(str(e))
     if not tx:
-        return await update.message.reply_text("⚠️ العملية غير موجودة.")
-    if tx["status"] not in ["approved_awaiting_txid", "pending"]:
-        return await update.message.reply_text(f"⚠️ العملية #{tx_id} ليست في حالة انتظار معرف التحويل أو معلقة.")
-    await run_db(store.finalize_shamcash_withdraw, tx_id, external_txid)
-    await run_db(store.add_audit_log, "shamcash_withdrawal", tx_id, "approved", f"admin_{update.effective_user.id}", f"TxID set: {external_txid}")
-    user_telegram = await run_db(store.get_user_telegram_by_id, tx["user_id"])
-    if user_telegram:
-        await notify_user(user_telegram, f"✅ تمت الموافقة على سحبك #{tx_id}.\n🆔 معرف التحويل: <code>{external_txid}</code>", parse_mode=ParseMode.HTML)
+        return await update.message.reply_text(
+            f"⚠️ العملية #{tx_id} غير موجودة أو ليست في حالة انتظار معرف التحويل أو معلقة.")
     await update.message.reply_text("تم تسجيل المعاملة بنجاح ✅")
 
 
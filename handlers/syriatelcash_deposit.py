@@ -14,7 +14,10 @@ from telegram.ext import (
 )
 import store
 import config
-from utils.notifications import notify_user, notify_admin
+from services import transitions
+from utils.notifications import notify_admin_event, admin_tx_key, resolve_admin_messages
+from services.events import publish_new
+from services.velocity import limiter
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +31,10 @@ async def run_db(fn, *args, **kwargs):
 async def start_deposit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     await q.answer()
+    blocked = await limiter.check_entry(q.from_user.id, "syriatel_dep")
+    if blocked:
+        await q.edit_message_text(blocked)
+        return ConversationHandler.END
     numbers = await run_db(store.get_syriatel_numbers)
     if not numbers:
         await q.edit_message_text("⚠️ لا توجد أرقام Syriatel متاحة للإيداع حالياً.")
@@ -103,6 +110,12 @@ async def finalize(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data.clear()
         return ConversationHandler.END
 
+    blocked = await limiter.acquire(update.effective_user.id, "syriatel_dep")
+    if blocked:
+        await update.message.reply_text(blocked)
+        context.user_data.clear()
+        return ConversationHandler.END
+
     try:
         tx_id = await run_db(
             store._execute_query,
@@ -114,12 +127,13 @@ async def finalize(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
     except Exception as e:
         logger.exception("DB error inserting syriatel deposit: %s", e)
+        await limiter.release(update.effective_user.id, "syriatel_dep")
         await update.message.reply_text("❌ حدث خطأ في تسجيل الإيداع بقاعدة البيانات.")
         context.user_data.clear()
         return ConversationHandler.END
 
     if tx_id:
-        await run_db(store.add_audit_log, "syriatel_deposit", tx_id, "pending", f"user_{user_telegram_id}", "User submitted deposit")
+        await run_db(store.add_audit_log, "syriatel_transactions", tx_id, "pending", f"user_{user_telegram_id}", "User submitted deposit")
         await update.message.reply_text(
             "✅ تم تسجيل عملية الإيداع الخاصة بك.\n🕓 قيد المراجعة من قبل الإدارة.\n📩 سيتم إعلامك فور اتخاذ القرار."
         )
@@ -136,8 +150,15 @@ async def finalize(update: Update, context: ContextTypes.DEFAULT_TYPE):
             [InlineKeyboardButton("✅ موافقة", callback_data=f"admin_approve_syriatel_dep:{tx_id}")],
             [InlineKeyboardButton("❌ رفض", callback_data=f"admin_reject_syriatel_dep:{tx_id}")]
         ])
-        await notify_admin(msg, reply_markup=kb, parse_mode=ParseMode.HTML)
+        publish_new("syriatel_transactions", tx_id, user_id=user["id"], username=update.effective_user.username,
+                    amount=f"{amount:,} SYP", details=txid)
+        await notify_admin_event(
+            "إيداع Syriatel", msg, f"#{tx_id} إيداع Syriatel {amount:,} SYP — TxID {txid}",
+            amount=amount, reply_markup=kb, parse_mode=ParseMode.HTML,
+            tx_key=admin_tx_key("syriatel_transactions", tx_id),
+        )
     else:
+        await limiter.release(update.effective_user.id, "syriatel_dep")
         await update.message.reply_text("❌ حدث خطأ في تسجيل الإيداع بقاعدة البيانات.")
         context.user_data.clear()
 
@@ -155,19 +176,16 @@ async def admin_approve_syriatel_dep(update: Update, context: ContextTypes.DEFAU
     except Exception:
         return await q.answer("⚠️ معرف العملية غير صالح.")
 
-    tx = await run_db(store.get_transaction, "syriatel_transactions", tx_id)
-    if not tx or tx.get("status") != "pending":
+    try:
+        tx = await transitions.apply("syriatel_transactions", tx_id, "approve", f"admin_{admin_id}")
+    except transitions.Claimed as e:
+        return await q.answer(str(e), show_alert=True)
+    if not tx:
         return await q.answer("⚠️ العملية غير موجودة أو تمت مراجعتها مسبقًا.")
 
-    await run_db(store.add_balance, tx["user_id"], tx["amount"])
-    await run_db(store.update_transaction_status, "syriatel_transactions", tx_id, "approved", None, None, datetime.now(), None)
-    await run_db(store.add_audit_log, "syriatel_deposit", tx_id, "approved", f"admin_{admin_id}", "Deposit approved by admin")
-
-    user_telegram = await run_db(store.get_user_telegram_by_id, tx["user_id"])
-    if user_telegram:
-        await notify_user(user_telegram,
-                          f"✅ تمّت الموافقة على إيداعك #{tx_id}\n💰 المبلغ: {tx['amount']:,} SYP\n🕓 {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-    await q.edit_message_text(f"✅ تمت الموافقة على العملية #{tx_id} بنجاح.")
+    if not await resolve_admin_messages(admin_tx_key("syriatel_transactions", tx_id),
+                                        f"✅ وافق عليها {q.from_user.full_name}", origin=q.message):
+        await q.edit_message_text(f"✅ تمت الموافقة على العملية #{tx_id} بنجاح.")
 
 
 async def admin_reject_syriatel_dep(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -189,15 +207,17 @@ async def receive_reject_reason_syriatel(update: Update, context: ContextTypes.D
         await update.message.reply_text("⚠️ حدث خطأ في معالجة الرفض. يرجى المحاولة مرة أخرى.")
         return ConversationHandler.END
 
-    await run_db(store.update_transaction_status, "syriatel_transactions", tx_id, "rejected", reason, None, None, datetime.now())
-    await run_db(store.add_audit_log, "syriatel_deposit", tx_id, "rejected", f"admin_{update.effective_user.id}", reason)
-
-    tx = await run_db(store.get_transaction, "syriatel_transactions", tx_id)
-    if tx:
-        user_telegram = await run_db(store.get_user_telegram_by_id, tx["user_id"])
-        if user_telegram:
-            await notify_user(user_telegram,
-                              f"🚫 تم رفض عملية الإيداع #{tx_id}\n💰 المبلغ: {tx['amount']:,} SYP\n📝 السبب: {reason}")
+    try:
+        tx = await transitions.apply("syriatel_transactions", tx_id, "reject", f"admin_{update.effective_user.id}",
+                                     reason=reason)
+    except transitions.Claimed as e:
+        await update.message.reply_text(str(e))
+        return ConversationHandler.END
+    if not tx:
+        await update.message.reply_text(f"⚠️ العملية #{tx_id} غير موجودة أو تمت مراجعتها مسبقًا.")
+        return ConversationHandler.END
+    await resolve_admin_messages(admin_tx_key("syriatel_transactions", tx_id),
+                                 f"🚫 رفضها {update.effective_user.full_name} — السبب: {reason}")
     await update.message.reply_text(f"تم تسجيل رفض العملية #{tx_id} ✅")
     return ConversationHandler.END
 
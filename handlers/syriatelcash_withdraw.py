@@ -14,7 +14,11 @@ from telegram.ext import (
 )
 import store
 import config
-from utils.notifications import notify_user, notify_admin
+from services import transitions
+from services.payout_workers import payout_workers
+from services.velocity import limiter
+from utils.notifications import notify_admin_event, admin_tx_key, resolve_admin_messages
+from services.events import publish_new
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +39,10 @@ async def run_db(fn, *args, **kwargs):
 async def start_withdraw(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     await q.answer()
+    blocked = await limiter.check_entry(q.from_user.id, "syriatel_wd")
+    if blocked:
+        await q.edit_message_text(blocked)
+        return ConversationHandler.END
     kb = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 إلغاء", callback_data="cancel_action")]])
     try:
         await q.edit_message_text(
@@ -71,6 +79,11 @@ async def ask_phone(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return AMOUNT
 
+    blocked = await limiter.check(update.effective_user.id, "syriatel_wd", amount)
+    if blocked:
+        await update.message.reply_text(blocked)
+        return ConversationHandler.END
+
     # get user
     user_telegram_id = str(update.effective_user.id)
     try:
@@ -175,11 +188,19 @@ async def finalize_withdraw(update: Update, context: ContextTypes.DEFAULT_TYPE):
     fee = int(amount * config.SYRIATEL_FEE_PERCENT / 100)
     net_amount = amount - fee
 
+    # velocity: يُسجل الطلب قبل إنشائه ويُلغى تسجيله إن فشل الإنشاء
+    blocked = await limiter.acquire(q.from_user.id, "syriatel_wd", amount)
+    if blocked:
+        await q.edit_message_text(blocked)
+        context.user_data.clear()
+        return ConversationHandler.END
+
     # deduct balance
     try:
         await run_db(store.deduct_balance, user["id"], amount)
     except Exception as e:
         logger.exception("DB error deduct balance: %s", e)
+        await limiter.release(q.from_user.id, "syriatel_wd", amount)
         await q.edit_message_text("❌ حدث خطأ في خصم الرصيد. العملية ملغاة.")
         context.user_data.clear()
         return ConversationHandler.END
@@ -202,6 +223,7 @@ async def finalize_withdraw(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await run_db(store.add_balance, user["id"], amount)
         except Exception:
             logger.exception("DB error refunding after failed insert")
+        await limiter.release(q.from_user.id, "syriatel_wd", amount)
         await q.edit_message_text("❌ حدث خطأ أثناء إنشاء الطلب. تم إرجاع المبلغ إن أمكن.")
         context.user_data.clear()
         return ConversationHandler.END
@@ -212,13 +234,14 @@ async def finalize_withdraw(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await run_db(store.add_balance, user["id"], amount)
         except Exception:
             logger.exception("DB error refunding after missing tx_id")
+        await limiter.release(q.from_user.id, "syriatel_wd", amount)
         await q.edit_message_text("❌ حدث خطأ أثناء إنشاء الطلب. تم إرجاع المبلغ إن أمكن.")
         context.user_data.clear()
         return ConversationHandler.END
 
     # add audit log
     try:
-        await run_db(store.add_audit_log, "syriatel_withdrawal", tx_id, "pending", f"user_{user_telegram_id}", "User requested withdrawal")
+        await run_db(store.add_audit_log, "syriatel_withdrawals", tx_id, "pending", f"user_{user_telegram_id}", "User requested withdrawal")
     except Exception:
         logger.exception("Failed to write audit log")
 
@@ -241,8 +264,14 @@ async def finalize_withdraw(update: Update, context: ContextTypes.DEFAULT_TYPE):
         [InlineKeyboardButton("✅ موافقة", callback_data=f"admin_approve_syriatel_wd:{tx_id}")],
         [InlineKeyboardButton("❌ رفض", callback_data=f"admin_reject_syriatel_wd:{tx_id}")]
     ])
+    publish_new("syriatel_withdrawals", tx_id, user_id=user["id"], username=q.from_user.username,
+                amount=f"{amount:,} NSP (الصافي {net_amount:,})", details=phone)
     try:
-        await notify_admin(msg, reply_markup=kb, parse_mode=ParseMode.HTML)
+        await notify_admin_event(
+            "سحب Syriatel", msg, f"#{tx_id} سحب Syriatel {amount:,} ل.س → {phone}",
+            amount=amount, reply_markup=kb, parse_mode=ParseMode.HTML,
+            tx_key=admin_tx_key("syriatel_withdrawals", tx_id),
+        )
     except Exception:
         logger.exception("Failed to notify admin")
 
@@ -266,26 +295,35 @@ async def admin_approve_syriatel_withdraw(update: Update, context: ContextTypes.
     except Exception:
         return await q.answer("⚠️ معرف العملية غير صالح.")
 
+    # mark awaiting txid (only if still pending) and ask admin to send it
     try:
-        tx = await run_db(store.get_transaction, "syriatel_withdrawals", tx_id)
-    except Exception:
-        tx = None
-
-    if not tx or tx.get("status") != "pending":
+        tx = await transitions.apply("syriatel_withdrawals", tx_id, "approve", f"admin_{admin_id}")
+    except transitions.Claimed as e:
+        return await q.answer(str(e), show_alert=True)
+    if not tx:
         return await q.answer("⚠️ العملية غير موجودة أو تمت مراجعتها مسبقًا.")
 
-    # mark awaiting txid and ask admin to send it
-    try:
-        await run_db(store.update_transaction_status, "syriatel_withdrawals", tx_id, "approved_awaiting_txid", None, None, datetime.now(), None)
-    except Exception:
-        logger.exception("Failed to update status to approved_awaiting_txid")
+    if payout_workers.enabled("syriatel"):
+        # التحويل والتقاط TxID عبر بوابة المزوّد (services/payout_workers)؛ إدخال المعرف يدوياً يبقى متاحاً إن فشل
+        text = f"✅ تمت الموافقة على السحب #{tx_id}.\n🤖 سيُنفذ التحويل آلياً عبر بوابة Syriatel."
+        if await resolve_admin_messages(admin_tx_key("syriatel_withdrawals", tx_id),
+                                        f"🤖 وافق عليه {q.from_user.full_name} — قيد التنفيذ الآلي", origin=q.message):
+            await q.message.reply_text(text)
+        else:
+            await q.edit_message_text(text)
+        return ConversationHandler.END
 
     context.user_data["awaiting_txid_for"] = tx_id
-    await q.edit_message_text(
+    text = (
         f"✅ تمت الموافقة المبدئية على السحب #{tx_id}.\n"
-        f"📤 الآن أرسل معرف التحويل (TxID) عبر رسالة هنا لإكمال العملية.",
-        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 إلغاء", callback_data="cancel_action")]])
+        f"📤 الآن أرسل معرف التحويل (TxID) عبر رسالة هنا لإكمال العملية."
     )
+    kb = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 إلغاء", callback_data="cancel_action")]])
+    if await resolve_admin_messages(admin_tx_key("syriatel_withdrawals", tx_id),
+                                    f"⏳ وافق عليه {q.from_user.full_name} — بانتظار معرف التحويل", origin=q.message):
+        await q.message.reply_text(text, reply_markup=kb)
+    else:
+        await q.edit_message_text(text, reply_markup=kb)
     return ADMIN_SET_TXID
 
 
@@ -307,31 +345,12 @@ async def receive_admin_syriatel_txid(update: Update, context: ContextTypes.DEFA
         await update.message.reply_text("⚠️ لا يوجد طلب معلق لإضافة معرف.")
         return ConversationHandler.END
 
-    # update status to approved, add txid
-    try:
-        await run_db(store.update_transaction_status, "syriatel_withdrawals", tx_id, "approved", None, txid, datetime.now(), None)
-    except Exception:
-        logger.exception("Failed to update withdrawal with txid")
-        await update.message.reply_text("❌ حدث خطأ داخلي أثناء حفظ معرف التحويل.")
+    # approved_awaiting_txid -> approved with txid; the user notification is written to the outbox in the same transaction
+    tx = await transitions.apply("syriatel_withdrawals", tx_id, "complete", f"admin_{admin_id}", txid=txid)
+    if not tx:
+        await update.message.reply_text(f"⚠️ العملية #{tx_id} ليست بانتظار معرف التحويل (ربما رُفضت أو اكتملت).")
         return ConversationHandler.END
 
-    try:
-        await run_db(store.add_audit_log, "syriatel_withdrawal", tx_id, "approved", f"admin_{admin_id}", f"TxID: {txid}")
-    except Exception:
-        logger.exception("Failed to write audit log for txid")
-
-    # notify user
-    try:
-        tx = await run_db(store.get_transaction, "syriatel_withdrawals", tx_id)
-        user_telegram = await run_db(store.get_user_telegram_by_id, tx["user_id"]) if tx else None
-        if user_telegram:
-            await notify_user(
-                user_telegram,
-                f"✅ تمت الموافقة على طلب السحب #{tx_id}.\n📤 المبلغ الصافي: {tx['net_amount']:,} ل.س\n🆔 معرف التحويل: {txid}"
-            )
-    except Exception:
-        logger.exception("Failed to notify user after setting txid")
-
     await update.message.reply_text(f"✅ تم تسجيل معرف التحويل #{tx_id} بنجاح.")
     context.user_data.clear()
     return ConversationHandler.END
@@ -370,28 +389,21 @@ async def receive_reject_reason_syriatel_withdraw(update: Update, context: Conte
         await update.message.reply_text("⚠️ حدث خطأ في معالجة الرفض. يرجى المحاولة مرة أخرى.")
         return ConversationHandler.END
 
-    # update status to rejected and refund
-    try:
-        await run_db(store.update_transaction_status, "syriatel_withdrawals", tx_id, "rejected", reason, None, None, datetime.now())
-    except Exception:
-        logger.exception("Failed to set withdrawal as rejected")
-
+    # reject, refund and notify in one transaction (only once: the refund hangs off the transition)
     try:
-        await run_db(store.add_audit_log, "syriatel_withdrawal", tx_id, "rejected", f"admin_{update.effective_user.id}", reason)
-    except Exception:
-        logger.exception("Failed to write audit log for rejection")
-
-    # refund user's balance
-    try:
-        tx = await run_db(store.get_transaction, "syriatel_withdrawals", tx_id)
-        if tx:
-            await run_db(store.add_balance, tx["user_id"], tx["amount"])
-            user_telegram = await run_db(store.get_user_telegram_by_id, tx["user_id"])
-            if user_telegram:
-                await notify_user(user_telegram, f"🚫 تم رفض طلب السحب #{tx_id}.\n📝 السبب: {reason}\n✅ تم إعادة رصيد {tx['amount']:,} ل.س إلى حسابك.")
-    except Exception:
-        logger.exception("Failed to refund or notify user after rejection")
+        tx = await transitions.apply("syriatel_withdrawals", tx_id, "reject", f"admin_{update.effective_user.id}",
+                                     reason=reason)
+    except transitions.Claimed as e:
+        await update.message.reply_text(str(e))
+        context.user_data.clear()
+        return ConversationHandler.END
+    if not tx:
+        await update.message.reply_text(f"⚠️ العملية #{tx_id} غير موجودة أو تمت معالجتها مسبقًا.")
+        context.user_data.clear()
+        return ConversationHandler.END
 
+    await resolve_admin_messages(admin_tx_key("syriatel_withdrawals", tx_id),
+                                 f"🚫 رفضه {update.effective_user.full_name} — السبب: {reason}")
     await update.message.reply_text(f"✅ تم تسجيل رفض العملية #{tx_id} مع السبب.")
     context.user_data.clear()
     return ConversationHandler.END
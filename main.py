@@ -1,4 +1,5 @@
 # main.py
+import asyncio
 import logging
 from telegram.ext import (
     Application,
@@ -8,7 +9,18 @@ from telegram.ext import (
 )
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 import config
-from utils.notifications import set_bot_instance
+from utils.notifications import set_bot_instance, outbound, admin_digest
+from services.coinex_withdraw_queue import withdraw_queue
+from services.coinex_reconciler import reconciler
+from services.outbox_dispatcher import dispatcher
+from services.broadcast import broadcaster
+from services.stats_rollup import compactor, user_stats_text, admin_stats_text
+from fastapi_admin.server import admin_web
+from services.claims import assigner
+from services.stale_sweeper import stale_sweeper
+from services.reconciliation import statement_inbox
+from services.payout_workers import payout_workers
+import store
 
 # === استيراد جميع الهاندلرز ===
 from handlers.shamcash_deposit import register_handlers as register_shamcash_deposit
@@ -22,6 +34,12 @@ from handlers.coinex_withdraw import register_handlers as register_coinex_withdr
 from handlers.admin_transactions import register_handlers as register_admin_handlers
 from handlers.address_management import register_handlers as register_address_handlers
 from handlers.admin_settings import register_handlers as register_admin_setting_handlers
+from handlers.broadcast import register_handlers as register_broadcast_handlers
+from handlers.history import register_handlers as register_history_handlers
+from handlers.export import register_handlers as register_export_handlers
+from handlers.audit_search import register_handlers as register_audit_search_handlers
+from handlers.claims import register_handlers as register_claim_handlers
+from handlers.debounce import register_handlers as register_debounce_handlers
 
 
 
@@ -50,7 +68,10 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             InlineKeyboardButton("🏦 عناويني", callback_data="manage_whitelist_addresses")
         ],
         [
-            InlineKeyboardButton("📊 الإحصائيات", callback_data="show_stats"),
+            InlineKeyboardButton("🧾 عملياتي", callback_data="my_tx"),
+            InlineKeyboardButton("📊 الإحصائيات", callback_data="show_stats")
+        ],
+        [
             InlineKeyboardButton("🆘 المساعدة", callback_data="show_help")
         ]
     ]
@@ -61,6 +82,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
     if update.message:
+        # مستخدم عاد بعد حظر البوت يدخل البث من جديد
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, store.clear_user_blocked, str(user.id))
         await update.message.reply_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
     else:
         query = update.callback_query
@@ -175,9 +199,28 @@ async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
+    loop = asyncio.get_running_loop()
+    user = await loop.run_in_executor(None, store.get_user_by_telegram_id, str(query.from_user.id))
+    keyboard = []
+    if query.from_user.id in config.ADMIN_IDS:
+        keyboard.append([InlineKeyboardButton("📈 إحصائيات النظام", callback_data="show_admin_stats")])
+    keyboard.append([InlineKeyboardButton("🔙 رجوع", callback_data="back_to_main")])
+
+    if not user:
+        text = "⚠️ حسابك غير مسجل. استخدم /start أولاً."
+    else:
+        text = await user_stats_text(user["id"])
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+
+async def show_admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    if query.from_user.id not in config.ADMIN_IDS:
+        return await query.edit_message_text("❌ غير مصرح لك.")
     await query.edit_message_text(
-        "📊 الإحصائيات قريباً...",
-        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 رجوع", callback_data="back_to_main")]])
+        await admin_stats_text(days=7),
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 رجوع", callback_data="show_stats")]])
     )
 
 
@@ -190,6 +233,47 @@ async def back_to_main(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await start(update, context)
 
 
+# ==============================
+#    BACKGROUND WORKERS
+# ==============================
+async def post_init(application: Application):
+    # عمّال تنفيذ سحوبات CoinEx الموافق عليها ومطابقة حالتها بعد الإرسال
+    withdraw_queue.start()
+    reconciler.start()
+    # إرسال الإشعارات المكتوبة في outbox (ومنها ما بقي من تشغيل سابق)
+    dispatcher.start()
+    # استئناف بث لم يكتمل قبل إعادة التشغيل
+    await broadcaster.resume()
+    # إعادة حساب حاويات الإحصائيات المتأثرة مرة كل ليلة
+    compactor.start()
+    # توزيع الطلبات المعلقة غير المحجوزة على المشرفين
+    assigner.start()
+    # إلغاء السحوبات المتروكة بعد مهلتها وإعادة رصيدها
+    stale_sweeper.start()
+    # مطابقة كشوف Syriatel / ShamCash الواردة إلى RECONCILE_INBOX_DIR
+    statement_inbox.start()
+    # تنفيذ سحوبات Syriatel / ShamCash الموافق عليها عبر بوابة المزوّد (PAYOUT_*_SCRIPT)
+    payout_workers.start()
+    # لوحة الويب داخل نفس الحلقة لتصلها أحداث الطلبات المعلقة (ADMIN_WEB_PORT)
+    admin_web.start()
+
+
+async def post_shutdown(application: Application):
+    await withdraw_queue.stop()
+    await reconciler.stop()
+    await dispatcher.stop()
+    await broadcaster.stop()
+    await compactor.stop()
+    await assigner.stop()
+    await stale_sweeper.stop()
+    await statement_inbox.stop()
+    await payout_workers.stop()
+    await admin_web.stop()
+    # تفريغ ما تبقى من الرسائل الصادرة قبل الإغلاق
+    await admin_digest.close()
+    await outbound.stop()
+
+
 # ==============================
 #       MAIN APPLICATION
 # ==============================
@@ -199,7 +283,13 @@ def main():
         logger.error("TELEGRAM_BOT_TOKEN not configured. ضع TELEGRAM_BOT_TOKEN في .env أو متغيرات البيئة.")
         raise SystemExit("Missing TELEGRAM_BOT_TOKEN")
 
-    application = Application.builder().token(config.TELEGRAM_BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(config.TELEGRAM_BOT_TOKEN)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # تمرير نسخة البوت لوحدة الاشعارات (مهم ليعمل notify_user/notify_admin)
     set_bot_instance(application.bot)
@@ -218,6 +308,7 @@ def main():
     application.add_handler(CallbackQueryHandler(withdraw_options, pattern="^withdraw_options$"))
     application.add_handler(CallbackQueryHandler(show_balance, pattern="^show_balance$"))
     application.add_handler(CallbackQueryHandler(show_stats, pattern="^show_stats$"))
+    application.add_handler(CallbackQueryHandler(show_admin_stats, pattern="^show_admin_stats$"))
     application.add_handler(CallbackQueryHandler(show_help, pattern="^show_help$"))
 
     # تسجيل كل الهاندلرز
@@ -232,6 +323,12 @@ def main():
     register_admin_handlers(application)
     register_address_handlers(application)
     register_admin_setting_handlers(application)
+    register_broadcast_handlers(application)
+    register_history_handlers(application)
+    register_export_handlers(application)
+    register_audit_search_handlers(application)
+    register_claim_handlers(application)
+    register_debounce_handlers(application)
 
     try:
         print("🤖 البوت يعمل الآن...")
@@ -0,0 +1,181 @@
+# services/broadcast.py
+"""
+بث رسالة لكل المستخدمين كمهمة قابلة للاستئناف.
+
+المستلمون يُقرأون من users على دفعات بترتيب id (keyset)، وتُرسل الرسائل بمعدل
+BROADCAST_RATE عبر مسار BULK في المُجدول الصادر حتى لا تزاحم رسائل المعاملات.
+بعد كل دفعة يُحفظ آخر id في جدول broadcasts، فإعادة التشغيل تكمل من نقطة الحفظ
+(قد تتكرر رسائل الدفعة التي كانت قيد الإرسال). من حظر البوت أو حُذف حسابه يُعلّم
+في users.blocked_at ويُتخطى في البث التالي. رسالة حالة واحدة تُحدّث أثناء التقدم.
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+
+import config
+import store
+from services.resilience import TokenBucket
+from utils.notifications import outbound, PRIORITY_ADMIN, PRIORITY_BULK
+
+logger = logging.getLogger(__name__)
+
+# أخطاء Telegram التي تعني أن المستخدم لن يستقبل رسائل (Forbidden أو محادثة غير موجودة)
+_GONE_MARKERS = ("blocked", "deactivated", "chat not found", "user not found", "kicked")
+
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+
+def _recipient_gone(exc: BaseException) -> bool:
+    if type(exc).__name__ == "Forbidden":
+        return True
+    text = str(exc).lower()
+    return any(marker in text for marker in _GONE_MARKERS)
+
+
+def _consume_exception(fut: asyncio.Future):
+    if not fut.cancelled():
+        fut.exception()
+
+
+class Broadcaster:
+    def __init__(self, rate: float, chunk_size: int, progress_seconds: float):
+        self.chunk_size = max(1, chunk_size)
+        self.progress_seconds = progress_seconds
+        self._bucket = TokenBucket(rate, capacity=1)
+        self._task: Optional[asyncio.Task] = None
+        self._cancel_requested = False
+        self.job: Optional[dict] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._task and not self._task.done())
+
+    # ---------- lifecycle ----------
+    async def resume(self):
+        """يُستدعى عند بدء التطبيق: يكمل أي بث بقي running من تشغيل سابق."""
+        job = await run_db(store.get_active_broadcast)
+        if job:
+            logger.info("Resuming broadcast #%s after user id %s", job["id"], job["last_user_id"])
+            self._launch(job)
+
+    async def start(self, text: str, parse_mode: Optional[str], created_by: int,
+                    status_chat_id: int, status_message_id: int) -> Optional[int]:
+        if self.running:
+            return None
+        broadcast_id = await run_db(store.create_broadcast, text, parse_mode, created_by,
+                                    status_chat_id, status_message_id)
+        if not broadcast_id:
+            return None
+        self._launch(await run_db(store.get_broadcast, broadcast_id))
+        return broadcast_id
+
+    def cancel(self) -> bool:
+        if not self.running:
+            return False
+        self._cancel_requested = True
+        return True
+
+    async def stop(self):
+        # الإيقاف عند الإغلاق يترك الحالة running ليُستأنف البث في التشغيل التالي
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _launch(self, job: dict):
+        self.job = dict(job)
+        self._cancel_requested = False
+        self._task = asyncio.create_task(self._run(), name=f"broadcast_{job['id']}")
+
+    # ---------- run ----------
+    async def _run(self):
+        job = self.job
+        last_report = 0.0
+        try:
+            while not self._cancel_requested:
+                rows = await run_db(store.get_broadcast_recipients, job["last_user_id"], self.chunk_size)
+                if not rows:
+                    break
+                futures = []
+                for row in rows:
+                    wait = self._bucket.try_acquire()
+                    while wait > 0:
+                        await asyncio.sleep(wait)
+                        wait = self._bucket.try_acquire()
+                    fut = outbound.submit(
+                        "send_message", row["telegram_id"], PRIORITY_BULK, raise_errors=True,
+                        text=job["text"], parse_mode=job["parse_mode"],
+                    )
+                    # إن أُوقفت المهمة قبل gather لا نريد تحذير "exception was never retrieved"
+                    fut.add_done_callback(_consume_exception)
+                    futures.append(fut)
+                results = await asyncio.gather(*futures, return_exceptions=True)
+
+                sent, failed, blocked_ids = 0, 0, []
+                for row, res in zip(rows, results):
+                    if not isinstance(res, BaseException):
+                        sent += 1
+                    elif _recipient_gone(res):
+                        blocked_ids.append(row["id"])
+                    else:
+                        failed += 1
+                job["last_user_id"] = rows[-1]["id"]
+                await run_db(store.checkpoint_broadcast, job["id"], job["last_user_id"], sent, failed, blocked_ids)
+                job["sent"] += sent
+                job["failed"] += failed
+                job["blocked"] += len(blocked_ids)
+
+                if time.monotonic() - last_report >= self.progress_seconds:
+                    last_report = time.monotonic()
+                    await self._report("running")
+
+            job["status"] = "cancelled" if self._cancel_requested else "done"
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Broadcast #%s failed", job["id"])
+            job["status"] = "failed"
+        await run_db(store.finish_broadcast, job["id"], job["status"])
+        await self._report(job["status"])
+
+    async def _report(self, status: str):
+        job = self.job
+        if not job.get("status_chat_id") or not job.get("status_message_id"):
+            return
+        await outbound.submit(
+            "edit_message_text", job["status_chat_id"], PRIORITY_ADMIN,
+            message_id=job["status_message_id"], text=format_progress(job, status),
+        )
+
+    def stats(self) -> Optional[dict]:
+        if not self.job:
+            return None
+        return {**self.job, "status": "running" if self.running else self.job.get("status")}
+
+
+def format_progress(job: dict, status: str) -> str:
+    labels = {"running": "⏳ جارٍ الإرسال", "done": "✅ اكتمل", "cancelled": "⛔ أُلغي", "failed": "❌ توقف بسبب خطأ"}
+    processed = job["sent"] + job["failed"] + job["blocked"]
+    total = job.get("total") or 0
+    percent = f" ({processed * 100 // total}%)" if total else ""
+    return (
+        f"📣 البث #{job['id']} — {labels.get(status, status)}\n\n"
+        f"👥 المعالجون: {processed:,} من {total:,}{percent}\n"
+        f"✅ أُرسلت: {job['sent']:,}\n"
+        f"🚫 حظروا البوت/محذوفون: {job['blocked']:,}\n"
+        f"❌ فشلت: {job['failed']:,}"
+    )
+
+
+broadcaster = Broadcaster(
+    rate=config.BROADCAST_RATE,
+    chunk_size=config.BROADCAST_CHUNK_SIZE,
+    progress_seconds=config.BROADCAST_PROGRESS_SECONDS,
+)
@@ -0,0 +1,95 @@
+# services/bulk_actions.py
+"""
+موافقة/رفض جماعي لطلبات معلقة من نفس النوع.
+
+كل نوع يصف: الجدول وقيمة الطلب بالـ NSP (للفلترة "أقل من X"). حالة الموافقة والمبلغ الذي يضاف
+للرصيد أو يُعاد ونص إشعار المستخدم تأتي من انتقالات approve/reject في services.transitions.
+التنفيذ كله في store.bulk_transition ضمن معاملة واحدة؛ الإشعارات تُكتب في outbox.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+import store
+from services import transitions
+from services.coinex_withdraw_queue import withdraw_queue, client_id_for
+from services.events import publish_resolved
+from services.outbox_dispatcher import dispatcher
+from services.rates import rates
+from utils.notifications import admin_tx_key, resolve_admin_messages
+
+logger = logging.getLogger(__name__)
+
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+
+@dataclass(frozen=True)
+class BulkKind:
+    table: str
+    label: str
+    value_sql: str                                    # قيمة الطلب بالـ NSP؛ %s = سعر USD إن لزم
+    uses_rate: bool = False
+
+    @property
+    def machine(self) -> transitions.Machine:
+        return transitions.machine(self.table)
+
+    @property
+    def approve_status(self) -> str:
+        return self.machine.transition("approve").target
+
+
+BULK_KINDS = {
+    "syriatel_dep": BulkKind("syriatel_transactions", "إيداعات Syriatel", "amount"),
+    "shamcash_dep": BulkKind("shamcash_transactions", "إيداعات ShamCash",
+                             "CASE WHEN currency = 'USD' THEN amount * COALESCE(quote_rate, %s) ELSE amount END",
+                             uses_rate=True),
+    "syriatel_wd": BulkKind("syriatel_withdrawals", "سحوبات Syriatel", "amount"),
+    "shamcash_wd": BulkKind("shamcash_withdrawals", "سحوبات ShamCash", "requested_amount"),
+    "coinex_wd": BulkKind("coinex_withdrawals", "سحوبات CoinEx", "nsp_amount"),
+}
+
+
+async def preview(kind: BulkKind, ids=None, max_value=None, approve: bool = True) -> list:
+    """[{id, user_id, value}] للطلبات المطابقة التي يقبلها الانتقال (pending، و error لرفض CoinEx)."""
+    params = ()
+    if kind.uses_rate:
+        params = (await rates.rate(),)
+    t = kind.machine.transition("approve" if approve else "reject")
+    return await run_db(store.get_pending_for_bulk, kind.table, kind.value_sql, max_value=max_value,
+                        ids=ids, value_params=params, statuses=t.sources)
+
+
+async def execute(kind: BulkKind, ids, approve: bool, actor: str, actor_name: str, reason: Optional[str] = None,
+                  respect_claims: bool = True) -> list:
+    """ينفذ الإجراء على ids (ما زال منها في حالات مصدر الانتقال فقط) ويرجع الصفوف التي تغيرت.
+    respect_claims=False للمنفذ الآلي: الطلبات المحجوزة لمشرفين لا تُتخطى."""
+    # نفس انتقال الموافقة/الرفض الفردي (services.transitions) لكن لكل الطلبات في معاملة واحدة
+    m = kind.machine
+    t = m.transition("approve" if approve else "reject")
+    rate = await rates.rate() if t.uses_rate else 0
+    ctx = transitions.Ctx(actor, reason, rate=rate)
+    rows = await run_db(
+        store.bulk_transition, kind.table, ids, t.target, actor, m.audit_source, reason=reason,
+        credit=(lambda r: t.balance(r, ctx)) if t.balance else None,
+        notify=(lambda r: t.notify(r, ctx)) if t.notify else None, parse_mode=t.parse_mode,
+        enqueue_client_id=client_id_for if t.enqueue else None, from_statuses=t.sources, stamp=t.stamp,
+        respect_claims=respect_claims,
+    )
+    if approve:
+        line = f"✅ وافق عليه {actor_name} (إجراء جماعي)"
+    else:
+        line = f"🚫 رفضه {actor_name} (إجراء جماعي) — السبب: {reason}"
+    if not rows:
+        return []
+    for r in rows:
+        publish_resolved(kind.table, r["id"], t.target, actor=actor)
+    dispatcher.wake()
+    if t.enqueue:
+        withdraw_queue.wake()
+    await asyncio.gather(*(resolve_admin_messages(admin_tx_key(kind.table, r["id"]), line) for r in rows))
+    return rows
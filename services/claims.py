@@ -0,0 +1,142 @@
+# services/claims.py
+"""
+حجز الطلبات المعلقة للمراجعة حتى لا يعمل مشرفان على نفس الطلب.
+
+الحجز compare-and-set على صف الطلب نفسه (store.claim_transaction): ينجح فقط إن كان الطلب pending
+وغير محجوز أو محجوزاً لنفس المشرف أو انتهت مدته، وينتهي تلقائياً بعد CLAIM_TTL_SECONDS.
+المُسنِد الخلفي يوزع كل طلب جديد (من ناقل الأحداث) وكل طلب انتهى حجزه على المشرف الأقل حملاً،
+مع تدوير بين المتساوين، وينشر حدث "claimed" للوحة.
+"""
+import asyncio
+import logging
+from typing import Optional
+
+import config
+import store
+from services.events import bus
+
+logger = logging.getLogger(__name__)
+
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+
+def holder_label(actor: str) -> str:
+    # admin_<telegram id> لا يحمل اسماً؛ نعرضه كما هو مختصراً
+    return actor.replace("admin_", "المشرف ").replace("web_", "لوحة الويب: ")
+
+
+def held_text(holder: str, until) -> str:
+    return f"🔒 هذا الطلب محجوز لـ {holder_label(holder)}" + (f" حتى {until.strftime('%H:%M')}." if until else ".")
+
+
+def _publish(table: str, row: dict):
+    bus.publish("claimed", table, row["id"], claimed_by=row["claimed_by"], claimed_until=row["claimed_until"])
+
+
+async def acquire(table: str, tx_id: int, actor: str) -> Optional[dict]:
+    """يحجز (أو يمدد حجز) الطلب لـ actor؛ يرجع حالة الصف (claimed / claimed_by / claimed_until / status)."""
+    row = await run_db(store.claim_transaction, table, tx_id, actor, config.CLAIM_TTL_SECONDS)
+    if row and row["acquired"] and row["claimed"]:
+        _publish(table, row)
+    return row
+
+
+async def release(table: str, tx_id: int, actor: str):
+    await run_db(store.release_claim, table, tx_id, actor)
+    bus.publish("claimed", table, tx_id, claimed_by=None, claimed_until=None)
+
+
+def assignees() -> list:
+    if config.CLAIM_ASSIGNEES:
+        return list(config.CLAIM_ASSIGNEES)
+    return [f"admin_{admin_id}" for admin_id in config.ADMIN_IDS]
+
+
+class ClaimAssigner:
+    def __init__(self, sweep_seconds: float, batch: int = 100):
+        self.sweep_seconds = sweep_seconds
+        self.batch = batch
+        self._task: Optional[asyncio.Task] = None
+        self._rr = 0
+        self.assigned = 0
+        self.conflicts = 0
+
+    def start(self):
+        if len(assignees()) == 0 or self.sweep_seconds <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop(), name="claim_assigner")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def pick(self, loads: dict, exclude: Optional[str] = None) -> str:
+        """الأقل حملاً؛ التعادل يُكسر بالتدوير. exclude: صاحب الحجز المنتهي (إن وُجد غيره)."""
+        pool = assignees()
+        if exclude in pool and len(pool) > 1:
+            pool = [a for a in pool if a != exclude]
+        start = self._rr % len(pool)
+        ordered = pool[start:] + pool[:start]
+        self._rr += 1
+        return min(ordered, key=lambda a: loads.get(a, 0))
+
+    async def assign(self, table: str, tx_id: int, loads: dict, previous: Optional[str] = None) -> bool:
+        actor = self.pick(loads, exclude=previous)
+        row = await run_db(store.claim_transaction, table, tx_id, actor, config.CLAIM_TTL_SECONDS)
+        if not row or not row["claimed"]:
+            # سبقه مشرف بالضغط على الطلب أو عولج بالفعل
+            self.conflicts += 1
+            return False
+        loads[actor] = loads.get(actor, 0) + 1
+        self.assigned += 1
+        _publish(table, row)
+        return True
+
+    async def sweep_once(self) -> int:
+        loads = await run_db(store.get_claim_loads)
+        assigned = 0
+        for table in store.CLAIM_TABLES:
+            for row in await run_db(store.get_unclaimed_pending, table, self.batch):
+                assigned += await self.assign(table, row["id"], loads, previous=row["claimed_by"])
+        if assigned:
+            logger.info("Claim sweep assigned %s pending requests", assigned)
+        return assigned
+
+    async def _loop(self):
+        sub = None
+        while True:
+            try:
+                if sub is None:
+                    sub, _, _ = bus.subscribe()
+                    await self.sweep_once()
+                try:
+                    event = await sub.get(self.sweep_seconds)
+                except EOFError:
+                    sub = None  # فُصل لامتلاء الطابور؛ الاشتراك من جديد يبدأ بمسح كامل
+                    continue
+                if event is None:
+                    await self.sweep_once()
+                elif event.type == "new" and event.table in store.CLAIM_TABLES:
+                    await self.assign(event.table, event.tx_id, await run_db(store.get_claim_loads))
+            except asyncio.CancelledError:
+                if sub:
+                    sub.close()
+                raise
+            except Exception:
+                logger.exception("Claim assignment pass failed")
+                await asyncio.sleep(self.sweep_seconds)
+
+    def stats(self) -> dict:
+        return {"assignees": len(assignees()), "assigned": self.assigned, "conflicts": self.conflicts}
+
+
+assigner = ClaimAssigner(config.CLAIM_SWEEP_SECONDS)
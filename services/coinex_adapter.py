@@ -7,8 +7,46 @@ import requests
 from urllib.parse import urlencode
 import config
 import asyncio
+from services.resilience import TokenBucket, CircuitBreaker, backoff_delay
 
-COINEX_BASE = "https://api.coinex.com"  # v2 endpoints are under /v2/
+
+def base_url() -> str:
+    """يُقرأ من config عند كل طلب (v2 endpoints are under /v2/)؛ توجيهه لخادم محلي أثناء التشغيل يسري فوراً."""
+    return config.COINEX_BASE_URL.rstrip("/")
+
+
+# تصنيف المسارات: السحب (POST) له حد وقاطع دارة مستقل عن طلبات القراءة
+WITHDRAW_PATHS = {"/assets/withdraw"}
+
+_limiters = {
+    "read": TokenBucket(config.COINEX_READ_RATE),
+    "withdraw": TokenBucket(config.COINEX_WITHDRAW_RATE),
+}
+_breakers = {
+    name: CircuitBreaker(f"coinex_{name}", config.COINEX_BREAKER_THRESHOLD, config.COINEX_BREAKER_RESET)
+    for name in ("read", "withdraw")
+}
+
+
+def _is_transient(res) -> bool:
+    """أخطاء الشبكة و429 و5xx تعتبر عابرة وتُحسب على قاطع الدارة؛ أخطاء 4xx الأخرى لا."""
+    if not isinstance(res, dict):
+        return False
+    err = res.get("error")
+    if err == "request-failed":
+        return True
+    if err == "http-error":
+        code = res.get("status_code") or 0
+        return code == 429 or code >= 500
+    return False
+
+
+def get_coinex_health() -> dict:
+    """حالة قواطع الدارة والتوكنات المتاحة لعرضها على المشرفين."""
+    return {
+        name: {**_breakers[name].snapshot(), "tokens": round(_limiters[name].available, 2)}
+        for name in _breakers
+    }
 
 def timestamp_ms():
     return str(int(time.time() * 1000))
@@ -36,6 +74,39 @@ class CoinExClient:
 
     def _request(self, method: str, path: str, params: dict = None, data: dict = None):
         method = method.upper()
+        endpoint_class = "withdraw" if method == "POST" and path in WITHDRAW_PATHS else "read"
+        breaker = _breakers[endpoint_class]
+        # إعادة المحاولة فقط لطلبات GET لأنها idempotent؛ السحب لا يعاد تلقائياً أبداً
+        attempts = 1 + max(0, config.COINEX_MAX_RETRIES) if method == "GET" else 1
+        res = None
+        for attempt in range(1, attempts + 1):
+            if not breaker.allow_request():
+                return {
+                    "error": "circuit-open",
+                    "error_desc": f"CoinEx {endpoint_class} circuit is open",
+                    "retry_after": round(breaker.retry_after(), 1),
+                }
+            if not _limiters[endpoint_class].acquire(timeout=config.COINEX_RATE_WAIT):
+                # لم نرسل شيئاً؛ نحرر الطلب التجريبي إن كانت الدارة half-open
+                breaker.release_trial()
+                return {"error": "rate-limited", "error_desc": f"local {endpoint_class} rate limit exceeded"}
+            res, retry_after = self._send(method, path, params, data)
+            if not _is_transient(res):
+                breaker.record_success()
+                return res
+            breaker.record_failure(res.get("error_desc") or res.get("text") or res.get("error"))
+            if attempt < attempts:
+                if retry_after and retry_after > config.COINEX_BACKOFF_CAP:
+                    # الخادم يطلب انتظاراً أطول مما يحتمله handler؛ نعيد الخطأ بدل حجز الخيط
+                    break
+                delay = backoff_delay(attempt, config.COINEX_BACKOFF_BASE, config.COINEX_BACKOFF_CAP)
+                time.sleep(max(delay, retry_after or 0.0))
+        return res
+
+    def _send(self, method: str, path: str, params: dict = None, data: dict = None):
+        """
+        إرسال طلب واحد موقّع. يرجع (response_dict, retry_after_seconds).
+        """
         params = params or {}
         data = data or {}
         request_path = f"/v2{path}"
@@ -44,22 +115,28 @@ class CoinExClient:
         ts = timestamp_ms()
         sign = sign_payload(self.secret_key, method, request_path, query_string, body_str, ts)
         headers = self._headers(sign, ts)
-        url = COINEX_BASE + request_path
+        url = base_url() + request_path
         try:
             if method == "GET":
-                resp = requests.get(url, params=params, headers=headers, timeout=15)
+                resp = requests.get(url, params=params, headers=headers, timeout=config.COINEX_TIMEOUT)
             elif method == "POST":
-                resp = requests.post(url, json=data, headers=headers, timeout=15)
+                # نرسل نفس السلسلة التي تم توقيعها حرفياً
+                resp = requests.post(url, data=body_str.encode("utf-8"), headers=headers, timeout=config.COINEX_TIMEOUT)
             else:
                 raise ValueError("Unsupported HTTP method")
             resp.raise_for_status()
-            return resp.json()
+            return resp.json(), None
         except requests.exceptions.HTTPError as e:
-            return {"error": "http-error", "status_code": e.response.status_code, "text": e.response.text}
+            retry_after = None
+            try:
+                retry_after = float(e.response.headers.get("Retry-After"))
+            except (TypeError, ValueError):
+                pass
+            return {"error": "http-error", "status_code": e.response.status_code, "text": e.response.text}, retry_after
         except requests.exceptions.RequestException as e:
-            return {"error": "request-failed", "error_desc": str(e)}
+            return {"error": "request-failed", "error_desc": str(e)}, None
         except Exception as e:
-            return {"error": "unexpected-error", "error_desc": str(e)}
+            return {"error": "unexpected-error", "error_desc": str(e)}, None
 
     def get_deposit_address(self, coin: str, chain: str = None):
         path = "/assets/deposit-address"
@@ -75,7 +152,7 @@ class CoinExClient:
             params["chain"] = chain
         return self._request("GET", path, params=params)
 
-    def withdraw(self, coin: str, to_address: str, amount: float, chain: str = None, memo: str = None, extra: dict = None):
+    def withdraw(self, coin: str, to_address: str, amount: float, chain: str = None, memo: str = None, extra: dict = None, remark: str = None):
         path = "/assets/withdraw"
         data = {"ccy": coin, "to_address": to_address, "amount": str(amount)}
         if chain:
@@ -84,8 +161,21 @@ class CoinExClient:
             data["memo"] = memo
         if extra:
             data["extra"] = extra
+        if remark:
+            data["remark"] = remark
         return self._request("POST", path, data=data)
 
+    def get_withdraw_history(self, coin: str = None, withdraw_id: int = None, status: str = None, limit: int = 50, page: int = 1):
+        path = "/assets/withdraw"
+        params = {"limit": limit, "page": page}
+        if coin:
+            params["ccy"] = coin
+        if withdraw_id:
+            params["withdraw_id"] = withdraw_id
+        if status:
+            params["status"] = status
+        return self._request("GET", path, params=params)
+
 _coinex_client = None
 
 def get_coinex_client():
@@ -110,7 +200,36 @@ async def get_deposit_history(coin: str, chain: str = None, limit: int = 10, pag
     loop = asyncio.get_running_loop()
     return await loop.run_in_executor(None, lambda: client.get_deposit_history(coin, chain, limit, page))
 
-async def withdraw_coinex(coin: str, to_address: str, amount: float, chain: str = None, memo: str = None):
+async def withdraw_coinex(coin: str, to_address: str, amount: float, chain: str = None, memo: str = None, remark: str = None):
     client = get_coinex_client()
     loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, lambda: client.withdraw(coin, to_address, amount, chain, memo))
+    return await loop.run_in_executor(None, lambda: client.withdraw(coin, to_address, amount, chain, memo, remark=remark))
+
+async def get_withdraw_history(coin: str = None, withdraw_id: int = None, status: str = None, limit: int = 50, page: int = 1):
+    client = get_coinex_client()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: client.get_withdraw_history(coin, withdraw_id, status, limit, page))
+
+async def scan_withdraw_history(coin: str, since_ms: int, page_size: int = 100, max_pages: int = 20, done=None):
+    """
+    يقرأ سجل السحوبات من الأحدث صفحةً صفحة حتى يتجاوز since_ms (created_at بالميلي ثانية) أو ينتهي السجل.
+    done(items) اختياري: يوقف المسح مبكراً عندما يرجع True (وُجد كل المطلوب).
+    يرجع (items, complete, error, pages): complete=False إن فشل طلب أو بلغنا max_pages قبل تجاوز since_ms،
+    أي أن غياب سحب عن items لا يعني أنه لم يُرسل.
+    """
+    items = []
+    for page in range(1, max(1, max_pages) + 1):
+        res = await get_withdraw_history(coin=coin, limit=page_size, page=page)
+        if not isinstance(res, dict) or res.get("error") or res.get("code") not in (0, None):
+            return items, False, res, page
+        batch = res.get("data") or []
+        items.extend(batch)
+        if done and done(items):
+            return items, True, None, page
+        if len(batch) < page_size:
+            return items, True, None, page
+        oldest = min((int(i.get("created_at") or 0) for i in batch), default=0)
+        # سجل بلا created_at لا يُعرف موضعه من since_ms؛ نتابع حتى نهايته أو حد الصفحات
+        if oldest and oldest < since_ms:
+            return items, True, None, page
+    return items, False, None, max(1, max_pages)
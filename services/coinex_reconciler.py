@@ -0,0 +1,164 @@
+# services/coinex_reconciler.py
+"""
+مطابقة حالة سحوبات CoinEx بعد إرسالها.
+
+السحب المرسل يبقى processing حتى يؤكده سجل السحوبات في CoinEx: finished → completed،
+و cancelled/failed → failed مع إعادة الرصيد في معاملة واحدة. الاستطلاع متكيّف:
+سريع ما دامت هناك سحوبات مفتوحة، وبطيء عندما لا يوجد شيء، ويُوقظ فوراً عند إرسال سحب جديد.
+صفحات السجل تُقرأ حتى ما قبل إرسال أقدم سحب مفتوح لم يُعثر عليه (approved_at، بهامش فرق الساعة)
+وبحد أقصى COINEX_RECONCILE_MAX_PAGES؛ سحب أقدم من نافذة الحد يُبلّغ عنه المشرفون مرة واحدة.
+"""
+import asyncio
+import logging
+from typing import Optional
+
+import config
+import store
+from services.coinex_adapter import scan_withdraw_history
+from services.outbox_dispatcher import dispatcher
+from utils.notifications import notify_admin
+
+logger = logging.getLogger(__name__)
+
+COMPLETED_STATES = {"finished"}
+FAILED_STATES = {"cancelled", "failed"}
+
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+
+class CoinExReconciler:
+    def __init__(self, fast_seconds: float, idle_seconds: float, page_size: int, max_pages: int):
+        self.fast_seconds = fast_seconds
+        self.idle_seconds = idle_seconds
+        self.page_size = max(1, page_size)
+        self.max_pages = max(1, max_pages)
+        self._alerted: set = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.last_open = 0
+        self.api_calls = 0
+        self.completed = 0
+        self.refunded = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop(), name="coinex_reconciler")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def _loop(self):
+        while True:
+            try:
+                self.last_open = await self.reconcile_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("CoinEx reconciliation pass failed")
+            delay = self.fast_seconds if self.last_open else self.idle_seconds
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def reconcile_once(self) -> int:
+        """دورة واحدة؛ ترجع عدد السحوبات التي بقيت مفتوحة."""
+        open_rows = await run_db(store.get_open_coinex_withdrawals)
+        if not open_rows:
+            return 0
+        # السحوبات التي لم نجدها بعد في صفحات السجل
+        unseen = {str(r["coinex_txid"]): r for r in open_rows}
+        self._alerted &= {r["id"] for r in open_rows}
+
+        completed, failed = [], []
+        # نقرأ حتى ما قبل إرسال أقدم سحب مفتوح (لا بعدد الصفحات)، ونتوقف مبكراً إن وُجدت كلها
+        oldest = min((r["approved_at"] for r in open_rows if r.get("approved_at")), default=None)
+        since_ms = int((oldest.timestamp() - config.COINEX_HISTORY_SKEW_SECONDS) * 1000) if oldest else 0
+        wanted = set(unseen)
+        items, complete, error, pages = await scan_withdraw_history(
+            "USDT", since_ms, page_size=self.page_size, max_pages=self.max_pages,
+            done=lambda got: wanted <= {str(i.get("withdraw_id") or i.get("id")) for i in got},
+        )
+        self.api_calls += pages
+        if error is not None:
+            logger.warning("CoinEx withdraw history unavailable: %s", error)
+        for item in items:
+            row = unseen.pop(str(item.get("withdraw_id") or item.get("id")), None)
+            if not row:
+                continue
+            state = str(item.get("status") or "").lower()
+            if state in COMPLETED_STATES:
+                completed.append(row)
+            elif state in FAILED_STATES:
+                failed.append((row, state))
+            # غير ذلك: لا يزال قيد المعالجة على الشبكة
+        if unseen and error is None:
+            await self._report_missing(list(unseen.values()), complete, len(items))
+
+        if completed:
+            done = await run_db(
+                store.complete_coinex_withdrawals,
+                [(r["id"], r["user_id"], f"✅ اكتمل سحب CoinEx #{r['id']} على الشبكة.") for r in completed]
+            )
+            self.completed += len(done)
+
+        if failed:
+            refunded = await run_db(
+                store.fail_and_refund_coinex_withdrawals,
+                [(r["id"], r["user_id"], r["nsp_amount"], f"CoinEx status: {state}",
+                  f"🚫 فشل سحب CoinEx #{r['id']} من طرف المنصة.\n✅ تم إعادة رصيد {int(r['nsp_amount']):,} NSP إلى حسابك.")
+                 for r, state in failed]
+            )
+            self.refunded += len(refunded)
+
+        if completed or failed:
+            # الإشعارات كُتبت في outbox ضمن نفس المعاملة
+            dispatcher.wake()
+
+        return len(open_rows) - len(completed) - len(failed)
+
+    async def _report_missing(self, rows: list, complete: bool, scanned: int):
+        """سحوبات مفتوحة لم تظهر في السجل المقروء: خارج نافذة الحد، أو غير موجودة في CoinEx أصلاً."""
+        ids = [r["id"] for r in rows]
+        if complete:
+            logger.warning("CoinEx withdrawals %s not found in history back to their submit time", ids)
+        else:
+            logger.warning("CoinEx withdrawals %s older than the %s history records scanned (%s pages)",
+                           ids, scanned, self.max_pages)
+        new = [i for i in ids if i not in self._alerted]
+        if not new:
+            return
+        self._alerted.update(new)
+        why = ("غير موجودة في سجل CoinEx" if complete
+               else f"أقدم من آخر {scanned} سجل (COINEX_RECONCILE_MAX_PAGES={self.max_pages})")
+        await notify_admin(f"⚠️ سحوبات CoinEx قيد المعالجة لا يمكن مطابقتها آلياً ({why}): "
+                           f"{', '.join(f'#{i}' for i in new)}\nيرجى التحقق منها يدوياً.")
+
+    def stats(self) -> dict:
+        return {
+            "open": self.last_open,
+            "api_calls": self.api_calls,
+            "completed": self.completed,
+            "refunded": self.refunded,
+        }
+
+
+reconciler = CoinExReconciler(
+    fast_seconds=config.COINEX_RECONCILE_FAST_SECONDS,
+    idle_seconds=config.COINEX_RECONCILE_IDLE_SECONDS,
+    page_size=config.COINEX_RECONCILE_PAGE_SIZE,
+    max_pages=config.COINEX_RECONCILE_MAX_PAGES,
+)
@@ -0,0 +1,258 @@
+# services/coinex_withdraw_queue.py
+"""
+قائمة تنفيذ دائمة لسحوبات CoinEx الموافق عليها.
+
+موافقة المشرف تضيف صفاً إلى coinex_withdraw_queue وتعود فوراً؛ مجموعة عمّال
+تسحب المهام من الجدول بتوازٍ محدود وترسلها إلى CoinEx. كل مهمة تحمل client_id
+ثابتاً يُرسل كـ remark، فإعادة المحاولة بعد نتيجة غامضة (timeout بعد الإرسال
+أو انهيار العملية) تبحث أولاً في سجل السحوبات بدل الإرسال مرة ثانية.
+البحث يقرأ السجل حتى ما قبل إضافة المهمة للقائمة؛ إن لم يكتمل (حد الصفحات أو فشل متكرر)
+يُنقل السحب إلى error للمراجعة اليدوية بدل إعادة الإرسال.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import config
+import store
+from services.coinex_adapter import withdraw_coinex, scan_withdraw_history
+from services.coinex_reconciler import reconciler
+from services import transitions
+from services.resilience import backoff_delay
+from utils.notifications import notify_admin
+
+logger = logging.getLogger(__name__)
+
+# أخطاء لم تصل فيها العملية إلى CoinEx أو فشلت مؤقتاً؛ يعاد جدولتها
+_TRANSIENT_ERRORS = {"circuit-open", "rate-limited", "request-failed"}
+
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+
+def client_id_for(withdrawal_id: int) -> str:
+    return f"ichancy-wd-{withdrawal_id}"
+
+
+def _is_transient(res) -> bool:
+    if not isinstance(res, dict):
+        return False
+    if res.get("error") in _TRANSIENT_ERRORS:
+        return True
+    if res.get("error") == "http-error":
+        code = res.get("status_code") or 0
+        return code == 429 or code >= 500
+    return False
+
+
+def _since_ms(job: dict) -> int:
+    enqueued = job.get("enqueued_at")
+    if not enqueued:
+        return 0
+    return int((enqueued.timestamp() - config.COINEX_HISTORY_SKEW_SECONDS) * 1000)
+
+
+def _extract_txid(data) -> Optional[str]:
+    if not isinstance(data, dict):
+        return None
+    txid = data.get("id") or data.get("withdraw_id") or data.get("order_id")
+    return str(txid) if txid else None
+
+
+class CoinExWithdrawQueue:
+    def __init__(self, concurrency: int, poll_seconds: float, max_attempts: int, lock_seconds: int):
+        self.concurrency = max(1, concurrency)
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.lock_seconds = lock_seconds
+        self._sem = asyncio.Semaphore(self.concurrency)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight: set = set()
+        # عدادات للعرض: توقيتات الإنجاز خلال آخر ساعة
+        self._completed_at: deque = deque()
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+
+    # ---------- lifecycle ----------
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._dispatch_loop(), name="coinex_withdraw_queue")
+            logger.info("CoinEx withdraw queue started (concurrency=%s)", self.concurrency)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def wake(self):
+        self._wakeup.set()
+
+    # ---------- dispatch ----------
+    async def _dispatch_loop(self):
+        while True:
+            try:
+                free = self.concurrency - len(self._in_flight)
+                jobs = []
+                if free > 0:
+                    jobs = await run_db(
+                        store.claim_coinex_withdraw_jobs, uuid.uuid4().hex, free, self.lock_seconds
+                    )
+                for job in jobs:
+                    task = asyncio.create_task(self._run_job(job))
+                    self._in_flight.add(task)
+                    task.add_done_callback(self._in_flight.discard)
+                if jobs and len(jobs) == free:
+                    # قد يكون هناك المزيد؛ ننتظر تحرر عامل بدل مهلة الاستطلاع الكاملة
+                    await asyncio.wait(set(self._in_flight), return_when=asyncio.FIRST_COMPLETED)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("CoinEx withdraw queue dispatch error")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _run_job(self, job: dict):
+        async with self._sem:
+            try:
+                await self._execute(job)
+            except Exception as e:
+                logger.exception("Unhandled error executing CoinEx withdraw job %s", job.get("job_id"))
+                await self._reschedule(job, f"Internal error: {e}")
+
+    async def _execute(self, job: dict):
+        if job.get("withdrawal_status") != "approved_by_admin":
+            # رُفض أو عولج بطريقة أخرى بعد الإضافة للقائمة
+            await run_db(store.finish_coinex_withdraw_job, job["job_id"], "cancelled",
+                         f"withdrawal status is {job.get('withdrawal_status')}")
+            return
+
+        client_id = job["client_id"]
+        if job["attempts"] > 1:
+            # محاولة سابقة ربما وصلت إلى CoinEx؛ نتحقق من السجل قبل الإرسال مجدداً
+            def mine(items):
+                return any(i.get("remark") == client_id for i in items)
+            items, complete, error, _ = await scan_withdraw_history(
+                "USDT", _since_ms(job), max_pages=config.COINEX_HISTORY_MAX_PAGES, done=mine)
+            for item in items:
+                if item.get("remark") == client_id:
+                    await self._succeed(job, _extract_txid(item), note="recovered from history")
+                    return
+            if error is not None:
+                await self._reschedule(job, f"history lookup failed: {error}")
+                return
+            if not complete:
+                await self._error(job, f"history lookup inconclusive: {len(items)} records in "
+                                       f"{config.COINEX_HISTORY_MAX_PAGES} pages did not reach the enqueue time")
+                return
+
+        res = await withdraw_coinex(
+            coin="USDT",
+            to_address=job["address"],
+            amount=float(job["usdt_amount"]),
+            chain=job["chain"],
+            remark=client_id,
+        )
+        if isinstance(res, dict) and res.get("code") == 0 and res.get("data"):
+            await self._succeed(job, _extract_txid(res["data"]))
+        elif _is_transient(res):
+            await self._reschedule(job, str(res))
+        else:
+            error_msg = (res.get("message") or res.get("error_desc") or str(res)) if isinstance(res, dict) else str(res)
+            await self._fail(job, f"CoinEx API error: {error_msg}")
+
+    # ---------- outcomes ----------
+    async def _succeed(self, job: dict, coinex_txid: Optional[str], note: str = "Executed via API"):
+        wid = job["withdrawal_id"]
+        if not coinex_txid:
+            await transitions.apply("coinex_withdrawals", wid, "error", "coinex_queue",
+                                    reason="CoinEx API success, but no TxID")
+            await run_db(store.finish_coinex_withdraw_job, job["job_id"], "failed", "no txid in response")
+            self.failed += 1
+            await notify_admin(f"⚠️ تم إرسال سحب CoinEx #{wid} لكن لم يتم استرجاع معرف العملية. يرجى المراجعة.")
+            return
+        # processing حتى يؤكد المُطابِق (coinex_reconciler) اكتمال السحب على الشبكة
+        await transitions.apply("coinex_withdrawals", wid, "submit", "coinex_queue", txid=coinex_txid,
+                                note=f"{note}, CoinEx TxID: {coinex_txid}")
+        await run_db(store.finish_coinex_withdraw_job, job["job_id"], "done")
+        reconciler.wake()
+        self.completed += 1
+        self._completed_at.append(time.monotonic())
+
+    async def _reschedule(self, job: dict, error: str):
+        wid = job["withdrawal_id"]
+        if job["attempts"] >= self.max_attempts:
+            # أخطاء مؤقتة حتى النهاية: لا نعرف إن كانت إحدى المحاولات قد وصلت، فلا إعادة رصيد آلية
+            await self._error(job, f"Gave up after {job['attempts']} attempts: {error}")
+            return
+        delay = max(1, int(backoff_delay(job["attempts"], base=5.0, cap=300.0)))
+        await run_db(store.retry_coinex_withdraw_job, job["job_id"], delay, error[:1000])
+        self.retried += 1
+        logger.warning("CoinEx withdraw #%s rescheduled in %ss: %s", wid, delay, error)
+
+    async def _fail(self, job: dict, reason: str):
+        wid = job["withdrawal_id"]
+        await transitions.apply("coinex_withdrawals", wid, "fail", "coinex_queue", reason=reason[:1000])
+        await run_db(store.finish_coinex_withdraw_job, job["job_id"], "failed", reason[:1000])
+        self.failed += 1
+        await notify_admin(f"❌ فشل تنفيذ سحب CoinEx #{wid} وأُعيد الرصيد للمستخدم.\nالخطأ: {reason[:300]}")
+
+    async def _error(self, job: dict, reason: str):
+        wid = job["withdrawal_id"]
+        await transitions.apply("coinex_withdrawals", wid, "error", "coinex_queue", reason=reason[:1000])
+        await run_db(store.finish_coinex_withdraw_job, job["job_id"], "failed", reason[:1000])
+        self.failed += 1
+        await notify_admin(f"⚠️ سحب CoinEx #{wid} يحتاج مراجعة يدوية: ربما أُرسل.\n"
+                           f"تحقق من سجل السحوبات في CoinEx (remark: {job['client_id']}) قبل أي إجراء؛ "
+                           f"إن لم يُرسل فالرفض يعيد الرصيد للمستخدم.\n"
+                           f"السبب: {reason[:300]}",
+                           reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(
+                               "❌ رفض وإعادة الرصيد", callback_data=f"admin_coinex_reject:{wid}")]]))
+
+    # ---------- metrics ----------
+    def stats(self) -> dict:
+        now = time.monotonic()
+        while self._completed_at and now - self._completed_at[0] > 3600:
+            self._completed_at.popleft()
+        last_5m = sum(1 for t in self._completed_at if now - t <= 300)
+        return {
+            "running": bool(self._task and not self._task.done()),
+            "in_flight": len(self._in_flight),
+            "concurrency": self.concurrency,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "completed_last_5m": last_5m,
+            "completed_last_hour": len(self._completed_at),
+        }
+
+
+withdraw_queue = CoinExWithdrawQueue(
+    concurrency=config.COINEX_WITHDRAW_CONCURRENCY,
+    poll_seconds=config.COINEX_QUEUE_POLL_SECONDS,
+    max_attempts=config.COINEX_QUEUE_MAX_ATTEMPTS,
+    lock_seconds=config.COINEX_QUEUE_LOCK_SECONDS,
+)
+
+
+async def get_queue_stats() -> dict:
+    depth = await run_db(store.get_coinex_withdraw_queue_depth)
+    return {**depth, **withdraw_queue.stats()}
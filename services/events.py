@@ -0,0 +1,138 @@
+# services/events.py
+"""
+ناقل أحداث داخل العملية لطوابير الطلبات المعلقة: new / claimed / resolved.
+
+المعالجات تنشر بعد commit فقط (صف لم يُحفظ لا يجب أن يظهر في اللوحة)، وكل مشترك (اتصال SSE)
+له طابور محدود. آخر EVENTS_REPLAY_SIZE حدثاً محفوظة بأرقام تسلسلية حتى يكمل العميل المعاد
+اتصاله من Last-Event-ID؛ إن كان أقدم من المخزن يتلقى "reset" ويعيد تحميل الصفحة.
+المشترك البطيء الذي يمتلئ طابوره يُفصل بنفس الطريقة بدل أن يبطئ النشر.
+
+النشر متزامن وغير حاجب ويجب أن يتم من حلقة الأحداث (لا من executor).
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ("new", "claimed", "resolved")
+_CLOSED = object()
+
+
+@dataclass
+class Event:
+    seq: int
+    type: str
+    table: str
+    tx_id: int
+    data: dict = field(default_factory=dict)
+    at: float = field(default_factory=time.time)
+
+    def as_dict(self) -> dict:
+        return {"seq": self.seq, "type": self.type, "table": self.table, "tx_id": self.tx_id,
+                "at": self.at, **self.data}
+
+
+class Subscription:
+    def __init__(self, bus: "EventBus", queue_size: int):
+        self._bus = bus
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    async def get(self, timeout: float) -> Optional[Event]:
+        """الحدث التالي، أو None عند انتهاء المهلة؛ يرمي EOFError إن أُغلق الاشتراك."""
+        try:
+            item = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if item is _CLOSED:
+            raise EOFError
+        return item
+
+    def close(self):
+        self._bus._subscribers.discard(self)
+
+
+class EventBus:
+    def __init__(self, replay_size: int, queue_size: int = 1000):
+        self.replay: deque = deque(maxlen=max(1, replay_size))
+        self.queue_size = queue_size
+        self._subscribers: set = set()
+        self._seq = 0
+        self.epoch = int(time.time())
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    def publish(self, type: str, table: str, tx_id: int, **data) -> Event:
+        self._seq += 1
+        event = Event(self._seq, type, table, int(tx_id), data)
+        self.replay.append(event)
+        self.published += 1
+        for sub in list(self._subscribers):
+            try:
+                sub.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._drop(sub)
+        return event
+
+    def _drop(self, sub: Subscription):
+        sub.overflowed = True
+        self._subscribers.discard(sub)
+        self.dropped_subscribers += 1
+        # نفرغ مكاناً لعلامة الإغلاق؛ العميل سيعيد الاتصال بـ Last-Event-ID ويكمل من المخزن
+        try:
+            sub.queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        sub.queue.put_nowait(_CLOSED)
+        logger.warning("Dropped slow event subscriber (queue full)")
+
+    def event_id(self, event: Event) -> str:
+        # epoch يميّز تشغيلات العملية: seq يبدأ من 1 بعد كل إعادة تشغيل
+        return f"{self.epoch}-{event.seq}"
+
+    def subscribe(self, last_event_id: Optional[str] = None):
+        """(subscription, backlog, reset): backlog أحداث المخزن بعد last_event_id؛
+        reset إن كانت هناك فجوة لا يغطيها المخزن (أو المعرّف من تشغيل سابق)."""
+        sub = Subscription(self, self.queue_size)
+        self._subscribers.add(sub)
+        if not last_event_id:
+            return sub, [], False
+        epoch, _, seq = last_event_id.partition("-")
+        if epoch != str(self.epoch) or not seq.isdigit():
+            return sub, [], True
+        last_seq = int(seq)
+        oldest = self.replay[0].seq if self.replay else self._seq + 1
+        if last_seq > self._seq or last_seq < oldest - 1:
+            return sub, [], True
+        return sub, [e for e in self.replay if e.seq > last_seq], False
+
+    def close(self):
+        """ينهي كل الاشتراكات (عند إيقاف الخادم) حتى لا تبقى اتصالات SSE معلقة."""
+        for sub in list(self._subscribers):
+            self._subscribers.discard(sub)
+            try:
+                sub.queue.put_nowait(_CLOSED)
+            except asyncio.QueueFull:
+                self._drop(sub)
+
+    def stats(self) -> dict:
+        return {"subscribers": len(self._subscribers), "published": self.published, "last_seq": self._seq,
+                "replay": len(self.replay), "dropped_subscribers": self.dropped_subscribers}
+
+
+bus = EventBus(config.EVENTS_REPLAY_SIZE)
+
+
+def publish_new(table: str, tx_id: int, **row):
+    """طلب معلق جديد؛ row يحمل ما تحتاجه اللوحة لرسم الصف دون قراءة قاعدة البيانات."""
+    return bus.publish("new", table, tx_id, **row)
+
+
+def publish_resolved(table: str, tx_id: int, status: str, actor: Optional[str] = None):
+    return bus.publish("resolved", table, tx_id, status=status, actor=actor)
@@ -0,0 +1,184 @@
+# services/export.py
+"""
+تصدير العمليات وسجل التدقيق كـ CSV أو JSONL (مع gzip اختياري) بذاكرة ثابتة.
+
+الصفوف تُقرأ من cursor غير مخزَّن (unbuffered): الخادم يرسلها تباعاً ونسحبها بـ fetchmany
+على دفعات، وكل دفعة تُرمَّز وتُسلَّم (bytes) قبل قراءة التالية. نفس المولّد يغذي
+StreamingResponse في لوحة الويب وملفاً مؤقتاً لأمر /export في البوت.
+"""
+import csv
+import io
+import json
+import logging
+import zlib
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Iterator, Optional
+
+import store
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 2000
+FORMATS = ("csv", "jsonl")
+
+TX_COLUMNS = ("method", "id", "user_id", "status", "amount", "currency", "txid", "created_at")
+AUDIT_COLUMNS = ("id", "source", "tx_id", "action", "actor", "reason", "created_at")
+
+
+@dataclass
+class ExportSpec:
+    kind: str                       # "transactions" | "audit"
+    date_from: date
+    date_to: date                   # شامل
+    method: Optional[str] = None    # جدول العمليات أو source في سجل التدقيق
+    status: Optional[str] = None    # status للعمليات أو action لسجل التدقيق
+    fmt: str = "csv"
+    gzip: bool = False
+
+    @property
+    def columns(self):
+        return TX_COLUMNS if self.kind == "transactions" else AUDIT_COLUMNS
+
+    @property
+    def filename(self) -> str:
+        parts = [self.kind, self.method, self.status, f"{self.date_from:%Y%m%d}-{self.date_to:%Y%m%d}"]
+        name = "_".join(p for p in parts if p) + f".{self.fmt}"
+        return name + ".gz" if self.gzip else name
+
+    @property
+    def media_type(self) -> str:
+        if self.gzip:
+            return "application/gzip"
+        return "text/csv" if self.fmt == "csv" else "application/x-ndjson"
+
+
+def validate(spec: ExportSpec) -> Optional[str]:
+    """يرجع رسالة خطأ أو None."""
+    if spec.kind not in ("transactions", "audit"):
+        return "kind must be transactions or audit"
+    if spec.fmt not in FORMATS:
+        return "format must be csv or jsonl"
+    if spec.date_to < spec.date_from:
+        return "date_to is before date_from"
+    if spec.kind == "transactions" and spec.method and spec.method not in store.TRANSACTION_TABLES:
+        return f"unknown method {spec.method}"
+    return None
+
+
+# ---------- rows ----------
+def _queries(spec: ExportSpec):
+    """(sql, params) لكل جدول مصدر؛ كل استعلام range على idx created_at بترتيبه."""
+    start, end = spec.date_from, spec.date_to + timedelta(days=1)
+    if spec.kind == "audit":
+        where, params = ["created_at >= %s", "created_at < %s"], [start, end]
+        if spec.method:
+            where.append("source = %s")
+            params.append(spec.method)
+        if spec.status:
+            where.append("action = %s")
+            params.append(spec.status)
+        yield (f"SELECT {', '.join(AUDIT_COLUMNS)} FROM audit_log WHERE {' AND '.join(where)} "
+               f"ORDER BY created_at, id"), params
+        return
+    for table in ([spec.method] if spec.method else store.HISTORY_METHODS):
+        amount, currency = store.ROLLUP_SOURCES[table]
+        where, params = ["created_at >= %s", "created_at < %s"], [start, end]
+        if spec.status:
+            where.append("status = %s")
+            params.append(spec.status)
+        yield (f"SELECT '{table}', id, user_id, status, {amount}, {currency}, {store.TXID_COLUMNS[table]}, created_at "
+               f"FROM {table} WHERE {' AND '.join(where)} ORDER BY created_at, id"), params
+
+
+def iter_row_chunks(spec: ExportSpec, chunk_rows: int = CHUNK_ROWS) -> Iterator[list]:
+    """دفعات من tuples بترتيب spec.columns، من اتصال مخصص و cursor غير مخزَّن."""
+    conn = store.getDatabaseConnection()
+    cursor = None
+    try:
+        session = conn.cursor()
+        # عميل بطيء (تنزيل عبر الويب) قد يوقف القراءة؛ لا نريد أن يقطع الخادم الاتصال بعد 60 ث
+        session.execute("SET SESSION net_write_timeout = 600")
+        session.close()
+        for sql, params in _queries(spec):
+            cursor = conn.cursor(buffered=False)
+            cursor.execute(sql, tuple(params))
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield rows
+            cursor.close()
+            cursor = None
+    finally:
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Exception:
+                # إغلاق cursor لم تُقرأ كل صفوفه (إلغاء التنزيل) قد يرمي؛ إغلاق الاتصال يكفي
+                pass
+        try:
+            conn.close()
+        except Exception:
+            logger.warning("Export connection closed with unread rows")
+
+
+# ---------- encoding ----------
+def _csv_value(v):
+    return "" if v is None else v
+
+
+def _json_value(v):
+    if v is None or isinstance(v, (int, float, str)):
+        return v
+    return str(v)   # Decimal / datetime
+
+
+def encode(spec: ExportSpec, chunks: Iterator[list]) -> Iterator[bytes]:
+    """يحوّل دفعات الصفوف إلى bytes (CSV أو JSONL، مضغوطة إن طُلب) دفعة بدفعة."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if spec.gzip else None  # wbits=31 → gzip
+
+    def out(text: str) -> bytes:
+        data = text.encode("utf-8")
+        return compressor.compress(data) if compressor else data
+
+    columns = spec.columns
+    buf = io.StringIO()
+    if spec.fmt == "csv":
+        writer = csv.writer(buf)
+        writer.writerow(columns)
+        yield out(buf.getvalue())
+        buf.seek(0)
+        buf.truncate()
+        for rows in chunks:
+            writer.writerows([_csv_value(v) for v in row] for row in rows)
+            data = out(buf.getvalue())
+            buf.seek(0)
+            buf.truncate()
+            if data:
+                yield data
+    else:
+        for rows in chunks:
+            for row in rows:
+                buf.write(json.dumps(dict(zip(columns, map(_json_value, row))), ensure_ascii=False))
+                buf.write("\n")
+            data = out(buf.getvalue())
+            buf.seek(0)
+            buf.truncate()
+            if data:
+                yield data
+    if compressor:
+        yield compressor.flush()
+
+
+def stream(spec: ExportSpec) -> Iterator[bytes]:
+    return encode(spec, iter_row_chunks(spec))
+
+
+def write_file(spec: ExportSpec, fileobj) -> int:
+    """يكتب التصدير في ملف مفتوح ويرجع عدد البايتات (للاستدعاء داخل executor)."""
+    written = 0
+    for data in stream(spec):
+        fileobj.write(data)
+        written += len(data)
+    return written
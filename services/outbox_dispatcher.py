@@ -0,0 +1,113 @@
+# services/outbox_dispatcher.py
+"""
+مُرسِل صندوق الإشعارات (outbox).
+
+الـ handlers تكتب الإشعار في جدول outbox ضمن نفس معاملة تغيير الحالة
+(store.apply_transition عبر services.transitions)، فلا يضيع الإشعار إن توقفت العملية بعد الـ commit.
+هذا المُرسِل يسحب الصفوف على دفعات، يرسلها عبر المُجدول الصادر، يعلّم المرسَل منها دفعة واحدة،
+ويعيد جدولة الفاشل مع backoff. التسليم at-least-once: انهيار بين الإرسال والتعليم قد يكرر رسالة.
+"""
+import asyncio
+import logging
+import uuid
+from typing import Optional
+
+import config
+import store
+from services.resilience import backoff_delay
+from utils.notifications import outbound, PRIORITY_USER
+
+logger = logging.getLogger(__name__)
+
+_LOCK_SECONDS = 120
+
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+
+class OutboxDispatcher:
+    def __init__(self, batch_size: int, poll_seconds: float, max_attempts: int):
+        self.batch_size = max(1, batch_size)
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max(1, max_attempts)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop(), name="outbox_dispatcher")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def _loop(self):
+        while True:
+            try:
+                drained = await self.drain_once()
+                if drained == self.batch_size:
+                    continue  # قد يكون هناك المزيد
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Outbox dispatch pass failed")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def drain_once(self) -> int:
+        rows = await run_db(store.claim_outbox_batch, uuid.uuid4().hex, self.batch_size, _LOCK_SECONDS)
+        if not rows:
+            return 0
+        futures = [
+            outbound.submit("send_message", row["chat_id"], PRIORITY_USER,
+                            text=row["text"], parse_mode=row["parse_mode"])
+            for row in rows
+        ]
+        results = await asyncio.gather(*futures)
+        sent_ids = []
+        for row, res in zip(rows, results):
+            if res is not None:
+                sent_ids.append(row["id"])
+                continue
+            give_up = row["attempts"] >= self.max_attempts
+            delay = backoff_delay(row["attempts"], base=10.0, cap=1800.0)
+            await run_db(store.reschedule_outbox, row["id"], max(1, int(delay)), "send failed", give_up)
+            if give_up:
+                self.dead += 1
+                logger.error("Outbox message %s to %s dropped after %s attempts", row["id"], row["chat_id"], row["attempts"])
+            else:
+                self.retried += 1
+        await run_db(store.mark_outbox_sent, sent_ids)
+        self.sent += len(sent_ids)
+        return len(rows)
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "retried": self.retried, "dead": self.dead}
+
+
+dispatcher = OutboxDispatcher(
+    batch_size=config.OUTBOX_BATCH_SIZE,
+    poll_seconds=config.OUTBOX_POLL_SECONDS,
+    max_attempts=config.OUTBOX_MAX_ATTEMPTS,
+)
+
+
+async def get_outbox_stats() -> dict:
+    depth = await run_db(store.get_outbox_depth)
+    return {"depth": depth, **dispatcher.stats()}
@@ -0,0 +1,91 @@
+# services/payout_portal.py
+"""
+سكربتات بوابات المزوّدين لتنفيذ سحوبات Syriatel / ShamCash عبر المتصفح (services/payout_workers).
+
+كل سكربت يعمل على Page من سياق متصفح دائم يحتفظ بجلسة الدخول، فلا تسجيل دخول لكل عملية:
+  - ensure_session(page): يفتح البوابة ويسجل الدخول فقط إن انتهت الجلسة؛ يرجع True إن سجل الدخول
+  - transfer(page, destination, amount, reference): ينفذ التحويل ويرجع TxID من صفحة النتيجة
+  - find_transfer(page, reference): يبحث في سجل البوابة عن تحويل سابق بنفس المرجع (بعد نتيجة غامضة)
+رفض صريح من البوابة (رصيد غير كافٍ، وجهة خاطئة) يُرمى كـ PayoutRejected؛ انتهاء الجلسة أثناء
+الإرسال كـ SessionExpired. أي استثناء آخر نتيجة غامضة: ربما أُرسل التحويل.
+
+السكربت يُختار بـ PAYOUT_<PROVIDER>_SCRIPT بصيغة "module:Class"؛ StandInPortal هنا يعمل مع
+البوابة المحلية benchmarks/payout_portal_standin.py ومرجع لكتابة سكربتات البوابات الحقيقية.
+"""
+import importlib
+from typing import Optional
+from urllib.parse import quote
+
+
+class PayoutRejected(Exception):
+    """البوابة رفضت التحويل ولم يُرسل شيء."""
+
+
+class SessionExpired(Exception):
+    """انتهت الجلسة قبل إرسال التحويل؛ آمن لإعادة المحاولة بعد تسجيل الدخول."""
+
+
+class PortalScript:
+    def __init__(self, base_url: str, username: str, password: str):
+        self.base_url = base_url.rstrip("/")
+        self.username = username
+        self.password = password
+
+    async def ensure_session(self, page) -> bool:
+        raise NotImplementedError
+
+    async def transfer(self, page, destination: str, amount, reference: str) -> str:
+        raise NotImplementedError
+
+    async def find_transfer(self, page, reference: str) -> Optional[str]:
+        raise NotImplementedError
+
+
+class StandInPortal(PortalScript):
+    """بوابة الاختبار المحلية: نموذج دخول، نموذج تحويل، وصفحة سجل تُبحث بالملاحظة."""
+
+    async def ensure_session(self, page) -> bool:
+        await page.goto(f"{self.base_url}/transfer")
+        if "/login" not in page.url:
+            return False
+        await page.fill("#login [name=username]", self.username)
+        await page.fill("#login [name=password]", self.password)
+        await page.click("#login [type=submit]")
+        await page.wait_for_selector("#transfer, #error")
+        if "/login" in page.url:
+            raise PayoutRejected(f"login failed: {await page.inner_text('#error')}")
+        return True
+
+    async def transfer(self, page, destination: str, amount, reference: str) -> str:
+        if not await page.locator("#transfer").count():
+            await page.goto(f"{self.base_url}/transfer")
+        await page.fill("#transfer [name=destination]", str(destination))
+        await page.fill("#transfer [name=amount]", str(amount))
+        await page.fill("#transfer [name=note]", reference)
+        await page.click("#transfer [type=submit]")
+        await page.wait_for_selector("#txid, #error, #login")
+        if "/login" in page.url:
+            raise SessionExpired("redirected to login on submit")
+        if await page.locator("#error").count():
+            raise PayoutRejected((await page.inner_text("#error")).strip())
+        return (await page.inner_text("#txid")).strip()
+
+    async def find_transfer(self, page, reference: str) -> Optional[str]:
+        await page.goto(f"{self.base_url}/history?note={quote(reference)}")
+        if "/login" in page.url:
+            raise SessionExpired("redirected to login on history")
+        cell = page.locator(f"tr[data-note=\"{reference}\"] .txid")
+        if await cell.count():
+            return (await cell.first.inner_text()).strip()
+        return None
+
+
+def load_script(spec: str, base_url: str, username: str, password: str) -> PortalScript:
+    """spec: "package.module:Class" (صنف فرعي من PortalScript)."""
+    module_name, _, class_name = spec.partition(":")
+    if not class_name:
+        raise ValueError(f"payout script must be 'module:Class', got {spec!r}")
+    cls = getattr(importlib.import_module(module_name), class_name)
+    if not (isinstance(cls, type) and issubclass(cls, PortalScript)):
+        raise ValueError(f"{spec} is not a PortalScript")
+    return cls(base_url, username, password)
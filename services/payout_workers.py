@@ -0,0 +1,419 @@
+# services/payout_workers.py
+"""
+تنفيذ سحوبات Syriatel / ShamCash الموافق عليها عبر بوابة المزوّد بمتصفح Playwright بلا واجهة.
+
+الموافقة تضع السحب في approved_awaiting_txid كما في المسار اليدوي؛ المُغذّي يضيف هذه السحوبات
+إلى payout_queue (عند حدث resolved وكل دورة استطلاع)، ولكل مزوّد مسار (PayoutLane) بتوازٍ محدود
+يساوي عدد سياقات المتصفح في مجموعته. السياقات طويلة العمر وجلستها محفوظة في
+PAYOUT_STATE_DIR (storage_state)، فتسجيل الدخول يحدث مرة عند انتهاء الجلسة لا لكل عملية.
+
+قبل التحويل يُنقل السحب بـ CAS إلى payout_in_progress (انتقال "start_payout")، فلا يرفضه مشرف
+ولا تنهيه المهلة ويُعاد الرصيد بينما المتصفح يرسل المال. TxID من صفحة النتيجة يكمل السحب بانتقال
+"complete" (نفس مسار receive_admin_syriatel_txid / set_shamcash_txid). كل مهمة تحمل client_id ثابتاً
+يُكتب في ملاحظة التحويل؛ إعادة المحاولة بعد نتيجة غامضة تبحث عنه في سجل البوابة أولاً بدل الإرسال
+مرة ثانية. رفض صريح من البوابة يعيد السحب إلى approved_awaiting_txid لإكماله أو رفضه يدوياً؛
+استنفاد المحاولات بعد نتيجة غامضة يتركه في payout_in_progress ويطلب من المشرفين مراجعة كشف الحساب،
+ثم إدخال المعرف أو إعادته للانتظار (زر admin_payout_release) إن تأكدوا أن التحويل لم يصل.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import config
+import store
+from services import transitions
+from services.events import bus
+from services.payout_portal import PayoutRejected, PortalScript, SessionExpired, load_script
+from services.resilience import backoff_delay
+from utils.notifications import notify_admin
+
+logger = logging.getLogger(__name__)
+
+ACTOR = "payout_worker"
+CLIENT_PREFIX = "ichancy-po-"
+
+_TABLE_PROVIDER = {table: provider for provider, (table, _) in store.PAYOUT_TABLES.items()}
+
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+
+@dataclass
+class Slot:
+    index: int
+    context: object
+    page: object
+
+
+class ContextPool:
+    """سياقات متصفح دائمة لمزوّد واحد؛ عددها هو حد التوازي (acquire ينتظر سياقاً حراً)."""
+
+    def __init__(self, provider: str, size: int, state_dir: str, timeout_ms: float):
+        self.provider = provider
+        self.size = max(1, size)
+        self.state_dir = state_dir
+        self.timeout_ms = timeout_ms
+        self._browser = None
+        self._free: asyncio.Queue = asyncio.Queue()
+        self._slots: list = []
+        self.logins = 0
+
+    def _state_path(self, index: int) -> str:
+        return os.path.join(self.state_dir, f"{self.provider}-{index}.json")
+
+    async def _new_slot(self, index: int) -> Slot:
+        path = self._state_path(index)
+        context = await self._browser.new_context(storage_state=path if os.path.exists(path) else None)
+        context.set_default_timeout(self.timeout_ms)
+        return Slot(index, context, await context.new_page())
+
+    async def open(self, browser):
+        self._browser = browser
+        os.makedirs(self.state_dir, exist_ok=True)
+        for i in range(self.size):
+            slot = await self._new_slot(i)
+            self._slots.append(slot)
+            self._free.put_nowait(slot)
+
+    async def acquire(self) -> Slot:
+        return await self._free.get()
+
+    def release(self, slot: Slot):
+        self._free.put_nowait(slot)
+
+    async def save(self, slot: Slot):
+        self.logins += 1
+        await slot.context.storage_state(path=self._state_path(slot.index))
+
+    async def reset(self, slot: Slot) -> Slot:
+        """سياق جديد مكان سياق تعطل (صفحة مغلقة، انهيار)؛ الجلسة المحفوظة تبقى."""
+        try:
+            await slot.context.close()
+        except Exception:
+            pass
+        fresh = await self._new_slot(slot.index)
+        self._slots[slot.index] = fresh
+        return fresh
+
+    async def close(self):
+        for slot in self._slots:
+            try:
+                await slot.context.close()
+            except Exception:
+                pass
+        self._slots.clear()
+
+    @property
+    def free(self) -> int:
+        return self._free.qsize()
+
+
+class PayoutLane:
+    """قائمة مزوّد واحد: نفس نمط CoinExWithdrawQueue مع سياق متصفح لكل عامل."""
+
+    def __init__(self, provider: str, script: PortalScript, pool: ContextPool,
+                 poll_seconds: float, max_attempts: int, lock_seconds: int):
+        self.provider = provider
+        self.table = store.PAYOUT_TABLES[provider][0]
+        self.script = script
+        self.pool = pool
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.lock_seconds = lock_seconds
+        self._wakeup = asyncio.Event()
+        self._in_flight: set = set()
+        self._durations: deque = deque(maxlen=200)
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.recovered = 0
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def dispatch_loop(self):
+        while True:
+            try:
+                free = self.pool.size - len(self._in_flight)
+                jobs = []
+                if free > 0:
+                    jobs = await run_db(store.claim_payout_jobs, self.provider, uuid.uuid4().hex, free,
+                                        self.lock_seconds)
+                for job in jobs:
+                    task = asyncio.create_task(self._run_job(job))
+                    self._in_flight.add(task)
+                    task.add_done_callback(self._in_flight.discard)
+                if jobs and len(jobs) == free:
+                    await asyncio.wait(set(self._in_flight), return_when=asyncio.FIRST_COMPLETED)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Payout lane %s dispatch error", self.provider)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def drain(self):
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    async def _run_job(self, job: dict):
+        slot = await self.pool.acquire()
+        started = time.monotonic()
+        try:
+            await self._execute(job, slot)
+        except Exception as e:
+            logger.exception("Unhandled error executing %s payout job %s", self.provider, job.get("job_id"))
+            try:
+                slot = await self.pool.reset(slot)
+            except Exception:
+                logger.exception("Could not reset %s browser context %s", self.provider, slot.index)
+            await self._reschedule(job, f"Internal error: {e}")
+        finally:
+            self.pool.release(slot)
+            self._durations.append(time.monotonic() - started)
+
+    async def _execute(self, job: dict, slot: Slot):
+        status = job.get("withdrawal_status")
+        resuming = status == transitions.PAYOUT_IN_PROGRESS and job["attempts"] > 1
+        if status != "approved_awaiting_txid" and not resuming:
+            # أكمله مشرف يدوياً، أو رُفض/انتهت مهلته بعد الإضافة للقائمة
+            await run_db(store.finish_payout_job, job["job_id"], "cancelled", f"withdrawal status is {status}")
+            return
+        try:
+            if await self.script.ensure_session(slot.page):
+                await self.pool.save(slot)
+            if resuming:
+                # محاولة سابقة ربما أرسلت التحويل؛ نبحث بالمرجع قبل الإرسال مجدداً
+                txid = await self.script.find_transfer(slot.page, job["client_id"])
+                if txid:
+                    self.recovered += 1
+                    await self._succeed(job, txid, note="recovered from portal history")
+                    return
+            else:
+                # الحجز قبل التحويل: إن سبقنا رفض أو انتهاء مهلة فلا نرسل شيئاً
+                if await transitions.apply(self.table, job["withdrawal_id"], "start_payout", ACTOR) is None:
+                    await run_db(store.finish_payout_job, job["job_id"], "cancelled",
+                                 "withdrawal left approved_awaiting_txid before transfer")
+                    return
+                job["withdrawal_status"] = transitions.PAYOUT_IN_PROGRESS
+            txid = await self.script.transfer(slot.page, job["destination"], job["amount"], job["client_id"])
+        except PayoutRejected as e:
+            # البوابة رفضت التحويل صراحة: لم يُرسل شيء، فيعود السحب للانتظار ويمكن رفضه أو إكماله يدوياً
+            if job["withdrawal_status"] == transitions.PAYOUT_IN_PROGRESS:
+                await transitions.apply(self.table, job["withdrawal_id"], "release_payout", ACTOR, note=str(e)[:300])
+                job["withdrawal_status"] = "approved_awaiting_txid"
+            await self._fail(job, f"Portal rejected: {e}")
+            return
+        except SessionExpired as e:
+            await self._reschedule(job, f"Session expired: {e}")
+            return
+        except Exception as e:
+            # نتيجة غامضة (مهلة، خطأ شبكة، تغيّر الصفحة): المحاولة التالية تبحث في السجل أولاً
+            await self._reschedule(job, f"{type(e).__name__}: {e}")
+            return
+        await self._succeed(job, txid)
+
+    # ---------- outcomes ----------
+    async def _succeed(self, job: dict, txid: str, note: str = "Paid via provider portal"):
+        wid = job["withdrawal_id"]
+        if not txid:
+            await run_db(store.finish_payout_job, job["job_id"], "failed", "no txid on result page")
+            self.failed += 1
+            await notify_admin(f"⚠️ تم تنفيذ سحب {self.provider} #{wid} عبر البوابة لكن لم يُلتقط معرف التحويل. "
+                               f"يرجى المراجعة وإدخاله يدوياً.")
+            return
+        row = await transitions.apply(self.table, wid, "complete", ACTOR, txid=txid, note=f"{note}, TxID: {txid}")
+        await run_db(store.finish_payout_job, job["job_id"], "done", external_txid=txid)
+        if row is None:
+            # المال أُرسل لكن السحب لم يعد قيد التحويل (أكمله مشرف بمعرف آخر مثلاً)
+            await notify_admin(f"🚨 سحب {self.provider} #{wid} أُرسل عبر البوابة (TxID: {txid}) "
+                               f"لكن حالته تغيرت قبل إكماله. يرجى المراجعة فوراً.")
+        self.completed += 1
+
+    async def _reschedule(self, job: dict, error: str):
+        wid = job["withdrawal_id"]
+        if job["attempts"] >= self.max_attempts:
+            await self._fail(job, f"Gave up after {job['attempts']} attempts: {error}")
+            return
+        delay = max(1, int(backoff_delay(job["attempts"], base=10.0, cap=600.0)))
+        await run_db(store.retry_payout_job, job["job_id"], delay, error[:1000])
+        self.retried += 1
+        logger.warning("%s payout #%s rescheduled in %ss: %s", self.provider, wid, delay, error)
+
+    async def _fail(self, job: dict, reason: str):
+        wid = job["withdrawal_id"]
+        await run_db(store.finish_payout_job, job["job_id"], "failed", reason[:1000])
+        self.failed += 1
+        if job.get("withdrawal_status") != transitions.PAYOUT_IN_PROGRESS:
+            await notify_admin(f"❌ تعذر تنفيذ سحب {self.provider} #{wid} آلياً؛ ما زال بانتظار معرف التحويل "
+                               f"ويمكن إكماله يدوياً.\nالخطأ: {reason[:300]}")
+            return
+        # نتيجة غامضة: ربما وصل التحويل، فلا يُعاد الرصيد ولا يُدفع يدوياً قبل مراجعة الكشف
+        await notify_admin(f"⚠️ سحب {self.provider} #{wid} ربما نُفذ عبر البوابة (client_id: {job['client_id']}) "
+                           f"لكن النتيجة غير مؤكدة. يرجى مراجعة كشف الحساب قبل أي إجراء:\n"
+                           f"• إن وُجد التحويل أدخل معرفه.\n"
+                           f"• إن لم يُرسل أعده للانتظار ثم ارفضه أو نفذه يدوياً.\nالخطأ: {reason[:300]}",
+                           reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton(
+                               "🔓 لم يُرسل — إعادة للانتظار",
+                               callback_data=f"admin_payout_release:{self.provider}:{wid}")]]))
+
+    def stats(self) -> dict:
+        recent = list(self._durations)
+        return {
+            "concurrency": self.pool.size,
+            "in_flight": len(self._in_flight),
+            "logins": self.pool.logins,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "recovered": self.recovered,
+            "avg_seconds": round(sum(recent) / len(recent), 2) if recent else 0,
+        }
+
+
+class PayoutWorkers:
+    def __init__(self, scripts: dict, concurrency: dict, state_dir: str, headless: bool, timeout_seconds: float,
+                 poll_seconds: float, max_attempts: int, lock_seconds: int, enqueue_window_hours: float):
+        # scripts: {provider: PortalScript}؛ المزوّد بلا سكربت يبقى يدوياً
+        self.scripts = scripts
+        self.concurrency = concurrency
+        self.state_dir = state_dir
+        self.headless = headless
+        self.timeout_ms = timeout_seconds * 1000
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.lock_seconds = lock_seconds
+        self.enqueue_window_seconds = enqueue_window_hours * 3600
+        self.lanes: dict = {}
+        self._task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+
+    def enabled(self, provider: str) -> bool:
+        return provider in self.scripts
+
+    def start(self):
+        if not self.scripts:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._main(), name="payout_workers")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self, provider: Optional[str] = None):
+        for name, lane in self.lanes.items():
+            if provider in (None, name):
+                lane.wake()
+
+    async def _main(self):
+        from playwright.async_api import async_playwright
+
+        async with async_playwright() as pw:
+            browser = await pw.chromium.launch(headless=self.headless)
+            tasks = []
+            try:
+                for provider, script in self.scripts.items():
+                    pool = ContextPool(provider, self.concurrency.get(provider, 1), self.state_dir, self.timeout_ms)
+                    await pool.open(browser)
+                    lane = PayoutLane(provider, script, pool, self.poll_seconds, self.max_attempts, self.lock_seconds)
+                    self.lanes[provider] = lane
+                    tasks.append(asyncio.create_task(lane.dispatch_loop(), name=f"payout_lane_{provider}"))
+                logger.info("Payout workers started: %s",
+                            ", ".join(f"{p} x{lane.pool.size}" for p, lane in self.lanes.items()))
+                await self._feed_loop()
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                for lane in self.lanes.values():
+                    await lane.drain()
+                    await lane.pool.close()
+                await browser.close()
+
+    async def _feed(self, provider: str):
+        added = await run_db(store.enqueue_payouts, provider, CLIENT_PREFIX + provider + "-",
+                             self.enqueue_window_seconds)
+        if added:
+            self.enqueued += added
+            self.lanes[provider].wake()
+
+    async def _feed_loop(self):
+        """يضيف السحوبات الموافق عليها للقائمة فور حدث resolved، ومسح كامل كل poll_seconds."""
+        sub = None
+        while True:
+            try:
+                if sub is None:
+                    sub, _, _ = bus.subscribe()
+                    for provider in self.lanes:
+                        await self._feed(provider)
+                try:
+                    event = await sub.get(self.poll_seconds)
+                except EOFError:
+                    sub = None
+                    continue
+                if event is None:
+                    for provider in self.lanes:
+                        await self._feed(provider)
+                elif (event.type == "resolved" and event.data.get("status") == "approved_awaiting_txid"
+                      and _TABLE_PROVIDER.get(event.table) in self.lanes):
+                    await self._feed(_TABLE_PROVIDER[event.table])
+            except asyncio.CancelledError:
+                if sub:
+                    sub.close()
+                raise
+            except Exception:
+                logger.exception("Payout feeder pass failed")
+                await asyncio.sleep(self.poll_seconds)
+
+    async def stats(self) -> dict:
+        depth = await run_db(store.get_payout_queue_depth)
+        return {
+            "running": bool(self._task and not self._task.done()),
+            "enqueued": self.enqueued,
+            "providers": {p: {**depth.get(p, {}), **lane.stats()} for p, lane in self.lanes.items()},
+        }
+
+
+def _scripts() -> dict:
+    scripts = {}
+    for provider, spec, url, username, password in (
+        ("syriatel", config.PAYOUT_SYRIATEL_SCRIPT, config.PAYOUT_SYRIATEL_URL,
+         config.PAYOUT_SYRIATEL_USERNAME, config.PAYOUT_SYRIATEL_PASSWORD),
+        ("shamcash", config.PAYOUT_SHAMCASH_SCRIPT, config.PAYOUT_SHAMCASH_URL,
+         config.PAYOUT_SHAMCASH_USERNAME, config.PAYOUT_SHAMCASH_PASSWORD),
+    ):
+        if spec:
+            scripts[provider] = load_script(spec, url, username, password)
+    return scripts
+
+
+payout_workers = PayoutWorkers(
+    scripts=_scripts(),
+    concurrency={"syriatel": config.PAYOUT_SYRIATEL_CONCURRENCY, "shamcash": config.PAYOUT_SHAMCASH_CONCURRENCY},
+    state_dir=config.PAYOUT_STATE_DIR,
+    headless=config.PAYOUT_HEADLESS,
+    timeout_seconds=config.PAYOUT_TIMEOUT_SECONDS,
+    poll_seconds=config.PAYOUT_POLL_SECONDS,
+    max_attempts=config.PAYOUT_MAX_ATTEMPTS,
+    lock_seconds=config.PAYOUT_LOCK_SECONDS,
+    enqueue_window_hours=config.PAYOUT_ENQUEUE_WINDOW_HOURS,
+)
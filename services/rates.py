@@ -0,0 +1,110 @@
+# services/rates.py
+"""
+سعر USD → NSP من الذاكرة، وعروض أسعار (Quote) مقفلة لكل مسار.
+
+السعر الحالي يُقرأ من rate_history مرة ويبقى في الذاكرة: set_rate يكتبه ويحدّث الذاكرة فوراً، وتُعاد
+القراءة من القاعدة كل RATE_CACHE_SECONDS لالتقاط تحديث من عملية أخرى.
+quote() يؤخذ مرة في المسار ويُحمل في context.user_data[QUOTE_KEY]؛ التسوية (قيمة USDT للسحب، قيمة
+الإيداع عند الموافقة) تستخدم سعره لا السعر الحالي. العرض صالح RATE_QUOTE_TTL_SECONDS، وبعدها
+revalidate() يجدده بنفس السعر إن لم يتغير، وإلا يرجع عرضاً بالسعر الجديد ليُعرض على المستخدم.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import config
+import store
+
+logger = logging.getLogger(__name__)
+
+QUOTE_KEY = "rate_quote"
+
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+
+@dataclass(frozen=True)
+class Quote:
+    rate: int
+    rate_id: Optional[int]
+    expires_at: float
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        return (now or time.time()) >= self.expires_at
+
+    def to_nsp(self, usd) -> int:
+        return int(float(usd) * self.rate)
+
+    def to_usd(self, nsp) -> float:
+        return float("{:.6f}".format(float(nsp) / self.rate))
+
+    @property
+    def minutes_left(self) -> int:
+        return max(0, int((self.expires_at - time.time()) // 60))
+
+
+class RateBook:
+    def __init__(self, quote_ttl: float, refresh_seconds: float):
+        self.quote_ttl = quote_ttl
+        self.refresh_seconds = refresh_seconds
+        self._current: Optional[dict] = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self.loads = 0
+        self.quotes = 0
+        self.requotes = 0
+
+    def _fresh(self) -> bool:
+        return self._current is not None and time.monotonic() - self._loaded_at < self.refresh_seconds
+
+    async def current(self) -> dict:
+        """{"id", "rate"} للسعر الحالي؛ من الذاكرة ما لم تمض RATE_CACHE_SECONDS على آخر قراءة."""
+        if self._fresh():
+            return self._current
+        async with self._lock:
+            if not self._fresh():
+                self._current = await run_db(store.get_current_rate)
+                self._loaded_at = time.monotonic()
+                self.loads += 1
+        return self._current
+
+    async def rate(self) -> int:
+        return (await self.current())["rate"] or 0
+
+    async def quote(self) -> Optional[Quote]:
+        """عرض مقفل بالسعر الحالي، أو None إن لم يكن السعر صالحاً."""
+        cur = await self.current()
+        if not cur["rate"] or cur["rate"] <= 0:
+            return None
+        self.quotes += 1
+        return Quote(cur["rate"], cur["id"], time.time() + self.quote_ttl)
+
+    async def revalidate(self, quote: Optional[Quote]) -> Tuple[Optional[Quote], bool]:
+        """
+        (العرض الصالح للتسوية، هل تغير السعر). العرض غير المنتهي يرجع كما هو؛ المنتهي يُجدد بنفس
+        السعر إن لم يتغير، وإلا يرجع عرض بالسعر الجديد و changed=True.
+        """
+        if quote is not None and not quote.expired():
+            return quote, False
+        fresh = await self.quote()
+        if quote is None or fresh is None:
+            return fresh, False
+        self.requotes += 1
+        return fresh, fresh.rate != quote.rate
+
+    async def set_rate(self, new_rate: int, actor: str) -> int:
+        rate_id = await run_db(store.update_usd_to_nsp_rate, new_rate, actor)
+        self._current = {"id": rate_id, "rate": int(new_rate)}
+        self._loaded_at = time.monotonic()
+        logger.info("USD→NSP rate set to %s by %s (rate_history #%s)", new_rate, actor, rate_id)
+        return rate_id
+
+    def stats(self) -> dict:
+        return {"current": self._current, "loads": self.loads, "quotes": self.quotes, "requotes": self.requotes}
+
+
+rates = RateBook(config.RATE_QUOTE_TTL_SECONDS, config.RATE_CACHE_SECONDS)
@@ -0,0 +1,383 @@
+# services/reconciliation.py
+"""
+مطابقة كشوف حساب Syriatel / ShamCash مع الإيداعات المعلقة.
+
+الإيداع يصرّح به المستخدم (المبلغ و TxID) وينتظر موافقة يدوية. هنا يُقرأ كشف المزوّد
+(CSV أو تصدير رسائل SMS) سطراً سطراً دون تحميله كاملاً، ويُفهرس في dict حسب TxID، ثم
+يمر على الطلبات المعلقة مرة واحدة:
+  - تطابق تام (TxID والمبلغ والعملة) -> موافقة جماعية عبر services.bulk_actions (انتقال approve)
+  - تطابق جزئي (نفس TxID بمبلغ/عملة مختلفة، TxID مكرر في الكشف، TxID يختلف بحرف واحد عن سطر
+    بنفس المبلغ، أو تجاوز حد الموافقة الآلية) -> سطر "reconcile_flag" في سجل التدقيق لمراجعة مشرف
+  - لا شيء في الكشف -> يبقى كما هو
+سطر الكشف يقابل تحويلاً واحداً: إن طالب به أكثر من طلب معلق (بعد تطبيع TxID)، أو استُخدم TxID في
+إيداع approved/rejected سابق، تُرسل الطلبات للمراجعة بدل الموافقة. التنبيه نفسه لا يُكرر في سجل
+التدقيق عند رفع الكشف مرة أخرى.
+
+مصادر الكشوف: مجلد وارد (RECONCILE_INBOX_DIR) يراقبه StatementInbox، أو رفع من لوحة الويب.
+"""
+import asyncio
+import csv
+import logging
+import os
+import re
+import shutil
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+import config
+import store
+from services import bulk_actions
+from utils.notifications import notify_admin
+
+logger = logging.getLogger(__name__)
+
+ACTOR = "reconciler"
+ACTOR_NAME = "المطابقة الآلية"
+FLAG_ACTION = "reconcile_flag"
+
+PROVIDERS = {
+    "syriatel": ("syriatel_transactions", "syriatel_dep"),
+    "shamcash": ("shamcash_transactions", "shamcash_dep"),
+}
+FORMATS = ("csv", "sms")
+
+# أسماء أعمدة الكشوف المعروفة (بعد lower/strip)
+_TXID_COLUMNS = {"txid", "tx id", "transaction id", "transaction_id", "reference", "ref", "operation id",
+                 "رقم العملية", "رقم المعاملة", "معرف العملية"}
+_AMOUNT_COLUMNS = {"amount", "value", "credit", "المبلغ", "القيمة"}
+_CURRENCY_COLUMNS = {"currency", "العملة"}
+
+_SMS_TXID = re.compile(r"(?:رقم العملية|رقم المعاملة|معرف العملية|Transaction ID|TxID|Ref(?:erence)?)\s*[:#]?\s*([A-Za-z0-9]+)",
+                       re.IGNORECASE)
+_SMS_AMOUNT = re.compile(r"(\d[\d,]*(?:\.\d+)?)\s*(ل\.س|ليرة|SYP|NSP|USD|\$)", re.IGNORECASE)
+_CURRENCY_ALIASES = {"ل.س": "NSP", "ليرة": "NSP", "SYP": "NSP", "NSP": "NSP", "USD": "USD", "$": "USD"}
+
+# حد فحص "يختلف بحرف واحد" لكل مبلغ حتى لا يصبح التطابق الجزئي تربيعياً
+_TYPO_BUCKET_LIMIT = 200
+
+
+class StatementLine(NamedTuple):
+    txid: str
+    amount: Decimal
+    currency: str
+
+
+def normalize_txid(txid) -> str:
+    # نفس تعبير عمود txid_norm (migration 0015): إزالة كل المسافات البيضاء ثم أحرف كبيرة
+    return re.sub(r"\s+", "", str(txid or "")).upper()
+
+
+def _amount(text) -> Optional[Decimal]:
+    try:
+        return Decimal(str(text).replace(",", "").strip())
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def _currency(text, default: str) -> str:
+    text = (text or "").strip()
+    return _CURRENCY_ALIASES.get(text.upper(), _CURRENCY_ALIASES.get(text, default))
+
+
+def _column(names: list, wanted: set) -> Optional[int]:
+    return next((i for i, n in enumerate(names) if n in wanted), None)
+
+
+def iter_csv(lines: Iterable[str], default_currency: str = "NSP") -> Iterator[Optional[StatementLine]]:
+    """سطر الترويسة يحدد الأعمدة؛ None للأسطر غير الصالحة (تُعد ولا تُفهرس)."""
+    reader = csv.reader(lines)
+    cols = None
+    for row in reader:
+        if cols is None:
+            names = [c.strip().lower() for c in row]
+            cols = (_column(names, _TXID_COLUMNS), _column(names, _AMOUNT_COLUMNS), _column(names, _CURRENCY_COLUMNS))
+            if cols[0] is None or cols[1] is None:
+                raise ValueError(f"statement header has no TxID/amount column: {row}")
+            continue
+        t, a, c = cols
+        if len(row) <= max(t, a):
+            yield None
+            continue
+        txid, amount = normalize_txid(row[t]), _amount(row[a])
+        if not txid or amount is None:
+            yield None
+            continue
+        yield StatementLine(txid, amount, _currency(row[c] if c is not None and c < len(row) else "", default_currency))
+
+
+def iter_sms(lines: Iterable[str], default_currency: str = "NSP") -> Iterator[Optional[StatementLine]]:
+    """رسالة في كل سطر: يُلتقط رقم العملية وأول مبلغ متبوع بعملة."""
+    for line in lines:
+        if not line.strip():
+            continue
+        m_tx, m_amount = _SMS_TXID.search(line), _SMS_AMOUNT.search(line)
+        if not m_tx or not m_amount:
+            yield None
+            continue
+        yield StatementLine(normalize_txid(m_tx.group(1)), _amount(m_amount.group(1)),
+                            _currency(m_amount.group(2), default_currency))
+
+
+@dataclass
+class StatementIndex:
+    by_txid: dict = field(default_factory=dict)
+    by_amount: dict = field(default_factory=dict)   # (amount, currency) -> [txid] لاكتشاف أخطاء الكتابة
+    duplicates: set = field(default_factory=set)    # TxID ظهر بأكثر من سطر مختلف
+    lines: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+
+    def add(self, line: Optional[StatementLine]):
+        self.lines += 1
+        if line is None:
+            self.skipped += 1
+            return
+        seen = self.by_txid.get(line.txid)
+        if seen is not None:
+            if seen != line:
+                self.duplicates.add(line.txid)
+            return
+        self.by_txid[line.txid] = line
+        self.by_amount.setdefault((line.amount, line.currency), []).append(line.txid)
+
+
+def build_index(lines: Iterable[str], fmt: str, default_currency: str = "NSP") -> StatementIndex:
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown statement format: {fmt}")
+    started = time.perf_counter()
+    index = StatementIndex()
+    parse = iter_csv if fmt == "csv" else iter_sms
+    for line in parse(lines, default_currency):
+        index.add(line)
+    index.seconds = time.perf_counter() - started
+    return index
+
+
+def index_file(path: str, fmt: str) -> StatementIndex:
+    # utf-8-sig: كشوف Excel تبدأ بـ BOM
+    with open(path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
+        return build_index(f, fmt)
+
+
+def _one_edit_apart(a: str, b: str) -> bool:
+    if a == b or abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        return sum(x != y for x, y in zip(a, b)) == 1
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+@dataclass
+class ReconcileReport:
+    provider: str
+    lines: int = 0
+    indexed: int = 0
+    skipped: int = 0
+    pending: int = 0
+    matched: list = field(default_factory=list)
+    approved: list = field(default_factory=list)
+    flagged: list = field(default_factory=list)    # [(tx_id, reason)]
+    new_flags: int = 0                              # منها ما لم يُسجل في رفع سابق
+    unmatched: int = 0
+    ingest_seconds: float = 0.0
+    match_seconds: float = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "provider": self.provider, "lines": self.lines, "indexed": self.indexed, "skipped": self.skipped,
+            "pending": self.pending, "matched": len(self.matched), "approved": self.approved,
+            "flagged": [{"id": i, "reason": r} for i, r in self.flagged], "new_flags": self.new_flags,
+            "unmatched": self.unmatched,
+            "ingest_seconds": round(self.ingest_seconds, 3), "match_seconds": round(self.match_seconds, 3),
+        }
+
+    def summary(self) -> str:
+        return (f"🧾 مطابقة كشف {self.provider}: {self.lines:,} سطر ({self.indexed:,} عملية)\n"
+                f"✅ موافقة آلية: {len(self.approved)} من {len(self.matched)} تطابق تام\n"
+                f"🚩 للمراجعة: {len(self.flagged)} (جديدة {self.new_flags}) — بلا مقابل في الكشف: {self.unmatched}")
+
+
+def classify(pending_row: dict, index: StatementIndex, provider: str) -> tuple:
+    """("match", None) | ("flag", سبب) | ("none", None) لطلب معلق واحد."""
+    txid = normalize_txid(pending_row.get("txid"))
+    currency = (pending_row.get("currency") or "NSP") if provider == "shamcash" else "NSP"
+    declared = _amount(pending_row.get("amount"))
+    line = index.by_txid.get(txid)
+    if line is not None:
+        if txid in index.duplicates:
+            return "flag", f"TxID {txid} appears more than once in the statement with different values"
+        if line.currency != currency:
+            return "flag", f"currency mismatch: statement {line.amount} {line.currency}, declared {declared} {currency}"
+        if line.amount != declared:
+            return "flag", f"amount mismatch: statement {line.amount}, declared {declared}"
+        if config.RECONCILE_AUTO_APPROVE_MAX and declared > config.RECONCILE_AUTO_APPROVE_MAX:
+            return "flag", f"exact match above auto-approve limit ({config.RECONCILE_AUTO_APPROVE_MAX:g})"
+        return "match", None
+    for candidate in index.by_amount.get((declared, currency), [])[:_TYPO_BUCKET_LIMIT]:
+        if _one_edit_apart(txid, candidate):
+            return "flag", f"TxID {txid} not in statement; {candidate} has the same amount"
+    return "none", None
+
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+
+async def reconcile(provider: str, index: StatementIndex) -> ReconcileReport:
+    table, kind_key = PROVIDERS[provider]
+    kind = bulk_actions.BULK_KINDS[kind_key]
+    report = ReconcileReport(provider, lines=index.lines, indexed=len(index.by_txid), skipped=index.skipped,
+                             ingest_seconds=index.seconds)
+    started = time.perf_counter()
+    after_id = 0
+    matched = {}    # TxID المطبّع -> [id]
+    claimants = {}  # TxID المطبّع الموجود في الكشف -> كل الطلبات المعلقة التي تطالب به
+    while True:
+        page = await run_db(store.get_pending_deposits, table, after_id, 1000)
+        for row in page:
+            report.pending += 1
+            txid = normalize_txid(row.get("txid"))
+            if txid in index.by_txid:
+                claimants.setdefault(txid, []).append(row["id"])
+            verdict, reason = classify(row, index, provider)
+            if verdict == "match":
+                matched.setdefault(txid, []).append(row["id"])
+            elif verdict == "flag":
+                report.flagged.append((row["id"], reason))
+            else:
+                report.unmatched += 1
+        if len(page) < 1000:
+            break
+        after_id = page[-1]["id"]
+
+    # تحويل واحد في الكشف لا يُضاف إلا لطلب واحد
+    used = await run_db(store.get_used_deposit_txids, table, list(matched)) if matched else {}
+    for txid, ids in matched.items():
+        others = claimants.get(txid, ids)
+        if len(others) > 1:
+            reason = f"TxID {txid} is claimed by {len(others)} pending deposits: {', '.join(f'#{i}' for i in others)}"
+        elif txid in used:
+            reason = f"TxID {txid} already used by deposit #{used[txid][0]} ({used[txid][1]})"
+        else:
+            report.matched.extend(ids)
+            continue
+        report.flagged.extend((i, reason) for i in ids)
+    report.match_seconds = time.perf_counter() - started
+
+    if report.matched:
+        # نفس مسار /bulk_approve: CAS على pending، الرصيد والتدقيق والإشعار في معاملة واحدة
+        # المُسنِد يحجز كل طلب لمشرف؛ التطابق التام مع الكشف لا يحتاج مراجعته فلا نتخطى الحجز
+        rows = await bulk_actions.execute(kind, report.matched, True, ACTOR, ACTOR_NAME, respect_claims=False)
+        report.approved = [r["id"] for r in rows]
+    if report.flagged:
+        source = kind.machine.audit_source
+        seen = await run_db(store.get_audit_reasons, source, FLAG_ACTION, [i for i, _ in report.flagged])
+        fresh = [(tx_id, reason[:1000]) for tx_id, reason in report.flagged if (tx_id, reason[:1000]) not in seen]
+        report.new_flags = len(fresh)
+        await run_db(store.add_audit_logs, [(source, tx_id, FLAG_ACTION, ACTOR, reason) for tx_id, reason in fresh])
+    logger.info("Reconciled %s statement: %s lines, %s approved, %s flagged, %s unmatched",
+                provider, report.lines, len(report.approved), len(report.flagged), report.unmatched)
+    return report
+
+
+async def reconcile_file(path: str, provider: str, fmt: str) -> ReconcileReport:
+    if provider not in PROVIDERS:
+        raise ValueError(f"unknown provider: {provider}")
+    index = await run_db(index_file, path, fmt)
+    return await reconcile(provider, index)
+
+
+def detect(filename: str):
+    """(provider, fmt) من اسم الملف: syriatel-*.csv / shamcash_*.txt ..."""
+    name = os.path.basename(filename).lower()
+    provider = next((p for p in PROVIDERS if name.startswith(p)), None)
+    fmt = "csv" if name.endswith(".csv") else "sms"
+    return provider, fmt
+
+
+class StatementInbox:
+    """يراقب مجلداً للكشوف؛ كل ملف يُطابق مرة ثم يُنقل إلى processed/ (أو failed/)."""
+
+    def __init__(self, directory: str, poll_seconds: float):
+        self.directory = directory
+        self.poll_seconds = poll_seconds
+        self._task: Optional[asyncio.Task] = None
+        self.files = 0
+        self.approved = 0
+        self.flagged = 0
+        self.last_report: Optional[ReconcileReport] = None
+
+    def start(self):
+        if not self.directory or self.poll_seconds <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop(), name="statement_inbox")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.scan_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Statement inbox scan failed")
+            await asyncio.sleep(self.poll_seconds)
+
+    async def scan_once(self) -> int:
+        if not os.path.isdir(self.directory):
+            return 0
+        names = sorted(n for n in os.listdir(self.directory)
+                       if os.path.isfile(os.path.join(self.directory, n)) and not n.startswith("."))
+        for name in names:
+            await self._process(name)
+        return len(names)
+
+    async def _process(self, name: str):
+        path = os.path.join(self.directory, name)
+        provider, fmt = detect(name)
+        try:
+            if provider is None:
+                raise ValueError("file name must start with " + " / ".join(PROVIDERS))
+            report = await reconcile_file(path, provider, fmt)
+        except Exception as e:
+            logger.exception("Statement %s failed", name)
+            self._move(path, "failed")
+            await notify_admin(f"⚠️ تعذرت مطابقة الكشف {name}: {e}")
+            return
+        self._move(path, "processed")
+        self.files += 1
+        self.approved += len(report.approved)
+        self.flagged += len(report.flagged)
+        self.last_report = report
+        await notify_admin(f"{report.summary()}\n📄 {name}")
+
+    def _move(self, path: str, sub: str):
+        target = os.path.join(self.directory, sub)
+        os.makedirs(target, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        shutil.move(path, os.path.join(target, f"{stamp}-{os.path.basename(path)}"))
+
+    def stats(self) -> dict:
+        return {"running": bool(self._task and not self._task.done()), "files": self.files,
+                "approved": self.approved, "flagged": self.flagged}
+
+
+statement_inbox = StatementInbox(config.RECONCILE_INBOX_DIR, config.RECONCILE_POLL_SECONDS)
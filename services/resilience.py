@@ -0,0 +1,155 @@
+# services/resilience.py
+"""
+أدوات حماية الاستدعاءات الخارجية: token bucket و circuit breaker و backoff.
+كل الأصناف thread-safe لأن عميل CoinEx يعمل داخل run_in_executor.
+"""
+import random
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Token bucket بسيط: rate توكن في الثانية مع سعة burst."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """
+        يحاول حجز التوكن. يرجع 0 عند النجاح، وإلا عدد الثواني اللازم انتظارها.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """ينتظر (blocking) حتى يتوفر التوكن أو ينتهي timeout. يرجع True عند النجاح."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or wait > remaining:
+                    return False
+            time.sleep(wait)
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker بثلاث حالات:
+      closed    — الطلبات تمر، ونعد الإخفاقات المتتالية
+      open      — نرفض فوراً حتى انقضاء reset_timeout
+      half_open — نسمح بطلب تجريبي واحد؛ نجاحه يغلق الدارة وفشله يعيد فتحها
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        # عدادات للعرض على المشرفين
+        self.total_failures = 0
+        self.total_rejected = 0
+        self.last_error: Optional[str] = None
+
+    def _maybe_half_open(self, now: float):
+        if self._state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.total_rejected += 1
+            return False
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """تحرير حجز الطلب التجريبي دون نتيجة (مثلاً عندما لم يُرسل الطلب أصلاً)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self, error: Optional[str] = None):
+        with self._lock:
+            self._failures += 1
+            self.total_failures += 1
+            self.last_error = error
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return {
+                "name": self.name,
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "total_failures": self.total_failures,
+                "total_rejected": self.total_rejected,
+                "retry_after": round(
+                    max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)), 1
+                ) if self._state == self.OPEN else 0.0,
+                "last_error": self.last_error,
+            }
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Exponential backoff مع full jitter (attempt يبدأ من 1)."""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
@@ -0,0 +1,143 @@
+# services/stale_sweeper.py
+"""
+إلغاء طلبات السحب المتروكة وإعادة رصيدها.
+
+السحب يخصم الرصيد عند تقديمه، فإن لم يعالجه المشرفون يبقى المال محجوزاً في pending أو
+approved_awaiting_txid. الكانس يمر دورياً على كل طريقة لها مهلة (STALE_WITHDRAW_HOURS_*)
+ويقرأ أقدم الطلبات عبر مسح مدى على (status, created_at) دفعةً دفعة، ثم يطبق انتقال
+"expire" من services.transitions على كل دفعة بـ store.bulk_transition: الحالة expired،
+إعادة الرصيد، سجل التدقيق والإشعار (outbox) في معاملة واحدة.
+حجوزات المشرفين (claims) لا تمنع الإلغاء: المُسنِد يحجز كل طلب معلق، والمهلة تخص الطلب لا المشرف.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+import config
+import store
+from services import transitions
+from services.events import publish_resolved
+from services.outbox_dispatcher import dispatcher
+from utils.notifications import admin_tx_key, resolve_admin_messages
+
+logger = logging.getLogger(__name__)
+
+ACTOR = "stale_sweeper"
+
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+
+class StaleWithdrawalSweeper:
+    def __init__(self, interval_seconds: float, batch: int, thresholds: dict):
+        self.interval_seconds = interval_seconds
+        self.batch = batch
+        # {table: ساعات}؛ 0 يعطل الطريقة
+        self.thresholds = {t: h for t, h in thresholds.items() if h > 0}
+        self._task: Optional[asyncio.Task] = None
+        self.sweeps = 0
+        self.expired = 0
+        self.refunded = 0.0
+        self.last_run: Optional[datetime] = None
+        self.batches: deque = deque(maxlen=50)
+
+    def start(self):
+        if not self.thresholds or self.interval_seconds <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop(), name="stale_withdrawal_sweeper")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.sweep_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Stale withdrawal sweep failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def sweep_once(self) -> int:
+        expired = 0
+        for table, hours in self.thresholds.items():
+            m = transitions.machine(table)
+            t = m.transition("expire")
+            reason = f"Expired after {hours:g}h without admin action"
+            for status in t.sources:
+                while True:
+                    started = time.monotonic()
+                    ids = await run_db(store.get_stale_withdrawal_ids, table, status, hours * 3600, self.batch)
+                    if not ids:
+                        break
+                    ctx = transitions.Ctx(ACTOR, reason)
+                    rows = await run_db(
+                        store.bulk_transition, table, ids, t.target, ACTOR, m.audit_source, reason=reason,
+                        credit=lambda r: t.balance(r, ctx), notify=lambda r: t.notify(r, ctx),
+                        parse_mode=t.parse_mode, from_statuses=(status,), stamp=t.stamp, respect_claims=False,
+                    )
+                    self._record(table, status, len(ids), rows, time.monotonic() - started, t, ctx)
+                    expired += len(rows)
+                    if rows:
+                        await self._announce(table, rows)
+                    # الدفعة الناقصة هي الأخيرة؛ دفعة لم يتغير منها شيء (سبقها مشرف) لا تتقدم فنتوقف
+                    if len(ids) < self.batch or not rows:
+                        break
+        self.sweeps += 1
+        self.last_run = datetime.now()
+        if expired:
+            logger.info("Stale withdrawal sweep expired and refunded %s requests", expired)
+        return expired
+
+    def _record(self, table: str, status: str, scanned: int, rows: list, seconds: float, t, ctx):
+        refunded = sum(float(t.balance(r, ctx) or 0) for r in rows)
+        self.expired += len(rows)
+        self.refunded += refunded
+        self.batches.append({
+            "at": datetime.now(), "table": table, "status": status, "scanned": scanned,
+            "expired": len(rows), "refunded": refunded, "ms": round(seconds * 1000, 1),
+        })
+
+    async def _announce(self, table: str, rows: list):
+        for r in rows:
+            publish_resolved(table, r["id"], "expired", actor=ACTOR)
+        dispatcher.wake()
+        await asyncio.gather(*(resolve_admin_messages(admin_tx_key(table, r["id"]), "⌛ انتهت مهلته وأُعيد الرصيد")
+                               for r in rows))
+
+    def stats(self) -> dict:
+        recent = list(self.batches)
+        return {
+            "running": bool(self._task and not self._task.done()),
+            "thresholds": dict(self.thresholds),
+            "sweeps": self.sweeps,
+            "expired": self.expired,
+            "refunded": self.refunded,
+            "last_run": self.last_run,
+            "recent_batches": recent[-10:],
+            "avg_batch_ms": round(sum(b["ms"] for b in recent) / len(recent), 1) if recent else 0,
+        }
+
+
+stale_sweeper = StaleWithdrawalSweeper(
+    interval_seconds=config.STALE_SWEEP_SECONDS,
+    batch=config.STALE_SWEEP_BATCH,
+    thresholds={
+        "syriatel_withdrawals": config.STALE_WITHDRAW_HOURS_SYRIATEL,
+        "shamcash_withdrawals": config.STALE_WITHDRAW_HOURS_SHAMCASH,
+        "coinex_withdrawals": config.STALE_WITHDRAW_HOURS_COINEX,
+    },
+)
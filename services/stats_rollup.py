@@ -0,0 +1,181 @@
+# services/stats_rollup.py
+"""
+شاشات الإحصائيات من جداول التجميع (stats_rollup) ومهمة الضغط الليلية.
+
+الـ triggers (migration 0006) تنقل كل عملية بين حاويات (يوم الإنشاء، الطريقة، الحالة) عند الإدراج
+وتغيّر الحالة، فالقراءة هنا تمر على صفوف بعدد الأيام لا بعدد العمليات.
+الحاوية التي تفقد عملية تُعلَّم dirty لأن min/max لا يمكن إنقاصهما تزايدياً؛ المهمة الليلية
+تعيد حساب هذه الحاويات بدقة من الجداول المصدر وتحذف الفارغ منها.
+"""
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import config
+import store
+
+logger = logging.getLogger(__name__)
+
+METHOD_LABELS = {
+    "syriatel_transactions": "📥 Syriatel Cash",
+    "shamcash_transactions": "📥 ShamCash",
+    "coinex_transactions": "📥 CoinEx",
+    "syriatel_withdrawals": "📤 Syriatel Cash",
+    "shamcash_withdrawals": "📤 ShamCash",
+    "coinex_withdrawals": "📤 CoinEx",
+}
+DEPOSIT_METHODS = ("syriatel_transactions", "shamcash_transactions", "coinex_transactions")
+
+_DONE = {"approved", "completed"}
+_OPEN = {"pending", "approved_awaiting_txid", "payout_in_progress", "approved_by_admin", "processing"}
+
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+
+def _bucket(status: str) -> str:
+    if status in _DONE:
+        return "done"
+    if status in _OPEN:
+        return "open"
+    return "failed"
+
+
+def _summarize(rows: list) -> dict:
+    """{method: {"done"/"open"/"failed": {currency: [cnt, total]}, "max": أكبر عملية منفذة بالـ NSP}}"""
+    out = {}
+    for r in rows:
+        per = out.setdefault(r["method"], {})
+        slot = per.setdefault(_bucket(r["status"]), {}).setdefault(r["currency"], [0, 0])
+        slot[0] += int(r["cnt"])
+        slot[1] += float(r["total"] or 0)
+        if r["status"] in _DONE and r["currency"] == "NSP" and r.get("max_amount") is not None:
+            per["max"] = max(per.get("max", 0), float(r["max_amount"]))
+    return out
+
+
+def _money(per_currency: dict) -> str:
+    return " + ".join(f"{int(total):,} {cur}" for cur, (_, total) in sorted(per_currency.items()))
+
+
+def _count(per_currency: dict) -> int:
+    return sum(cnt for cnt, _ in per_currency.values())
+
+
+def _format(summary: dict, with_max: bool) -> str:
+    lines = []
+    for method, label in METHOD_LABELS.items():
+        per = summary.get(method)
+        if not per:
+            continue
+        parts = []
+        if per.get("done"):
+            parts.append(f"✅ {_count(per['done'])} ({_money(per['done'])})")
+        if per.get("open"):
+            parts.append(f"⏳ {_count(per['open'])}")
+        if per.get("failed"):
+            parts.append(f"🚫 {_count(per['failed'])}")
+        if with_max and per.get("max"):
+            parts.append(f"⬆️ {int(per['max']):,}")
+        lines.append(f"{label}: " + " · ".join(parts))
+    return "\n".join(lines)
+
+
+def _totals(summary: dict, methods) -> dict:
+    totals = {}
+    for method in methods:
+        for cur, (cnt, total) in summary.get(method, {}).get("done", {}).items():
+            slot = totals.setdefault(cur, [0, 0])
+            slot[0] += cnt
+            slot[1] += total
+    return totals
+
+
+async def user_stats_text(user_id: int) -> str:
+    summary = _summarize(await run_db(store.get_user_stats, user_id))
+    if not summary:
+        return "📊 إحصائياتك\n\nلا توجد عمليات بعد."
+    deposits = _totals(summary, DEPOSIT_METHODS)
+    withdrawals = _totals(summary, [m for m in METHOD_LABELS if m not in DEPOSIT_METHODS])
+    return (
+        "📊 إحصائياتك\n\n"
+        f"📥 إجمالي الإيداعات المقبولة: {_money(deposits) or 0}\n"
+        f"📤 إجمالي السحوبات المنفذة: {_money(withdrawals) or 0}\n\n"
+        f"{_format(summary, with_max=False)}\n\n"
+        "✅ منفذة · ⏳ قيد المعالجة · 🚫 مرفوضة/فاشلة"
+    )
+
+
+async def admin_stats_text(days: int = 7) -> str:
+    since = date.today() - timedelta(days=days - 1)
+    today, period = await asyncio.gather(
+        run_db(store.get_global_stats, date.today()),
+        run_db(store.get_global_stats, since),
+    )
+    today_s, period_s = _summarize(today), _summarize(period)
+    return (
+        "📈 إحصائيات النظام\n\n"
+        f"📅 اليوم:\n{_format(today_s, with_max=False) or '—'}\n\n"
+        f"🗓 آخر {days} أيام:\n{_format(period_s, with_max=True) or '—'}\n\n"
+        "✅ منفذة (المبلغ) · ⏳ قيد المعالجة · 🚫 مرفوضة/فاشلة · ⬆️ أكبر عملية"
+    )
+
+
+class StatsCompactor:
+    """يعيد حساب الحاويات dirty مرة يومياً في الساعة المحددة (بتوقيت الخادم)."""
+
+    def __init__(self, hour: int, batch: int = 500):
+        self.hour = hour % 24
+        self.batch = batch
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: Optional[datetime] = None
+        self.last_rebuilt = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop(), name="stats_compactor")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _seconds_until_next_run(self) -> float:
+        now = datetime.now()
+        run_at = now.replace(hour=self.hour, minute=0, second=0, microsecond=0)
+        if run_at <= now:
+            run_at += timedelta(days=1)
+        return (run_at - now).total_seconds()
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self._seconds_until_next_run())
+            try:
+                await self.compact_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Stats rollup compaction failed")
+
+    async def compact_once(self) -> int:
+        rebuilt = 0
+        while True:
+            groups = await run_db(store.get_dirty_rollup_groups, self.batch)
+            for g in groups:
+                await run_db(store.rebuild_rollup_day, g["method"], g["day"])
+            rebuilt += len(groups)
+            if len(groups) < self.batch:
+                break
+        self.last_run, self.last_rebuilt = datetime.now(), rebuilt
+        logger.info("Stats rollup compaction rebuilt %s day/method groups", rebuilt)
+        return rebuilt
+
+
+compactor = StatsCompactor(hour=config.STATS_COMPACT_HOUR)
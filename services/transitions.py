@@ -0,0 +1,298 @@
+# services/transitions.py
+"""
+آلة حالات الطلبات: الانتقالات القانونية لكل نوع طلب وآثارها الجانبية في مكان واحد.
+
+كل انتقال يُطبق كـ compare-and-set (store.apply_transition):
+UPDATE ... WHERE id = %s AND status IN (المصادر)، وعدد الصفوف المتأثرة هو الجواب — لا قراءة
+مسبقة للطلب، والضغط المزدوج أو مشرفان معاً لا ينتج موافقة/رفضاً (أو استرداداً) مرتين.
+الرصيد وسجل التدقيق والإشعار وإضافة سحب CoinEx للقائمة تُحسب من الصف بعد التحديث وتُكتب
+في نفس المعاملة، ثم يُنشر حدث resolved ويُوقظ المُرسِل بعد commit.
+
+قرارات المشرفين (actor = admin_… / web_…) تحترم الحجز داخل نفس CAS: طلب pending محجوز لمشرف آخر
+لا يتغير، ويُرمى Claimed ليعرض handler "محجوز لـ …" بدل "تمت مراجعته".
+
+انتقالات processing -> completed/failed لسحوبات CoinEx يديرها coinex_reconciler بـ CAS خاص به.
+
+سحوبات Syriatel / ShamCash المنفذة عبر البوابة تمر بـ payout_in_progress طوال تشغيل التحويل
+(services/payout_workers)؛ هذه الحالة ليست مصدراً لـ reject/expire، فلا يُعاد رصيد سحب قد يكون أُرسل.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Optional
+
+from telegram.constants import ParseMode
+
+import store
+from services.claims import held_text
+from services.events import publish_resolved
+from services.outbox_dispatcher import dispatcher
+from services.rates import rates
+
+logger = logging.getLogger(__name__)
+
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+
+class IllegalTransition(ValueError):
+    pass
+
+
+class Claimed(Exception):
+    """الانتقال لم يُطبق لأن الطلب محجوز لمشرف آخر؛ str(e) نص جاهز للمشرف."""
+
+    def __init__(self, holder: str, until=None):
+        super().__init__(held_text(holder, until))
+        self.holder = holder
+        self.until = until
+
+
+ADMIN_ACTOR_PREFIXES = ("admin_", "web_")
+
+
+@dataclass(frozen=True)
+class Ctx:
+    actor: str
+    reason: Optional[str] = None
+    txid: Optional[str] = None
+    rate: float = 0
+
+
+@dataclass(frozen=True)
+class Transition:
+    sources: tuple
+    target: str
+    stamp: Optional[str] = None                                   # approved_at / rejected_at
+    balance: Optional[Callable[[dict, Ctx], float]] = None        # يضاف لرصيد صاحب الطلب
+    notify: Optional[Callable[[dict, Ctx], str]] = None
+    parse_mode: Optional[str] = None
+    note: Optional[Callable[[dict, Ctx], str]] = None             # سبب سجل التدقيق إن لم يُمرر reason
+    uses_rate: bool = False
+    enqueue: bool = False
+
+
+@dataclass(frozen=True)
+class Machine:
+    table: str
+    audit_source: str         # audit_log.source — اسم الجدول لكل الأنواع (migration 0014)
+    transitions: dict = field(default_factory=dict)
+
+    def transition(self, name: str) -> Transition:
+        t = self.transitions.get(name)
+        if t is None:
+            raise IllegalTransition(f"{self.table}: no transition '{name}'")
+        return t
+
+    def can(self, name: str, status: str) -> bool:
+        t = self.transitions.get(name)
+        return bool(t) and status in t.sources
+
+
+def shamcash_nsp(row: dict, rate: float) -> float:
+    # السعر المقفل عند تقديم الطلب (quote_rate) إن وُجد، وإلا السعر الحالي (طلبات ما قبل rate_history)
+    return int(row["amount"] * (row.get("quote_rate") or rate)) if row.get("currency") == "USD" else row["amount"]
+
+
+def _now() -> str:
+    return datetime.now().strftime('%Y-%m-%d %H:%M')
+
+
+def _expired_text(row: dict, refund: str) -> str:
+    return (f"⌛ انتهت مهلة طلب السحب #{row['id']} دون تنفيذ وتم إلغاؤه.\n"
+            f"✅ تم إعادة رصيد {refund} إلى حسابك.")
+
+
+_AWAITING = ("approved_awaiting_txid",)
+PAYOUT_IN_PROGRESS = "payout_in_progress"
+
+
+def _payout_transitions() -> dict:
+    # عامل البوابة يحجز السحب قبل التحويل؛ release يعيده للانتظار حين يتأكد أن شيئاً لم يُرسل
+    return {
+        "start_payout": Transition(
+            _AWAITING, PAYOUT_IN_PROGRESS,
+            note=lambda r, c: "Payout started via provider portal",
+        ),
+        "release_payout": Transition(
+            (PAYOUT_IN_PROGRESS,), _AWAITING[0],
+            note=lambda r, c: "Payout released back to awaiting txid",
+        ),
+    }
+
+MACHINES = {m.table: m for m in (
+    Machine("syriatel_transactions", "syriatel_transactions", {
+        "approve": Transition(
+            ("pending",), "approved", stamp="approved_at",
+            balance=lambda r, c: r["amount"],
+            notify=lambda r, c: f"✅ تمّت الموافقة على إيداعك #{r['id']}\n💰 المبلغ: {r['amount']:,} SYP\n🕓 {_now()}",
+            note=lambda r, c: "Deposit approved by admin",
+        ),
+        "reject": Transition(
+            ("pending",), "rejected", stamp="rejected_at",
+            notify=lambda r, c: f"🚫 تم رفض عملية الإيداع #{r['id']}\n💰 المبلغ: {r['amount']:,} SYP\n📝 السبب: {c.reason}",
+        ),
+    }),
+    Machine("shamcash_transactions", "shamcash_transactions", {
+        "approve": Transition(
+            ("pending",), "approved", stamp="approved_at", uses_rate=True,
+            balance=lambda r, c: shamcash_nsp(r, c.rate),
+            notify=lambda r, c: f"✅ تمت الموافقة على إيداعك #{r['id']} بمبلغ <b>{shamcash_nsp(r, c.rate)} NSP</b>.",
+            parse_mode=ParseMode.HTML,
+            note=lambda r, c: "Admin approved deposit",
+        ),
+        "reject": Transition(
+            ("pending",), "rejected", stamp="rejected_at",
+            notify=lambda r, c: f"🚫 تم رفض عملية الإيداع #{r['id']}.\n📝 السبب: {c.reason}",
+        ),
+    }),
+    Machine("syriatel_withdrawals", "syriatel_withdrawals", {
+        "approve": Transition(
+            ("pending",), "approved_awaiting_txid", stamp="approved_at",
+            notify=lambda r, c: f"✅ تمت الموافقة على طلب السحب الخاص بك #{r['id']}. يرجى انتظار معرف التحويل.",
+        ),
+        "complete": Transition(
+            _AWAITING + (PAYOUT_IN_PROGRESS,), "approved", stamp="approved_at",
+            notify=lambda r, c: (f"✅ تمت الموافقة على طلب السحب #{r['id']}.\n📤 المبلغ الصافي: {r['net_amount']:,} ل.س\n"
+                                 f"🆔 معرف التحويل: {c.txid}"),
+            note=lambda r, c: f"TxID: {c.txid}",
+        ),
+        "reject": Transition(
+            ("pending",) + _AWAITING, "rejected", stamp="rejected_at",
+            balance=lambda r, c: r["amount"],
+            notify=lambda r, c: (f"🚫 تم رفض طلب السحب #{r['id']}.\n📝 السبب: {c.reason}\n"
+                                 f"✅ تم إعادة رصيد {r['amount']:,} ل.س إلى حسابك."),
+        ),
+        "expire": Transition(
+            ("pending",) + _AWAITING, "expired", stamp="rejected_at",
+            balance=lambda r, c: r["amount"],
+            notify=lambda r, c: _expired_text(r, f"{r['amount']:,} ل.س"),
+        ),
+        **_payout_transitions(),
+    }),
+    Machine("shamcash_withdrawals", "shamcash_withdrawals", {
+        "approve": Transition(
+            ("pending",), "approved_awaiting_txid", stamp="approved_at",
+            notify=lambda r, c: f"✅ تمت الموافقة المبدئية على طلب سحبك #{r['id']}. يرجى انتظار معرف التحويل.",
+            note=lambda r, c: "Admin approved awaiting txid",
+        ),
+        # /set_shamcash_txid يقبل أيضاً طلباً ما زال pending (موافقة وإكمال بخطوة واحدة)
+        "complete": Transition(
+            ("pending",) + _AWAITING + (PAYOUT_IN_PROGRESS,), "approved", stamp="approved_at",
+            notify=lambda r, c: f"✅ تمت الموافقة على سحبك #{r['id']}.\n🆔 معرف التحويل: <code>{c.txid}</code>",
+            parse_mode=ParseMode.HTML,
+            note=lambda r, c: f"TxID set: {c.txid}",
+        ),
+        "reject": Transition(
+            ("pending",) + _AWAITING, "rejected", stamp="rejected_at",
+            balance=lambda r, c: r["requested_amount"],
+            notify=lambda r, c: (f"🚫 تم رفض طلب السحب #{r['id']}.\n📝 السبب: {c.reason}\n"
+                                 f"✅ تم إعادة رصيد {int(r['requested_amount']):,} NSP إلى حسابك."),
+        ),
+        "expire": Transition(
+            ("pending",) + _AWAITING, "expired", stamp="rejected_at",
+            balance=lambda r, c: r["requested_amount"],
+            notify=lambda r, c: _expired_text(r, f"{int(r['requested_amount']):,} NSP"),
+        ),
+        **_payout_transitions(),
+    }),
+    Machine("coinex_withdrawals", "coinex_withdrawals", {
+        "approve": Transition(
+            ("pending",), "approved_by_admin", stamp="approved_at", enqueue=True,
+            notify=lambda r, c: f"✅ تمت الموافقة على طلب سحب CoinEx الخاص بك #{r['id']}. قيد التنفيذ...",
+            note=lambda r, c: "Queued for CoinEx execution",
+        ),
+        # error (نتيجة غامضة من قائمة التنفيذ): يرفضه المشرف بعد التحقق من سجل CoinEx فيُعاد الرصيد
+        "reject": Transition(
+            ("pending", "error"), "rejected", stamp="rejected_at",
+            balance=lambda r, c: r["nsp_amount"],
+            notify=lambda r, c: (f"🚫 تم رفض عملية السحب #{r['id']}.\n📝 السبب: {c.reason}\n"
+                                 f"✅ تم إعادة رصيد {int(r['nsp_amount']):,} NSP إلى حسابك."),
+        ),
+        # approved_by_admin فما بعد يخص قائمة التنفيذ والمُطابِق، لا ينتهي بالمهلة
+        "expire": Transition(
+            ("pending",), "expired", stamp="rejected_at",
+            balance=lambda r, c: r["nsp_amount"],
+            notify=lambda r, c: _expired_text(r, f"{int(r['nsp_amount']):,} NSP"),
+        ),
+        # نتائج قائمة التنفيذ (coinex_withdraw_queue)
+        "submit": Transition(
+            ("approved_by_admin",), "processing", stamp="approved_at",
+            notify=lambda r, c: (f"✅ تم إرسال سحبك #{r['id']} وهو قيد المعالجة على الشبكة.\n"
+                                 f"🆔 معرف تحويل CoinEx: `{c.txid}`"),
+            parse_mode="Markdown",
+        ),
+        # رفض صريح من CoinEx: لم يُرسل شيء، فيُعاد الرصيد المخصوم عند الطلب كما يفعل المُطابِق
+        "fail": Transition(
+            ("approved_by_admin",), "failed",
+            balance=lambda r, c: r["nsp_amount"],
+            notify=lambda r, c: (f"🚫 تعذر تنفيذ سحب CoinEx #{r['id']}.\n"
+                                 f"✅ تم إعادة رصيد {int(r['nsp_amount']):,} NSP إلى حسابك."),
+        ),
+        "error": Transition(("approved_by_admin",), "error", stamp="approved_at"),
+    }),
+)}
+
+
+def machine(table: str) -> Machine:
+    m = MACHINES.get(table)
+    if m is None:
+        raise IllegalTransition(f"no state machine for {table}")
+    return m
+
+
+def _effects(m: Machine, t: Transition, ctx: Ctx, note: Optional[str]):
+    def effects(row: dict) -> dict:
+        audit_reason = note or ctx.reason or (t.note(row, ctx) if t.note else None)
+        return {
+            "balance": t.balance(row, ctx) if t.balance else None,
+            "audit": (m.audit_source, row["id"], t.target, ctx.actor, audit_reason),
+            "notify": (t.notify(row, ctx), t.parse_mode) if t.notify else None,
+            "enqueue": (_client_id(row["id"]), ctx.actor) if t.enqueue else None,
+        }
+    return effects
+
+
+def _client_id(withdrawal_id: int) -> str:
+    from services.coinex_withdraw_queue import client_id_for
+    return client_id_for(withdrawal_id)
+
+
+async def apply(table: str, tx_id: int, name: str, actor: str, reason: Optional[str] = None,
+                txid: Optional[str] = None, note: Optional[str] = None) -> Optional[dict]:
+    """
+    يطبق الانتقال name على الطلب؛ يرجع الصف بعده، أو None إن لم يكن الطلب في إحدى حالات
+    المصدر (غير موجود، عولج مسبقاً، أو سبقه مشرف آخر). يرمي Claimed إن كان actor مشرفاً
+    والطلب محجوزاً لغيره.
+    reason يُحفظ في عمود reason وسجل التدقيق؛ note لسجل التدقيق فقط.
+    """
+    m = machine(table)
+    t = m.transition(name)
+    rate = await rates.rate() if t.uses_rate else 0
+    ctx = Ctx(actor, reason, txid, rate)
+    now = datetime.now()
+    claim_actor = actor if actor.startswith(ADMIN_ACTOR_PREFIXES) else None
+    row = await run_db(
+        store.apply_transition, table, int(tx_id), t.sources, t.target,
+        reason=reason, txid_external=txid,
+        approved_at=now if t.stamp == "approved_at" else None,
+        rejected_at=now if t.stamp == "rejected_at" else None,
+        effects=_effects(m, t, ctx, note), claim_actor=claim_actor,
+    )
+    if row is None and claim_actor:
+        held = await run_db(store.get_claim_holder, table, int(tx_id), claim_actor)
+        if held:
+            raise Claimed(*held)
+    if row is None:
+        logger.info("Transition %s.%s skipped for #%s (not in %s)", table, name, tx_id, "/".join(t.sources))
+        return None
+    publish_resolved(table, tx_id, t.target, actor=actor)
+    if t.notify:
+        dispatcher.wake()
+    if t.enqueue:
+        from services.coinex_withdraw_queue import withdraw_queue
+        withdraw_queue.wake()
+    return row
@@ -0,0 +1,331 @@
+# services/velocity.py
+"""
+حدود السرعة لكل مستخدم وطريقة: عدد الطلبات في الساعة / في 24 ساعة، ومجموع مبالغ السحب في 24 ساعة،
+إضافة إلى حد محاولات فتح المسار في الدقيقة (مستخدم عالق أو بوت يكرر الضغط).
+
+العدادات نوافذ منزلقة بدقة سلة (VELOCITY_BUCKET_SECONDS) داخل العملية: لكل (مستخدم، طريقة)
+deque من [سلة، عدد، مبلغ] لا يتجاوز 24 ساعة، في قاموس LRU محدود الحجم. النافذة الباردة تُملأ عند
+أول استخدام باستعلام تجميعي واحد (store.get_velocity_buckets)، وبعدها لا يلمس الفحص قاعدة البيانات.
+مع عدة عمليات للبوت يُفعّل VELOCITY_REDIS_URL فتُحفظ السلال في Redis ويُفحص ويُسجل بسكربت Lua ذري.
+
+كل الطلبات المقدمة تُحتسب أياً كانت نتيجتها (المرفوض والمنتهي أيضاً): الحد على سرعة التقديم.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Optional
+
+import config
+import store
+
+logger = logging.getLogger(__name__)
+
+HOUR = 3600
+DAY = 24 * 3600
+
+
+@dataclass(frozen=True)
+class Method:
+    table: str
+    label: str
+    amount_column: Optional[str] = None   # سحوبات: المبلغ المخصوم من الرصيد (NSP)
+
+
+# نفس مفاتيح services.bulk_actions.BULK_KINDS، إضافة إلى إيداع CoinEx (يُسجل مقبولاً بلا مراجعة)
+METHODS = {
+    "syriatel_dep": Method("syriatel_transactions", "إيداع Syriatel"),
+    "shamcash_dep": Method("shamcash_transactions", "إيداع ShamCash"),
+    "coinex_dep": Method("coinex_transactions", "إيداع CoinEx"),
+    "syriatel_wd": Method("syriatel_withdrawals", "سحب Syriatel", "amount"),
+    "shamcash_wd": Method("shamcash_withdrawals", "سحب ShamCash", "requested_amount"),
+    "coinex_wd": Method("coinex_withdrawals", "سحب CoinEx", "nsp_amount"),
+}
+
+
+@dataclass(frozen=True)
+class Limits:
+    per_hour: int = 0
+    per_day: int = 0
+    daily_amount: float = 0   # 0 = بلا حد
+
+
+async def run_db(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+
+def _verdict(method: str, limits: Limits, hour_n: int, day_n: int, day_amount: float, amount: float) -> Optional[str]:
+    label = METHODS[method].label
+    if limits.per_hour and hour_n >= limits.per_hour:
+        return f"⏳ وصلت إلى الحد الأقصى لطلبات {label} خلال ساعة ({limits.per_hour}). حاول لاحقاً."
+    if limits.per_day and day_n >= limits.per_day:
+        return f"⏳ وصلت إلى الحد الأقصى لطلبات {label} خلال 24 ساعة ({limits.per_day}). حاول لاحقاً."
+    if limits.daily_amount and day_amount + amount > limits.daily_amount:
+        left = max(0, int(limits.daily_amount - day_amount))
+        return (f"⚠️ تجاوزت الحد اليومي لمبالغ {label} ({int(limits.daily_amount):,} NSP خلال 24 ساعة).\n"
+                f"المتبقي حالياً: {left:,} NSP.")
+    return None
+
+
+class Window:
+    """سلال 24 ساعة لمستخدم وطريقة: [سلة، عدد، مبلغ] بترتيب زمني."""
+    __slots__ = ("buckets",)
+
+    def __init__(self):
+        self.buckets: deque = deque()
+
+    def totals(self, now_bucket: int, hour_buckets: int, day_buckets: int):
+        while self.buckets and self.buckets[0][0] <= now_bucket - day_buckets:
+            self.buckets.popleft()
+        hour_n = day_n = 0
+        day_amount = 0.0
+        for b, n, a in self.buckets:
+            day_n += n
+            day_amount += a
+            if b > now_bucket - hour_buckets:
+                hour_n += n
+        return hour_n, day_n, day_amount
+
+    def add(self, bucket: int, n: int, amount: float):
+        if self.buckets and self.buckets[-1][0] == bucket:
+            self.buckets[-1][1] += n
+            self.buckets[-1][2] += amount
+        elif not self.buckets or self.buckets[-1][0] < bucket:
+            self.buckets.append([bucket, n, amount])
+        else:
+            # بذور الاستعلام التجميعي قد تصل بغير ترتيب؛ نادر ومرة لكل نافذة
+            self.buckets.append([bucket, n, amount])
+            self.buckets = deque(sorted(self.buckets))
+
+
+# KEYS[1] = hash السلال؛ الحقول c<سلة> (عدد) و a<سلة> (مبلغ) و s (علامة التهيئة)
+# ARGV: now_bucket, hour_buckets, day_buckets, per_hour, per_day, daily_amount, amount, record, ttl
+_ACQUIRE_LUA = """
+local now, hb, db = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local h = redis.call('HGETALL', KEYS[1])
+local hour_n, day_n, day_amt = 0, 0, 0
+for i = 1, #h, 2 do
+  local f, v = h[i], tonumber(h[i + 1])
+  local kind, b = string.sub(f, 1, 1), tonumber(string.sub(f, 2))
+  if b then
+    if b <= now - db then
+      redis.call('HDEL', KEYS[1], f)
+    elseif kind == 'c' then
+      day_n = day_n + v
+      if b > now - hb then hour_n = hour_n + v end
+    else
+      day_amt = day_amt + v
+    end
+  end
+end
+local amount = tonumber(ARGV[7])
+local blocked = (tonumber(ARGV[4]) > 0 and hour_n >= tonumber(ARGV[4]))
+  or (tonumber(ARGV[5]) > 0 and day_n >= tonumber(ARGV[5]))
+  or (tonumber(ARGV[6]) > 0 and day_amt + amount > tonumber(ARGV[6]))
+if not blocked and ARGV[8] == '1' then
+  redis.call('HINCRBY', KEYS[1], 'c' .. now, 1)
+  redis.call('HINCRBYFLOAT', KEYS[1], 'a' .. now, amount)
+  redis.call('EXPIRE', KEYS[1], ARGV[9])
+end
+return {hour_n, day_n, tostring(day_amt)}
+"""
+
+# يهيئ المفتاح من بذور قاعدة البيانات مرة واحدة فقط (عملية أخرى ربما سبقت)
+_SEED_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then return 0 end
+redis.call('HSET', KEYS[1], 's', 1)
+for i = 1, #ARGV - 1, 3 do
+  redis.call('HSET', KEYS[1], 'c' .. ARGV[i], ARGV[i + 1], 'a' .. ARGV[i], ARGV[i + 2])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[#ARGV])
+return 1
+"""
+
+
+class RedisBackend:
+    """السلال في Redis لعدة عمليات؛ الفحص والتسجيل في سكربت Lua واحد."""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis_asyncio  # اختياري: فقط مع VELOCITY_REDIS_URL
+
+        self._redis = redis_asyncio.from_url(url)
+        self._acquire = self._redis.register_script(_ACQUIRE_LUA)
+        self._seed = self._redis.register_script(_SEED_LUA)
+
+    async def ensure(self, key: str, load) -> bool:
+        if await self._redis.exists(key):
+            return False
+        args = []
+        for b, n, a in await load():
+            args += [b, n, a]
+        await self._seed(keys=[key], args=args + [DAY + HOUR])
+        return True
+
+    async def evaluate(self, key: str, now_bucket: int, hb: int, db: int, limits: Limits, amount: float,
+                       record: bool):
+        hour_n, day_n, day_amount = await self._acquire(keys=[key], args=[
+            now_bucket, hb, db, limits.per_hour, limits.per_day, limits.daily_amount, amount,
+            "1" if record else "0", DAY + HOUR,
+        ])
+        return int(hour_n), int(day_n), float(day_amount)
+
+    async def add(self, key: str, bucket: int, n: int, amount: float):
+        pipe = self._redis.pipeline()
+        pipe.hincrby(key, f"c{bucket}", n)
+        pipe.hincrbyfloat(key, f"a{bucket}", amount)
+        await pipe.execute()
+
+
+class VelocityLimiter:
+    def __init__(self, limits: dict, attempts_per_minute: int, bucket_seconds: int, max_users: int,
+                 redis_url: str = ""):
+        self.limits = limits
+        self.attempts_per_minute = attempts_per_minute
+        self.bucket_seconds = max(1, bucket_seconds)
+        self.hour_buckets = max(1, HOUR // self.bucket_seconds)
+        self.day_buckets = max(1, DAY // self.bucket_seconds)
+        self.max_users = max(1, max_users)
+        self._windows: "OrderedDict[tuple, Window]" = OrderedDict()
+        self._seeding: dict = {}
+        self._attempts: "OrderedDict[tuple, deque]" = OrderedDict()
+        self._redis_url = redis_url
+        self._backend: Optional[RedisBackend] = None
+        self.seeds = 0
+        self.blocked = {"attempts": 0, "limits": 0}
+
+    @property
+    def backend(self) -> Optional[RedisBackend]:
+        if self._backend is None and self._redis_url:
+            self._backend = RedisBackend(self._redis_url)
+        return self._backend
+
+    def _now_bucket(self) -> int:
+        return int(time.time() // self.bucket_seconds)
+
+    # ---------- محاولات فتح المسار (ذاكرة فقط) ----------
+    def attempt(self, telegram_id, method: str) -> Optional[str]:
+        if self.attempts_per_minute <= 0:
+            return None
+        key = (str(telegram_id), method)
+        now = time.monotonic()
+        hits = self._attempts.pop(key, None) or deque()
+        self._attempts[key] = hits
+        while hits and hits[0] <= now - 60:
+            hits.popleft()
+        if len(self._attempts) > self.max_users:
+            self._attempts.popitem(last=False)
+        if len(hits) >= self.attempts_per_minute:
+            self.blocked["attempts"] += 1
+            return "⏳ محاولات كثيرة خلال دقيقة. يرجى الانتظار قليلاً ثم المحاولة مجدداً."
+        hits.append(now)
+        return None
+
+    # ---------- النوافذ ----------
+    def _load(self, telegram_id, method: str):
+        m = METHODS[method]
+        return run_db(store.get_velocity_buckets, m.table, m.amount_column, telegram_id, DAY, self.bucket_seconds)
+
+    async def _window(self, telegram_id, method: str) -> Window:
+        key = (str(telegram_id), method)
+        window = self._windows.get(key)
+        if window is not None:
+            self._windows.move_to_end(key)
+            return window
+        pending = self._seeding.get(key)
+        if pending is None:
+            pending = self._seeding[key] = asyncio.ensure_future(self._load(telegram_id, method))
+        try:
+            rows = await pending
+        finally:
+            self._seeding.pop(key, None)
+        window = self._windows.get(key)
+        if window is None:
+            window = Window()
+            for b, n, a in rows:
+                window.add(int(b), int(n), float(a or 0))
+            self._windows[key] = window
+            self.seeds += 1
+            if len(self._windows) > self.max_users:
+                self._windows.popitem(last=False)
+        return window
+
+    async def _evaluate(self, telegram_id, method: str, amount: float, record: bool) -> Optional[str]:
+        limits = self.limits.get(method)
+        if limits is None or not (limits.per_hour or limits.per_day or limits.daily_amount):
+            return None
+        now_bucket = self._now_bucket()
+        try:
+            if self.backend:
+                key = f"velocity:{method}:{telegram_id}"
+                if await self.backend.ensure(key, lambda: self._load(telegram_id, method)):
+                    self.seeds += 1
+                hour_n, day_n, day_amount = await self.backend.evaluate(
+                    key, now_bucket, self.hour_buckets, self.day_buckets, limits, amount, record)
+            else:
+                window = await self._window(telegram_id, method)
+                # لا await بين الفحص والتسجيل: ذري داخل حلقة الأحداث
+                hour_n, day_n, day_amount = window.totals(now_bucket, self.hour_buckets, self.day_buckets)
+        except Exception:
+            # تعذر الوصول للعدادات (Redis / قاعدة البيانات): لا نوقف الإيداع والسحب بسببه
+            logger.exception("Velocity check failed for %s/%s; allowing", method, telegram_id)
+            return None
+        reason = _verdict(method, limits, hour_n, day_n, day_amount, amount)
+        if reason:
+            self.blocked["limits"] += 1
+        elif record and not self.backend:
+            window.add(now_bucket, 1, amount)
+        return reason
+
+    async def check(self, telegram_id, method: str, amount: float = 0) -> Optional[str]:
+        """سبب المنع (نص للمستخدم) أو None؛ لا يسجل شيئاً."""
+        return await self._evaluate(telegram_id, method, float(amount or 0), record=False)
+
+    async def check_entry(self, telegram_id, method: str) -> Optional[str]:
+        """عند فتح مسار الإيداع/السحب: حد المحاولات ثم حدود العدد، قبل أي استعلام آخر."""
+        return self.attempt(telegram_id, method) or await self.check(telegram_id, method)
+
+    async def acquire(self, telegram_id, method: str, amount: float = 0) -> Optional[str]:
+        """يفحص ويسجل الطلب معاً قبل إنشائه؛ release إن فشل الإنشاء بعدها."""
+        return await self._evaluate(telegram_id, method, float(amount or 0), record=True)
+
+    async def release(self, telegram_id, method: str, amount: float = 0):
+        now_bucket = self._now_bucket()
+        if self.backend:
+            try:
+                await self.backend.add(f"velocity:{method}:{telegram_id}", now_bucket, -1, -float(amount or 0))
+            except Exception:
+                logger.exception("Velocity release failed for %s/%s", method, telegram_id)
+            return
+        window = self._windows.get((str(telegram_id), method))
+        if window is not None:
+            window.add(now_bucket, -1, -float(amount or 0))
+
+    def stats(self) -> dict:
+        return {
+            "backend": "redis" if self._redis_url else "memory",
+            "windows": len(self._windows),
+            "seeds": self.seeds,
+            "blocked_attempts": self.blocked["attempts"],
+            "blocked_limits": self.blocked["limits"],
+        }
+
+
+limiter = VelocityLimiter(
+    limits={
+        "syriatel_dep": Limits(config.VELOCITY_DEPOSIT_PER_HOUR, config.VELOCITY_DEPOSIT_PER_DAY),
+        "shamcash_dep": Limits(config.VELOCITY_DEPOSIT_PER_HOUR, config.VELOCITY_DEPOSIT_PER_DAY),
+        "coinex_dep": Limits(config.VELOCITY_COINEX_DEPOSIT_PER_HOUR, config.VELOCITY_COINEX_DEPOSIT_PER_DAY),
+        "syriatel_wd": Limits(config.VELOCITY_WITHDRAW_PER_HOUR, config.VELOCITY_WITHDRAW_PER_DAY,
+                              config.VELOCITY_DAILY_NSP_SYRIATEL),
+        "shamcash_wd": Limits(config.VELOCITY_WITHDRAW_PER_HOUR, config.VELOCITY_WITHDRAW_PER_DAY,
+                              config.VELOCITY_DAILY_NSP_SHAMCASH),
+        "coinex_wd": Limits(config.VELOCITY_WITHDRAW_PER_HOUR, config.VELOCITY_WITHDRAW_PER_DAY,
+                            config.VELOCITY_DAILY_NSP_COINEX),
+    },
+    attempts_per_minute=config.VELOCITY_ATTEMPTS_PER_MINUTE,
+    bucket_seconds=config.VELOCITY_BUCKET_SECONDS,
+    max_users=config.VELOCITY_MAX_USERS,
+    redis_url=config.VELOCITY_REDIS_URL,
+)
@@ -1,7 +1,9 @@
 # store.py
 import mysql.connector
+from contextlib import contextmanager
 from datetime import datetime
 import logging
+import re
 import config
 
 logger = logging.getLogger(__name__)
@@ -35,6 +37,25 @@ def _execute_query(sql, params=None, fetch=False, fetchone=False):
         cursor.close()
         conn.close()
 
+@contextmanager
+def transaction():
+    """
+    وحدة عمل: cursor واحد على اتصال واحد، commit عند النجاح و rollback عند أي استثناء.
+    الاستثناءات تُعاد رميها للمستدعي (على عكس _execute_query).
+    """
+    conn = getDatabaseConnection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        conn.start_transaction()
+        yield cursor
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
 # Users
 def get_user_by_id(user_id):
     return _execute_query("SELECT * FROM users WHERE id = %s", (user_id,), fetchone=True)
@@ -57,26 +78,34 @@ def deduct_balance(user_id, amount):
     _execute_query("UPDATE users SET balance = balance - %s WHERE id = %s", (amount, user_id))
 
 # Transactions
+TRANSACTION_TABLES = (
+    "syriatel_transactions", "shamcash_transactions",
+    "coinex_transactions", "coinex_withdrawals",
+    "shamcash_withdrawals", "syriatel_withdrawals"
+)
+
 def get_transaction(table_name, tx_id):
-    valid_tables = [
-        "syriatel_transactions", "shamcash_transactions",
-        "coinex_transactions", "coinex_withdrawals",
-        "shamcash_withdrawals", "syriatel_withdrawals"
-    ]
-    if table_name not in valid_tables:
+    if table_name not in TRANSACTION_TABLES:
         logger.error(f"Invalid table name: {table_name}")
         return None
     return _execute_query(f"SELECT * FROM {table_name} WHERE id = %s", (tx_id,), fetchone=True)
 
-def update_transaction_status(table_name, tx_id, status, reason=None, txid_external=None, approved_at=None, rejected_at=None):
-    valid_tables = [
-        "syriatel_transactions", "shamcash_transactions",
-        "coinex_transactions", "coinex_withdrawals",
-        "shamcash_withdrawals", "syriatel_withdrawals"
-    ]
-    if table_name not in valid_tables:
-        logger.error(f"Error: Invalid table name {table_name} in update_transaction_status")
-        return
+def get_transaction_with_user(table_name, tx_id, for_update=False, cur=None):
+    """
+    صف الطلب مع telegram_id و username لصاحبه في استعلام واحد (بدل get_transaction ثم قراءة المستخدم).
+    cur: مؤشر من transaction() للقراءة ضمن وحدة عمل؛ for_update يقفل الصف حتى commit (له معنى مع cur فقط).
+    """
+    if table_name not in TRANSACTION_TABLES:
+        logger.error(f"Invalid table name: {table_name}")
+        return None
+    sql = (f"SELECT t.*, u.telegram_id, u.username FROM {table_name} t "
+           f"LEFT JOIN users u ON u.id = t.user_id WHERE t.id = %s")
+    if cur is None:
+        return _execute_query(sql, (tx_id,), fetchone=True)
+    cur.execute(sql + (" FOR UPDATE" if for_update else ""), (tx_id,))
+    return cur.fetchone()
+
+def _status_update_sql(table_name, tx_id, status, reason=None, txid_external=None, approved_at=None, rejected_at=None):
     sql_parts = ["status = %s"]
     params = [status]
     if reason is not None:
@@ -95,13 +124,666 @@ def update_transaction_status(table_name, tx_id, status, reason=None, txid_exter
         sql_parts.append("rejected_at = %s")
         params.append(rejected_at)
     params.append(tx_id)
-    sql = f"UPDATE {table_name} SET {', '.join(sql_parts)} WHERE id = %s"
+    return f"UPDATE {table_name} SET {', '.join(sql_parts)} WHERE id = %s", params
+
+def update_transaction_status(table_name, tx_id, status, reason=None, txid_external=None, approved_at=None, rejected_at=None):
+    if table_name not in TRANSACTION_TABLES:
+        logger.error(f"Error: Invalid table name {table_name} in update_transaction_status")
+        return
+    sql, params = _status_update_sql(table_name, tx_id, status, reason, txid_external, approved_at, rejected_at)
     _execute_query(sql, params)
 
+def apply_transition(table_name, tx_id, from_statuses, status, reason=None, txid_external=None,
+                     approved_at=None, rejected_at=None, effects=None, claim_actor=None):
+    """
+    انتقال compare-and-set: UPDATE ... WHERE id = %s AND status IN (from_statuses)، وعدد الصفوف المتأثرة
+    هو الجواب — لا قراءة مسبقة للحالة ولا موافقة مزدوجة.
+    claim_actor (قرارات المشرفين): طلب pending محجوز حجزاً سارياً لغيره لا يتغير (راجع get_claim_holder).
+    effects(row) -> dict اختياري يُحسب من الصف بعد التحديث وضمن نفس المعاملة:
+      balance: مبلغ يضاف لرصيد صاحب الطلب (سالب للخصم)
+      audit:   (source, tx_id, action, actor, reason)
+      notify:  (text, parse_mode) — يُكتب في outbox
+      enqueue: (client_id, actor) — سحب CoinEx إلى قائمة التنفيذ
+    يرجع الصف بعد الانتقال (مع telegram_id و username)، أو None إن لم يكن في إحدى الحالات المصدر (أو عند خطأ).
+    """
+    if table_name not in TRANSACTION_TABLES:
+        logger.error(f"Error: Invalid table name {table_name} in apply_transition")
+        return None
+    sql, params = _status_update_sql(table_name, tx_id, status, reason, txid_external, approved_at, rejected_at)
+    sql += f" AND status IN ({','.join(['%s'] * len(from_statuses))})"
+    params = list(params) + list(from_statuses)
+    if claim_actor and table_name in CLAIM_TABLES:
+        sql += f" AND (status <> 'pending' OR claimed_by = %s OR {_CLAIM_FREE.format(t='')})"
+        params.append(claim_actor)
+    try:
+        with transaction() as cur:
+            cur.execute(sql, params)
+            if cur.rowcount != 1:
+                return None
+            # الصف مقفول بالفعل بعد UPDATE؛ القراءة ضمن نفس المعاملة ترى القيم الجديدة
+            row = get_transaction_with_user(table_name, tx_id, cur=cur)
+            fx = effects(row) if effects else None
+            if fx:
+                if fx.get("balance"):
+                    cur.execute("UPDATE users SET balance = balance + %s WHERE id = %s", (fx["balance"], row["user_id"]))
+                if fx.get("audit"):
+                    _audit_insert(cur, *fx["audit"])
+                if fx.get("notify") and fx["notify"][0]:
+                    _outbox_insert(cur, row["user_id"], *fx["notify"])
+                if fx.get("enqueue"):
+                    client_id, actor = fx["enqueue"]
+                    cur.execute(
+                        "INSERT IGNORE INTO coinex_withdraw_queue (withdrawal_id, client_id, status, enqueued_by, "
+                        "available_at, created_at) VALUES (%s,%s,'queued',%s,NOW(),NOW())",
+                        (tx_id, client_id, actor)
+                    )
+        return row
+    except mysql.connector.Error as err:
+        logger.error(f"Database Error in apply_transition({table_name}, {tx_id}, {status}): {err}")
+        return None
+
+def get_pending_deposits(table_name, after_id, limit):
+    """صفحة keyset من الإيداعات المعلقة (id, user_id, amount, currency, txid) للمطابقة مع كشوف المزوّد."""
+    if table_name not in ("syriatel_transactions", "shamcash_transactions"):
+        logger.error(f"Error: Invalid table name {table_name} in get_pending_deposits")
+        return []
+    currency = "currency" if table_name == "shamcash_transactions" else "'NSP' AS currency"
+    return _execute_query(
+        f"SELECT id, user_id, amount, {currency}, txid FROM {table_name} "
+        f"WHERE status = 'pending' AND id > %s ORDER BY id LIMIT %s",
+        (int(after_id), int(limit)), fetch=True
+    ) or []
+
+def get_velocity_buckets(table_name, amount_column, telegram_id, window_seconds, bucket_seconds):
+    """
+    [(سلة، عدد، مبلغ)] لطلبات المستخدم خلال window_seconds، مجمعة بسلال bucket_seconds
+    (سلة = FLOOR(UNIX_TIMESTAMP / bucket_seconds)) — بذور نوافذ services.velocity.
+    """
+    if table_name not in TRANSACTION_TABLES:
+        logger.error(f"Error: Invalid table name {table_name} in get_velocity_buckets")
+        return []
+    total = f"COALESCE(SUM(t.{amount_column}), 0)" if amount_column else "0"
+    rows = _execute_query(
+        f"SELECT FLOOR(UNIX_TIMESTAMP(t.created_at) / %s) AS bucket, COUNT(*) AS n, {total} AS total "
+        f"FROM {table_name} t JOIN users u ON u.id = t.user_id "
+        f"WHERE u.telegram_id = %s AND t.created_at >= NOW() - INTERVAL %s SECOND "
+        f"GROUP BY bucket ORDER BY bucket",
+        (int(bucket_seconds), str(telegram_id), int(window_seconds)), fetch=True
+    ) or []
+    return [(int(r["bucket"]), int(r["n"]), float(r["total"] or 0)) for r in rows]
+
+def get_used_deposit_txids(table_name, txids):
+    """
+    {TxID المطبّع: (id, status)} لإيداعات approved/rejected تستخدم أحد txids (قيم normalize_txid).
+    المقارنة على عمود txid_norm المولّد بنفس التطبيع (migration 0015) وفهرس (txid_norm, status).
+    """
+    if table_name not in ("syriatel_transactions", "shamcash_transactions"):
+        logger.error(f"Error: Invalid table name {table_name} in get_used_deposit_txids")
+        return {}
+    txids = sorted(set(txids))
+    used = {}
+    for i in range(0, len(txids), 500):
+        chunk = txids[i:i + 500]
+        rows = _execute_query(
+            f"SELECT id, status, txid_norm AS norm FROM {table_name} "
+            f"WHERE txid_norm IN ({','.join(['%s'] * len(chunk))}) AND status IN ('approved', 'rejected')",
+            tuple(chunk), fetch=True
+        ) or []
+        for r in rows:
+            used.setdefault(r["norm"], (r["id"], r["status"]))
+    return used
+
+def get_audit_reasons(source, action, tx_ids):
+    """{(tx_id, reason)} المسجلة مسبقاً بهذا الإجراء — لتجنب تكرار نفس التنبيه."""
+    tx_ids = sorted({int(i) for i in tx_ids})
+    found = set()
+    for i in range(0, len(tx_ids), 500):
+        chunk = tx_ids[i:i + 500]
+        rows = _execute_query(
+            f"SELECT tx_id, reason FROM audit_log WHERE source = %s AND tx_id IN ({','.join(['%s'] * len(chunk))}) "
+            f"AND action = %s",
+            (source, *chunk, action), fetch=True
+        ) or []
+        found.update((r["tx_id"], r["reason"]) for r in rows)
+    return found
+
+def get_stale_withdrawal_ids(table_name, status, older_than_seconds, limit):
+    """أقدم طلبات status التي تجاوز عمرها older_than_seconds — مسح مدى على (status, created_at)."""
+    if table_name not in TRANSACTION_TABLES:
+        logger.error(f"Error: Invalid table name {table_name} in get_stale_withdrawal_ids")
+        return []
+    rows = _execute_query(
+        f"SELECT id FROM {table_name} WHERE status = %s AND created_at < NOW() - INTERVAL %s SECOND "
+        f"ORDER BY created_at LIMIT %s",
+        (status, int(older_than_seconds), int(limit)), fetch=True
+    )
+    return [r["id"] for r in rows or []]
+
+# Admin work claims (claimed_by / claimed_until — راجع migration 0010)
+CLAIM_TABLES = ("syriatel_transactions", "shamcash_transactions", "syriatel_withdrawals",
+                "shamcash_withdrawals", "coinex_withdrawals")
+_CLAIM_FREE = "{t}claimed_by IS NULL OR {t}claimed_until < NOW()"
+
+def claim_transaction(table_name, tx_id, actor, ttl_seconds):
+    """
+    compare-and-set: يحجز الطلب لـ actor إن كان pending وغير محجوز (أو محجوزاً له أو انتهى حجزه).
+    يرجع حالة الصف بعد المحاولة مع claimed (هل هو الآن لـ actor) و acquired (هل تغيّر المالك/المدة فعلاً)،
+    أو None إن لم يوجد الصف.
+    """
+    if table_name not in CLAIM_TABLES:
+        logger.error(f"Error: Invalid table name {table_name} in claim_transaction")
+        return None
+    try:
+        with transaction() as cur:
+            cur.execute(
+                f"UPDATE {table_name} SET claimed_by = %s, claimed_until = NOW() + INTERVAL %s SECOND "
+                f"WHERE id = %s AND status = 'pending' AND (claimed_by = %s OR {_CLAIM_FREE.format(t='')})",
+                (actor, int(ttl_seconds), int(tx_id), actor)
+            )
+            acquired = cur.rowcount == 1
+            cur.execute(
+                f"SELECT id, status, claimed_by, claimed_until, claimed_until > NOW() AS active "
+                f"FROM {table_name} WHERE id = %s",
+                (int(tx_id),)
+            )
+            row = cur.fetchone()
+    except mysql.connector.Error as err:
+        logger.error(f"Database Error in claim_transaction({table_name}, {tx_id}): {err}")
+        return None
+    if row:
+        row["acquired"] = acquired
+        row["claimed"] = row["status"] == "pending" and row["claimed_by"] == actor and bool(row["active"])
+    return row
+
+def get_claim_holder(table_name, tx_id, actor):
+    """(claimed_by, claimed_until) إن كان الطلب pending ومحجوزاً حجزاً سارياً لغير actor، وإلا None."""
+    if table_name not in CLAIM_TABLES:
+        return None
+    row = _execute_query(
+        f"SELECT claimed_by, claimed_until FROM {table_name} "
+        f"WHERE id = %s AND status = 'pending' AND claimed_by <> %s AND claimed_until >= NOW()",
+        (int(tx_id), actor), fetchone=True
+    )
+    return (row["claimed_by"], row["claimed_until"]) if row else None
+
+def release_claim(table_name, tx_id, actor):
+    if table_name not in CLAIM_TABLES:
+        return
+    _execute_query(
+        f"UPDATE {table_name} SET claimed_by = NULL, claimed_until = NULL WHERE id = %s AND claimed_by = %s",
+        (int(tx_id), actor)
+    )
+
+def get_claim_loads():
+    """{actor: عدد الطلبات المعلقة المحجوزة له حالياً} عبر كل جداول المراجعة."""
+    union = " UNION ALL ".join(
+        f"SELECT claimed_by FROM {t} WHERE status = 'pending' AND claimed_until > NOW()" for t in CLAIM_TABLES
+    )
+    rows = _execute_query(f"SELECT claimed_by, COUNT(*) AS n FROM ({union}) c GROUP BY claimed_by", fetch=True) or []
+    return {r["claimed_by"]: int(r["n"]) for r in rows}
+
+def get_unclaimed_pending(table_name, limit=100):
+    """طلبات pending بلا حجز ساري (لم تُسند أو انتهى حجزها)، الأقدم أولاً."""
+    if table_name not in CLAIM_TABLES:
+        return []
+    return _execute_query(
+        f"SELECT id, claimed_by FROM {table_name} WHERE status = 'pending' AND ({_CLAIM_FREE.format(t='')}) "
+        f"ORDER BY id LIMIT %s",
+        (int(limit),), fetch=True
+    ) or []
+
+def bulk_transition(table_name, ids, status, actor, audit_source, reason=None,
+                    credit=None, notify=None, enqueue_client_id=None, parse_mode=None,
+                    from_statuses=("pending",), stamp=None, respect_claims=True):
+    """
+    انتقال جماعي من إحدى from_statuses (مصادر Transition كما في apply_transition) إلى status في معاملة واحدة:
+      - الصفوف تُقفل بـ FOR UPDATE، و UPDATE واحد بشرط status IN (from_statuses)
+      - stamp: عمود الوقت (approved_at / rejected_at)؛ الافتراضي rejected_at للرفض و approved_at لغيره
+      - respect_claims=False للمنفذين الآليين (المطابقة، انتهاء المهلة): لا يتخطون حجوزات المشرفين
+      - credit(row) -> مبلغ يضاف لرصيد صاحب الطلب؛ تُجمع لكل مستخدم في UPDATE واحد
+      - سجل التدقيق والإشعارات (notify(row) -> نص بصيغة parse_mode) تُكتب بإدخال متعدد الصفوف
+      - enqueue_client_id(id) -> client_id لإضافة سحوبات CoinEx إلى قائمة التنفيذ
+    يرجع الصفوف التي تغيرت فعلاً (مع telegram_id).
+    """
+    if table_name not in TRANSACTION_TABLES:
+        logger.error(f"Error: Invalid table name {table_name} in bulk_transition")
+        return []
+    ids = sorted({int(i) for i in ids})
+    if not ids:
+        return []
+    from_statuses = tuple(from_statuses)
+    in_sources = ",".join(["%s"] * len(from_statuses))
+    now = datetime.now()
+    with transaction() as cur:
+        placeholders = ",".join(["%s"] * len(ids))
+        # طلبات pending محجوزة لأدمن آخر (حجز ساري) تُتخطى كما تُتخطى المعالَجة مسبقاً
+        claim_guard, claim_params = "", ()
+        if respect_claims and table_name in CLAIM_TABLES:
+            claim_guard = f" AND (t.status <> 'pending' OR t.claimed_by = %s OR {_CLAIM_FREE.format(t='t.')})"
+            claim_params = (actor,)
+        cur.execute(
+            f"SELECT t.*, u.telegram_id FROM {table_name} t JOIN users u ON u.id = t.user_id "
+            f"WHERE t.id IN ({placeholders}) AND t.status IN ({in_sources}){claim_guard} FOR UPDATE",
+            tuple(ids) + from_statuses + claim_params
+        )
+        rows = cur.fetchall()
+        if not rows:
+            return []
+        locked = [r["id"] for r in rows]
+        placeholders = ",".join(["%s"] * len(locked))
+        sets, params = ["status = %s"], [status]
+        stamp = stamp or ("rejected_at" if status == "rejected" else "approved_at")
+        sets.append(f"{stamp} = %s")
+        params.append(now)
+        if reason is not None:
+            sets.append("reason = %s")
+            params.append(reason)
+        cur.execute(
+            f"UPDATE {table_name} SET {', '.join(sets)} WHERE id IN ({placeholders}) AND status IN ({in_sources})",
+            tuple(params + locked + list(from_statuses))
+        )
+
+        if credit:
+            per_user = {}
+            for r in rows:
+                amount = credit(r)
+                if amount:
+                    per_user[r["user_id"]] = per_user.get(r["user_id"], 0) + amount
+            if per_user:
+                cases = " ".join(["WHEN %s THEN %s"] * len(per_user))
+                user_placeholders = ",".join(["%s"] * len(per_user))
+                case_params = [v for pair in per_user.items() for v in pair]
+                cur.execute(
+                    f"UPDATE users SET balance = balance + CASE id {cases} END WHERE id IN ({user_placeholders})",
+                    tuple(case_params + list(per_user))
+                )
+
+        # executemany على INSERT ... VALUES يُرسل كإدخال واحد متعدد الصفوف
+        cur.executemany(
+            "INSERT INTO audit_log (source, tx_id, action, actor, reason, created_at) VALUES (%s,%s,%s,%s,%s,%s)",
+            [(audit_source, r["id"], status, actor, reason, now) for r in rows]
+        )
+        if notify:
+            outbox_rows = []
+            for r in rows:
+                text = notify(r)
+                if text and r.get("telegram_id"):
+                    outbox_rows.append((r["telegram_id"], text, parse_mode, now, now))
+            if outbox_rows:
+                cur.executemany(
+                    "INSERT INTO outbox (chat_id, text, parse_mode, status, attempts, next_attempt_at, created_at) "
+                    "VALUES (%s,%s,%s,'pending',0,%s,%s)",
+                    outbox_rows
+                )
+        if enqueue_client_id:
+            cur.executemany(
+                "INSERT IGNORE INTO coinex_withdraw_queue (withdrawal_id, client_id, status, enqueued_by, available_at, created_at) "
+                "VALUES (%s,%s,'queued',%s,%s,%s)",
+                [(r["id"], enqueue_client_id(r["id"]), actor, now, now) for r in rows]
+            )
+    return rows
+
+def get_pending_for_bulk(table_name, value_sql, max_value=None, ids=None, value_params=(), limit=200,
+                         statuses=("pending",)):
+    """الطلبات المرشحة لإجراء جماعي (status IN statuses — مصادر الانتقال) مع قيمتها (value_sql) — للمعاينة قبل التأكيد."""
+    if table_name not in TRANSACTION_TABLES:
+        return []
+    where, params = [f"status IN ({','.join(['%s'] * len(statuses))})"], list(statuses)
+    if ids:
+        where.append(f"id IN ({','.join(['%s'] * len(ids))})")
+        params += [int(i) for i in ids]
+    if max_value is not None:
+        where.append(f"({value_sql}) < %s")
+        params += list(value_params) + [max_value]
+    return _execute_query(
+        f"SELECT id, user_id, ({value_sql}) AS value FROM {table_name} WHERE {' AND '.join(where)} ORDER BY id LIMIT %s",
+        tuple(list(value_params) + params + [int(limit)]), fetch=True
+    ) or []
+
+# Admin web queries (fastapi_admin) — كلها keyset على id حتى تبقى كل صفحة استعلام index range قصير
+TXID_COLUMNS = {
+    "syriatel_transactions": "txid", "shamcash_transactions": "txid", "coinex_transactions": "txid",
+    "coinex_withdrawals": "coinex_txid", "shamcash_withdrawals": "txid", "syriatel_withdrawals": "txid",
+}
+
+def get_pending_page(table_name, after_id=0, limit=50, actor=None):
+    """الطلبات المعلقة الأقدم أولاً بعد after_id — idx (status, id).
+    مع actor: طلباته المحجوزة + غير المحجوزة فقط؛ claim_holder = صاحب الحجز الساري."""
+    if table_name not in TRANSACTION_TABLES:
+        return []
+    where, params = ["t.status = 'pending'", "t.id > %s"], [int(after_id)]
+    if actor and table_name in CLAIM_TABLES:
+        where.append(f"(t.claimed_by = %s OR {_CLAIM_FREE.format(t='t.')})")
+        params.append(actor)
+    holder = ("IF(t.claimed_until > NOW(), t.claimed_by, NULL)" if table_name in CLAIM_TABLES else "NULL")
+    return _execute_query(
+        f"SELECT t.*, {holder} AS claim_holder, u.telegram_id, u.username "
+        f"FROM {table_name} t LEFT JOIN users u ON u.id = t.user_id "
+        f"WHERE {' AND '.join(where)} ORDER BY t.id LIMIT %s",
+        tuple(params + [int(limit)]), fetch=True
+    ) or []
+
+def search_transactions(table_name, status=None, user_id=None, txid=None, before_id=None, limit=50):
+    """بحث بالأحدث أولاً؛ كل فلتر يطابق index: (status, id) أو (user_id, id) أو txid."""
+    if table_name not in TRANSACTION_TABLES:
+        return []
+    where, params = [], []
+    if status:
+        where.append("t.status = %s")
+        params.append(status)
+    if user_id is not None:
+        where.append("t.user_id = %s")
+        params.append(int(user_id))
+    if txid:
+        where.append(f"t.{TXID_COLUMNS[table_name]} = %s")
+        params.append(txid)
+    if before_id:
+        where.append("t.id < %s")
+        params.append(int(before_id))
+    sql = f"SELECT t.*, u.telegram_id, u.username FROM {table_name} t LEFT JOIN users u ON u.id = t.user_id"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return _execute_query(sql + " ORDER BY t.id DESC LIMIT %s", tuple(params + [int(limit)]), fetch=True) or []
+
+def lookup_users(q=None, after_id=0, limit=50):
+    """رقم -> id أو telegram_id؛ نص -> username يبدأ بـ q (idx username)."""
+    where, params = ["id > %s"], [int(after_id)]
+    q = (q or "").strip().lstrip("@")
+    if q.isdigit():
+        where.append("(id = %s OR telegram_id = %s)")
+        params += [int(q), q]
+    elif q:
+        where.append("username LIKE %s")
+        params.append(q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+    return _execute_query(
+        f"SELECT id, telegram_id, username, balance, blocked_at FROM users WHERE {' AND '.join(where)} "
+        f"ORDER BY id LIMIT %s",
+        tuple(params + [int(limit)]), fetch=True
+    ) or []
+
+# Audit log search. كل نمط فلترة له فهرس (equality..., id) — راجع migration 0009 —
+# والمدى الزمني يتحول إلى حدود id لأن الصفوف تُدرج بـ created_at = now() فترتيب id يتبع الوقت.
+AUDIT_SEARCH_INDEXES = {
+    (): "PRIMARY",
+    ("source",): "idx_audit_source_id",
+    ("source", "tx_id"): "idx_audit_source_tx",
+    ("source", "tx_id", "action"): "idx_audit_source_tx",
+    ("source", "action"): "idx_audit_source_action",
+    ("actor",): "idx_audit_actor",
+    ("actor", "action"): "idx_audit_actor_action",
+    ("action",): "idx_audit_action",
+}
+
+def _fulltext_terms(text):
+    """كلمات النص كلها مطلوبة وتطابق كبادئة: "فشل تحويل" -> "+فشل* +تحويل*" (بلا عوامل من المستخدم)."""
+    return " ".join(f"+{w}*" for w in re.findall(r"\w+", text or ""))
+
+def build_audit_search(source=None, tx_id=None, actor=None, action=None, text=None,
+                       min_id=None, max_id=None, before_id=None, limit=50):
+    """(sql, params) لصفحة بحث واحدة بالأحدث أولاً؛ نفس النص الذي يفحصه benchmarks/explain_audit_search."""
+    where, params = [], []
+    if source:
+        where.append("source = %s")
+        params.append(source)
+        if tx_id is not None:
+            where.append("tx_id = %s")
+            params.append(int(tx_id))
+    if actor:
+        where.append("actor = %s")
+        params.append(actor)
+    if action:
+        where.append("action = %s")
+        params.append(action)
+    terms = _fulltext_terms(text)
+    if terms:
+        where.append("MATCH(reason) AGAINST (%s IN BOOLEAN MODE)")
+        params.append(terms)
+    if min_id is not None:
+        where.append("id >= %s")
+        params.append(int(min_id))
+    upper = [int(x) + 1 for x in (max_id,) if x is not None] + [int(x) for x in (before_id,) if x]
+    if upper:
+        where.append("id < %s")
+        params.append(min(upper))
+    sql = "SELECT id, source, tx_id, action, actor, reason, created_at FROM audit_log"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return sql + " ORDER BY id DESC LIMIT %s", tuple(params + [int(limit)])
+
+AUDIT_ID_BOUNDS_SQL = (
+    "SELECT (SELECT id FROM audit_log WHERE created_at >= %s ORDER BY created_at, id LIMIT 1) AS min_id, "
+    "(SELECT id FROM audit_log WHERE created_at < %s ORDER BY created_at DESC, id DESC LIMIT 1) AS max_id"
+)
+
+def get_audit_id_bounds(time_from=None, time_to=None):
+    """[time_from, time_to) -> (min_id, max_id) بقراءتين LIMIT 1 من idx_audit_created_at.
+    يرجع None إن لم يقع أي صف في المدى."""
+    row = _execute_query(AUDIT_ID_BOUNDS_SQL, (time_from or datetime(1970, 1, 1), time_to or datetime(9999, 1, 1)),
+                         fetchone=True)
+    if not row or row["min_id"] is None or row["max_id"] is None or row["min_id"] > row["max_id"]:
+        return None
+    return row["min_id"], row["max_id"]
+
+def get_audit_page(source=None, tx_id=None, actor=None, action=None, text=None,
+                   time_from=None, time_to=None, before_id=None, limit=50):
+    """بحث سجل التدقيق بالأحدث أولاً، keyset على id (before_id = آخر id في الصفحة السابقة)."""
+    min_id = max_id = None
+    if time_from or time_to:
+        bounds = get_audit_id_bounds(time_from, time_to)
+        if bounds is None:
+            return []
+        min_id, max_id = bounds
+    sql, params = build_audit_search(source, tx_id, actor, action, text, min_id, max_id, before_id, limit)
+    return _execute_query(sql, params, fetch=True) or []
+
+# Statistics rollups (stats_rollup؛ تُحدَّث عبر triggers — راجع migration 0006)
+# عمود المبلغ وتعبير العملة لكل جدول، بنفس ما تستخدمه الـ triggers
+ROLLUP_SOURCES = {
+    "syriatel_transactions": ("amount", "'NSP'"),
+    "shamcash_transactions": ("amount", "COALESCE(currency, 'NSP')"),
+    "coinex_transactions": ("nsp_value", "'NSP'"),
+    "coinex_withdrawals": ("nsp_amount", "'NSP'"),
+    "syriatel_withdrawals": ("amount", "'NSP'"),
+    "shamcash_withdrawals": ("requested_amount", "'NSP'"),
+}
+
+def get_user_stats(user_id):
+    """إجماليات المستخدم لكل (method, status, currency) — صفوف بعدد أيام نشاطه لا بعدد عملياته."""
+    return _execute_query(
+        "SELECT method, status, currency, SUM(cnt) AS cnt, SUM(total) AS total, "
+        "MIN(min_amount) AS min_amount, MAX(max_amount) AS max_amount "
+        "FROM stats_rollup WHERE user_id = %s GROUP BY method, status, currency HAVING SUM(cnt) > 0",
+        (int(user_id),), fetch=True
+    ) or []
+
+def get_global_stats(since_day):
+    """إجماليات كل المستخدمين (user_id = 0) منذ since_day."""
+    return _execute_query(
+        "SELECT method, status, currency, SUM(cnt) AS cnt, SUM(total) AS total, "
+        "MIN(min_amount) AS min_amount, MAX(max_amount) AS max_amount "
+        "FROM stats_rollup WHERE user_id = 0 AND day >= %s GROUP BY method, status, currency HAVING SUM(cnt) > 0",
+        (since_day,), fetch=True
+    ) or []
+
+def get_dirty_rollup_groups(limit=500):
+    return _execute_query(
+        "SELECT DISTINCT day, method FROM stats_rollup WHERE dirty = 1 LIMIT %s", (int(limit),), fetch=True
+    ) or []
+
+def rebuild_rollup_day(method, day):
+    """
+    يعيد حساب كل صفوف (day, method) بدقة من الجدول المصدر (min/max وحذف الحاويات الفارغة).
+    INSERT ... SELECT يقرأ المصدر بأقفال مشتركة، فأي تغيير متزامن ينتظر الـ commit ثم يطبّق فرقه فوق النتيجة.
+    """
+    if method not in ROLLUP_SOURCES:
+        return
+    amount, currency = ROLLUP_SOURCES[method]
+    aggregates = f"COUNT(*), SUM({amount}), MIN({amount}), MAX({amount}), 0"
+    where = "created_at >= %s AND created_at < %s + INTERVAL 1 DAY"
+    with transaction() as cur:
+        cur.execute("DELETE FROM stats_rollup WHERE day = %s AND method = %s", (day, method))
+        cur.execute(
+            "INSERT INTO stats_rollup (user_id, day, method, status, currency, cnt, total, min_amount, max_amount, dirty) "
+            f"SELECT user_id, %s, %s, status, {currency}, {aggregates} FROM {method} "
+            f"WHERE {where} GROUP BY user_id, status, {currency} "
+            "UNION ALL "
+            f"SELECT 0, %s, %s, status, {currency}, {aggregates} FROM {method} "
+            f"WHERE {where} GROUP BY status, {currency}",
+            (day, method, day, day, day, method, day, day)
+        )
+
+# Per-user history (كل الطرق في صفحة واحدة مرتبة زمنياً)
+# ترتيب الجداول ثابت: رقم الجدول جزء من مفتاح الترتيب (created_at, method, id) ومن المؤشر
+HISTORY_METHODS = (
+    "syriatel_transactions", "shamcash_transactions", "coinex_transactions",
+    "syriatel_withdrawals", "shamcash_withdrawals", "coinex_withdrawals",
+)
+
+def get_user_history_page(user_id, cursor=None, older=True, limit=10):
+    """
+    صفحة من عمليات المستخدم عبر الجداول الستة في استعلام واحد (UNION ALL).
+    cursor = (created_at, method_index, id) لآخر صف معروض؛ older=False للصفحة الأحدث منه.
+    كل فرع يقرأ range على idx (user_id, created_at, id) ويحدّ نفسه بـ LIMIT قبل الدمج،
+    فتكلفة الصفحة ثابتة مهما رجع المستخدم في السجل. الصفوف ترجع بالأحدث أولاً دائماً.
+    """
+    op, order = ("<", "DESC") if older else (">", "ASC")
+    parts, params = [], []
+    for idx, table in enumerate(HISTORY_METHODS):
+        amount, currency = ROLLUP_SOURCES[table]
+        where, branch = ["user_id = %s"], [int(user_id)]
+        if cursor:
+            created_at, method_idx, tx_id = cursor
+            if idx == method_idx:
+                where.append(f"(created_at {op} %s OR (created_at = %s AND id {op} %s))")
+                branch += [created_at, created_at, int(tx_id)]
+            else:
+                # جدول قبل/بعد جدول المؤشر في الترتيب يشمل نفس الثانية أو يستبعدها
+                same_second_included = (idx < method_idx) if older else (idx > method_idx)
+                where.append(f"created_at {op}{'=' if same_second_included else ''} %s")
+                branch.append(created_at)
+        parts.append(
+            f"(SELECT {idx} AS method_idx, id, status, {amount} AS amount, {currency} AS currency, created_at "
+            f"FROM {table} WHERE {' AND '.join(where)} "
+            f"ORDER BY created_at {order}, id {order} LIMIT %s)"
+        )
+        params += branch + [int(limit)]
+    sql = (" UNION ALL ".join(parts) +
+           f" ORDER BY created_at {order}, method_idx {order}, id {order} LIMIT %s")
+    rows = _execute_query(sql, tuple(params + [int(limit)]), fetch=True) or []
+    for r in rows:
+        r["method"] = HISTORY_METHODS[r["method_idx"]]
+    return rows if older else rows[::-1]
+
 def add_audit_log(source, tx_id, action, actor="system", reason=None):
     _execute_query("INSERT INTO audit_log (source, tx_id, action, actor, reason, created_at) VALUES (%s,%s,%s,%s,%s,%s)",
                    (source, tx_id, action, actor, reason, datetime.now()))
 
+def add_audit_logs(entries):
+    """entries: [(source, tx_id, action, actor, reason)] — إدخال متعدد الصفوف في معاملة واحدة."""
+    if not entries:
+        return
+    now = datetime.now()
+    try:
+        with transaction() as cur:
+            cur.executemany(
+                "INSERT INTO audit_log (source, tx_id, action, actor, reason, created_at) VALUES (%s,%s,%s,%s,%s,%s)",
+                [tuple(e) + (now,) for e in entries]
+            )
+    except mysql.connector.Error as err:
+        logger.error(f"Database Error in add_audit_logs: {err}")
+
+def _audit_insert(cur, source, tx_id, action, actor="system", reason=None):
+    cur.execute("INSERT INTO audit_log (source, tx_id, action, actor, reason, created_at) VALUES (%s,%s,%s,%s,%s,%s)",
+                (source, tx_id, action, actor, reason, datetime.now()))
+
+# Notification outbox
+def _outbox_insert(cur, user_id, text, parse_mode=None):
+    # telegram_id يُحل داخل نفس الاستعلام بدل قراءة منفصلة
+    cur.execute(
+        "INSERT INTO outbox (chat_id, text, parse_mode, status, attempts, next_attempt_at, created_at) "
+        "SELECT telegram_id, %s, %s, 'pending', 0, NOW(), NOW() FROM users WHERE id = %s AND telegram_id IS NOT NULL",
+        (text, parse_mode, user_id)
+    )
+
+def claim_outbox_batch(claim_token, limit, lock_seconds):
+    _execute_query(
+        "UPDATE outbox SET status = 'sending', claim_token = %s, attempts = attempts + 1, "
+        "locked_until = NOW() + INTERVAL %s SECOND "
+        "WHERE (status = 'pending' AND next_attempt_at <= NOW()) "
+        "   OR (status = 'sending' AND locked_until < NOW()) "
+        "ORDER BY id LIMIT %s",
+        (claim_token, int(lock_seconds), int(limit))
+    )
+    return _execute_query(
+        "SELECT id, chat_id, text, parse_mode, attempts FROM outbox WHERE claim_token = %s AND status = 'sending' ORDER BY id",
+        (claim_token,), fetch=True
+    ) or []
+
+def mark_outbox_sent(ids):
+    if not ids:
+        return
+    placeholders = ",".join(["%s"] * len(ids))
+    _execute_query(
+        f"UPDATE outbox SET status = 'sent', sent_at = NOW(), claim_token = NULL, locked_until = NULL "
+        f"WHERE id IN ({placeholders})",
+        tuple(ids)
+    )
+
+def reschedule_outbox(outbox_id, delay_seconds, last_error=None, give_up=False):
+    _execute_query(
+        "UPDATE outbox SET status = %s, last_error = %s, claim_token = NULL, locked_until = NULL, "
+        "next_attempt_at = NOW() + INTERVAL %s SECOND WHERE id = %s",
+        ("failed" if give_up else "pending", last_error, int(delay_seconds), outbox_id)
+    )
+
+def get_outbox_depth():
+    rows = _execute_query(
+        "SELECT status, COUNT(*) AS n FROM outbox WHERE status IN ('pending','sending','failed') GROUP BY status",
+        fetch=True
+    ) or []
+    return {row["status"]: row["n"] for row in rows}
+
+# Broadcasts
+def create_broadcast(text, parse_mode, created_by, status_chat_id, status_message_id):
+    return _execute_query(
+        "INSERT INTO broadcasts (text, parse_mode, status, created_by, status_chat_id, status_message_id, total, created_at) "
+        "SELECT %s, %s, 'running', %s, %s, %s, COUNT(*), NOW() FROM users "
+        "WHERE telegram_id IS NOT NULL AND blocked_at IS NULL",
+        (text, parse_mode, created_by, status_chat_id, status_message_id)
+    )
+
+def get_broadcast(broadcast_id):
+    return _execute_query("SELECT * FROM broadcasts WHERE id = %s", (broadcast_id,), fetchone=True)
+
+def get_active_broadcast():
+    return _execute_query("SELECT * FROM broadcasts WHERE status = 'running' ORDER BY id LIMIT 1", fetchone=True)
+
+def get_broadcast_recipients(after_user_id, limit):
+    # keyset على المفتاح الأساسي: كل دفعة استعلام قصير يبدأ من نقطة الحفظ
+    return _execute_query(
+        "SELECT id, telegram_id FROM users WHERE id > %s AND telegram_id IS NOT NULL AND blocked_at IS NULL "
+        "ORDER BY id LIMIT %s",
+        (after_user_id, int(limit)), fetch=True
+    ) or []
+
+def checkpoint_broadcast(broadcast_id, last_user_id, sent, failed, blocked_user_ids):
+    """حفظ تقدم دفعة واحدة وتعليم المستخدمين الذين حظروا البوت في معاملة واحدة."""
+    with transaction() as cur:
+        cur.execute(
+            "UPDATE broadcasts SET last_user_id = %s, sent = sent + %s, failed = failed + %s, "
+            "blocked = blocked + %s, updated_at = NOW() WHERE id = %s",
+            (last_user_id, sent, failed, len(blocked_user_ids), broadcast_id)
+        )
+        if blocked_user_ids:
+            placeholders = ",".join(["%s"] * len(blocked_user_ids))
+            cur.execute(f"UPDATE users SET blocked_at = NOW() WHERE id IN ({placeholders})", tuple(blocked_user_ids))
+
+def finish_broadcast(broadcast_id, status):
+    _execute_query("UPDATE broadcasts SET status = %s, finished_at = NOW() WHERE id = %s", (status, broadcast_id))
+
+def clear_user_blocked(telegram_id):
+    _execute_query("UPDATE users SET blocked_at = NULL WHERE telegram_id = %s AND blocked_at IS NOT NULL", (telegram_id,))
+
 # Rates & settings
 def get_usd_to_nsp_rate():
     result = _execute_query("SELECT value FROM settings WHERE key_name = %s", ("usd_to_nsp_rate",), fetchone=True)
@@ -112,14 +794,33 @@ def get_usd_to_nsp_rate():
             logger.warning("usd_to_nsp_rate in settings couldn't be parsed to int; returning fallback")
     return 5000
 
-def update_usd_to_nsp_rate(new_rate):
-    # use upsert to ensure setting exists
-    _execute_query(
-        "INSERT INTO settings (key_name, value, updated_at) VALUES (%s,%s,NOW()) "
-        "ON DUPLICATE KEY UPDATE value = VALUES(value), updated_at = NOW()",
-        ("usd_to_nsp_rate", str(new_rate))
-    )
-    add_audit_log("system", 0, "update_rate", actor="admin", reason=f"New rate set to {new_rate}")
+def get_current_rate(pair="USD_NSP"):
+    """{"id", "rate"} لآخر صف في rate_history؛ قبل أول تحديث (أو قبل المهاجرة) يُقرأ من settings و id = None."""
+    row = _execute_query("SELECT id, rate FROM rate_history WHERE pair = %s ORDER BY id DESC LIMIT 1",
+                         (pair,), fetchone=True)
+    if row:
+        return {"id": row["id"], "rate": int(row["rate"])}
+    return {"id": None, "rate": get_usd_to_nsp_rate()}
+
+def update_usd_to_nsp_rate(new_rate, actor="admin"):
+    """يضيف صفاً إلى rate_history ويحدّث settings في معاملة واحدة؛ يرجع id الصف الجديد."""
+    with transaction() as cur:
+        cur.execute("INSERT INTO rate_history (pair, rate, set_by, created_at) VALUES (%s,%s,%s,%s)",
+                    ("USD_NSP", int(new_rate), actor, datetime.now()))
+        rate_id = cur.lastrowid
+        # use upsert to ensure setting exists
+        cur.execute(
+            "INSERT INTO settings (key_name, value, updated_at) VALUES (%s,%s,NOW()) "
+            "ON DUPLICATE KEY UPDATE value = VALUES(value), updated_at = NOW()",
+            ("usd_to_nsp_rate", str(new_rate))
+        )
+        cur.execute("INSERT INTO audit_log (source, tx_id, action, actor, reason, created_at) VALUES (%s,%s,%s,%s,%s,%s)",
+                    ("system", rate_id, "update_rate", actor, f"New rate set to {new_rate}", datetime.now()))
+    return rate_id
+
+def get_rate_history(limit=10, pair="USD_NSP"):
+    return _execute_query("SELECT id, rate, set_by, created_at FROM rate_history WHERE pair = %s ORDER BY id DESC LIMIT %s",
+                          (pair, limit), fetch=True) or []
 
 def get_syriatel_numbers():
     result = _execute_query("SELECT value FROM settings WHERE key_name = %s", ("syriatel_numbers",), fetchone=True)
@@ -162,12 +863,174 @@ def is_coinex_address_whitelisted(user_id, address, chain=None):
 def get_user_telegram_by_tx(table_name, tx_id):
     if table_name not in ["shamcash_withdrawals", "syriatel_withdrawals"]:
         return None
-    tx = get_transaction(table_name, tx_id)
-    if tx:
-        user = get_user_by_id(tx["user_id"])
-        return user["telegram_id"] if user else None
-    return None
+    tx = get_transaction_with_user(table_name, tx_id)
+    return tx["telegram_id"] if tx else None
 
 def finalize_shamcash_withdraw(tx_id, external_txid):
     _execute_query("UPDATE shamcash_withdrawals SET status = %s, txid = %s, approved_at = %s WHERE id = %s",
                    ("approved", external_txid, datetime.now(), tx_id))
+
+# CoinEx withdrawal execution queue
+def claim_coinex_withdraw_jobs(claim_token, limit, lock_seconds):
+    """
+    يحجز حتى limit مهام جاهزة (أو مهام processing انتهى قفلها بعد انهيار العملية)
+    ويرجعها مع بيانات السحب. الحجز عبر claim_token يجعل العملية آمنة مع عدة عمليات.
+    """
+    _execute_query(
+        "UPDATE coinex_withdraw_queue SET status = 'processing', claim_token = %s, attempts = attempts + 1, "
+        "locked_until = NOW() + INTERVAL %s SECOND "
+        "WHERE (status = 'queued' AND available_at <= NOW()) "
+        "   OR (status = 'processing' AND locked_until < NOW()) "
+        "ORDER BY id LIMIT %s",
+        (claim_token, int(lock_seconds), int(limit))
+    )
+    return _execute_query(
+        "SELECT q.id AS job_id, q.withdrawal_id, q.client_id, q.attempts, q.created_at AS enqueued_at, "
+        "       w.user_id, w.usdt_amount, w.nsp_amount, w.chain, w.address, w.status AS withdrawal_status "
+        "FROM coinex_withdraw_queue q JOIN coinex_withdrawals w ON w.id = q.withdrawal_id "
+        "WHERE q.claim_token = %s AND q.status = 'processing'",
+        (claim_token,), fetch=True
+    ) or []
+
+def finish_coinex_withdraw_job(job_id, status, last_error=None):
+    _execute_query(
+        "UPDATE coinex_withdraw_queue SET status = %s, last_error = %s, claim_token = NULL, "
+        "locked_until = NULL, finished_at = NOW() WHERE id = %s",
+        (status, last_error, job_id)
+    )
+
+def retry_coinex_withdraw_job(job_id, delay_seconds, last_error=None):
+    _execute_query(
+        "UPDATE coinex_withdraw_queue SET status = 'queued', last_error = %s, claim_token = NULL, "
+        "locked_until = NULL, available_at = NOW() + INTERVAL %s SECOND WHERE id = %s",
+        (last_error, int(delay_seconds), job_id)
+    )
+
+def get_coinex_withdraw_queue_depth():
+    rows = _execute_query(
+        "SELECT status, COUNT(*) AS n FROM coinex_withdraw_queue "
+        "WHERE status IN ('queued','processing') GROUP BY status",
+        fetch=True
+    ) or []
+    depth = {"queued": 0, "processing": 0}
+    for row in rows:
+        depth[row["status"]] = row["n"]
+    return depth
+
+# Syriatel / ShamCash portal payout queue
+# provider -> (جدول السحوبات، عمود الوجهة)؛ المبلغ المرسل هو net_amount في الطريقتين
+PAYOUT_TABLES = {
+    "syriatel": ("syriatel_withdrawals", "phone"),
+    "shamcash": ("shamcash_withdrawals", "wallet_address"),
+}
+
+def enqueue_payouts(provider, client_prefix, window_seconds):
+    """
+    يضيف للقائمة كل سحب approved_awaiting_txid وافق عليه مشرف خلال window_seconds؛
+    INSERT IGNORE على (provider, withdrawal_id) فتكرار الاستدعاء آمن. يرجع عدد المضاف.
+    """
+    table, _ = PAYOUT_TABLES[provider]
+    try:
+        with transaction() as cur:
+            cur.execute(
+                f"INSERT IGNORE INTO payout_queue (provider, withdrawal_id, client_id, status, available_at, created_at) "
+                f"SELECT %s, id, CONCAT(%s, id), 'queued', NOW(), NOW() FROM {table} "
+                f"WHERE status = 'approved_awaiting_txid' AND approved_at >= NOW() - INTERVAL %s SECOND",
+                (provider, client_prefix, int(window_seconds))
+            )
+            return cur.rowcount
+    except mysql.connector.Error as err:
+        logger.error(f"Database Error in enqueue_payouts({provider}): {err}")
+        return 0
+
+def claim_payout_jobs(provider, claim_token, limit, lock_seconds):
+    """مثل claim_coinex_withdraw_jobs لمزوّد واحد؛ يرجع المهام مع الوجهة والمبلغ وحالة السحب."""
+    table, destination = PAYOUT_TABLES[provider]
+    _execute_query(
+        "UPDATE payout_queue SET status = 'processing', claim_token = %s, attempts = attempts + 1, "
+        "locked_until = NOW() + INTERVAL %s SECOND "
+        "WHERE provider = %s AND ((status = 'queued' AND available_at <= NOW()) "
+        "   OR (status = 'processing' AND locked_until < NOW())) "
+        "ORDER BY id LIMIT %s",
+        (claim_token, int(lock_seconds), provider, int(limit))
+    )
+    return _execute_query(
+        f"SELECT q.id AS job_id, q.provider, q.withdrawal_id, q.client_id, q.attempts, "
+        f"       w.user_id, w.net_amount AS amount, w.{destination} AS destination, w.status AS withdrawal_status "
+        f"FROM payout_queue q JOIN {table} w ON w.id = q.withdrawal_id "
+        f"WHERE q.claim_token = %s AND q.status = 'processing'",
+        (claim_token,), fetch=True
+    ) or []
+
+def finish_payout_job(job_id, status, last_error=None, external_txid=None):
+    _execute_query(
+        "UPDATE payout_queue SET status = %s, last_error = %s, external_txid = COALESCE(%s, external_txid), "
+        "claim_token = NULL, locked_until = NULL, finished_at = NOW() WHERE id = %s",
+        (status, last_error, external_txid, job_id)
+    )
+
+def retry_payout_job(job_id, delay_seconds, last_error=None):
+    _execute_query(
+        "UPDATE payout_queue SET status = 'queued', last_error = %s, claim_token = NULL, "
+        "locked_until = NULL, available_at = NOW() + INTERVAL %s SECOND WHERE id = %s",
+        (last_error, int(delay_seconds), job_id)
+    )
+
+def get_payout_queue_depth():
+    rows = _execute_query(
+        "SELECT provider, status, COUNT(*) AS n FROM payout_queue "
+        "WHERE status IN ('queued','processing') GROUP BY provider, status",
+        fetch=True
+    ) or []
+    depth = {p: {"queued": 0, "processing": 0} for p in PAYOUT_TABLES}
+    for row in rows:
+        depth.setdefault(row["provider"], {"queued": 0, "processing": 0})[row["status"]] = row["n"]
+    return depth
+
+# CoinEx withdrawal reconciliation
+def get_open_coinex_withdrawals(limit=500):
+    return _execute_query(
+        "SELECT id, user_id, nsp_amount, usdt_amount, coinex_txid, approved_at FROM coinex_withdrawals "
+        "WHERE status = 'processing' AND coinex_txid IS NOT NULL ORDER BY id LIMIT %s",
+        (int(limit),), fetch=True
+    ) or []
+
+def complete_coinex_withdrawals(completions):
+    """
+    completions: [(withdrawal_id, user_id, notify_text)]
+    يرجع المعرفات التي انتقلت فعلاً من processing إلى completed.
+    """
+    done = []
+    with transaction() as cur:
+        for wid, user_id, notify_text in completions:
+            cur.execute(
+                "UPDATE coinex_withdrawals SET status = 'completed' WHERE id = %s AND status = 'processing'",
+                (wid,)
+            )
+            if cur.rowcount != 1:
+                continue
+            _audit_insert(cur, "coinex_withdrawals", wid, "completed", "coinex_reconciler", "Confirmed by CoinEx history")
+            _outbox_insert(cur, user_id, notify_text)
+            done.append(wid)
+    return done
+
+def fail_and_refund_coinex_withdrawals(failures):
+    """
+    failures: [(withdrawal_id, user_id, nsp_amount, reason, notify_text)]
+    الانتقال إلى failed وإعادة الرصيد وسجل التدقيق والإشعار في معاملة واحدة؛ الشرط status='processing'
+    يمنع إعادة الرصيد مرتين. يرجع معرفات السحوبات التي تمت معالجتها فعلاً.
+    """
+    refunded = []
+    with transaction() as cur:
+        for wid, user_id, nsp_amount, reason, notify_text in failures:
+            cur.execute(
+                "UPDATE coinex_withdrawals SET status = 'failed', reason = %s WHERE id = %s AND status = 'processing'",
+                (reason, wid)
+            )
+            if cur.rowcount != 1:
+                continue
+            cur.execute("UPDATE users SET balance = balance + %s WHERE id = %s", (nsp_amount, user_id))
+            _audit_insert(cur, "coinex_withdrawals", wid, "failed_refunded", "coinex_reconciler", reason)
+            _outbox_insert(cur, user_id, notify_text)
+            refunded.append(wid)
+    return refunded
@@ -0,0 +1,110 @@
+# tests/test_reconciliation.py
+import asyncio
+
+import pytest
+
+from services import reconciliation
+from services.reconciliation import normalize_txid
+
+
+class FakeStore:
+    """دوال store التي تستدعيها reconcile، في الذاكرة."""
+
+    def __init__(self, pending, used=None):
+        self.pending = pending
+        self.used = used or {}
+        self.audit = []
+
+    def get_pending_deposits(self, table_name, after_id, limit):
+        return [r for r in self.pending if r["id"] > after_id][:limit]
+
+    def get_used_deposit_txids(self, table_name, txids):
+        return {t: self.used[t] for t in txids if t in self.used}
+
+    def get_audit_reasons(self, source, action, tx_ids):
+        return {(tx_id, reason) for s, tx_id, a, _, reason in self.audit if s == source and a == action}
+
+    def add_audit_logs(self, entries):
+        self.audit.extend(entries)
+
+
+@pytest.fixture
+def fake(monkeypatch, tmp_path):
+    approved = []
+
+    async def execute(kind, ids, approve, actor, actor_name, reason=None, respect_claims=True):
+        assert approve and not respect_claims
+        approved.extend(ids)
+        return [{"id": i} for i in ids]
+
+    def install(pending, used=None, lines=("ABC123,5000",)):
+        store = FakeStore(pending, used)
+        for name in ("get_pending_deposits", "get_used_deposit_txids", "get_audit_reasons", "add_audit_logs"):
+            monkeypatch.setattr(reconciliation.store, name, getattr(store, name))
+        monkeypatch.setattr(reconciliation.bulk_actions, "execute", execute)
+        path = tmp_path / "statement.csv"
+        path.write_text("Transaction ID,Amount\n" + "\n".join(lines) + "\n", encoding="utf-8")
+        store.approved = approved
+        store.index = reconciliation.index_file(str(path), "csv")
+        return store
+    return install
+
+
+def _deposit(i, txid, amount=5000):
+    return {"id": i, "user_id": 100 + i, "amount": amount, "currency": "NSP", "txid": txid}
+
+
+def _reconcile(store):
+    return asyncio.run(reconciliation.reconcile("syriatel", store.index))
+
+
+def test_normalize_txid_strips_all_whitespace():
+    assert normalize_txid(" ab c\t12\n3 ") == "ABC123"
+    assert normalize_txid(None) == ""
+
+
+def test_exact_match_is_approved(fake):
+    store = fake([_deposit(1, "abc123")])
+    report = _reconcile(store)
+    assert report.approved == [1] and store.approved == [1]
+    assert report.flagged == []
+
+
+def test_two_pending_deposits_claiming_one_line_are_both_flagged(fake):
+    store = fake([_deposit(1, "abc123"), _deposit(2, "ABC 123")])
+    report = _reconcile(store)
+    assert store.approved == []
+    assert [i for i, _ in report.flagged] == [1, 2]
+    assert all("claimed by 2 pending deposits" in reason for _, reason in report.flagged)
+
+
+def test_duplicate_claim_with_a_mismatched_amount_still_blocks_the_match(fake):
+    store = fake([_deposit(1, "ABC123"), _deposit(2, "abc123", amount=7000)])
+    report = _reconcile(store)
+    assert store.approved == []
+    assert {i for i, _ in report.flagged} == {1, 2}
+
+
+def test_txid_used_by_a_resolved_deposit_is_flagged(fake):
+    store = fake([_deposit(1, "abc 123")], used={"ABC123": (9, "approved")})
+    report = _reconcile(store)
+    assert store.approved == []
+    assert report.flagged == [(1, "TxID ABC123 already used by deposit #9 (approved)")]
+
+
+def test_reupload_does_not_repeat_flags(fake):
+    store = fake([_deposit(1, "abc123"), _deposit(2, "ABC123")])
+    first = _reconcile(store)
+    second = _reconcile(store)
+    assert first.new_flags == 2 and second.new_flags == 0
+    assert len(second.flagged) == 2
+    assert len(store.audit) == 2
+    assert {entry[0] for entry in store.audit} == {"syriatel_transactions"}
+
+
+def test_unrelated_matches_are_approved_alongside_flags(fake):
+    store = fake([_deposit(1, "abc123"), _deposit(2, "abc123"), _deposit(3, "XYZ789", 800)],
+                 lines=("ABC123,5000", "XYZ789,800"))
+    report = _reconcile(store)
+    assert store.approved == [3]
+    assert {i for i, _ in report.flagged} == {1, 2}
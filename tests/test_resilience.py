@@ -0,0 +1,100 @@
+# tests/test_resilience.py
+import pytest
+
+from services import resilience
+from services.resilience import CircuitBreaker, TokenBucket, backoff_delay
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", c)
+    return c
+
+
+def test_bucket_spends_burst_then_reports_wait(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert [bucket.try_acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.try_acquire() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.try_acquire() == 0.0
+
+
+def test_bucket_refill_is_capped_at_capacity(clock):
+    bucket = TokenBucket(rate=10, capacity=2)
+    bucket.try_acquire(2)
+    clock.now += 60
+    assert bucket.available == pytest.approx(2)
+
+
+def test_bucket_rejects_non_positive_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_bucket_acquire_gives_up_when_wait_exceeds_timeout(clock):
+    bucket = TokenBucket(rate=1, capacity=1)
+    bucket.try_acquire()
+    assert bucket.acquire(timeout=0.5) is False
+
+
+def test_breaker_opens_after_threshold_and_rejects(clock):
+    breaker = CircuitBreaker("t", failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure("boom")
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure("boom")
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow_request() is False
+    assert breaker.total_rejected == 1
+    assert breaker.retry_after() == pytest.approx(30)
+
+
+def test_breaker_success_resets_consecutive_failures(clock):
+    breaker = CircuitBreaker("t", failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_half_open_allows_one_trial(clock):
+    breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request() is True
+    assert breaker.allow_request() is False
+    breaker.release_trial()
+    assert breaker.allow_request() is True
+
+
+def test_breaker_half_open_trial_outcome(clock):
+    breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow_request()
+    breaker.record_failure("still down")
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.snapshot()["retry_after"] == pytest.approx(10)
+
+    clock.now += 10
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot()["consecutive_failures"] == 0
+
+
+def test_backoff_delay_is_jittered_under_the_capped_exponential(monkeypatch):
+    monkeypatch.setattr(resilience.random, "uniform", lambda lo, hi: hi)
+    assert [backoff_delay(n, base=0.5, cap=8.0) for n in range(1, 7)] == [0.5, 1.0, 2.0, 4.0, 8.0, 8.0]
+    monkeypatch.setattr(resilience.random, "uniform", lambda lo, hi: lo)
+    assert backoff_delay(5) == 0
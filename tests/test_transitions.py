@@ -0,0 +1,155 @@
+# tests/test_transitions.py
+import asyncio
+
+import pytest
+
+from services import transitions
+from services.transitions import MACHINES, PAYOUT_IN_PROGRESS, Ctx
+
+# المبلغ المخصوم من الرصيد عند تقديم السحب — هو ما يُعاد عند الرفض/الفشل/انتهاء المهلة
+DEBITED = {
+    "syriatel_withdrawals": "amount",
+    "shamcash_withdrawals": "requested_amount",
+    "coinex_withdrawals": "nsp_amount",
+}
+DEPOSITS = ("syriatel_transactions", "shamcash_transactions")
+REFUNDS = ("reject", "expire", "fail")
+
+
+def _row(table: str, **extra) -> dict:
+    row = {"id": 7, "user_id": 3, "telegram_id": "42", "amount": 5000, "net_amount": 4900,
+           "requested_amount": 6000, "nsp_amount": 8000, "currency": "NSP", "status": "pending"}
+    row.update(extra)
+    return row
+
+
+EXPECTED = {
+    ("syriatel_transactions", "approve"): (("pending",), "approved"),
+    ("syriatel_transactions", "reject"): (("pending",), "rejected"),
+    ("shamcash_transactions", "approve"): (("pending",), "approved"),
+    ("shamcash_transactions", "reject"): (("pending",), "rejected"),
+    ("syriatel_withdrawals", "approve"): (("pending",), "approved_awaiting_txid"),
+    ("syriatel_withdrawals", "reject"): (("pending", "approved_awaiting_txid"), "rejected"),
+    ("syriatel_withdrawals", "expire"): (("pending", "approved_awaiting_txid"), "expired"),
+    ("shamcash_withdrawals", "approve"): (("pending",), "approved_awaiting_txid"),
+    ("shamcash_withdrawals", "reject"): (("pending", "approved_awaiting_txid"), "rejected"),
+    ("shamcash_withdrawals", "expire"): (("pending", "approved_awaiting_txid"), "expired"),
+    ("coinex_withdrawals", "approve"): (("pending",), "approved_by_admin"),
+    ("coinex_withdrawals", "reject"): (("pending", "error"), "rejected"),
+    ("coinex_withdrawals", "expire"): (("pending",), "expired"),
+    ("coinex_withdrawals", "fail"): (("approved_by_admin",), "failed"),
+}
+
+
+@pytest.mark.parametrize("table,name", sorted(EXPECTED))
+def test_sources_and_target(table, name):
+    t = MACHINES[table].transition(name)
+    sources, target = EXPECTED[(table, name)]
+    assert set(t.sources) == set(sources)
+    assert t.target == target
+
+
+@pytest.mark.parametrize("table", DEPOSITS)
+def test_deposit_approve_credits_and_reject_does_not(table):
+    m = MACHINES[table]
+    ctx = Ctx("admin_1", rate=15000)
+    assert m.transition("approve").balance(_row(table), ctx) == 5000
+    assert m.transition("reject").balance is None
+
+
+def test_shamcash_usd_deposit_credits_at_the_locked_quote():
+    t = MACHINES["shamcash_transactions"].transition("approve")
+    row = _row("shamcash_transactions", amount=10, currency="USD", quote_rate=14000)
+    assert t.balance(row, Ctx("admin_1", rate=15000)) == 140000
+
+
+@pytest.mark.parametrize("table", sorted(DEBITED))
+def test_withdrawal_refunds_return_exactly_the_debited_amount(table):
+    m = MACHINES[table]
+    row = _row(table)
+    assert m.transition("approve").balance is None
+    for name in REFUNDS:
+        t = m.transitions.get(name)
+        if t is not None:
+            assert t.balance(row, Ctx("system")) == row[DEBITED[table]] > 0
+
+
+@pytest.mark.parametrize("table", sorted(DEBITED))
+def test_no_refund_target_is_a_source_of_another_refund(table):
+    m = MACHINES[table]
+    refunding = [t for t in m.transitions.values() if t.balance]
+    refunded_states = {t.target for t in refunding}
+    for t in refunding:
+        assert not refunded_states & set(t.sources)
+
+
+@pytest.mark.parametrize("table", ("syriatel_withdrawals", "shamcash_withdrawals"))
+def test_payout_in_progress_cannot_be_refunded(table):
+    m = MACHINES[table]
+    assert not m.can("reject", PAYOUT_IN_PROGRESS)
+    assert not m.can("expire", PAYOUT_IN_PROGRESS)
+    assert m.can("complete", PAYOUT_IN_PROGRESS)
+    assert m.can("start_payout", "approved_awaiting_txid")
+    assert m.can("release_payout", PAYOUT_IN_PROGRESS)
+
+
+class MemoryStore:
+    """apply_transition بدلالات CAS على صف في الذاكرة، مع تطبيق أثر الرصيد."""
+
+    def __init__(self, row: dict):
+        self.row = row
+        self.balance = 0
+        self.audits = []
+
+    def apply_transition(self, table_name, tx_id, from_statuses, status, effects=None, claim_actor=None, **kw):
+        if self.row["status"] not in from_statuses:
+            return None
+        self.row["status"] = status
+        fx = effects(dict(self.row)) if effects else {}
+        self.balance += fx.get("balance") or 0
+        self.audits.append(fx.get("audit"))
+        return dict(self.row)
+
+
+def _run(store, table, names):
+    async def go():
+        return [await transitions.apply(table, 7, name, "system") for name in names]
+    return asyncio.run(go())
+
+
+@pytest.fixture
+def memory(monkeypatch):
+    def make(table, status):
+        store = MemoryStore(_row(table, status=status))
+        monkeypatch.setattr(transitions.store, "apply_transition", store.apply_transition)
+        monkeypatch.setattr(transitions, "publish_resolved", lambda *a, **k: None)
+        return store
+    return make
+
+
+@pytest.mark.parametrize("table,status,names", [
+    ("syriatel_withdrawals", "pending", ["reject", "reject", "expire"]),
+    ("shamcash_withdrawals", "approved_awaiting_txid", ["expire", "reject"]),
+    ("coinex_withdrawals", "approved_by_admin", ["fail", "reject", "fail"]),
+    ("coinex_withdrawals", "approved_by_admin", ["error", "reject", "reject"]),
+])
+def test_refund_is_applied_once(memory, table, status, names):
+    store = memory(table, status)
+    results = _run(store, table, names)
+    assert store.balance == store.row[DEBITED[table]]
+    assert sum(r is not None and transitions.machine(table).transition(n).balance is not None
+               for r, n in zip(results, names)) == 1
+
+
+def test_deposit_approve_credits_once(memory):
+    store = memory("syriatel_transactions", "pending")
+    assert [r is not None for r in _run(store, "syriatel_transactions", ["approve", "approve", "reject"])] \
+        == [True, False, False]
+    assert store.balance == 5000
+
+
+def test_audit_source_is_the_table_name(memory):
+    store = memory("syriatel_withdrawals", "pending")
+    _run(store, "syriatel_withdrawals", ["reject"])
+    assert store.audits[0][0] == "syriatel_withdrawals"
+    assert all(m.audit_source == table for table, m in MACHINES.items())
@@ -1,17 +1,43 @@
 # utils/notifications.py
 import asyncio
+import heapq
+import html
 import logging
 import os
-from typing import Any, Optional, Sequence
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Sequence
 
 import config
+from services.resilience import TokenBucket
+from utils.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
 _bot_instance: Optional[Any] = None
 
-# حد التوازي الافتراضي عند ارسال إشعارات للمشرفين (يمكن تغييره عبر env NOTIF_ADMIN_CONCURRENCY)
-_ADMIN_CONCURRENCY = int(os.getenv("NOTIF_ADMIN_CONCURRENCY", "5"))
+# ميزانية الإرسال: Telegram يسمح بحوالي 30 رسالة/ث إجمالاً وحوالي رسالة/ث لكل محادثة
+_GLOBAL_RATE = float(os.getenv("NOTIF_GLOBAL_RATE", "25"))
+_PER_CHAT_INTERVAL = float(os.getenv("NOTIF_PER_CHAT_INTERVAL", "1.0"))
+# أقصى عدد طلبات إرسال متزامنة نحو Telegram (كان سابقاً حد التوازي لإشعارات المشرفين)
+_MAX_IN_FLIGHT = int(os.getenv("NOTIF_MAX_IN_FLIGHT", os.getenv("NOTIF_ADMIN_CONCURRENCY", "10")))
+
+# وضع الملخص لإشعارات المشرفين: تُجمع الطلبات خلال نافذة وتُرسل رسالة واحدة لكل مشرف.
+# NOTIF_DIGEST_WINDOW=0 يعطّل التجميع. الطلبات بمبلغ >= NOTIF_DIGEST_IMMEDIATE_AMOUNT (NSP) تُرسل فوراً.
+_DIGEST_WINDOW = float(os.getenv("NOTIF_DIGEST_WINDOW", "60"))
+_DIGEST_TOP_N = int(os.getenv("NOTIF_DIGEST_TOP_N", "5"))
+_DIGEST_IMMEDIATE_AMOUNT = float(os.getenv("NOTIF_DIGEST_IMMEDIATE_AMOUNT", "1000000"))
+
+# نسخ رسالة الطلب عند كل مشرف (لتحديثها جميعاً عند تغيّر الحالة)
+_ADMIN_MSG_TTL = float(os.getenv("NOTIF_ADMIN_MSG_TTL", "172800"))
+_ADMIN_MSG_MAX = int(os.getenv("NOTIF_ADMIN_MSG_MAX", "5000"))
+
+# مسارات الأولوية: الأصغر يُرسل أولاً
+PRIORITY_USER = 0      # رسائل المعاملات للمستخدمين
+PRIORITY_ADMIN = 1     # إشعارات المشرفين
+PRIORITY_BULK = 2      # الملخصات والبث الجماعي
+_LANES = (PRIORITY_USER, PRIORITY_ADMIN, PRIORITY_BULK)
 
 
 def set_bot_instance(bot: Any):
@@ -26,6 +52,191 @@ def set_bot_instance(bot: Any):
     logger.debug("Bot instance set for notifications")
 
 
+@dataclass
+class _OutboundJob:
+    method: str
+    chat_id: int
+    kwargs: dict
+    priority: int
+    attempts_left: int = 0
+    retry_delay: float = 1.0
+    attempt: int = 0
+    raise_errors: bool = False
+    enqueued_at: float = field(default_factory=time.monotonic)
+    future: Optional[asyncio.Future] = None
+
+
+class OutboundScheduler:
+    """
+    مُجدول مركزي لكل الرسائل الصادرة:
+      - token bucket عام (NOTIF_GLOBAL_RATE رسالة/ث)
+      - فاصل أدنى بين رسالتين لنفس المحادثة (NOTIF_PER_CHAT_INTERVAL)
+      - مسارات أولوية: رسائل المستخدمين قبل إشعارات المشرفين قبل الرسائل الجماعية
+      - RetryAfter (429) يوقف الإرسال كله المدة المطلوبة ثم يعيد الرسالة لرأس مسارها
+    """
+
+    def __init__(self, global_rate: float, per_chat_interval: float, max_in_flight: int):
+        self.per_chat_interval = per_chat_interval
+        self._bucket = TokenBucket(global_rate)
+        self._max_in_flight = max(1, max_in_flight)
+        self._lanes: Dict[int, deque] = {p: deque() for p in _LANES}
+        self._next_allowed: Dict[int, float] = {}
+        self._paused_until = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight: set = set()
+        # مقاييس
+        self._latencies: deque = deque(maxlen=2000)
+        self.sent = 0
+        self.failed = 0
+        self.retry_after_hits = 0
+
+    # ---------- public ----------
+    def submit(self, method: str, chat_id: int, priority: int = PRIORITY_USER,
+               retry_attempts: int = 0, retry_delay: float = 1.0, raise_errors: bool = False,
+               **kwargs) -> asyncio.Future:
+        """
+        يضيف استدعاء bot.<method>(chat_id=..., **kwargs) إلى الطابور ويرجع Future
+        تُحل بنتيجة الاستدعاء عند النجاح، وعند الفشل النهائي بـ None
+        (أو بالاستثناء نفسه إذا raise_errors=True).
+        """
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        job = _OutboundJob(method, chat_id, kwargs, priority if priority in self._lanes else PRIORITY_BULK,
+                           attempts_left=retry_attempts, retry_delay=retry_delay, raise_errors=raise_errors,
+                           future=loop.create_future())
+        self._lanes[job.priority].append(job)
+        self._wakeup.set()
+        return job.future
+
+    async def stop(self, drain_timeout: float = 5.0):
+        if not self._task:
+            return
+        deadline = time.monotonic() + drain_timeout
+        while self.depth() and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def depth(self) -> int:
+        return sum(len(q) for q in self._lanes.values())
+
+    def stats(self) -> dict:
+        lat = sorted(self._latencies)
+
+        def pct(p):
+            return round(lat[min(len(lat) - 1, int(p / 100.0 * len(lat)))] * 1000, 1) if lat else 0.0
+
+        return {
+            "depth": {"user": len(self._lanes[PRIORITY_USER]), "admin": len(self._lanes[PRIORITY_ADMIN]),
+                      "bulk": len(self._lanes[PRIORITY_BULK])},
+            "in_flight": len(self._in_flight),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retry_after_hits": self.retry_after_hits,
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 1),
+            "latency_p50_ms": pct(50),
+            "latency_p99_ms": pct(99),
+        }
+
+    # ---------- internals ----------
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self._max_in_flight)
+            self._task = asyncio.create_task(self._run(), name="outbound_scheduler")
+
+    def _pop_ready(self, now: float) -> Optional[_OutboundJob]:
+        if now < self._paused_until:
+            return None
+        for p in _LANES:
+            lane = self._lanes[p]
+            for i, job in enumerate(lane):
+                if self._next_allowed.get(job.chat_id, 0.0) <= now:
+                    del lane[i]
+                    return job
+        return None
+
+    def _seconds_until_ready(self, now: float) -> Optional[float]:
+        if not self.depth():
+            return None
+        if now < self._paused_until:
+            return self._paused_until - now
+        waits = [self._next_allowed.get(job.chat_id, 0.0) - now for lane in self._lanes.values() for job in lane]
+        return max(0.01, min(waits))
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            job = self._pop_ready(now)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self._seconds_until_ready(now))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            # حجز المحادثة فوراً حتى لا تُختار رسالتها التالية قبل انقضاء الفاصل
+            self._next_allowed[job.chat_id] = now + self.per_chat_interval
+            if len(self._next_allowed) > 10000:
+                self._next_allowed = {c: t for c, t in self._next_allowed.items() if t > now}
+            wait = self._bucket.try_acquire()
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self._bucket.try_acquire()
+            await self._slots.acquire()
+            task = asyncio.create_task(self._send(job))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, job: _OutboundJob):
+        try:
+            if not _bot_instance:
+                raise RuntimeError("Bot instance not set for notifications utility.")
+            result = await getattr(_bot_instance, job.method)(chat_id=job.chat_id, **job.kwargs)
+        except Exception as exc:
+            retry_after = getattr(exc, "retry_after", None)
+            if retry_after is not None:
+                # PTB قد يعطي int أو timedelta
+                seconds = retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+                self.retry_after_hits += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+                self._lanes[job.priority].appendleft(job)
+                logger.warning("Telegram flood control: pausing outbound for %.1fs", seconds)
+            elif job.attempts_left > 0:
+                job.attempts_left -= 1
+                job.attempt += 1
+                logger.warning("%s attempt %s failed for %s: %s", job.method, job.attempt, job.chat_id, exc)
+                self._next_allowed[job.chat_id] = time.monotonic() + job.retry_delay * job.attempt
+                self._lanes[job.priority].appendleft(job)
+            else:
+                self.failed += 1
+                logger.warning("Failed %s to %s: %s", job.method, job.chat_id, exc)
+                if not job.future.done():
+                    if job.raise_errors:
+                        job.future.set_exception(exc)
+                    else:
+                        job.future.set_result(None)
+            self._wakeup.set()
+            return
+        finally:
+            self._slots.release()
+        self.sent += 1
+        self._latencies.append(time.monotonic() - job.enqueued_at)
+        if not job.future.done():
+            job.future.set_result(result)
+
+
+outbound = OutboundScheduler(_GLOBAL_RATE, _PER_CHAT_INTERVAL, _MAX_IN_FLIGHT)
+
+
 async def notify_user(
     telegram_id: int,
     message: str,
@@ -34,25 +245,42 @@ async def notify_user(
     timeout: float = 10.0,
 ) -> bool:
     """
-    إرسال رسالة لمستخدم واحد. ترجع True إذا نجحت، False إن فشل.
+    إرسال رسالة لمستخدم واحد عبر المُجدول (مسار الأولوية الأعلى).
+    ترجع True إذا أُرسلت خلال timeout، False إن فشلت أو تأخرت (الرسالة المتأخرة تبقى في الطابور).
     """
     if not _bot_instance:
         logger.error("Bot instance not set for notifications utility.")
         return False
 
+    fut = outbound.submit("send_message", telegram_id, PRIORITY_USER,
+                          text=message, parse_mode=parse_mode, reply_markup=reply_markup)
     try:
-        coro = _bot_instance.send_message(
-            chat_id=telegram_id, text=message, parse_mode=parse_mode, reply_markup=reply_markup
-        )
-        await asyncio.wait_for(coro, timeout=timeout)
-        return True
+        return await asyncio.wait_for(asyncio.shield(fut), timeout=timeout) is not None
     except asyncio.TimeoutError:
         logger.error("Timeout sending message to %s", telegram_id)
-    except Exception as e:
-        logger.exception("Failed to notify user %s: %s", telegram_id, e)
     return False
 
 
+async def _send_to_admins(message: str, parse_mode: Optional[str], reply_markup: Optional[Any],
+                          retry_attempts: int = 0, retry_delay: float = 1.0) -> list:
+    """يرجع [(admin_id, message_or_None)] بترتيب ADMIN_IDS."""
+    admin_ids: Sequence[int] = getattr(config, "ADMIN_IDS", []) or []
+    if not admin_ids:
+        logger.info("No admin IDs configured; skip notify_admin")
+        return []
+    futures = [
+        outbound.submit("send_message", admin_id, PRIORITY_ADMIN,
+                        retry_attempts=retry_attempts, retry_delay=retry_delay,
+                        text=message, parse_mode=parse_mode, reply_markup=reply_markup)
+        for admin_id in admin_ids
+    ]
+    return list(zip(admin_ids, await asyncio.gather(*futures)))
+
+
+def _copies(sent: list) -> list:
+    return [(admin_id, msg.message_id) for admin_id, msg in sent if getattr(msg, "message_id", None)]
+
+
 async def notify_admin(
     message: str,
     parse_mode: Optional[str] = None,
@@ -60,40 +288,231 @@ async def notify_admin(
     concurrency: Optional[int] = None,
     retry_attempts: int = 0,
     retry_delay: float = 1.0,
+    tx_key: Optional[str] = None,
 ) -> dict:
     """
-    إرسال الرسالة لكل المشرفين (ADMIN_IDS) مع تحكم بالتوازي وإمكانية إعادة المحاولة.
+    إرسال الرسالة لكل المشرفين (ADMIN_IDS) عبر المُجدول مع إمكانية إعادة المحاولة.
+    التوازي يحدده المُجدول العام (concurrency مُبقى للتوافق فقط).
+    tx_key (من admin_tx_key) يسجل نسخ الرسالة لتحديثها لاحقاً عبر resolve_admin_messages.
     يعيد dict من شكل {admin_id: success_bool}
     """
     if not _bot_instance:
         logger.error("Bot instance not set for notifications utility.")
         return {}
 
-    admin_ids: Sequence[int] = getattr(config, "ADMIN_IDS", []) or []
-    if not admin_ids:
-        logger.info("No admin IDs configured; skip notify_admin")
-        return {}
+    sent = await _send_to_admins(message, parse_mode, reply_markup, retry_attempts, retry_delay)
+    if tx_key:
+        copies = _copies(sent)
+        if copies:
+            admin_messages.set(tx_key, _AdminCopies(copies, message, parse_mode))
+    return {admin_id: res is not None for admin_id, res in sent}
+
+
+# ---------- نسخ رسائل الطلبات عند المشرفين ----------
+@dataclass
+class _DigestMessage:
+    """رسالة ملخص مشتركة: أزرار كل طلب معروض فيها + أسطر الطلبات التي عولجت."""
+    text: str
+    rows: Dict[Any, list]     # tx_key (أو رقم تسلسلي لطلب بلا مفتاح) → صف أزرار
+    copies: list = field(default_factory=list)
+    handled: list = field(default_factory=list)
+
+
+@dataclass
+class _AdminCopies:
+    copies: list                      # [(admin_id, message_id)]
+    text: str = ""
+    parse_mode: Optional[str] = None
+    digest: Optional[_DigestMessage] = None
+
+
+admin_messages = TTLCache(_ADMIN_MSG_MAX, _ADMIN_MSG_TTL)
+
+
+def admin_tx_key(table_name: str, tx_id: Any) -> str:
+    return f"{table_name}:{tx_id}"
+
+
+def _escape(text: str, parse_mode: Optional[str]) -> str:
+    mode = str(parse_mode or "").lower()
+    if mode == "html":
+        return html.escape(text)
+    if mode == "markdown":
+        for ch in ("_", "*", "`", "["):
+            text = text.replace(ch, "\\" + ch)
+    return text
+
+
+async def resolve_admin_messages(tx_key: str, status_line: str, origin: Optional[Any] = None) -> bool:
+    """
+    تحديث كل نسخ رسالة الطلب عند المشرفين بالتوازي: إزالة الأزرار وإضافة status_line
+    (مثلاً من عالج الطلب). origin: رسالة المشرف الذي ضغط الزر (q.message).
+    ترجع True إذا كانت origin من النسخ التي حُدّثت، ليتجنب الـ handler تعديلها مرة ثانية.
+    """
+    entry = admin_messages.pop(tx_key)
+    if not entry:
+        return False
+    if entry.digest:
+        from telegram import InlineKeyboardMarkup
+
+        dm = entry.digest
+        dm.rows.pop(tx_key, None)
+        dm.handled.append(html.escape(status_line))
+        text = dm.text + "\n\n" + "\n".join(dm.handled)
+        markup = InlineKeyboardMarkup(list(dm.rows.values())) if dm.rows else None
+        copies, kwargs = dm.copies, {"text": text, "parse_mode": "HTML", "reply_markup": markup}
+    else:
+        text = entry.text + "\n\n" + _escape(status_line, entry.parse_mode)
+        copies, kwargs = entry.copies, {"text": text, "parse_mode": entry.parse_mode, "reply_markup": None}
+
+    futures = [
+        outbound.submit("edit_message_text", admin_id, PRIORITY_ADMIN, message_id=message_id, **kwargs)
+        for admin_id, message_id in copies
+    ]
+    await asyncio.gather(*futures)
+    if origin is None:
+        return False
+    return (getattr(origin, "chat_id", None), getattr(origin, "message_id", None)) in set(copies)
+
+
+@dataclass
+class _DigestItem:
+    kind: str
+    summary: str
+    amount: float
+    message: str
+    parse_mode: Optional[str]
+    reply_markup: Optional[Any]
+    tx_key: Optional[str] = None
+    seq: int = 0
+
+
+class AdminDigest:
+    """
+    يجمع إشعارات المشرفين خلال نافذة زمنية ويدمجها في رسالة ملخص واحدة:
+    عدد الطلبات لكل نوع + أكبر top_n طلبات مع أزرارها. إذا لم يصل خلال النافذة
+    إلا طلب واحد تُرسل رسالته الأصلية كما هي.
+    """
+
+    def __init__(self, window: float, top_n: int, immediate_amount: float):
+        self.window = window
+        self.top_n = max(1, top_n)
+        self.immediate_amount = immediate_amount
+        self._items: list = []
+        self._seq = 0
+        self._flush_task: Optional[asyncio.Task] = None
+        # مقاييس
+        self.digests_sent = 0
+        self.coalesced = 0
+        self.immediate = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def add(self, item: _DigestItem):
+        self._seq += 1
+        item.seq = self._seq
+        self._items.append(item)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later(), name="admin_digest")
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.window)
+        except asyncio.CancelledError:
+            return
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Failed to send admin digest")
+
+    async def close(self):
+        """إرسال ما تبقى فوراً (عند الإغلاق)."""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self.flush()
+
+    async def flush(self):
+        items, self._items = self._items, []
+        if not items:
+            return
+        if len(items) == 1:
+            only = items[0]
+            await notify_admin(only.message, parse_mode=only.parse_mode, reply_markup=only.reply_markup,
+                               tx_key=only.tx_key)
+            return
+        dm = self._render(items)
+        self.digests_sent += 1
+        self.coalesced += len(items)
+        markup = None
+        if dm.rows:
+            from telegram import InlineKeyboardMarkup
+            markup = InlineKeyboardMarkup(list(dm.rows.values()))
+        sent = await _send_to_admins(dm.text, "HTML", markup)
+        dm.copies = _copies(sent)
+        if dm.copies:
+            for key in dm.rows:
+                if isinstance(key, str):
+                    admin_messages.set(key, _AdminCopies(dm.copies, digest=dm))
+
+    def _render(self, items: list) -> _DigestMessage:
+        from telegram import InlineKeyboardButton
+
+        counts = Counter(i.kind for i in items)
+        top = heapq.nlargest(self.top_n, items, key=lambda i: (i.amount or 0, -i.seq))
+        lines = [f"🗂 <b>ملخص طلبات آخر {int(self.window)} ث:</b> {len(items)} طلب", ""]
+        lines += [f"• {html.escape(kind)}: {n}" for kind, n in counts.most_common()]
+        lines += ["", f"🔝 <b>أكبر {len(top)} طلبات:</b>"]
+        rows = {}
+        for n, item in enumerate(top, 1):
+            lines.append(f"{n}. {html.escape(item.summary)}")
+            buttons = [b for row in getattr(item.reply_markup, "inline_keyboard", None) or [] for b in row]
+            if buttons:
+                rows[item.tx_key or item.seq] = [
+                    InlineKeyboardButton(f"{b.text} ({n})", callback_data=b.callback_data) for b in buttons
+                ]
+        if len(items) > len(top):
+            lines += ["", f"… و{len(items) - len(top)} طلبات أخرى في /admin_panel"]
+        return _DigestMessage("\n".join(lines), rows)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "buffered": len(self._items),
+            "digests_sent": self.digests_sent,
+            "coalesced": self.coalesced,
+            "immediate": self.immediate,
+        }
+
+
+admin_digest = AdminDigest(_DIGEST_WINDOW, _DIGEST_TOP_N, _DIGEST_IMMEDIATE_AMOUNT)
+
+
+async def notify_admin_event(
+    kind: str,
+    message: str,
+    summary: str,
+    amount: Optional[float] = None,
+    parse_mode: Optional[str] = None,
+    reply_markup: Optional[Any] = None,
+    tx_key: Optional[str] = None,
+):
+    """
+    إشعار المشرفين بطلب جديد عبر وضع الملخص.
+    kind: اسم نوع الطلب المعروض في الملخص (مثلاً "إيداع Syriatel")
+    summary: سطر نصي قصير يمثل الطلب داخل الملخص
+    amount: قيمة الطلب بالـ NSP؛ إن تجاوزت الحد يُرسل الإشعار فوراً
+    tx_key: مفتاح الطلب (admin_tx_key) لتحديث نسخ الرسالة عند معالجته
+    """
+    if not admin_digest.enabled or (amount is not None and amount >= admin_digest.immediate_amount):
+        if admin_digest.enabled:
+            admin_digest.immediate += 1
+        await notify_admin(message, parse_mode=parse_mode, reply_markup=reply_markup, tx_key=tx_key)
+        return
+    admin_digest.add(_DigestItem(kind, summary, float(amount or 0), message, parse_mode, reply_markup, tx_key))
+
 
-    conc = concurrency or _ADMIN_CONCURRENCY
-    sem = asyncio.Semaphore(conc)
-
-    async def _send_with_retries(admin_id: int) -> tuple[int, bool]:
-        attempt = 0
-        while attempt <= retry_attempts:
-            try:
-                async with sem:
-                    coro = _bot_instance.send_message(
-                        chat_id=admin_id, text=message, parse_mode=parse_mode, reply_markup=reply_markup
-                    )
-                    await coro
-                    return admin_id, True
-            except Exception as exc:
-                logger.warning("notify_admin attempt %s failed for %s: %s", attempt + 1, admin_id, exc)
-                attempt += 1
-                if attempt <= retry_attempts:
-                    await asyncio.sleep(retry_delay * attempt)
-        return admin_id, False
-
-    tasks = [asyncio.create_task(_send_with_retries(a)) for a in admin_ids]
-    results = await asyncio.gather(*tasks, return_exceptions=False)
-    return {admin_id: success for admin_id, success in results}
\ No newline at end of file
+def get_outbound_stats() -> dict:
+    return {**outbound.stats(), "digest": admin_digest.stats(), "tracked_admin_messages": len(admin_messages)}
@@ -0,0 +1,56 @@
+# utils/ttl_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class TTLCache:
+    """
+    قاموس محدود الحجم بمدة صلاحية لكل مفتاح.
+    عند تجاوز maxsize يُحذف الأقدم إدخالاً؛ المفاتيح المنتهية تُحذف عند الوصول إليها أو عند الإضافة.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def set(self, key: Hashable, value: Any):
+        now = time.monotonic()
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (now + self.ttl, value)
+            self._evict(now)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            if item[0] <= time.monotonic():
+                del self._data[key]
+                return default
+            return item[1]
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+        if item is None or item[0] <= time.monotonic():
+            return default
+        return item[1]
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._evict(time.monotonic())
+            return len(self._data)
+
+    def _evict(self, now: float):
+        # الإدخالات مرتبة حسب وقت الإضافة، وكلها بنفس الـ ttl، فالمنتهي في البداية دائماً
+        while self._data:
+            key, (expires, _) = next(iter(self._data.items()))
+            if expires > now and len(self._data) <= self.maxsize:
+                break
+            del self._data[key]
+